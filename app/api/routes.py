@@ -1,12 +1,15 @@
+import secrets
 import time
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import JSONResponse
 from app.api.schemas import (
-    GapsRequest, OptimizeRequest,
+    GapsRequest, OptimizeRequest, UniverseChangeRequest, ClusterRequest, SimilarBatchRequest,
     SimilarSummaryRequest, GapsSummaryRequest, OptimizeSummaryRequest,
-    HealthResponse, SimilarResponse, GapResponse,
-    OptimizeResponse, SummaryResponse
+    HealthResponse, SimilarResponse, SimilarBatchResponse, GapResponse, ClusterResponse, ClusterBatchResponse,
+    OptimizeResponse, SummaryResponse, UniverseChangeResponse, UniverseChangeQueued
 )
-from app.core.validators import validate_tickers, validate_min_tickers
+from app.core.config import settings
+from app.core.validators import validate_tickers, validate_min_tickers, validate_ticker_format
 from app.services.recommender import recommender
 from app.models.summarizer import summarize_similar, summarize_gaps, summarize_optimize
 from app.core.logger import get_logger
@@ -17,6 +20,17 @@ router = APIRouter(prefix='/api/v1')
 
 START_TIME = time.time()
 
+
+def _universe() -> list[str]:
+    """Tickers of the live snapshot; 503 while the first build is still running."""
+    if not recommender.is_ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Recommender is building — retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    return recommender.combined_df.index.tolist()
+
 # ── Health ─────────────────────────────────────────────────────────────────────
 
 @router.get('/health', response_model=HealthResponse)
@@ -26,37 +40,86 @@ def health() -> HealthResponse:
         ready          = recommender.is_ready,
         ticker_count   = len(recommender.combined_df) if recommender.is_ready else 0,
         uptime_seconds = round(time.time() - START_TIME, 1),
+        building       = recommender.is_building,
+        generation     = recommender.generation if recommender.is_ready else None,
+        role           = recommender.role,
+        cluster_churn  = (recommender.artifacts.get('cluster_churn') or {}).get('churn'),
+        memory         = recommender.memory_report() if recommender.is_ready else None,
     )
 
 # ── Similarity ─────────────────────────────────────────────────────────────────
 
 @router.get('/similar/{ticker}', response_model=list[SimilarResponse])
-def similar(ticker: str, top_n: int = 5) -> list[SimilarResponse]:
+def similar(
+    ticker: str,
+    top_n: int = 5,
+    fund_weight: float | None = Query(default=None, ge=0.0, le=1.0),
+) -> list[SimilarResponse]:
+    """Most similar tickers; `fund_weight` re-blends fundamental vs technical at query time."""
     ticker = ticker.strip().upper()
-    universe = recommender.combined_df.index.tolist()
-    validate_tickers([ticker], universe)
+    universe = _universe()
+
+    # Out-of-universe: transform just this symbol with the fitted pipeline
+    if ticker not in universe:
+        validate_ticker_format([ticker])
+        try:
+            results = recommender.similar_external(ticker, top_n, fund_weight)
+        except ValueError as e:
+            log.warning(f"External similarity failed for {ticker}: {e}")
+            validate_tickers([ticker], universe)
+        return [SimilarResponse(**r) for r in results]
 
     try:
-        results = recommender.similar(ticker, top_n)
+        results = recommender.similar(ticker, top_n, fund_weight)
         return [SimilarResponse(**r) for r in results]
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
 
+@router.post('/similar', response_model=SimilarBatchResponse)
+def similar_batch(req: SimilarBatchRequest) -> SimilarBatchResponse:
+    """Similar tickers for up to 100 universe tickers, scored together; others in `missing`."""
+    _universe()
+    return SimilarBatchResponse(**recommender.similar_batch(req.tickers, req.top_n, req.fund_weight))
+
+# ── Clusters ───────────────────────────────────────────────────────────────────
+
+@router.get('/cluster/{ticker}', response_model=ClusterResponse)
+def cluster(ticker: str) -> ClusterResponse:
+    """Cluster and label of one ticker; out-of-universe symbols are placed without a refit."""
+    ticker = ticker.strip().upper()
+    _universe()
+    validate_ticker_format([ticker])
+    result = recommender.clusters([ticker])
+    if not result['results']:
+        raise HTTPException(status_code=404, detail=f"No data available for '{ticker}'")
+    return ClusterResponse(**result['results'][0])
+
+@router.post('/cluster', response_model=ClusterBatchResponse)
+def cluster_batch(req: ClusterRequest) -> ClusterBatchResponse:
+    """Clusters for up to 100 tickers; symbols without data are listed in `missing`."""
+    _universe()
+    validate_ticker_format(req.tickers)
+    return ClusterBatchResponse(**recommender.clusters(req.tickers))
+
 # ── Gaps ───────────────────────────────────────────────────────────────────────
 
 @router.post('/gaps', response_model=list[GapResponse])
 def gaps(req: GapsRequest) -> list[GapResponse]:
-    universe = recommender.combined_df.index.tolist()
+    universe = _universe()
     validate_tickers(req.portfolio, universe)
 
-    results = recommender.gaps(req.portfolio, req.top_n)
+    results = recommender.gaps(
+        req.portfolio, req.top_n,
+        weights=req.weights, rank_by=req.rank_by, add_weight=req.add_weight,
+        investable_only=req.investable_only,
+    )
     return [GapResponse(**r) for r in results]
 
 # ── Optimize ───────────────────────────────────────────────────────────────────
 
 @router.post('/optimize', response_model=OptimizeResponse)
 def optimize(req: OptimizeRequest) -> OptimizeResponse:
-    universe = recommender.combined_df.index.tolist()
+    universe = _universe()
     validate_tickers(req.tickers, universe)
     validate_min_tickers(req.tickers, minimum=2)
 
@@ -72,14 +135,42 @@ def evaluate_optimizer(tickers: str, risk: str = 'moderate'):
     tickers: comma-separated e.g. AAPL,MSFT,JNJ,XOM
     """
     ticker_list = [t.strip().upper() for t in tickers.split(',')]
-    universe    = recommender.combined_df.index.tolist()
+    universe    = _universe()
     validate_tickers(ticker_list, universe)
     validate_min_tickers(ticker_list, minimum=3)
     return backtest_optimizer(recommender.prices, ticker_list, risk)
 
+@router.get('/evaluate/stability')
+def evaluate_stability(limit: int = Query(default=20, ge=1, le=1000)):
+    """
+    Bootstrap stability of the current clustering (cached per generation).
+    Tickers are listed least stable first, up to `limit`. The analysis runs
+    in the background; 503 with Retry-After until it has finished.
+    """
+    _universe()
+    try:
+        result = recommender.stability()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if result is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Stability analysis is running for this generation — retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    tickers = result['tickers'].sort_values('stability').head(limit)
+    tickers = tickers.astype(object).where(tickers.notna(), None)     # NaN is not JSON
+    return {
+        'generation': recommender.generation,
+        'summary':    result['summary'],
+        'clusters':   result['clusters'].reset_index().to_dict(orient='records'),
+        'tickers':    tickers.reset_index(names='ticker').to_dict(orient='records'),
+    }
+
 @router.post('/evaluate/portfolio_metrics')
 def portfolio_metrics(req: OptimizeRequest):
     """Compute realized metrics for a given set of weights"""
+    _universe()
     result  = recommender.optimize(req.tickers, req.risk)
     metrics = compute_portfolio_metrics(recommender.prices, result['weights'])
     return {
@@ -91,6 +182,48 @@ def portfolio_metrics(req: OptimizeRequest):
             'note':       'Positive gap = optimizer was optimistic. Expected for in-sample prediction.'
         }
     }
+# ── Admin: universe changes ────────────────────────────────────────────────────
+
+def _change_universe(change: str, tickers: list[str], token: str | None):
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled — set ADMIN_TOKEN")
+    if not secrets.compare_digest(token or '', settings.admin_token):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Admin-Token")
+    _universe()
+    if recommender.role == 'follower':
+        # Only the builder changes the universe — hand it over via the store
+        queued = UniverseChangeQueued(**recommender.queue_universe_change(change, tickers))
+        return JSONResponse(status_code=202, content=queued.model_dump())
+    if recommender.is_building:
+        raise HTTPException(
+            status_code=409,
+            detail="A build is in progress — retry shortly",
+            headers={"Retry-After": "5"},
+        )
+    apply = recommender.add_tickers if change == 'add' else recommender.remove_tickers
+    try:
+        return UniverseChangeResponse(**apply(tickers))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.post('/admin/universe/add', response_model=UniverseChangeResponse,
+             responses={202: {'model': UniverseChangeQueued}})
+def universe_add(
+    req: UniverseChangeRequest,
+    x_admin_token: str | None = Header(default=None),
+) -> UniverseChangeResponse:
+    """Add tickers without a rebuild (fetches only the new symbols)."""
+    return _change_universe('add', req.tickers, x_admin_token)
+
+@router.post('/admin/universe/remove', response_model=UniverseChangeResponse,
+             responses={202: {'model': UniverseChangeQueued}})
+def universe_remove(
+    req: UniverseChangeRequest,
+    x_admin_token: str | None = Header(default=None),
+) -> UniverseChangeResponse:
+    """Remove tickers without a rebuild."""
+    return _change_universe('remove', req.tickers, x_admin_token)
+
 # ── Summarize ──────────────────────────────────────────────────────────────────
 
 @router.post('/summarize/similar', response_model=SummaryResponse)
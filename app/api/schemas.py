@@ -1,17 +1,35 @@
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 from typing import Literal
 
+MAX_HOLDINGS = 1000
+
 # ── Request schemas ────────────────────────────────────────────────────────────
 
 class GapsRequest(BaseModel):
-    portfolio: list[str] = Field(..., min_length=1, max_length=20)
-    top_n:     int       = Field(default=5, ge=1, le=20)
+    portfolio:       list[str]          = Field(..., min_length=1, max_length=MAX_HOLDINGS)
+    weights:         list[float] | None = None    # parallel to portfolio; default equal weight
+    top_n:           int                = Field(default=5, ge=1, le=20)
+    rank_by:         Literal['correlation', 'marginal_vol', 'vol_change'] = 'correlation'
+    add_weight:      float              = Field(default=0.05, gt=0, lt=1)   # candidate weight for vol_change
+    investable_only: bool               = False   # skip candidates with an exclusion_reason
 
     @field_validator('portfolio')
     @classmethod
     def uppercase_tickers(cls, v):
         return [t.strip().upper() for t in v]
 
+    @model_validator(mode='after')
+    def check_weights(self):
+        if self.weights is None:
+            return self
+        if len(self.weights) != len(self.portfolio):
+            raise ValueError(
+                f"weights has {len(self.weights)} entries, portfolio has {len(self.portfolio)}"
+            )
+        if any(w <= 0 for w in self.weights):
+            raise ValueError("weights must be positive")
+        return self
+
 class OptimizeRequest(BaseModel):
     tickers: list[str]                                    = Field(..., min_length=2, max_length=20)
     risk:    Literal['conservative', 'moderate', 'aggressive'] = 'moderate'
@@ -21,6 +39,32 @@ class OptimizeRequest(BaseModel):
     def uppercase_tickers(cls, v):
         return [t.strip().upper() for t in v]
 
+class UniverseChangeRequest(BaseModel):
+    tickers: list[str] = Field(..., min_length=1, max_length=100)
+
+    @field_validator('tickers')
+    @classmethod
+    def uppercase_tickers(cls, v):
+        return [t.strip().upper() for t in v]
+
+class ClusterRequest(BaseModel):
+    tickers: list[str] = Field(..., min_length=1, max_length=100)
+
+    @field_validator('tickers')
+    @classmethod
+    def uppercase_tickers(cls, v):
+        return list(dict.fromkeys(t.strip().upper() for t in v))
+
+class SimilarBatchRequest(BaseModel):
+    tickers:     list[str] = Field(..., min_length=1, max_length=100)
+    top_n:       int       = Field(default=5, ge=1, le=50)
+    fund_weight: float | None = Field(default=None, ge=0.0, le=1.0)   # None = build blend (0.70)
+
+    @field_validator('tickers')
+    @classmethod
+    def uppercase_tickers(cls, v):
+        return list(dict.fromkeys(t.strip().upper() for t in v))
+
 class SimilarSummaryRequest(BaseModel):
     ticker:  str
     results: list[dict]
@@ -36,11 +80,26 @@ class OptimizeSummaryRequest(BaseModel):
 
 # ── Response schemas ───────────────────────────────────────────────────────────
 
+class MemoryReport(BaseModel):
+    prices_mb:     float
+    combined_mb:   float
+    scaled_mb:     float
+    similarity_mb: float
+    neighbors_mb:  float = 0.0
+    returns_mb:    float = 0.0
+    total_mb:      float
+    compact:       bool
+
 class HealthResponse(BaseModel):
     status:          str
     ready:           bool
     ticker_count:    int
     uptime_seconds:  float
+    building:        bool       = False
+    generation:      int | None = None
+    role:            str        = 'standalone'
+    cluster_churn:   float | None = None   # share of tickers that changed cluster vs previous generation
+    memory:          MemoryReport | None = None
 
 class SimilarResponse(BaseModel):
     ticker:      str
@@ -50,10 +109,43 @@ class SimilarResponse(BaseModel):
     momentum_6m: float
     volatility:  float
 
+class SimilarBatchResponse(BaseModel):
+    results: dict[str, list[SimilarResponse]]
+    missing: list[str] = []            # not in the universe
+
 class GapResponse(BaseModel):
-    ticker:      str
-    sector:      str
-    correlation: float
+    ticker:       str
+    sector:       str
+    correlation:  float | None
+    marginal_vol: float | None = None
+    vol_change:   float | None = None
+
+class ClusterResponse(BaseModel):
+    ticker:        str
+    cluster:       int
+    cluster_label: str
+    sector:        str | None   = None
+    distance:      float | None = None   # to the cluster centroid, weighted feature space
+    in_universe:   bool
+
+class ClusterBatchResponse(BaseModel):
+    results: list[ClusterResponse]
+    missing: list[str] = []            # no usable prices / fundamentals
+
+class UniverseChangeResponse(BaseModel):
+    added:             list[str]
+    removed:           list[str]
+    skipped:           list[str]         # already present / unknown / no data
+    generation:        int
+    ticker_count:      int
+    seconds:           float
+    refit_recommended: bool
+    refit_reasons:     list[str] = []
+
+class UniverseChangeQueued(BaseModel):
+    request_id: str                      # applied by the builder on its next poll
+    change:     str                      # 'add' / 'remove'
+    tickers:    list[str]
 
 class OptimizeResponse(BaseModel):
     weights:         dict[str, float]
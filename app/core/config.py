@@ -17,6 +17,73 @@ class Settings(BaseSettings):
     hf_model:        str   = "human-centered-summarization/financial-summarization-pegasus"
     groq_model:      str   = "llama-3.3-70b-versatile"
 
+    # Build pipeline stage memoization (app/core/stage_cache.py)
+    stage_cache_enabled: bool = True
+    stage_cache_dir:     str  = "app/data/stages"
+
+    # Technical stage (app/features/indicator_state.py): roll the saved indicator state
+    # forward by the new bars instead of recomputing the full history every build
+    technical_incremental: bool = True
+    technical_state_path:  str  = "app/data/state/technical_state.npz"
+
+    # Build DAG executor (app/core/dag.py)
+    build_max_workers:   int  = 4
+    build_use_processes: bool = True    # process pool for cpu stages
+
+    # On-disk snapshots for fast cold starts (app/services/snapshot_store.py)
+    snapshot_enabled: bool = True
+    snapshot_dir:     str  = "app/data/snapshots"
+    snapshot_keep:    int  = 3
+
+    # Several workers share one builder + the mmapped snapshot (uvicorn --workers N)
+    shared_snapshot:       bool  = False
+    snapshot_poll_seconds: float = 5.0
+
+    # Clustering (app/models/clustering.py): 'minibatch' for thousands of tickers
+    cluster_mode:       Literal["kmeans", "minibatch"] = "kmeans"
+    cluster_batch_size: int = 1024
+    cluster_warm_start: bool = True    # init from the previous build's centroids, stable ids
+
+    # Number of clusters (app/models/k_selection.py): 'fixed' = 8, or swept per build
+    cluster_k_rule:   Literal["fixed", "silhouette", "elbow"] = "fixed"
+    cluster_k_min:    int = 4
+    cluster_k_max:    int = 16
+    cluster_min_size: int = 3    # smallest admissible cluster for the sweep rules
+
+    # Cluster label rule table (app/models/clustering.py LabelRules): JSON file, empty = built-in
+    cluster_label_rules: str = ""
+
+    # Similarity serving (app/models/similarity.py NeighborIndex): top/bottom k per ticker;
+    # the dense N x N matrices (snapshot.similarity_df) are only built when similarity_dense
+    # is on — no query path reads them, so memory stays linear in N by default
+    similarity_neighbors: int  = 50
+    similarity_dense:     bool = False
+
+    # 'lsh' = approximate index for very large universes (app/models/ann.py LSHIndex)
+    similarity_index: Literal["topk", "lsh"] = "topk"
+    lsh_tables:       int = 16
+    lsh_bits:         int = 12
+    lsh_probes:       int = 2    # extra buckets per table at query time
+
+    # Bootstrap cluster stability (app/evaluation/stability.py), computed once per
+    # generation on a background thread — started on publish, or on first request
+    stability_bootstrap:    int   = 50
+    stability_on_publish:   bool  = True
+    stability_sample_frac:  float = 0.8
+    stability_feature_frac: float = 0.8
+
+    # Runtime universe changes (/admin/universe/*); empty = admin endpoints disabled
+    admin_token: str = ""
+
+    # Investable-universe filter (recommender.exclusion_reasons)
+    investable_min_history:      int   = 60
+    investable_min_debt_equity:  float = -3.0
+    investable_speculative_pe:   float = 300.0
+    investable_speculative_beta: float = 1.5
+
+    # float32 / categorical storage of the built universe (app/core/memory.py)
+    compact_mode: bool = False
+
     tickers: list[str] = [
         # Technology
         "AAPL", "MSFT", "GOOGL", "AMZN", "META",
@@ -0,0 +1,256 @@
+"""
+Build DAG Executor
+------------------
+Runs pipeline stages as a dependency graph instead of a fixed sequence,
+so independent stages overlap:
+
+    prices ───────> technical ─┐
+    fundamentals ──────────────┴─> merge -> scale ─┬─> cluster ───> investable
+                                                   └─> similarity     (+ prices)
+
+Each stage is submitted as soon as all of its dependencies finished:
+  - kind='io'  : thread pool  (network fetches, cheap glue stages)
+  - kind='cpu' : process pool (numpy / sklearn heavy stages), so they do
+                 not contend for the GIL. Arguments and results are pickled
+                 across the process boundary — set use_processes=False to
+                 run them on threads when that copy outweighs the win.
+                 Workers start from a forkserver, not fork() — see
+                 process_pool().
+
+A stage function receives its dependencies' outputs positionally, in
+`deps` order; fixed arguments are bound with functools.partial.
+
+With a StageCache, a stage whose key (inputs + code version) is unchanged
+is loaded in the main process and never dispatched.
+
+After run(), `report` holds per-stage timings and the critical path —
+the dependency chain with the largest summed stage time, which is the
+lower bound on wall time however many workers are available.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import time
+from concurrent.futures import (
+    FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait,
+)
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from app.core.logger import get_logger
+from app.core.stage_cache import StageCache
+
+log = get_logger(__name__)
+
+STAGE_KINDS = ('io', 'cpu')
+
+# Imported once by the forkserver; its workers fork from that clean,
+# single-threaded process instead of re-importing the numeric stack.
+WORKER_PRELOAD = (
+    'numpy', 'pandas', 'sklearn.cluster',
+    'app.features.technical', 'app.features.fundamentals',
+    'app.models.clustering', 'app.models.similarity', 'app.models.ann',
+    'app.models.k_selection', 'app.evaluation.stability',
+)
+
+
+def process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    ProcessPoolExecutor whose workers start from a forkserver (spawn where
+    that is unavailable) instead of fork().
+
+    fork() copies the caller mid-flight, including locks held by its other
+    threads — the background build, IO stage threads, fetch workers,
+    uvicorn's threads — and a child can block forever on one of them.
+    Every process pool in the app goes through here.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload(list(WORKER_PRELOAD))   # no-op once the server runs
+    else:
+        context = multiprocessing.get_context('spawn')
+    return ProcessPoolExecutor(max_workers, mp_context=context)
+
+
+@dataclass
+class Stage:
+    """One node of the build graph."""
+    name:       str
+    fn:         Callable
+    deps:       tuple[str, ...] = ()
+    kind:       str             = 'io'    # 'io' -> threads, 'cpu' -> processes
+    key_inputs: Any             = None    # cache key override (see StageCache.run)
+    memoize:    bool            = True
+
+
+def _timed(fn: Callable, *args) -> tuple[Any, float]:
+    """Run fn in a worker and measure its own compute time (excludes queueing)."""
+    start = time.perf_counter()
+    out   = fn(*args)
+    return out, time.perf_counter() - start
+
+
+def _topological_order(stages: dict[str, Stage]) -> list[str]:
+    """Stage names in dependency order; raises ValueError on unknown deps or cycles."""
+    for stage in stages.values():
+        unknown = [d for d in stage.deps if d not in stages]
+        if unknown:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stages {unknown}")
+        if stage.kind not in STAGE_KINDS:
+            raise ValueError(f"Stage '{stage.name}' has invalid kind '{stage.kind}'")
+
+    order, state = [], {}
+
+    def visit(name: str, path: tuple[str, ...]):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Cycle in build graph: {' -> '.join(path + (name,))}")
+        state[name] = 'visiting'
+        for dep in stages[name].deps:
+            visit(dep, path + (name,))
+        state[name] = 'done'
+        order.append(name)
+
+    for name in stages:
+        visit(name, ())
+    return order
+
+
+class DAGExecutor:
+    """
+    Execute a set of Stages concurrently, respecting dependencies.
+
+    Attributes:
+        report: filled by run() — wall time, per-stage timings and the
+                critical path
+    """
+
+    def __init__(
+        self,
+        stages: list[Stage],
+        cache: StageCache = None,
+        max_workers: int = 4,
+        use_processes: bool = True,
+    ):
+        self.stages        = {s.name: s for s in stages}
+        self.cache         = cache
+        self.max_workers   = max_workers
+        self.use_processes = use_processes
+        self.order         = _topological_order(self.stages)
+        self.report: dict  = {}
+
+    def run(self) -> dict[str, Any]:
+        """
+        Run every stage once.
+
+        Returns:
+            dict stage name -> output
+        """
+        t0       = time.perf_counter()
+        results: dict[str, Any]  = {}
+        timings: dict[str, dict] = {}
+        pending  = list(self.order)
+        running: dict[Future, tuple[str, str, float]] = {}
+
+        need_procs = self.use_processes and any(
+            s.kind == 'cpu' for s in self.stages.values()
+        )
+        procs_ctx  = process_pool(self.max_workers) if need_procs else nullcontext()
+
+        with ThreadPoolExecutor(self.max_workers) as threads, procs_ctx as procs:
+            while pending or running:
+                # Launch (or load from cache) every stage whose deps are done
+                for name in [n for n in pending if all(d in results for d in self.stages[n].deps)]:
+                    pending.remove(name)
+                    stage   = self.stages[name]
+                    args    = tuple(results[d] for d in stage.deps)
+                    started = time.perf_counter() - t0
+
+                    key = None
+                    if self.cache is not None and self.cache.enabled and stage.memoize:
+                        inputs   = stage.key_inputs if stage.key_inputs is not None else (args, {})
+                        key      = self.cache.key(name, stage.fn, inputs)
+                        hit, out = self.cache.lookup(name, key)
+                        if hit:
+                            results[name] = out
+                            loaded        = time.perf_counter() - t0 - started
+                            timings[name] = self._timing(stage, 'hit', started, t0, loaded)
+                            self.cache.record(name, 'hit', timings[name]['seconds'], key)
+                            continue
+
+                    pool   = procs if (stage.kind == 'cpu' and procs is not None) else threads
+                    future = pool.submit(_timed, stage.fn, *args)
+                    running[future] = (name, key, started)
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, key, started = running.pop(future)
+                    stage = self.stages[name]
+                    try:
+                        out, seconds = future.result()
+                    except Exception:
+                        log.error(f"Build stage '{name}' failed")
+                        for other in running:
+                            other.cancel()
+                        raise
+
+                    status = 'run'
+                    if key is not None:
+                        self.cache.store(name, key, out)
+                        status = 'miss'
+                    results[name] = out
+                    timings[name] = self._timing(stage, status, started, t0, seconds)
+                    if self.cache is not None:
+                        self.cache.record(name, status, seconds, key)
+
+        wall               = time.perf_counter() - t0
+        path, path_seconds = self._critical_path(timings)
+        self.report = {
+            'wall_seconds':          round(wall, 4),
+            'stage_seconds_sum':     round(sum(t['seconds'] for t in timings.values()), 4),
+            'critical_path':         path,
+            'critical_path_seconds': round(path_seconds, 4),
+            'stages':                [timings[n] for n in self.order],
+        }
+        log.info(
+            f"Build DAG done in {wall:.2f}s — "
+            f"sum of stages {self.report['stage_seconds_sum']:.2f}s, "
+            f"critical path {' -> '.join(path)} ({path_seconds:.2f}s)"
+        )
+        return results
+
+    @staticmethod
+    def _timing(stage: Stage, status: str, started: float, t0: float, seconds: float) -> dict:
+        return {
+            'stage':   stage.name,
+            'kind':    stage.kind,
+            'status':  status,
+            'seconds': round(seconds, 4),
+            'start':   round(started, 4),
+            'end':     round(time.perf_counter() - t0, 4),
+        }
+
+    def _critical_path(self, timings: dict[str, dict]) -> tuple[list[str], float]:
+        """Longest dependency chain by summed stage seconds."""
+        best: dict[str, tuple[float, str | None]] = {}
+        for name in self.order:
+            own  = timings[name]['seconds']
+            prev = max(self.stages[name].deps, key=lambda d: best[d][0], default=None)
+            best[name] = (own + (best[prev][0] if prev else 0.0), prev)
+
+        if not best:
+            return [], 0.0
+        # Ties (e.g. a near-zero final stage) resolve to the later stage
+        end  = max(reversed(self.order), key=lambda n: best[n][0])
+        path = []
+        node = end
+        while node is not None:
+            path.append(node)
+            node = best[node][1]
+        return path[::-1], best[end][0]
@@ -0,0 +1,82 @@
+"""
+Compact In-Memory Representation
+--------------------------------
+Helpers for holding the built universe in less memory per worker.
+
+Compact mode (settings.compact_mode) converts the recommender's frames
+after a build:
+  - numeric blocks float64 -> float32    (half the bytes)
+  - 'sector' / 'cluster_label' / 'exclusion_reason' object -> category
+    (one code per row)
+
+Tolerance vs float64: float32 keeps ~7 significant digits, so similarity
+scores differ from the float64 build by < COMPACT_ATOL (1e-5 absolute);
+rankings only change between candidates whose scores are within that
+tolerance of each other. Heavy computations (features, scaling, cosine)
+still run in float64 — only the stored results are compacted.
+
+TickerIndex is a __slots__, array-backed symbol <-> position map shared
+by all matrices of a build instead of per-lookup `.index.tolist()` scans.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+COMPACT_ATOL     = 1e-5
+CATEGORICAL_COLS = ('sector', 'cluster_label', 'exclusion_reason')
+
+
+class TickerIndex:
+    """Array-backed ticker index: position lookups without a list scan."""
+
+    __slots__ = ('symbols', '_pos')
+
+    def __init__(self, symbols):
+        self.symbols = np.asarray([str(s) for s in symbols], dtype=object)
+        self._pos    = {s: i for i, s in enumerate(self.symbols)}
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self._pos
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def position(self, ticker: str) -> int:
+        """Row / column position of `ticker`; KeyError if unknown."""
+        return self._pos[ticker]
+
+    def positions(self, tickers: list[str]) -> np.ndarray:
+        """Positions of known `tickers` (unknown ones are skipped)."""
+        return np.fromiter(
+            (self._pos[t] for t in tickers if t in self._pos), dtype=np.intp
+        )
+
+    def tolist(self) -> list[str]:
+        return self.symbols.tolist()
+
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """float64 -> float32 and sector/label -> category; other columns untouched."""
+    if df is None:
+        return None
+    out = df.copy()
+    float_cols = out.select_dtypes(include='float64').columns
+    if len(float_cols):
+        out[float_cols] = out[float_cols].astype(np.float32)
+    for col in CATEGORICAL_COLS:
+        if col in out.columns and not isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = out[col].astype('category')
+    return out
+
+
+def frame_mb(df) -> float:
+    """Deep memory usage of a DataFrame / Series in MB (0 for None)."""
+    if df is None:
+        return 0.0
+    usage = df.memory_usage(deep=True)
+    return float(usage.sum() if hasattr(usage, 'sum') else usage) / 1e6
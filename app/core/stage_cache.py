@@ -0,0 +1,211 @@
+"""
+Stage Cache
+-----------
+Content-addressed artifact cache for the build pipeline stages.
+
+Each stage is memoized under a key built from:
+  - the stage name
+  - a fingerprint of its inputs (DataFrames hashed by content, not identity)
+  - a code version: hash of the source of the module defining the stage
+    function, so editing the feature / clustering code invalidates it
+
+A stage whose key is unchanged is skipped and its pickled output loaded
+from disk. Only the latest artifact per stage is kept.
+
+Every run() appends a record to `report` (stage, hit/miss, seconds), so a
+build can log which stages actually did work:
+
+    stage prices        run    1.84s
+    stage fundamentals  hit    0.01s
+    stage technical     miss   0.12s
+    ...
+
+Sits alongside SimpleCache (query results) and DiskCache (raw yfinance
+payloads) — this one caches derived build artifacts.
+"""
+
+from __future__ import annotations
+
+import functools
+import hashlib
+import inspect
+import json
+import pickle
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+
+from app.core.logger import get_logger
+
+log = get_logger(__name__)
+
+STAGE_CACHE_DIR = "app/data/stages"
+
+
+def _update(h, obj: Any) -> None:
+    """Feed a content fingerprint of `obj` into hash `h`."""
+    if isinstance(obj, pd.DataFrame):
+        h.update(b'df')
+        h.update(json.dumps([str(c) for c in obj.columns]).encode())
+        h.update(json.dumps([str(d) for d in obj.dtypes]).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, pd.Series):
+        h.update(b'series')
+        h.update(str(obj.name).encode() + str(obj.dtype).encode())
+        h.update(pd.util.hash_pandas_object(obj, index=True).to_numpy().tobytes())
+    elif isinstance(obj, np.ndarray):
+        h.update(f"nd{obj.dtype}{obj.shape}".encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, (list, tuple)):
+        h.update(b'[')
+        for item in obj:
+            _update(h, item)
+        h.update(b']')
+    elif isinstance(obj, dict):
+        h.update(b'{')
+        for k in sorted(obj, key=str):
+            _update(h, k)
+            _update(h, obj[k])
+        h.update(b'}')
+    elif obj is None or isinstance(obj, (str, int, float, bool)):
+        h.update(repr(obj).encode())
+    else:
+        h.update(pickle.dumps(obj))
+
+
+def fingerprint(*objs: Any) -> str:
+    """Content hash of arbitrary stage inputs."""
+    h = hashlib.md5()
+    for obj in objs:
+        _update(h, obj)
+    return h.hexdigest()
+
+
+_code_versions: dict[str, str] = {}
+
+
+def code_version(fn: Callable) -> str:
+    """Hash of the source of the module defining `fn` (cached per module)."""
+    module = inspect.getmodule(fn)
+    name   = module.__name__ if module else getattr(fn, '__qualname__', repr(fn))
+    if name not in _code_versions:
+        try:
+            source = inspect.getsource(module or fn)
+        except (OSError, TypeError):
+            source = name
+        _code_versions[name] = hashlib.md5(source.encode()).hexdigest()[:12]
+    return _code_versions[name]
+
+
+class StageCache:
+    """
+    Memoize pipeline stages on disk by input content + code version.
+
+    Layout:
+        app/data/stages/
+            technical-<key>.pkl
+            scale-<key>.pkl
+            ...
+    """
+
+    def __init__(self, cache_dir: str = STAGE_CACHE_DIR, enabled: bool = True):
+        self._dir    = Path(cache_dir)
+        self.enabled = enabled
+        self.report: list[dict] = []
+
+    def _path(self, name: str, key: str) -> Path:
+        return self._dir / f"{name}-{key}.pkl"
+
+    def key(self, name: str, fn: Callable, inputs: Any) -> str:
+        # functools.partial: bound arguments are inputs too
+        if isinstance(fn, functools.partial):
+            return fingerprint(name, code_version(fn.func), (fn.args, fn.keywords), inputs)[:16]
+        return fingerprint(name, code_version(fn), inputs)[:16]
+
+    def run(
+        self,
+        name: str,
+        fn: Callable,
+        *args,
+        key_inputs: Any = None,
+        memoize: bool = True,
+        **kwargs,
+    ) -> Any:
+        """
+        Run `fn(*args, **kwargs)` as stage `name`, or load its cached output.
+
+        Args:
+            name:       stage name (used in file names and the report)
+            fn:         stage function
+            key_inputs: what the output depends on, if not simply the call
+                        arguments (e.g. tickers + date for a network fetch)
+            memoize:    False to always run (still timed and reported)
+
+        Returns:
+            the stage output
+        """
+        start = time.perf_counter()
+
+        if not (self.enabled and memoize):
+            out = fn(*args, **kwargs)
+            self.record(name, 'run', time.perf_counter() - start)
+            return out
+
+        inputs   = key_inputs if key_inputs is not None else (args, kwargs)
+        key      = self.key(name, fn, inputs)
+        hit, out = self.lookup(name, key)
+        if hit:
+            self.record(name, 'hit', time.perf_counter() - start, key)
+            return out
+
+        out = fn(*args, **kwargs)
+        self.store(name, key, out)
+        self.record(name, 'miss', time.perf_counter() - start, key)
+        return out
+
+    def lookup(self, name: str, key: str) -> tuple[bool, Any]:
+        """(True, output) if an artifact for `key` is on disk, else (False, None)."""
+        path = self._path(name, key)
+        if not path.exists():
+            return False, None
+        try:
+            with open(path, 'rb') as f:
+                return True, pickle.load(f)
+        except Exception as e:
+            log.warning(f"stage_cache_read_error  {name}: {e}")
+            return False, None
+
+    def store(self, name: str, key: str, out: Any) -> None:
+        """Persist a stage output under `key`, replacing older artifacts."""
+        try:
+            self._dir.mkdir(parents=True, exist_ok=True)
+            for old in self._dir.glob(f"{name}-*.pkl"):
+                old.unlink()
+            tmp = self._path(name, key).with_suffix('.tmp')
+            with open(tmp, 'wb') as f:
+                pickle.dump(out, f, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp.replace(self._path(name, key))
+        except Exception as e:
+            log.warning(f"stage_cache_write_error  {name}: {e}")
+
+    def record(self, name: str, status: str, seconds: float, key: str = None) -> None:
+        """Append a report entry for one stage execution."""
+        self.report.append({
+            'stage':   name,
+            'status':  status,
+            'seconds': round(seconds, 4),
+            'key':     key,
+        })
+        log.info(f"stage {name:<13} {status:<5} {seconds:.2f}s")
+
+    def reset_report(self) -> None:
+        self.report = []
+
+    def clear(self) -> None:
+        """Delete all cached stage artifacts."""
+        for f in self._dir.glob("*.pkl"):
+            f.unlink()
+        log.info("stage_cache_cleared")
@@ -1,11 +1,31 @@
+import re
+
 from fastapi import HTTPException
 from app.core.logger import get_logger
 
 log = get_logger(__name__)
 
+# Yahoo symbols: AAPL, BRK-B, 0700.HK, ^GSPC, EURUSD=X
+TICKER_PATTERN = re.compile(r"^\^?[A-Z0-9][A-Z0-9.\-=]{0,14}$")
+
+def validate_ticker_format(tickers: list[str]) -> list[str]:
+    """Reject malformed symbols before anything is fetched for them"""
+    invalid = [t for t in tickers if not TICKER_PATTERN.match(t)]
+    if invalid:
+        log.warning(f"Malformed tickers requested: {invalid}")
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "error":   "Invalid ticker format",
+                "invalid": invalid,
+            }
+        )
+    return tickers
+
 def validate_tickers(tickers: list[str], universe: list[str]) -> list[str]:
     """Validate all tickers exist in the known universe"""
-    invalid = [t for t in tickers if t not in universe]
+    known   = set(universe)
+    invalid = [t for t in tickers if t not in known]
     if invalid:
         log.warning(f"Invalid tickers requested: {invalid}")
         raise HTTPException(
@@ -0,0 +1,207 @@
+"""
+Cluster Stability
+-----------------
+Are the KMeans groupings structure or noise? Bootstrap consensus
+clustering (Monti et al., 2003) on the built universe:
+
+  1. each replicate draws `sample_frac` of the tickers and `feature_frac`
+     of the feature columns (without replacement — duplicated rows would
+     pull centroids towards themselves) and re-clusters them with the
+     same ClusterModel settings as the build
+  2. co-assignment: for every pair of tickers, the share of the replicates
+     that sampled both in which they landed in the same cluster
+  3. per-ticker stability: mean co-assignment with the other members of
+     its built cluster (1.0 = always grouped with them). A singleton has
+     no peers; its score is 1 - its highest co-assignment with any other
+     ticker, i.e. how reliably it stays on its own
+  4. per-cluster stability: mean co-assignment within the cluster, and
+     the adjusted Rand index of each replicate against the built
+     partition (on the tickers it sampled)
+
+Replicates are independent, so they run in a process pool in chunks of
+`ceil(n_boot / workers)` (one pickle of the feature matrix per chunk),
+each worker on its share of the BLAS/OpenMP threads. Workers return only
+cluster ids; the parent accumulates the N x N counts with two matrix
+products per replicate.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import adjusted_rand_score
+from threadpoolctl import threadpool_limits
+
+from app.core.dag import process_pool
+from app.core.logger import get_logger
+from app.models.clustering import DEFAULT_N_CLUSTERS, MINIBATCH_SIZE, ClusterModel
+
+log = get_logger(__name__)
+
+UNSTABLE_BELOW = 0.6    # tickers / clusters reported as unstable
+
+
+def _draw(n_rows: int, n_cols: int, n_clusters: int, sample_frac: float, feature_frac: float, rng):
+    """Row and column positions of one replicate (sorted)."""
+    rows = max(n_clusters + 1, round(sample_frac * n_rows))
+    cols = max(2, round(feature_frac * n_cols))
+    return (
+        np.sort(rng.choice(n_rows, min(rows, n_rows), replace=False)),
+        np.sort(rng.choice(n_cols, min(cols, n_cols), replace=False)),
+    )
+
+
+def _run_replicates(
+    scaled_df: pd.DataFrame,
+    replicates: list[int],
+    n_clusters: int,
+    sample_frac: float,
+    feature_frac: float,
+    mode: str,
+    batch_size: int,
+    seed: int,
+    threads: int,
+) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Fit a chunk of replicates (runs in a worker process); (row positions, ids) each."""
+    out = []
+    with threadpool_limits(limits=threads):
+        for b in replicates:
+            rng        = np.random.default_rng([seed, b])
+            rows, cols = _draw(len(scaled_df), scaled_df.shape[1], n_clusters, sample_frac, feature_frac, rng)
+            sample     = scaled_df.iloc[rows, cols]
+            ids        = ClusterModel(n_clusters, mode, batch_size).fit_predict(sample)
+            out.append((rows, ids.astype(np.int32)))
+    return out
+
+
+def bootstrap_stability(
+    scaled_df: pd.DataFrame,
+    reference: pd.Series,
+    n_clusters: int = DEFAULT_N_CLUSTERS,
+    n_boot: int = 50,
+    sample_frac: float = 0.8,
+    feature_frac: float = 0.8,
+    mode: str = 'kmeans',
+    batch_size: int = MINIBATCH_SIZE,
+    max_workers: int = 4,
+    use_processes: bool = True,
+    seed: int = 0,
+) -> dict:
+    """
+    Bootstrap consensus stability of a clustering.
+
+    Args:
+        scaled_df:     scaled features the clustering was fitted on
+        reference:     built cluster id per ticker (indexed like scaled_df)
+        n_clusters:    k used for every replicate
+        n_boot:        number of replicates
+        sample_frac:   share of tickers drawn per replicate
+        feature_frac:  share of feature columns drawn per replicate
+        mode:          ClusterModel mode
+        max_workers:   parallel workers
+        use_processes: process pool (default) or threads
+        seed:          replicate b draws from default_rng([seed, b])
+
+    Returns:
+        dict with
+          'coassignment' DataFrame (N x N, NaN where a pair was never
+                         sampled together)
+          'tickers'      DataFrame: cluster, stability, sampled
+          'clusters'     DataFrame: size, stability
+          'summary'      n_boot, mean / min stability, ARI mean and 5th
+                         percentile, unstable tickers, seconds
+    """
+    start     = time.perf_counter()
+    tickers   = scaled_df.index
+    reference = reference.reindex(tickers).to_numpy()
+    n         = len(tickers)
+
+    workers  = max(1, min(max_workers, n_boot))
+    threads  = max(1, (os.cpu_count() or 1) // workers)
+    size     = math.ceil(n_boot / workers)
+    chunks   = [list(range(i, min(i + size, n_boot))) for i in range(0, n_boot, size)]
+    executor = process_pool if use_processes else ThreadPoolExecutor
+    with executor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(
+                _run_replicates, scaled_df, chunk, n_clusters, sample_frac, feature_frac,
+                mode, batch_size, seed, threads,
+            )
+            for chunk in chunks
+        ]
+        replicates = [r for f in futures for r in f.result()]
+
+    # together[i, j]: same cluster; sampled[i, j]: both drawn — via one-hot products
+    # float32 counts are exact up to 2**24 replicates and halve the N x N memory
+    together = np.zeros((n, n), dtype=np.float32)
+    sampled  = np.zeros((n, n), dtype=np.float32)
+    ari      = np.empty(len(replicates))
+    for b, (rows, ids) in enumerate(replicates):
+        onehot = np.zeros((n, n_clusters), dtype=np.float32)
+        onehot[rows, ids] = 1.0
+        drawn  = np.zeros(n, dtype=np.float32)
+        drawn[rows] = 1.0
+        together += onehot @ onehot.T
+        sampled  += np.outer(drawn, drawn)
+        ari[b]    = adjusted_rand_score(reference[rows], ids)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        coassign = np.where(sampled > 0, together / sampled, np.nan)
+
+    # Per ticker: consensus with its built cluster's other members
+    stability = np.empty(n)
+    for i in range(n):
+        peers = (reference == reference[i])
+        peers[i] = False
+        if peers.any():
+            stability[i] = np.nanmean(coassign[i, peers])
+        else:
+            others       = np.delete(coassign[i], i)
+            stability[i] = 1.0 - np.nanmax(others) if np.isfinite(others).any() else np.nan
+
+    ticker_df = pd.DataFrame({
+        'cluster':   reference,
+        'stability': stability.round(4),
+        'sampled':   np.diag(sampled).astype(int),
+    }, index=tickers)
+
+    cluster_rows = {}
+    for cluster, members in ticker_df.groupby('cluster').groups.items():
+        pos   = tickers.get_indexer(members)
+        block = coassign[np.ix_(pos, pos)]
+        off   = ~np.eye(len(pos), dtype=bool)
+        cluster_rows[cluster] = {
+            'size':      len(pos),
+            'stability': round(float(np.nanmean(block[off])), 4) if len(pos) > 1
+                         else round(float(ticker_df.loc[members[0], 'stability']), 4),
+        }
+    cluster_df = pd.DataFrame.from_dict(cluster_rows, orient='index').rename_axis('cluster')
+
+    unstable = ticker_df.index[ticker_df['stability'] < UNSTABLE_BELOW].tolist()
+    summary  = {
+        'n_boot':         len(replicates),
+        'sample_frac':    sample_frac,
+        'feature_frac':   feature_frac,
+        'mean_stability': round(float(np.nanmean(stability)), 4),
+        'min_stability':  round(float(np.nanmin(stability)), 4),
+        'ari_mean':       round(float(ari.mean()), 4),
+        'ari_p5':         round(float(np.percentile(ari, 5)), 4),
+        'unstable':       unstable,
+        'seconds':        round(time.perf_counter() - start, 2),
+    }
+    log.info(
+        f"Cluster stability over {len(replicates)} replicates ({workers} workers): "
+        f"mean {summary['mean_stability']:.2f}, ARI {summary['ari_mean']:.2f}, "
+        f"{len(unstable)} unstable tickers, {summary['seconds']:.1f}s"
+    )
+    return {
+        'coassignment': pd.DataFrame(coassign, index=tickers, columns=tickers),
+        'tickers':      ticker_df,
+        'clusters':     cluster_df,
+        'summary':      summary,
+    }
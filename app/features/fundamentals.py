@@ -1,3 +1,6 @@
+import pickle
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
@@ -6,6 +9,8 @@ from app.core.logger import get_logger
 
 log = get_logger(__name__)
 
+FEATURE_PIPELINE_PATH = "app/data/state/feature_pipeline.pkl"
+
 # ── Base feature columns from fundamentals + technical pipeline ───────────────
 FUNDAMENTAL_COLS = [
     'pe_ratio', 'pb_ratio', 'roe', 'debt_to_equity',
@@ -16,6 +21,13 @@ TECHNICAL_COLS = [
     'momentum_3m', 'momentum_6m', 'volatility', 'rsi',
 ]
 
+# Multi-horizon momentum / volatility family from the technical engine
+HORIZON_COLS = [
+    'momentum_1m', 'momentum_12m', 'momentum_12_1',
+    'volatility_20d', 'volatility_60d', 'volatility_252d', 'downside_vol',
+]
+TECHNICAL_COLS = TECHNICAL_COLS + HORIZON_COLS
+
 # Engineered binary/derived columns added during preprocessing
 ENGINEERED_COLS = [
     'is_profitable',          # 1 if pe_ratio > 0 else 0
@@ -43,6 +55,7 @@ MEDIAN_IMPUTE_COLS = [
     'pe_ratio', 'pb_ratio', 'roe', 'debt_to_equity',
     'revenue_growth', 'beta',
     'momentum_3m', 'momentum_6m', 'volatility', 'rsi',
+    *HORIZON_COLS,
     'market_cap_log',
 ]
 
@@ -120,12 +133,15 @@ def _clip_outliers(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def _impute(df: pd.DataFrame) -> pd.DataFrame:
+def _impute(df: pd.DataFrame, median_imputer: SimpleImputer = None) -> pd.DataFrame:
     """
     Apply per-column imputation strategy:
       - Binary cols    : fill with 0 (already set, just a safety net)
       - Zero cols      : fill with 0 (missing dividend = no dividend)
       - Median cols    : fill with column median
+
+    Pass a fitted `median_imputer` to reuse training medians (transform
+    only); otherwise a new one is fitted on `df`.
     """
     df = df.copy()
 
@@ -145,13 +161,110 @@ def _impute(df: pd.DataFrame) -> pd.DataFrame:
     if missing:
         log.info(f"Median imputing columns: {missing}")
 
-    median_imputer = SimpleImputer(strategy='median')
-    median_cols    = [c for c in MEDIAN_IMPUTE_COLS if c in df.columns]
-    df[median_cols] = median_imputer.fit_transform(df[median_cols])
+    median_cols = [c for c in MEDIAN_IMPUTE_COLS if c in df.columns]
+    if median_imputer is None:
+        # keep_empty_features: long horizons (e.g. 12m momentum) are all-NaN on
+        # short histories — keep the column (imputed 0) so FEATURE_COLS is stable
+        median_imputer  = SimpleImputer(strategy='median', keep_empty_features=True)
+        df[median_cols] = median_imputer.fit_transform(df[median_cols])
+    else:
+        df[median_cols] = median_imputer.transform(df[median_cols])
 
     return df, median_imputer
 
 
+def _prepare(combined: pd.DataFrame) -> pd.DataFrame:
+    """Steps shared by fit and transform: engineer -> clip."""
+    # Step 1: engineer derived + binary features
+    df = _engineer_features(combined)
+
+    # Step 2: clip outliers (after engineering so flags use raw values)
+    return _clip_outliers(df)
+
+
+class FeaturePipeline:
+    """
+    Fitted engineer -> clip -> impute -> scale pipeline.
+
+    fit() learns the feature order, training medians and scaler moments
+    from the universe; transform() applies them unchanged to any rows —
+    e.g. a single out-of-universe ticker — without refitting, so its
+    scaled vector lives in the same space as the universe.
+    """
+
+    def __init__(self):
+        self.feature_cols:   list[str]       = []
+        self.median_imputer: SimpleImputer   = None
+        self.scaler:         StandardScaler  = None
+        self.fit_tickers:    list[str]       = []     # universe the moments came from
+
+    @property
+    def is_fitted(self) -> bool:
+        return self.scaler is not None
+
+    def fit_transform(self, combined: pd.DataFrame) -> pd.DataFrame:
+        df = _prepare(combined)
+
+        self.fit_tickers  = list(df.index)
+
+        # Step 3: select only final feature cols
+        self.feature_cols = [c for c in FEATURE_COLS if c in df.columns]
+        missing_cols      = [c for c in FEATURE_COLS if c not in df.columns]
+        if missing_cols:
+            log.warning(f"Missing expected feature columns: {missing_cols}")
+        df = df[self.feature_cols]
+
+        # Step 4: per-column imputation
+        df, self.median_imputer = _impute(df)
+
+        # Step 5: standardise
+        self.scaler = StandardScaler()
+        scaled = pd.DataFrame(
+            self.scaler.fit_transform(df),
+            index=df.index,
+            columns=self.feature_cols,
+        )
+
+        log.info(f"Scaled features shape: {scaled.shape}")
+        return scaled
+
+    def fit(self, combined: pd.DataFrame) -> 'FeaturePipeline':
+        self.fit_transform(combined)
+        return self
+
+    def transform(self, combined: pd.DataFrame) -> pd.DataFrame:
+        """Scale new rows with the fitted medians / moments (no refit)."""
+        if not self.is_fitted:
+            raise RuntimeError("FeaturePipeline is not fitted — call fit() first")
+
+        df = _prepare(combined).reindex(columns=self.feature_cols)
+        df, _ = _impute(df, self.median_imputer)
+        return pd.DataFrame(
+            self.scaler.transform(df),
+            index=df.index,
+            columns=self.feature_cols,
+        )
+
+    def save(self, path: str = FEATURE_PIPELINE_PATH) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            pickle.dump(self, f)
+        log.info(f"Feature pipeline saved -> {path}")
+
+    @classmethod
+    def load(cls, path: str = FEATURE_PIPELINE_PATH) -> 'FeaturePipeline':
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+def fit_feature_pipeline(combined: pd.DataFrame) -> tuple[FeaturePipeline, pd.DataFrame]:
+    """Fit a new FeaturePipeline on `combined`; returns (pipeline, scaled)."""
+    pipeline = FeaturePipeline()
+    scaled   = pipeline.fit_transform(combined)
+    return pipeline, scaled
+
+
 def scale_features(combined: pd.DataFrame):
     """
     Full preprocessing pipeline: engineer -> clip -> impute -> scale.
@@ -163,30 +276,8 @@ def scale_features(combined: pd.DataFrame):
         scaled:          StandardScaler-transformed DataFrame (FEATURE_COLS)
         scaler:          fitted StandardScaler
         median_imputer:  fitted SimpleImputer for median cols
-    """
-    # Step 1: engineer derived + binary features
-    df = _engineer_features(combined)
-
-    # Step 2: clip outliers (after engineering so flags use raw values)
-    df = _clip_outliers(df)
-
-    # Step 3: select only final feature cols
-    available_cols = [c for c in FEATURE_COLS if c in df.columns]
-    missing_cols   = [c for c in FEATURE_COLS if c not in df.columns]
-    if missing_cols:
-        log.warning(f"Missing expected feature columns: {missing_cols}")
-    df = df[available_cols]
-
-    # Step 4: per-column imputation
-    df, median_imputer = _impute(df)
-
-    # Step 5: standardise
-    scaler = StandardScaler()
-    scaled = pd.DataFrame(
-        scaler.fit_transform(df),
-        index=df.index,
-        columns=available_cols,
-    )
 
-    log.info(f"Scaled features shape: {scaled.shape}")
-    return scaled, scaler, median_imputer
\ No newline at end of file
+    Use FeaturePipeline directly to keep the fitted state for transform().
+    """
+    pipeline, scaled = fit_feature_pipeline(combined)
+    return scaled, pipeline.scaler, pipeline.median_imputer
@@ -0,0 +1,411 @@
+"""
+Incremental Indicator State
+---------------------------
+Constant-time per-bar updates of the technical features, so a daily (or
+intraday) refresh does not recompute five years of history.
+
+State is array-backed — one column per ticker — so a new bar for the
+whole universe is a handful of vectorised operations:
+  - price ring buffer : last RING_SIZE valid closes per ticker, enough for
+                        every momentum horizon (up to 252 bars back), the
+                        bar leaving each rolling window, and the RSI window
+  - window sums       : running sums of log r, r^2 and min(r, 0)^2 per
+                        rolling window (20 / 60 / 252 days) — add the new
+                        return, subtract the one leaving the window
+  - Welford stats     : running count / mean / M2 of daily returns, giving
+                        the full-history volatility without the history
+  - rsi               : the repo's RSI is a simple 14-bar mean of gains and
+                        losses, so it is read off the last 15 ring prices
+
+NaN in a bar means "no trade" for that ticker and leaves its state
+untouched, matching the `dropna()` semantics of compute_technical_features.
+
+verify() rebuilds the features from full history and reports the
+largest deviation per column, for use after a batch of updates.
+
+refresh_technical_features() is the build's `technical` stage: it loads
+the state saved by the previous build, applies only the bars after its
+as_of date and saves it again. It falls back to a full recompute (and
+reseeds the state) when the state cannot be trusted — none saved, the
+universe gained tickers, the close at as_of moved (split / dividend
+re-adjustment rewrites the whole history), or verify() on a random
+sample of tickers fails.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.core.logger import get_logger
+from app.features.technical import (
+    MIN_HISTORY, MOMENTUM_HORIZONS, SKIP_MOMENTUM, VOLATILITY_WINDOWS,
+    DOWNSIDE_WINDOWS, RSI_WINDOW, TRADING_DAYS, TECHNICAL_FEATURES,
+    _compact, _cumsum0, _take, compute_technical_features,
+)
+
+log = get_logger(__name__)
+
+WINDOWS = sorted(set(VOLATILITY_WINDOWS.values()) | set(DOWNSIDE_WINDOWS.values()))
+
+RING_SIZE = max(
+    [*MOMENTUM_HORIZONS.values(), *(lag for lag, _ in SKIP_MOMENTUM.values()),
+     *WINDOWS, RSI_WINDOW]
+) + 1
+
+DEFAULT_STATE_PATH = "app/data/state/technical_state.npz"
+VERIFY_RTOL        = 1e-8
+VERIFY_ATOL        = 1e-10
+VERIFY_SAMPLE      = 32       # tickers recomputed in full to check each refresh
+
+
+def _rsi_last(window_prices: np.ndarray) -> np.ndarray:
+    """RSI of the final bar from a (RSI_WINDOW + 1, N) block of prices."""
+    delta = np.diff(window_prices, axis=0)
+    gain  = np.clip(delta, 0, None).mean(axis=0)
+    loss  = (-np.clip(delta, None, 0)).mean(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - 100 / (1 + gain / loss)
+
+
+class IndicatorState:
+    """
+    Running technical-indicator state for a universe of tickers.
+
+    Build once with from_prices(), then feed each new bar to update().
+    features() returns the same frame as compute_technical_features()
+    on the full history seen so far.
+    """
+
+    def __init__(self, tickers: list[str]):
+        n = len(tickers)
+        self.tickers   = list(tickers)
+        self._pos      = {t: i for i, t in enumerate(self.tickers)}
+        self.ring      = np.full((RING_SIZE, n), np.nan)
+        self.count     = np.zeros(n, dtype=np.int64)    # valid prices seen
+        self.ret_count = np.zeros(n, dtype=np.int64)    # Welford n
+        self.ret_mean  = np.zeros(n)                    # Welford mean
+        self.ret_m2    = np.zeros(n)                    # Welford M2
+        self.win_sum   = np.zeros((len(WINDOWS), n))    # sum of log r per window
+        self.win_sq    = np.zeros((len(WINDOWS), n))    # sum of r^2
+        self.win_down  = np.zeros((len(WINDOWS), n))    # sum of min(r, 0)^2
+        self.as_of: pd.Timestamp | None = None
+
+    # ── Construction ──────────────────────────────────────────────────────────
+
+    @classmethod
+    def from_prices(cls, prices: pd.DataFrame) -> IndicatorState:
+        """Seed the state from a full price history (one-off O(T) cost)."""
+        state          = cls(prices.columns.tolist())
+        packed, counts = _compact(prices.to_numpy(dtype=float))
+
+        # Ring holds the last RING_SIZE valid prices, written in arrival order
+        for k in range(min(RING_SIZE, len(packed))):
+            rows = counts - 1 - k
+            cols = np.flatnonzero(rows >= 0)
+            state.ring[rows[cols] % RING_SIZE, cols] = packed[rows[cols], cols]
+
+        returns = packed[1:] / packed[:-1] - 1
+        n_ret   = np.clip(counts - 1, 0, None)
+        with np.errstate(invalid='ignore'):
+            mean = np.nansum(returns, axis=0) / np.maximum(n_ret, 1)
+            m2   = np.nansum((returns - mean) ** 2, axis=0)
+
+        # Window sums over the last min(w, returns seen) log returns
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_ret     = np.zeros_like(packed)
+            log_ret[1:] = np.log(packed[1:] / packed[:-1])
+        ends = np.clip(counts - 1, 0, None)[None, :]
+        for k, w in enumerate(WINDOWS):
+            start = np.clip(ends - w, 0, None)
+            for target, series in (
+                (state.win_sum,  log_ret),
+                (state.win_sq,   log_ret ** 2),
+                (state.win_down, np.minimum(log_ret, 0) ** 2),
+            ):
+                c = _cumsum0(series)
+                target[k] = np.nan_to_num((_take(c, ends) - _take(c, start))[0])
+
+        state.count     = counts.astype(np.int64)
+        state.ret_count = n_ret.astype(np.int64)
+        state.ret_mean  = mean
+        state.ret_m2    = m2
+        state.as_of     = prices.index[-1] if len(prices) else None
+        return state
+
+    def _add_tickers(self, tickers: list[str]) -> None:
+        new = [t for t in tickers if t not in self._pos]
+        if not new:
+            return
+        k = len(new)
+        for t in new:
+            self._pos[t] = len(self.tickers)
+            self.tickers.append(t)
+        self.ring      = np.hstack([self.ring, np.full((RING_SIZE, k), np.nan)])
+        self.count     = np.concatenate([self.count,     np.zeros(k, dtype=np.int64)])
+        self.ret_count = np.concatenate([self.ret_count, np.zeros(k, dtype=np.int64)])
+        self.ret_mean  = np.concatenate([self.ret_mean,  np.zeros(k)])
+        self.ret_m2    = np.concatenate([self.ret_m2,    np.zeros(k)])
+        self.win_sum   = np.hstack([self.win_sum,  np.zeros((len(WINDOWS), k))])
+        self.win_sq    = np.hstack([self.win_sq,   np.zeros((len(WINDOWS), k))])
+        self.win_down  = np.hstack([self.win_down, np.zeros((len(WINDOWS), k))])
+        log.info(f"IndicatorState: added {k} new ticker(s)")
+
+    # ── Updates ───────────────────────────────────────────────────────────────
+
+    def update(self, bar: pd.Series, as_of: pd.Timestamp | None = None) -> None:
+        """
+        Apply one bar of closes (indexed by ticker) in O(1) per ticker.
+
+        Bars at or before the last applied date are ignored, so replaying
+        a refresh is harmless.
+        """
+        if as_of is not None and self.as_of is not None and as_of <= self.as_of:
+            log.info(f"IndicatorState: skipping bar {as_of} (state as of {self.as_of})")
+            return
+
+        bar = bar.dropna()
+        self._add_tickers(bar.index.tolist())
+        cols  = np.array([self._pos[t] for t in bar.index], dtype=np.int64)
+        price = bar.to_numpy(dtype=float)
+
+        # Return vs previous close — only for tickers that already have one
+        has_prev = self.count[cols] > 0
+        prev     = self.ring[(self.count[cols] - 1) % RING_SIZE, cols]
+        c        = cols[has_prev]
+        r        = price[has_prev] / prev[has_prev] - 1
+
+        # Welford update
+        self.ret_count[c] += 1
+        delta              = r - self.ret_mean[c]
+        self.ret_mean[c]  += delta / self.ret_count[c]
+        self.ret_m2[c]    += delta * (r - self.ret_mean[c])
+
+        # Rolling-window sums: add the new log return, drop the one leaving
+        lr = np.log(price[has_prev] / prev[has_prev])
+        e  = self.count[c]                        # observation number of the new bar
+        for k, w in enumerate(WINDOWS):
+            leaving      = e - w >= 1
+            out          = np.zeros_like(lr)
+            cl, el       = c[leaving], e[leaving]
+            out[leaving] = np.log(
+                self.ring[(el - w) % RING_SIZE, cl] / self.ring[(el - w - 1) % RING_SIZE, cl]
+            )
+            self.win_sum[k, c]  += lr - out
+            self.win_sq[k, c]   += lr ** 2 - out ** 2
+            self.win_down[k, c] += np.minimum(lr, 0) ** 2 - np.minimum(out, 0) ** 2
+
+        # Ring buffer write
+        self.ring[self.count[cols] % RING_SIZE, cols] = price
+        self.count[cols] += 1
+
+        if as_of is not None:
+            self.as_of = as_of
+
+    def update_many(self, prices: pd.DataFrame) -> None:
+        """Apply a block of new bars in date order."""
+        for date, bar in prices.iterrows():
+            self.update(bar, as_of=date)
+
+    # ── Read-out ──────────────────────────────────────────────────────────────
+
+    def _lag(self, k: int) -> np.ndarray:
+        """Price k valid bars before the latest one (NaN if not seen)."""
+        out = self.ring[(self.count - 1 - k) % RING_SIZE, np.arange(len(self.tickers))]
+        return np.where(self.count > k, out, np.nan)
+
+    def features(self) -> pd.DataFrame:
+        """Current technical features — same schema as compute_technical_features()."""
+        keep      = self.count >= MIN_HISTORY
+        close     = self._lag(0)
+        n_ret     = self.ret_count
+        rsi_block = np.vstack([self._lag(k) for k in range(RSI_WINDOW, -1, -1)])
+        features  = {}
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for name, lag in MOMENTUM_HORIZONS.items():
+                features[name] = close / self._lag(lag) - 1
+            for name, (lag, skip) in SKIP_MOMENTUM.items():
+                features[name] = self._lag(skip) / self._lag(lag) - 1
+
+            features['volatility'] = np.sqrt(self.ret_m2 / (n_ret - 1)) * np.sqrt(TRADING_DAYS)
+
+            for name, w in VOLATILITY_WINDOWS.items():
+                k   = WINDOWS.index(w)
+                var = (self.win_sq[k] - self.win_sum[k] ** 2 / w) / (w - 1)
+                features[name] = np.where(
+                    n_ret >= w, np.sqrt(np.clip(var, 0, None) * TRADING_DAYS), np.nan
+                )
+            for name, w in DOWNSIDE_WINDOWS.items():
+                k = WINDOWS.index(w)
+                features[name] = np.where(
+                    n_ret >= w, np.sqrt(self.win_down[k] / w * TRADING_DAYS), np.nan
+                )
+
+            features['rsi'] = _rsi_last(rsi_block)
+
+        index = pd.Index(self.tickers)[keep]
+        return pd.DataFrame(
+            {name: features[name][keep] for name in TECHNICAL_FEATURES}, index=index
+        )
+
+    def verify(
+        self,
+        prices: pd.DataFrame,
+        rtol: float = VERIFY_RTOL,
+        atol: float = VERIFY_ATOL,
+    ) -> dict:
+        """
+        Check the running state against a full recompute on `prices`.
+
+        A value passes when |state - recompute| <= atol + rtol * |recompute|;
+        the reported figure is that deviation divided by the allowance.
+
+        Only the tickers in `prices` are compared, so a column sample
+        checks the state at a fraction of the recompute cost.
+
+        Returns:
+            dict with 'ok' (bool), 'max_rel_diff' per feature column
+            (<= 1.0 passes) and 'missing' tickers present in one result
+            but not the other
+        """
+        expected = compute_technical_features(prices)
+        actual   = self.features()
+        actual   = actual[actual.index.isin(prices.columns)]
+        common   = expected.index.intersection(actual.index)
+        missing  = sorted(set(expected.index) ^ set(actual.index))
+
+        diffs = {}
+        for col in expected.columns:
+            e = expected.loc[common, col].to_numpy(dtype=float)
+            a = actual.loc[common, col].to_numpy(dtype=float)
+            both_nan = np.isnan(e) & np.isnan(a)
+            with np.errstate(invalid='ignore'):
+                rel = np.abs(a - e) / (atol + rtol * np.abs(e))
+            rel = np.where(both_nan, 0.0, rel)
+            diffs[col] = float(np.nan_to_num(rel, nan=np.inf).max()) if len(rel) else 0.0
+
+        ok = not missing and all(d <= 1.0 for d in diffs.values())
+        if not ok:
+            log.warning(f"IndicatorState verify failed — max_rel_diff={diffs}, missing={missing}")
+        return {'ok': ok, 'max_rel_diff': diffs, 'missing': missing}
+
+    # ── Persistence ───────────────────────────────────────────────────────────
+
+    def save(self, path: str = DEFAULT_STATE_PATH) -> None:
+        """Write the state atomically (temp file + rename): readers never see half a file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp  = path.parent / f".{path.name}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp, 'wb') as f:
+            self._savez(f)
+        os.replace(tmp, path)
+        log.info(f"IndicatorState saved — {len(self.tickers)} tickers -> {path}")
+
+    def _savez(self, f) -> None:
+        np.savez(
+            f,
+            tickers=np.array(self.tickers, dtype=str),
+            ring=self.ring,
+            count=self.count,
+            ret_count=self.ret_count,
+            ret_mean=self.ret_mean,
+            ret_m2=self.ret_m2,
+            win_sum=self.win_sum,
+            win_sq=self.win_sq,
+            win_down=self.win_down,
+            as_of=np.array(str(self.as_of) if self.as_of is not None else ''),
+        )
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_STATE_PATH) -> IndicatorState:
+        with np.load(path) as data:
+            state           = cls(data['tickers'].tolist())
+            state.ring      = data['ring']
+            state.count     = data['count']
+            state.ret_count = data['ret_count']
+            state.ret_mean  = data['ret_mean']
+            state.ret_m2    = data['ret_m2']
+            state.win_sum   = data['win_sum']
+            state.win_sq    = data['win_sq']
+            state.win_down  = data['win_down']
+            as_of           = str(data['as_of'])
+            state.as_of     = pd.Timestamp(as_of) if as_of else None
+        return state
+
+
+# ── Build stage ───────────────────────────────────────────────────────────────
+
+def _load_state(path: str) -> IndicatorState | None:
+    if not Path(path).exists():
+        return None
+    try:
+        return IndicatorState.load(path)
+    except Exception as e:
+        log.warning(f"IndicatorState at {path} unreadable — {type(e).__name__}: {e}")
+        return None
+
+
+def _stale_reason(state: IndicatorState | None, prices: pd.DataFrame) -> str | None:
+    """Why `state` cannot be rolled forward to `prices`, or None if it can."""
+    if state is None or state.as_of is None:
+        return "no saved state"
+    if state.as_of not in prices.index:
+        return f"state as of {state.as_of.date()} is outside the price history"
+    new = [t for t in prices.columns if t not in state._pos]
+    if new:
+        return f"{len(new)} ticker(s) without state"
+
+    # An adjusted history (split, dividend) moves every close, including as_of's
+    close = prices.loc[state.as_of].to_numpy(dtype=float)
+    seen  = state._lag(0)[[state._pos[t] for t in prices.columns]]
+    traded = ~np.isnan(close)
+    if not np.allclose(seen[traded], close[traded], rtol=VERIFY_RTOL, atol=0.0):
+        return f"closes at {state.as_of.date()} changed since the state was saved"
+    return None
+
+
+def refresh_technical_features(
+    prices: pd.DataFrame,
+    path: str = DEFAULT_STATE_PATH,
+    sample: int = VERIFY_SAMPLE,
+) -> pd.DataFrame:
+    """
+    Build stage: technical features from the saved IndicatorState plus the new bars.
+
+    Args:
+        prices: full price history (dates x tickers), as fetched by the build
+        path:   where the state is kept between builds
+        sample: tickers recomputed from full history to verify the update
+
+    Returns:
+        the compute_technical_features(prices) frame — from the rolled-forward
+        state, or from a full recompute when the state was stale or failed
+        verification (the state is then reseeded)
+    """
+    state  = _load_state(path)
+    reason = _stale_reason(state, prices)
+    if reason is None:
+        bars = prices.loc[prices.index > state.as_of]
+        state.update_many(bars)
+        rng     = np.random.default_rng()
+        checked = rng.choice(prices.columns, size=min(sample, prices.shape[1]), replace=False)
+        report  = state.verify(prices[checked])
+        if report['ok']:
+            state.save(path)
+            features = state.features()
+            log.info(
+                f"Technical features rolled forward {len(bars)} bar(s) "
+                f"for {prices.shape[1]} tickers (verified {len(checked)})"
+            )
+            return features.loc[[t for t in prices.columns if t in features.index]]
+        reason = "verify() failed on the sampled tickers"
+
+    log.info(f"Technical features recomputed in full — {reason}")
+    features = compute_technical_features(prices)
+    IndicatorState.from_prices(prices).save(path)
+    return features
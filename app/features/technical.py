@@ -1,30 +1,199 @@
+"""
+Technical Features
+------------------
+Momentum, volatility and RSI families computed over the whole price
+matrix at once by a single multi-horizon engine.
+
+Each ticker's history is treated exactly like `prices[ticker].dropna()`:
+valid observations are packed to the top of their column (`_compact`) so
+NaN runs — late listings, halts, missing bars — never leak into a window.
+
+Engine (`_feature_block`):
+  - one aligned log-price / log-return matrix per build
+  - cumulative sums of r, r^2 and min(r, 0)^2 (plus simple returns and
+    price deltas for the legacy volatility / RSI definitions)
+  - every feature is then two gathers per horizon: sum over (e - w, e]
+    = C[e] - C[e - w], for any set of end rows e
+
+The O(T x N) cumulative sums are paid once; each extra horizon only adds
+O(N) gathers, so cost grows sub-linearly with the number of horizons
+(see benchmarks/bench_technical_horizons.py). The same engine serves the
+last bar (compute_technical_features) and every bar (technical_panel).
+
+Tickers with fewer than MIN_HISTORY valid prices are dropped.
+"""
+
 import pandas as pd
 import numpy as np
 from app.core.logger import get_logger
 
 log = get_logger(__name__)
 
-def compute_rsi(close: pd.Series, window: int = 14) -> float:
+MIN_HISTORY    = 60     # trading days required before a ticker is scored
+RSI_WINDOW     = 14
+TRADING_DAYS   = 252
+
+# Momentum: total return over the last `lag` bars
+MOMENTUM_HORIZONS = {
+    'momentum_1m':  21,
+    'momentum_3m':  63,
+    'momentum_6m':  126,
+    'momentum_12m': 252,
+}
+
+# Skip-month momentum: return from `lag` bars ago to `skip` bars ago
+SKIP_MOMENTUM = {
+    'momentum_12_1': (252, 21),
+}
+
+# Realized volatility of log returns over a trailing window (annualised)
+VOLATILITY_WINDOWS = {
+    'volatility_20d':  20,
+    'volatility_60d':  60,
+    'volatility_252d': 252,
+}
+
+# Downside semi-deviation of log returns (annualised, target 0)
+DOWNSIDE_WINDOWS = {
+    'downside_vol': 252,
+}
+
+# Column order of compute_technical_features()
+TECHNICAL_FEATURES = (
+    list(MOMENTUM_HORIZONS) + list(SKIP_MOMENTUM) +
+    ['volatility'] + list(VOLATILITY_WINDOWS) + list(DOWNSIDE_WINDOWS) +
+    ['rsi']
+)
+
+
+def compute_rsi(close: pd.Series, window: int = RSI_WINDOW) -> float:
     delta = close.diff()
     gain  = delta.clip(lower=0).rolling(window).mean()
     loss  = (-delta.clip(upper=0)).rolling(window).mean()
     rs    = gain / loss
     return (100 - 100 / (1 + rs)).iloc[-1]
 
+
+def _compact(values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pack each column's valid values to the top, preserving order.
+
+    Args:
+        values: (T, N) float array with NaN gaps
+
+    Returns:
+        packed: (T, N) array — column j holds its n_j valid values in
+                rows [0, n_j), NaN below
+        counts: (N,) number of valid values per column
+    """
+    valid  = ~np.isnan(values)
+    order  = np.argsort(~valid, axis=0, kind='stable')
+    packed = np.take_along_axis(values, order, axis=0)
+    counts = valid.sum(axis=0)
+    packed[np.arange(len(values))[:, None] >= counts] = np.nan
+    return packed, counts
+
+
+def _take(a: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """a[rows[..., j], j] per column; negative rows give NaN."""
+    out = np.take_along_axis(a, np.clip(rows, 0, None), axis=0)
+    return np.where(rows >= 0, out, np.nan)
+
+
+def _cumsum0(x: np.ndarray) -> np.ndarray:
+    """Cumulative sum along rows treating NaN as 0 (row i = sum of rows <= i)."""
+    return np.cumsum(np.nan_to_num(x, nan=0.0), axis=0)
+
+
+def _window_sum(c: np.ndarray, ends: np.ndarray, window: int) -> np.ndarray:
+    """Sum of the per-row series over (end - window, end], NaN if it does not fit."""
+    start = ends - window
+    return np.where(start >= 0, _take(c, ends) - _take(c, start), np.nan)
+
+
+def _feature_block(
+    packed: np.ndarray,
+    ends: np.ndarray,
+    momentum: dict[str, int] = MOMENTUM_HORIZONS,
+    skip_momentum: dict[str, tuple[int, int]] = SKIP_MOMENTUM,
+    vol_windows: dict[str, int] = VOLATILITY_WINDOWS,
+    downside_windows: dict[str, int] = DOWNSIDE_WINDOWS,
+) -> dict[str, np.ndarray]:
+    """
+    Multi-horizon technical features for arbitrary end observations.
+
+    Args:
+        packed: (T, N) packed prices from _compact()
+        ends:   integer array of observation rows, shape (R, N); use
+                counts - 1 for the last bar or every row for a panel
+        momentum / skip_momentum / vol_windows / downside_windows:
+                horizon definitions (defaults are the production set)
+
+    Returns:
+        dict feature name -> array shaped like `ends`, ordered as
+        TECHNICAL_FEATURES for the default horizons
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # One aligned log-return matrix: r[i] = log p[i] - log p[i-1], r[0] = 0
+        log_p       = np.log(packed)
+        log_ret     = np.zeros_like(packed)
+        log_ret[1:] = np.diff(log_p, axis=0)
+
+        # Legacy series: simple returns (full-history volatility) and price
+        # deltas (RSI) share the same row alignment
+        simple      = np.zeros_like(packed)
+        simple[1:]  = packed[1:] / packed[:-1] - 1
+        delta       = np.zeros_like(packed)
+        delta[1:]   = np.diff(packed, axis=0)
+
+        c_ret  = _cumsum0(log_ret)
+        c_sq   = _cumsum0(log_ret ** 2)
+        c_down = _cumsum0(np.minimum(log_ret, 0) ** 2)
+        c_s1   = _cumsum0(simple)
+        c_s2   = _cumsum0(simple ** 2)
+        c_gain = _cumsum0(np.clip(delta, 0, None))
+        c_loss = _cumsum0(-np.clip(delta, None, 0))
+
+        out = {}
+
+        for name, lag in momentum.items():
+            out[name] = np.expm1(_window_sum(c_ret, ends, lag))
+
+        for name, (lag, skip) in skip_momentum.items():
+            out[name] = np.expm1(_window_sum(c_ret, ends - skip, lag - skip))
+
+        # Full-history volatility of simple returns (returns at rows 1..e)
+        n   = ends.astype(float)
+        s1  = _take(c_s1, ends)
+        s2  = _take(c_s2, ends)
+        var = (s2 - s1 * s1 / n) / (n - 1)
+        out['volatility'] = np.where(n >= 2, np.sqrt(np.clip(var, 0, None)), np.nan) * np.sqrt(TRADING_DAYS)
+
+        for name, w in vol_windows.items():
+            s1  = _window_sum(c_ret, ends, w)
+            s2  = _window_sum(c_sq,  ends, w)
+            var = (s2 - s1 * s1 / w) / (w - 1)
+            out[name] = np.sqrt(np.clip(var, 0, None) * TRADING_DAYS)
+
+        for name, w in downside_windows.items():
+            out[name] = np.sqrt(_window_sum(c_down, ends, w) / w * TRADING_DAYS)
+
+        gain = _window_sum(c_gain, ends, RSI_WINDOW)
+        loss = _window_sum(c_loss, ends, RSI_WINDOW)
+        out['rsi'] = 100 - 100 / (1 + gain / loss)
+
+    return out
+
+
 def compute_technical_features(prices: pd.DataFrame) -> pd.DataFrame:
-    log.info("Computing technical features")
-    records = {}
-    
-    for ticker in prices.columns:
-        close = prices[ticker].dropna()
-        if len(close) < 60:
-            continue
-        returns = close.pct_change().dropna()
-        records[ticker] = {
-            'momentum_3m': close.pct_change(63).iloc[-1],
-            'momentum_6m': close.pct_change(126).iloc[-1],
-            'volatility':  returns.std() * np.sqrt(252),
-            'rsi':         compute_rsi(close),
-        }
-    
-    return pd.DataFrame(records).T
\ No newline at end of file
+    log.info(f"Computing technical features for {prices.shape[1]} tickers")
+
+    packed, counts = _compact(prices.to_numpy(dtype=float))
+    keep           = counts >= MIN_HISTORY
+    packed, counts = packed[:, keep], counts[keep]
+
+    block = _feature_block(packed, (counts - 1)[None, :])
+    return pd.DataFrame(
+        {name: values[0] for name, values in block.items()},
+        index=prices.columns[keep].rename(None),
+    )
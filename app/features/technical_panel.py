@@ -0,0 +1,227 @@
+"""
+Technical Feature Panel
+-----------------------
+Technical features for EVERY date, not just the last bar, as a single
+(date x ticker x feature) array computed in one vectorised pass.
+
+panel.at(date) equals compute_technical_features(prices.loc[:date]), so
+point-in-time consumers (backtests, historical similarity / clustering)
+index into the panel instead of re-running the feature code on
+truncated frames in a loop.
+
+How it works:
+  1. Valid prices are packed per column (see technical._compact), so each
+     column is a gap-free series indexed by observation number.
+  2. The multi-horizon engine (technical._feature_block) evaluates every
+     feature at every observation from one set of cumulative sums.
+  3. Each (date, ticker) picks the value at its latest observation on or
+     before that date — cumsum(valid) - 1 — which reproduces the
+     dropna()/truncate semantics, including stale tickers.
+
+Panels are cached on disk as a raw .npy block keyed by a hash of the
+price frame and re-opened with mmap_mode='r', so a backtest touching a
+handful of dates never pulls the full array into memory. A panel is
+written into a temp directory and renamed into place (as SnapshotStore
+publishes generations), so a crash or a concurrent build never leaves a
+half-written values.npy under the cache key. Keys are content hashes, so
+a complete entry is never deleted or replaced — a second writer of the
+same key just discards its copy.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.core.logger import get_logger
+from app.features.technical import (
+    MIN_HISTORY, TECHNICAL_FEATURES, _compact, _feature_block,
+)
+
+log = get_logger(__name__)
+
+PANEL_FEATURES  = TECHNICAL_FEATURES
+PANEL_CACHE_DIR = "app/data/panels"
+
+
+class TechnicalPanel:
+    """
+    (date x ticker x feature) technical features.
+
+    Attributes:
+        values:   float array of shape (len(dates), len(tickers), len(features));
+                  may be a read-only np.memmap when loaded from disk
+        dates:    DatetimeIndex of the source price frame
+        tickers:  ticker Index
+        features: feature names, last axis order
+    """
+
+    def __init__(self, values: np.ndarray, dates, tickers, features: list[str]):
+        self.values   = values
+        self.dates    = pd.DatetimeIndex(dates)
+        self.tickers  = pd.Index(tickers)
+        self.features = list(features)
+
+    def _row(self, date) -> int:
+        i = self.dates.searchsorted(pd.Timestamp(date), side='right') - 1
+        if i < 0:
+            raise KeyError(f"{date} is before the first panel date {self.dates[0].date()}")
+        return int(i)
+
+    def at(self, date) -> pd.DataFrame:
+        """Features as known at `date` (as-of lookup) — same shape as compute_technical_features()."""
+        block = pd.DataFrame(
+            np.asarray(self.values[self._row(date)]),
+            index=self.tickers,
+            columns=self.features,
+        )
+        return block.dropna(how='all')
+
+    def feature(self, name: str) -> pd.DataFrame:
+        """Full (date x ticker) history of one feature."""
+        k = self.features.index(name)
+        return pd.DataFrame(
+            np.asarray(self.values[:, :, k]),
+            index=self.dates,
+            columns=self.tickers,
+        )
+
+    # ── Persistence ───────────────────────────────────────────────────────────
+
+    def save(self, path: str) -> None:
+        """
+        Write the panel to `path` atomically (temp directory + rename).
+
+        A complete directory already at `path` is left in place — readers
+        may have it mapped. An incomplete one (no meta.json: a write that
+        crashed before this code renamed into place) is renamed aside
+        first, so `path` only ever names nothing, the old directory, or
+        the complete new one.
+        """
+        path   = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        suffix = f"{os.getpid()}-{threading.get_ident()}"
+        tmp    = path.parent / f".{path.name}.tmp-{suffix}"
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir()
+
+        np.save(tmp / 'values.npy', np.ascontiguousarray(self.values))
+        with open(tmp / 'meta.json', 'w', encoding='utf-8') as f:
+            json.dump({
+                'dates':    [d.isoformat() for d in self.dates],
+                'tickers':  [str(t) for t in self.tickers],
+                'features': self.features,
+            }, f)
+
+        stale = None
+        if path.exists() and not (path / 'meta.json').exists():
+            stale = path.parent / f".{path.name}.stale-{suffix}"
+            try:
+                os.rename(path, stale)
+            except OSError:
+                stale = None        # another writer moved or replaced it first
+        try:
+            os.rename(tmp, path)    # fails if a non-empty `path` exists — never clobbers
+        except OSError:
+            # a concurrent build published the same key first — same content
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not (path / 'meta.json').exists():
+                raise
+        finally:
+            if stale is not None:
+                shutil.rmtree(stale, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> TechnicalPanel:
+        path = Path(path)
+        with open(path / 'meta.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        values = np.load(path / 'values.npy', mmap_mode='r' if mmap else None)
+        return cls(values, pd.to_datetime(meta['dates']), meta['tickers'], meta['features'])
+
+
+def _observation_features(packed: np.ndarray) -> np.ndarray:
+    """
+    Features for every packed observation.
+
+    Returns:
+        (T, N, F) array in PANEL_FEATURES order, indexed by observation number
+    """
+    T, N  = packed.shape
+    ends  = np.broadcast_to(np.arange(T)[:, None], (T, N))
+    block = _feature_block(packed, ends)
+    out   = np.stack([block[name] for name in PANEL_FEATURES], axis=-1)
+
+    # Observations past each column's last valid price are padding
+    out[np.isnan(packed)] = np.nan
+    return out
+
+
+def compute_technical_panel(
+    prices: pd.DataFrame,
+    dtype: type = np.float64,
+) -> TechnicalPanel:
+    """
+    Compute technical features at every date in one vectorised pass.
+
+    Args:
+        prices: closing price DataFrame (date x ticker)
+        dtype:  output dtype — float32 halves memory for very large universes
+
+    Returns:
+        TechnicalPanel where panel.at(d) == compute_technical_features(prices.loc[:d])
+    """
+    log.info(f"Computing technical panel — {prices.shape[0]} dates x {prices.shape[1]} tickers")
+
+    values       = prices.to_numpy(dtype=float)
+    packed, _    = _compact(values)
+    obs_features = _observation_features(packed)
+
+    # Latest observation at or before each date, per ticker
+    seen  = np.cumsum(~np.isnan(values), axis=0)
+    obs   = np.clip(seen - 1, 0, None)
+    cols  = np.arange(values.shape[1])[None, :]
+    panel = obs_features[obs, cols].astype(dtype, copy=False)
+    panel[seen < MIN_HISTORY] = np.nan
+
+    return TechnicalPanel(panel, prices.index, prices.columns.rename(None), PANEL_FEATURES)
+
+
+def _prices_key(prices: pd.DataFrame) -> str:
+    h = hashlib.md5()
+    h.update(pd.util.hash_pandas_object(prices, index=True).to_numpy().tobytes())
+    h.update(json.dumps([str(c) for c in prices.columns]).encode())
+    return h.hexdigest()[:16]
+
+
+def load_or_compute_technical_panel(
+    prices: pd.DataFrame,
+    cache_dir: str = PANEL_CACHE_DIR,
+) -> TechnicalPanel:
+    """
+    Return the panel for `prices`, memory-mapped from disk when cached.
+
+    The cache key is a content hash of the price frame, so any change in
+    dates, tickers or values produces a fresh panel.
+    """
+    path = Path(cache_dir) / _prices_key(prices)
+    if (path / 'values.npy').exists() and (path / 'meta.json').exists():
+        try:
+            panel = TechnicalPanel.load(str(path))
+            log.info(f"technical_panel_cache_hit  {path.name}")
+            return panel
+        except Exception as e:
+            log.warning(f"technical_panel_cache_read_error  {path.name}: {e}")
+
+    panel = compute_technical_panel(prices)
+    panel.save(str(path))
+    log.info(f"technical_panel_cached  {path.name}")
+    return TechnicalPanel.load(str(path))
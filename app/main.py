@@ -2,6 +2,7 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.api.routes import router
 from app.services.recommender import recommender
+from app.core.config import settings
 from app.core.logger import get_logger
 from fastapi.staticfiles import StaticFiles
 
@@ -9,9 +10,21 @@ log = get_logger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    log.info("Starting up — building recommender...")
-    recommender.build()
+    # Serve the last on-disk snapshot right away (mmap, no network), then
+    # refresh off the request path. With no snapshot on disk the API
+    # answers 503 until the first build is published.
+    #
+    # SHARED_SNAPSHOT=true (uvicorn --workers N): one elected worker builds,
+    # the others attach to the same mmapped snapshot and follow new
+    # generations — one Yahoo fetch and one copy of the matrices per host.
+    log.info("Starting up — loading snapshot, refreshing in the background...")
+    if settings.shared_snapshot:
+        recommender.start_shared()
+    else:
+        recommender.load_latest_snapshot()
+        recommender.build_in_background()
     yield
+    recommender.stop()
     log.info("Shutting down")
 
 app = FastAPI(
@@ -0,0 +1,226 @@
+"""
+Approximate Nearest Neighbors
+-----------------------------
+Random-projection LSH over the combined similarity, for universes where
+even the blocked O(N²) NeighborIndex build is too slow (50k+ tickers).
+
+The combined score 0.7·cos(f) + 0.3·cos(t) is a plain inner product of
+the embeddings e = [√0.7·f̂, √0.3·t̂] (f̂, t̂ the L2-normalized fundamental
+and technical rows), so cosine LSH on e finds its neighbors:
+
+  hash     each of `n_tables` tables draws `n_bits` random hyperplanes;
+           a ticker's code in that table is the sign pattern of e against
+           them (SimHash — two rows at angle θ agree on a bit with
+           probability 1 - θ/π)
+  query    the union of the query's bucket in every table, plus
+           `probes` neighbouring buckets per table (the code with one of
+           its least certain bits — smallest |projection| — flipped),
+           re-ranked by the exact score
+  negated  the least similar tickers are the nearest neighbors of -e, so
+           complementary queries hash the negated embedding
+  blend    at fund_weight w the query is [w/√0.7·f̂, (1-w)/√0.3·t̂]: its
+           inner product with a stored e is w·cos(f) + (1-w)·cos(t), and
+           every stored e has the same norm, so the same tables serve
+           any blend without rehashing
+
+Knobs (build: n_tables, n_bits; query: probes):
+  more tables / probes   higher recall, more candidates to re-rank
+  more bits              smaller buckets, fewer candidates, lower recall
+
+Build is O(N·d·tables·bits) plus one sort per table, and incremental
+adds / removes only hash or drop rows. Returned scores are always exact;
+only the candidate set is approximate. When a query (after filters) has
+fewer than n candidates it falls back to the exact O(N·d) scan, so the
+result count never depends on the hashing.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+from app.core.config import settings
+from app.core.logger import get_logger
+from app.models.similarity import FUNDAMENTAL_WEIGHT, TECHNICAL_WEIGHT, UnitEmbeddings, _blend
+
+log = get_logger(__name__)
+
+LSH_TABLES = 16
+LSH_BITS   = 12
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    """Boolean (..., n_bits) sign patterns -> int64 codes."""
+    return (bits.astype(np.int64) << np.arange(bits.shape[-1], dtype=np.int64)).sum(axis=-1)
+
+
+class LSHIndex(UnitEmbeddings):
+    """
+    SimHash tables over the combined-similarity embeddings.
+
+    Serves the same neighbors() / row() / score() interface as
+    NeighborIndex, so get_similar_stocks and get_complementary_stocks run
+    on either.
+    """
+
+    kind = 'lsh'
+
+    def __init__(
+        self,
+        scaled_df: pd.DataFrame,
+        planes: np.ndarray = None,
+        codes: np.ndarray = None,
+        dtype=np.float64,
+    ):
+        super().__init__(scaled_df, dtype)
+        self.planes = planes            # (n_tables, d, n_bits)
+        self.codes  = codes             # (n_tables, N) int64
+        if codes is not None:
+            self._sort()
+
+    @property
+    def n_tables(self) -> int:
+        return self.planes.shape[0]
+
+    @property
+    def n_bits(self) -> int:
+        return self.planes.shape[2]
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """Hyperplanes and codes (the buckets are re-sorted on load)."""
+        return {'planes': self.planes, 'codes': self.codes}
+
+    @classmethod
+    def from_arrays(cls, scaled_df: pd.DataFrame, arrays: dict[str, np.ndarray]) -> 'LSHIndex':
+        return cls(scaled_df, **arrays)
+
+    # ── Hashing ───────────────────────────────────────────────────────────────
+
+    def _embedding(self, rows) -> np.ndarray:
+        """Rows whose inner products are the combined similarity."""
+        parts = []
+        if self.fund is not None:
+            parts.append(self.fund[rows] * np.sqrt(FUNDAMENTAL_WEIGHT if self.tech is not None else 1.0))
+        if self.tech is not None:
+            parts.append(self.tech[rows] * np.sqrt(TECHNICAL_WEIGHT if self.fund is not None else 1.0))
+        return np.hstack(parts).astype(np.float64)
+
+    def _query(self, pos: int, fund_weight: float = None) -> np.ndarray:
+        """Embedding of the row at `pos`, re-weighted so q · e is the score at `fund_weight`."""
+        query = self._embedding([pos])[0]
+        if fund_weight is None or self.fund is None or self.tech is None:
+            return query
+        w_fund, w_tech = _blend(fund_weight)
+        split = self.fund.shape[1]
+        query[:split] *= w_fund / FUNDAMENTAL_WEIGHT
+        query[split:] *= w_tech / TECHNICAL_WEIGHT
+        return query
+
+    def _hash(self, rows) -> np.ndarray:
+        """(n_tables, len(rows)) codes of the rows at `rows`."""
+        emb = self._embedding(rows)
+        return np.stack([_pack(emb @ planes > 0) for planes in self.planes])
+
+    def _sort(self):
+        """Per table: ticker positions ordered by code, and the sorted codes."""
+        self._order  = np.argsort(self.codes, axis=1, kind='stable')
+        self._sorted = np.take_along_axis(self.codes, self._order, 1)
+
+    @classmethod
+    def build(
+        cls,
+        scaled_df: pd.DataFrame,
+        n_tables: int = LSH_TABLES,
+        n_bits: int = LSH_BITS,
+        seed: int = 0,
+        dtype=np.float64,
+    ) -> 'LSHIndex':
+        """
+        Hash every ticker of `scaled_df`.
+
+        Args:
+            scaled_df: scaled features (same columns as for the matrices)
+            n_tables:  independent hash tables
+            n_bits:    hyperplanes per table (at most 62)
+            seed:      hyperplane seed — indexes with the same seed share
+                       hyperplanes
+            dtype:     storage dtype of the normalized features
+        """
+        if not 1 <= n_bits <= 62:
+            raise ValueError(f"n_bits must be in [1, 62], got {n_bits}")
+        index        = cls(scaled_df, dtype=dtype)
+        dim          = sum(u.shape[1] for u in (index.fund, index.tech) if u is not None)
+        index.planes = np.random.default_rng(seed).standard_normal((n_tables, dim, n_bits))
+        index.codes  = index._hash(slice(None))
+        index._sort()
+        log.info(
+            f"LSH index built for {len(index)} tickers "
+            f"({n_tables} tables x {n_bits} bits, {index.nbytes / 1e6:.1f} MB)"
+        )
+        return index
+
+    def extended(self, scaled_df: pd.DataFrame) -> 'LSHIndex':
+        """Index over `scaled_df` = this index's tickers followed by new ones."""
+        grown = LSHIndex(scaled_df, dtype=self.dtype)
+        grown.planes = self.planes
+        grown.codes  = np.hstack([self.codes, grown._hash(slice(len(self), len(scaled_df)))])
+        grown._sort()
+        return grown
+
+    def without(self, scaled_df: pd.DataFrame) -> 'LSHIndex':
+        """Index restricted to the tickers of `scaled_df` (a subset, same order)."""
+        keep = self.tickers.positions(scaled_df.index)
+        out  = LSHIndex(scaled_df, dtype=self.dtype)
+        out.planes = self.planes
+        out.codes  = self.codes[:, keep]
+        out._sort()
+        return out
+
+    # ── Queries ───────────────────────────────────────────────────────────────
+
+    def candidates(self, vector: np.ndarray, probes: int = None) -> np.ndarray:
+        """
+        Positions sharing a bucket with `vector` (an embedding row) in any table.
+
+        Args:
+            probes: extra buckets per table, each the query code with one
+                    of its least certain bits flipped (default
+                    settings.lsh_probes — a query-time knob, no rebuild)
+        """
+        probes = settings.lsh_probes if probes is None else probes
+        proj   = np.einsum('d,tdb->tb', vector, self.planes)            # (tables, bits)
+        codes  = _pack(proj > 0)
+        keys   = [codes[:, None]]
+        if probes:
+            flip = np.argsort(np.abs(proj), axis=1)[:, :probes]
+            keys.append(codes[:, None] ^ (np.int64(1) << flip.astype(np.int64)))
+        keys   = np.hstack(keys)                                        # (tables, 1 + probes)
+
+        found = []
+        for t in range(self.n_tables):
+            lo = np.searchsorted(self._sorted[t], keys[t], side='left')
+            hi = np.searchsorted(self._sorted[t], keys[t], side='right')
+            found.extend(self._order[t, a:b] for a, b in zip(lo, hi) if b > a)
+        return np.unique(np.concatenate(found)) if found else np.empty(0, dtype=np.intp)
+
+    def neighbors(
+        self,
+        ticker: str,
+        allowed: np.ndarray = None,
+        n: int = 5,
+        largest: bool = True,
+        fund_weight: float = None,
+        probes: int = None,
+    ) -> pd.Series:
+        pos   = self.tickers.position(ticker)
+        query = self._query(pos, fund_weight)
+        cand  = self.candidates(query if largest else -query, probes)
+        cand  = cand[cand != pos]
+        if allowed is not None:
+            cand = cand[allowed[cand]]
+        if len(cand) < n:
+            return self._exact(pos, allowed, n, largest, fund_weight)
+
+        scores = self._block([pos], cand, fund_weight)[0].astype(np.float64)
+        best   = np.argsort(-scores if largest else scores, kind='stable')[:n]
+        return pd.Series(scores[best], index=self.tickers.symbols[cand[best]])
@@ -5,32 +5,78 @@ Groups stocks into behaviorally similar clusters using KMeans on a
 weighted scaled feature matrix. Labels are assigned per-ticker from
 raw fundamental values — NOT from cluster centroids — making them
 deterministic and always correct regardless of KMeans groupings.
+The labels come from an ordered rule table (LabelRules) evaluated over
+whole columns with np.select; it can be replaced by a JSON file
+(settings.cluster_label_rules) without code changes.
 
 Feature weights for KMeans:
   - Fundamental cols : 2.0x
-  - Technical cols   : 1.0x
+  - Technical cols   : 1.0x (core 3m/6m momentum, volatility, RSI)
+  - Horizon cols     : 0.5x (extra momentum / volatility horizons — they are
+                       highly correlated with the core set, so a lower weight
+                       keeps the technical block from swamping fundamentals)
   - Engineered cols  : 0.5x
 
 Optimal n_clusters=8 from elbow analysis on 50 tickers.
+
+Two fitting modes (ClusterModel, settings.cluster_mode):
+  - kmeans    : full KMeans, n_init=10 — the default for small universes
+  - minibatch : MiniBatchKMeans for thousands of tickers; partial_fit()
+                updates the centroids incrementally when tickers are added
+                (see benchmarks/bench_clustering.py for runtime / quality)
+
+Warm start across rebuilds: given the previous build's centroids,
+fit_clusters() starts from them with a single initialization (n_init=1
+instead of 10) and then matches the new centroids to the old ones with
+the Hungarian algorithm (minimum total centroid distance), renumbering
+so that a cluster keeps its ID from one generation to the next.
+cluster_churn() reports how many tickers still moved.
 """
 
+import json
+import operator
+from dataclasses import dataclass
+
 import pandas as pd
 import numpy as np
-from sklearn.cluster import KMeans
+from scipy.optimize import linear_sum_assignment
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from app.core.config import settings
 from app.core.logger import get_logger
-from app.features.fundamentals import FUNDAMENTAL_COLS, TECHNICAL_COLS, ENGINEERED_COLS
+from app.features.fundamentals import (
+    FUNDAMENTAL_COLS, TECHNICAL_COLS, HORIZON_COLS, ENGINEERED_COLS,
+)
 
 log = get_logger(__name__)
 
 DEFAULT_N_CLUSTERS = 8
+CLUSTER_MODES      = ('kmeans', 'minibatch')
+MINIBATCH_SIZE     = 1024
 
 FEATURE_WEIGHTS = (
     {col: 2.0 for col in FUNDAMENTAL_COLS} |
     {col: 1.0 for col in TECHNICAL_COLS}   |
+    {col: 0.5 for col in HORIZON_COLS}     |
     {col: 0.5 for col in ENGINEERED_COLS}
 )
 
 
+def _feature_weights(columns: list[str]) -> np.ndarray:
+    """FEATURE_WEIGHTS for `columns`, in order (unlisted columns weigh 1.0)."""
+    return np.array([FEATURE_WEIGHTS.get(col, 1.0) for col in columns], dtype=np.float64)
+
+
+def _nearest(points: np.ndarray, centers: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Index of, and squared distance to, the nearest center for each point."""
+    dists = (
+        (points ** 2).sum(axis=1)[:, None]
+        - 2 * points @ centers.T
+        + (centers ** 2).sum(axis=1)[None, :]
+    )
+    ids = dists.argmin(axis=1)
+    return ids, np.maximum(dists[np.arange(len(points)), ids], 0.0)
+
+
 def _apply_weights(scaled_df: pd.DataFrame) -> pd.DataFrame:
     weights   = pd.Series(FEATURE_WEIGHTS)
     available = weights.index.intersection(scaled_df.columns)
@@ -39,99 +85,291 @@ def _apply_weights(scaled_df: pd.DataFrame) -> pd.DataFrame:
     return weighted
 
 
-def _ticker_label(row: pd.Series) -> str:
-    """
-    Assign a human-readable label to a single ticker based on its
-    raw fundamental values. Applied per-row, fully deterministic.
-
-    Priority order — most distinctive conditions checked first.
-    """
-    eps        = row.get('eps_ttm',        np.nan)
-    de         = row.get('debt_to_equity', np.nan)
-    rev_growth = row.get('revenue_growth', np.nan)
-    pe         = row.get('pe_ratio',       np.nan)
-    beta       = row.get('beta',           np.nan)
-    roe        = row.get('roe',            np.nan)
-    div        = row.get('dividend_yield', np.nan)
-    vol        = row.get('volatility',     np.nan)
-    sector     = row.get('sector',         '')
-
-    # Loss-making
-    if pd.notna(eps) and eps <= 0:
-        return 'Distressed'
-
-    # Negative equity
-    if pd.notna(de) and de < -3:
-        return 'Negative Equity'
-
-    # Hypergrowth: >50% revenue growth
-    if pd.notna(rev_growth) and rev_growth > 0.50:
-        return 'Hypergrowth'
-
-    # Speculative: very high PE + high beta
-    if pd.notna(pe) and pd.notna(beta) and pe > 150 and beta > 1.5:
-        return 'Speculative'
-
-    # Quality Growth: high ROE + solid revenue growth
-    if pd.notna(roe) and pd.notna(rev_growth) and roe > 0.25 and rev_growth > 0.10:
-        return 'Quality Growth'
-
-    # Defensive Income: low beta + dividend payer
-    if pd.notna(beta) and pd.notna(div) and beta < 0.7 and div > 0.015:
-        return 'Defensive Income'
-
-    # Sector-based fallbacks
-    sector_map = {
-        'Energy':                 'Energy',
-        'Healthcare':             'Healthcare',
-        'Financial Services':     'Financials',
-        'Technology':             'Technology',
-        'Communication Services': 'Technology',
-        'Consumer Defensive':     'Consumer Defensive',
-        'Consumer Cyclical':      'Consumer Cyclical',
-        'Industrials':            'Industrials',
-        'Utilities':              'Utilities',
-        'Real Estate':            'Real Estate',
-    }
-    if sector in sector_map:
-        return sector_map[sector]
+# Label rules in priority order — a ticker gets the first label whose
+# conditions all hold. A condition is (column, op, threshold); a missing
+# column or NaN value never satisfies it.
+LABEL_RULES = (
+    ('Distressed',       (('eps_ttm', '<=', 0.0),)),                            # loss-making
+    ('Negative Equity',  (('debt_to_equity', '<', -3.0),)),
+    ('Hypergrowth',      (('revenue_growth', '>', 0.50),)),                     # >50% revenue growth
+    ('Speculative',      (('pe_ratio', '>', 150.0), ('beta', '>', 1.5))),
+    ('Quality Growth',   (('roe', '>', 0.25), ('revenue_growth', '>', 0.10))),
+    ('Defensive Income', (('beta', '<', 0.7), ('dividend_yield', '>', 0.015))),
+)
 
-    return 'Blend'
+# Fallback when no rule matches: label by sector, then LABEL_DEFAULT
+SECTOR_LABELS = {
+    'Energy':                 'Energy',
+    'Healthcare':             'Healthcare',
+    'Financial Services':     'Financials',
+    'Technology':             'Technology',
+    'Communication Services': 'Technology',
+    'Consumer Defensive':     'Consumer Defensive',
+    'Consumer Cyclical':      'Consumer Cyclical',
+    'Industrials':            'Industrials',
+    'Utilities':              'Utilities',
+    'Real Estate':            'Real Estate',
+}
+LABEL_DEFAULT = 'Blend'
+
+LABEL_OPS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+
+@dataclass(frozen=True)
+class LabelRules:
+    """
+    Ordered label rule table (settings: CLUSTER_LABEL_RULES, a JSON file).
 
+    The JSON file may override any of the three parts; omitted parts keep
+    the built-in defaults:
 
-def cluster_stocks(
+      {"rules":   [{"label": "Distressed", "when": [["eps_ttm", "<=", 0]]}, ...],
+       "sectors": {"Energy": "Energy", ...},
+       "default": "Blend"}
+    """
+    rules:   tuple = LABEL_RULES
+    sectors: tuple = tuple(SECTOR_LABELS.items())
+    default: str   = LABEL_DEFAULT
+
+    def __post_init__(self):
+        for label, conditions in self.rules:
+            for _, op, _ in conditions:
+                if op not in LABEL_OPS:
+                    raise ValueError(
+                        f"Label rule '{label}': unknown operator '{op}' — expected one of {tuple(LABEL_OPS)}"
+                    )
+
+    @classmethod
+    def from_json(cls, path: str) -> 'LabelRules':
+        with open(path) as f:
+            spec = json.load(f)
+        base = cls()
+        return cls(
+            rules   = tuple(
+                (r['label'], tuple((col, op, float(value)) for col, op, value in r['when']))
+                for r in spec['rules']
+            ) if 'rules' in spec else base.rules,
+            sectors = tuple(spec['sectors'].items()) if 'sectors' in spec else base.sectors,
+            default = spec.get('default', base.default),
+        )
+
+    @classmethod
+    def from_settings(cls) -> 'LabelRules':
+        return cls.from_json(settings.cluster_label_rules) if settings.cluster_label_rules else cls()
+
+
+class ClusterModel:
+    """
+    KMeans over FEATURE_WEIGHTS-weighted features, in one of CLUSTER_MODES.
+
+      kmeans     full Lloyd iterations, n_init=10 — best quality, every
+                 iteration touches every row
+      minibatch  MiniBatchKMeans: each step uses `batch_size` random rows,
+                 so a fit costs ~O(batch_size) per step instead of O(N);
+                 partial_fit() folds new rows into the centroids without
+                 refitting (streaming / incremental universe updates)
+
+    The model keeps the column order and FEATURE_WEIGHTS it was fitted
+    with, so it is self-contained: pickled with a snapshot it places any
+    scaled feature row without the build that produced it. predict() is a
+    plain numpy nearest-centroid lookup (no sklearn input validation), a
+    few microseconds per row.
+    """
+
+    def __init__(
+        self,
+        n_clusters: int = DEFAULT_N_CLUSTERS,
+        mode: str = 'kmeans',
+        batch_size: int = MINIBATCH_SIZE,
+    ):
+        if mode not in CLUSTER_MODES:
+            raise ValueError(f"Unknown cluster mode '{mode}' — expected one of {CLUSTER_MODES}")
+        self.n_clusters = n_clusters
+        self.mode       = mode
+        self.batch_size = batch_size
+        self.columns    = []
+        self.weights    = np.empty(0)
+        self.estimator  = None
+
+    def _new_estimator(self, init: np.ndarray = None):
+        warm = init is not None
+        if self.mode == 'kmeans':
+            return KMeans(
+                n_clusters=self.n_clusters,
+                random_state=42,
+                n_init=1 if warm else 10,
+                init=init if warm else 'k-means++',
+            )
+        return MiniBatchKMeans(
+            n_clusters=self.n_clusters,
+            random_state=42,
+            n_init=1 if warm else 3,
+            init=init if warm else 'k-means++',
+            batch_size=self.batch_size,
+        )
+
+    def _weighted(self, scaled: pd.DataFrame) -> np.ndarray:
+        if not scaled.columns.equals(pd.Index(self.columns)):
+            scaled = scaled[self.columns]
+        return scaled.to_numpy(dtype=np.float64) * self.weights
+
+    def fit_predict(self, scaled_df: pd.DataFrame, init: pd.DataFrame = None) -> np.ndarray:
+        """
+        Fit on the whole universe; returns one cluster id per row.
+
+        Args:
+            scaled_df: scaled features
+            init:      previous centroids (weighted space, one row per
+                       cluster) to warm-start from; ignored unless it has
+                       exactly n_clusters complete rows over these columns
+        """
+        self.columns   = list(scaled_df.columns)
+        self.weights   = _feature_weights(self.columns)
+        start          = None
+        if init is not None and len(init) == self.n_clusters:
+            start = init.reindex(columns=self.columns).to_numpy(dtype=np.float64)
+            start = start if np.isfinite(start).all() else None
+        self.estimator = self._new_estimator(start)
+        return self.estimator.fit_predict(self._weighted(scaled_df))
+
+    def renumber(self, order: np.ndarray) -> None:
+        """
+        Give cluster i the id order[i] (order is a permutation of 0..k-1).
+
+        Centroids (and minibatch counts) are permuted in place, so predict()
+        and partial_fit() use the new ids from here on.
+        """
+        est            = self.estimator
+        centers        = np.empty_like(est.cluster_centers_)
+        centers[order] = est.cluster_centers_
+        est.cluster_centers_ = centers
+        est.labels_          = order[est.labels_]
+        if getattr(est, '_counts', None) is not None:
+            counts        = np.empty_like(est._counts)
+            counts[order] = est._counts
+            est._counts   = counts
+
+    def partial_fit(self, scaled_rows: pd.DataFrame) -> 'ClusterModel':
+        """Move the centroids towards new rows (minibatch mode only)."""
+        if self.mode != 'minibatch':
+            raise ValueError("partial_fit needs mode='minibatch'")
+        self.estimator.partial_fit(self._weighted(scaled_rows))
+        return self
+
+    def predict(self, scaled_rows: pd.DataFrame) -> pd.Series:
+        """Nearest centroid for each row (no refit)."""
+        ids, _ = self.assign(scaled_rows)
+        return pd.Series(ids, index=scaled_rows.index, name='cluster')
+
+    def assign(self, scaled_rows: pd.DataFrame) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Nearest cluster id and the distance to its centroid for each row.
+
+        Returns:
+            (int32 cluster ids, euclidean distances in the weighted space)
+        """
+        ids, sq = _nearest(self._weighted(scaled_rows), self.estimator.cluster_centers_)
+        return ids.astype(np.int32), np.sqrt(sq)
+
+    def distances(self, scaled_rows: pd.DataFrame, ids: np.ndarray) -> np.ndarray:
+        """Distance of each row to the centroid of the given cluster id."""
+        centers = self.estimator.cluster_centers_[np.asarray(ids, dtype=np.intp)]
+        return np.linalg.norm(self._weighted(scaled_rows) - centers, axis=1)
+
+    @property
+    def centroids(self) -> pd.DataFrame:
+        """Centroids in the weighted feature space, one row per cluster id."""
+        return pd.DataFrame(self.estimator.cluster_centers_, columns=self.columns)
+
+    @property
+    def inertia(self) -> float:
+        return float(self.estimator.inertia_)
+
+
+def match_clusters(centroids: pd.DataFrame, previous: pd.DataFrame) -> np.ndarray:
+    """
+    Hungarian matching of new centroids to the previous generation's.
+
+    Args:
+        centroids: new centroids, row i = new cluster i
+        previous:  previous centroids, indexed by their cluster id
+
+    Returns:
+        int array: new cluster i -> previous cluster id (a permutation of
+        0..k-1 when previous is indexed 0..k-1)
+    """
+    new   = centroids.to_numpy(dtype=np.float64)
+    old   = previous.reindex(columns=centroids.columns).fillna(0.0).to_numpy(dtype=np.float64)
+    cost  = ((new[:, None, :] - old[None, :, :]) ** 2).sum(axis=2)
+    rows, cols = linear_sum_assignment(cost)
+    order = np.empty(len(new), dtype=np.intp)
+    order[rows] = previous.index.to_numpy()[cols]
+    return order
+
+
+def cluster_churn(previous: pd.Series, current: pd.Series) -> dict:
+    """
+    How many tickers changed cluster id between two generations.
+
+    Only tickers present in both are compared (additions / removals are
+    not churn).
+
+    Returns:
+        {'compared': n, 'changed': m, 'churn': m / n}
+    """
+    common  = previous.index.intersection(current.index)
+    changed = int((previous.loc[common].to_numpy() != current.loc[common].to_numpy()).sum())
+    return {
+        'compared': len(common),
+        'changed':  changed,
+        'churn':    round(changed / len(common), 4) if len(common) else 0.0,
+    }
+
+
+def fit_clusters(
     scaled_df: pd.DataFrame,
     combined_df: pd.DataFrame,
     n_clusters: int = DEFAULT_N_CLUSTERS,
-) -> pd.DataFrame:
+    mode: str = 'kmeans',
+    batch_size: int = MINIBATCH_SIZE,
+    previous: pd.DataFrame = None,
+    labels: LabelRules = None,
+) -> tuple[ClusterModel, pd.DataFrame]:
     """
-    Cluster stocks using KMeans on weighted features, label per-ticker.
+    Cluster stocks on weighted features and label them per-ticker.
 
     Args:
         scaled_df:   scaled feature DataFrame from scale_features()
         combined_df: original merged DataFrame with raw fundamentals + 'sector'
         n_clusters:  number of clusters (default=8 from elbow analysis)
+        mode:        'kmeans' or 'minibatch' (see ClusterModel)
+        batch_size:  rows per MiniBatchKMeans step
+        previous:    previous generation's centroids (see cluster_centroids);
+                     warm-starts the fit and keeps cluster ids stable
+        labels:      label rule table (default: the built-in LABEL_RULES)
 
     Returns:
-        combined_df with 'cluster' (int) and 'cluster_label' (str) columns added
+        (fitted ClusterModel, combined_df with 'cluster' (int) and
+        'cluster_label' (str) columns added)
     """
-    log.info(f"Clustering {len(scaled_df)} tickers into {n_clusters} groups")
-
-    weighted_df = _apply_weights(scaled_df)
-
-    km = KMeans(
-        n_clusters=n_clusters,
-        random_state=42,
-        n_init=10,
-        init='k-means++',
+    warm = previous is not None and len(previous) == n_clusters
+    log.info(
+        f"Clustering {len(scaled_df)} tickers into {n_clusters} groups "
+        f"({mode}, {'warm start' if warm else 'cold start'})"
     )
-    cluster_ids = km.fit_predict(weighted_df)
+
+    model       = ClusterModel(n_clusters, mode, batch_size)
+    cluster_ids = model.fit_predict(scaled_df, init=previous if warm else None)
+    if warm:
+        order       = match_clusters(model.centroids, previous)
+        model.renumber(order)
+        cluster_ids = order[cluster_ids].astype(cluster_ids.dtype)
 
     result             = combined_df.copy()
     result['cluster']  = cluster_ids
 
     # Assign labels per-ticker from raw fundamentals — deterministic
-    result['cluster_label'] = result.apply(_ticker_label, axis=1)
+    result['cluster_label'] = label_tickers(result, labels)
 
     # Log cluster label summary
     summary = (
@@ -155,7 +393,77 @@ def cluster_stocks(
             f"clusters may be unbalanced"
         )
 
-    return result
+    return model, result
+
+
+def cluster_stocks(
+    scaled_df: pd.DataFrame,
+    combined_df: pd.DataFrame,
+    n_clusters: int = DEFAULT_N_CLUSTERS,
+    mode: str = 'kmeans',
+) -> pd.DataFrame:
+    """
+    Cluster stocks using KMeans on weighted features, label per-ticker.
+
+    Returns:
+        combined_df with 'cluster' (int) and 'cluster_label' (str) columns added
+        (see fit_clusters for the fitted model as well)
+    """
+    return fit_clusters(scaled_df, combined_df, n_clusters, mode)[1]
+
+
+def cluster_centroids(scaled_df: pd.DataFrame, cluster_ids: pd.Series) -> pd.DataFrame:
+    """
+    Centroid of each KMeans cluster in the weighted feature space.
+
+    At convergence KMeans centroids are exactly these per-cluster means,
+    so they can be recovered from a built universe without the model.
+    """
+    weighted = _apply_weights(scaled_df)
+    return weighted.groupby(cluster_ids.reindex(weighted.index).to_numpy()).mean()
+
+
+def assign_clusters(scaled_rows: pd.DataFrame, centroids: pd.DataFrame) -> pd.Series:
+    """Nearest existing centroid for new scaled rows (no refit)."""
+    weighted = _apply_weights(scaled_rows)[centroids.columns].to_numpy()
+    ids, _   = _nearest(weighted, centroids.to_numpy())
+    return pd.Series(centroids.index.to_numpy()[ids], index=scaled_rows.index, name='cluster')
+
+
+def label_tickers(combined_df: pd.DataFrame, labels: LabelRules = None) -> pd.Series:
+    """
+    Per-ticker labels from raw fundamentals, evaluated as whole columns.
+
+    Each rule becomes one boolean mask (the AND of its conditions) and
+    np.select picks the first rule that holds, so priority follows the
+    table order. Tickers matching no rule get their sector label, then
+    labels.default.
+
+    Returns:
+        Series 'cluster_label' indexed like combined_df
+    """
+    labels = labels or LabelRules()
+    n      = len(combined_df)
+
+    def col(name: str) -> np.ndarray:
+        if name in combined_df.columns:
+            return pd.to_numeric(combined_df[name], errors='coerce').to_numpy(dtype=np.float64)
+        return np.full(n, np.nan)
+
+    columns = {c: col(c) for _, conditions in labels.rules for c, _, _ in conditions}
+    masks   = [
+        np.logical_and.reduce([LABEL_OPS[op](columns[c], value) for c, op, value in conditions])
+        for _, conditions in labels.rules
+    ]
+    choices = [np.full(n, label, dtype=object) for label, _ in labels.rules]
+
+    if 'sector' in combined_df.columns:
+        sector = combined_df['sector'].astype(object).map(dict(labels.sectors)).to_numpy(dtype=object)
+        masks.append(pd.notna(sector))
+        choices.append(sector)
+
+    codes = np.select(masks, choices, default=labels.default) if masks else np.full(n, labels.default)
+    return pd.Series(codes, index=combined_df.index, name='cluster_label', dtype=object)
 
 
 def get_cluster_stats(clustered_df: pd.DataFrame) -> pd.DataFrame:
@@ -0,0 +1,374 @@
+"""
+Diversification
+---------------
+Correlation of every universe ticker against a portfolio's daily return
+series, used by gaps() to recommend the least correlated additions.
+
+The returns matrix (dates x tickers) is computed once per snapshot and
+stored column-centred with NaNs zeroed, next to a 0/1 validity mask
+(None when the data has no gaps). A query is then a handful of
+matrix-vector products instead of a pandas .corr() per ticker. Both
+arrays are saved with each snapshot generation (arrays / from_arrays) and
+memory-mapped on load, so shared-mode workers do not each rebuild them:
+
+    n   = M'1          s_x = X'1         s_xx = (X*X)'1      (per column)
+    s_y = M'y          s_yy = M'(y*y)    s_xy = X'y
+
+    corr = (n s_xy - s_x s_y) / sqrt((n s_xx - s_x^2) (n s_yy - s_y^2))
+
+Each ticker is correlated over the dates where both it and the portfolio
+have returns — the same pairwise-complete rule as Series.corr, so a
+ticker with a short history is still scored. With no gaps this is a
+single standardized product X_std'y_std / T. Pearson correlation is
+shift-invariant, which is what makes the column centring free.
+
+Holdings may carry weights: the portfolio series is one weights . returns
+product over the held columns.
+
+Risk-based ranking needs only Sigma w (one entry per ticker) and the
+diagonal of Sigma, never the N x N covariance matrix itself, so neither
+the build nor the snapshot holds one. marginal_volatility() ranks every
+candidate by the first-order change in portfolio volatility when weight
+is moved into it, and volatility_change() by the exact change from
+adding it at a given weight (a rank-one update of w'Sigma w). Both take
+Sigma w from ReturnsMatrix.covariance_with() — X'(X_h w) / (n - 1), one
+(T x N) matrix-vector product — and the diagonal from the cached column
+sums. Holdings with gaps in their history each share a different set
+of dates with every ticker and add one (T x N) product apiece.
+
+Top-N selection uses argpartition (O(N)) and only sorts the N winners.
+"""
+
+import numpy as np
+import pandas as pd
+
+MIN_OBSERVATIONS = 2
+TRADING_DAYS     = 252
+
+
+class ReturnsMatrix:
+    """Daily simple returns of a ticker universe, arranged for correlation queries."""
+
+    __slots__ = ('dates', 'tickers', 'values', 'mask', '_col_sums')
+
+    def __init__(self, prices: pd.DataFrame, tickers):
+        returns        = prices.reindex(columns=list(tickers)).pct_change().iloc[1:]
+        raw            = returns.to_numpy(dtype=np.float64)
+        finite         = np.isfinite(raw)
+        counts         = finite.sum(axis=0)
+        means          = np.where(finite, raw, 0.0).sum(axis=0) / np.maximum(counts, 1)
+
+        self.dates     = returns.index
+        self.tickers   = list(tickers)
+        self.values    = np.where(finite, raw - means, 0.0)
+        self.mask      = None if finite.all() else finite.astype(np.float64)
+        self._col_sums = self._sums(self.values, self.mask)
+
+    @staticmethod
+    def _sums(values: np.ndarray, mask: np.ndarray | None) -> tuple:
+        n = np.full(values.shape[1], float(len(values))) if mask is None else mask.sum(axis=0)
+        return n, values.sum(axis=0), np.einsum('ij,ij->j', values, values)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + (self.mask.nbytes if self.mask is not None else 0)
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """Centred returns and (when the data has gaps) the validity mask."""
+        if self.mask is None:
+            return {'values': self.values}
+        return {'values': self.values, 'mask': self.mask}
+
+    @classmethod
+    def from_arrays(cls, dates, tickers, arrays: dict[str, np.ndarray]) -> 'ReturnsMatrix':
+        """
+        Wrap saved arrays (e.g. read-only memmaps) without copying them.
+
+        Args:
+            dates:   return dates — the price index without its first row
+            tickers: column order the arrays were saved in
+            arrays:  output of arrays()
+        """
+        matrix           = cls.__new__(cls)
+        matrix.dates     = pd.DatetimeIndex(dates)
+        matrix.tickers   = list(tickers)
+        matrix.values    = arrays['values']
+        matrix.mask      = arrays.get('mask')
+        matrix._col_sums = cls._sums(matrix.values, matrix.mask)
+        return matrix
+
+    def extended(self, other: 'ReturnsMatrix') -> 'ReturnsMatrix':
+        """This matrix with the columns of `other` (same dates) appended."""
+        if self.mask is None and other.mask is None:
+            arrays = {'values': np.hstack([self.values, other.values])}
+        else:
+            masks  = [
+                m.mask if m.mask is not None else np.ones(m.values.shape) for m in (self, other)
+            ]
+            arrays = {'values': np.hstack([self.values, other.values]), 'mask': np.hstack(masks)}
+        return ReturnsMatrix.from_arrays(self.dates, self.tickers + other.tickers, arrays)
+
+    def subset(self, positions: np.ndarray) -> 'ReturnsMatrix':
+        """The columns at `positions` — each keeps its own full-history mean."""
+        arrays = {'values': self.values[:, positions]}
+        if self.mask is not None:
+            mask = self.mask[:, positions]
+            if not mask.all():
+                arrays['mask'] = mask
+        return ReturnsMatrix.from_arrays(self.dates, [self.tickers[i] for i in positions], arrays)
+
+    def portfolio_returns(
+        self,
+        positions: np.ndarray,
+        weights: np.ndarray = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Weighted return series of the columns at `positions`.
+
+        Args:
+            positions: column positions of the holdings
+            weights:   holding weights summing to 1 (default: equal weight)
+
+        Only dates where every holding has a return are kept (as
+        prices[portfolio].pct_change().dropna() would). The series is
+        shifted by a constant because the columns are centred, which does
+        not change any correlation with it.
+
+        Returns:
+            (row indices into the matrix, portfolio returns on those rows)
+        """
+        if self.mask is None:
+            rows = np.arange(len(self.values))
+        else:
+            rows = np.flatnonzero(self.mask[:, positions].all(axis=1))
+        if weights is None:
+            weights = np.full(len(positions), 1.0 / len(positions))
+        if len(rows) == len(self.values):
+            return rows, self.values[:, positions] @ weights
+        return rows, self.values[np.ix_(rows, positions)] @ weights
+
+    def variances(self) -> np.ndarray:
+        """Daily variance of every column — the diagonal of covariance_block(self)."""
+        n, _, s_xx = self._col_sums
+        return _covariance(s_xx, n)
+
+    def covariance_with(self, positions: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """
+        Sigma w for every column, without forming Sigma.
+
+        Equals covariance_block(self)[:, positions] @ weights. A holding with
+        a full history shares exactly the n_c valid dates of every column c,
+        so all such holdings collapse into one matrix-vector product scaled
+        by 1 / (n_c - 1); only holdings with gaps need pairwise counts.
+
+        Args:
+            positions: column positions of the k holdings
+            weights:   holding weights
+
+        Returns:
+            (N,) float64 array
+        """
+        positions = np.asarray(positions)
+        weights   = np.asarray(weights, dtype=np.float64)
+        if self.mask is None:
+            full = np.ones(len(positions), dtype=bool)
+        else:
+            full = self.mask[:, positions].all(axis=0)
+
+        n       = self._col_sums[0]
+        sigma_w = np.zeros(self.values.shape[1])
+        if full.any():
+            gram     = self.values.T @ (self.values[:, positions[full]] @ weights[full])
+            sigma_w += _covariance(gram, n)
+        if not full.all():
+            gapped   = positions[~full]
+            gram     = self.values.T @ self.values[:, gapped]
+            pairs    = self.mask.T @ self.mask[:, gapped]
+            sigma_w += _covariance(gram, pairs) @ weights[~full]
+        return sigma_w
+
+    def correlations(self, rows: np.ndarray, target: np.ndarray) -> np.ndarray:
+        """
+        Pearson correlation of every column with `target` over `rows`.
+
+        Returns:
+            float64 array, one entry per ticker; NaN where fewer than
+            MIN_OBSERVATIONS pairs exist or either side has zero variance
+        """
+        n_rows       = len(self.values)
+        y            = target - target.mean()
+        values, mask = self.values, self.mask
+        n, s_x, s_xx = self._col_sums
+
+        if len(rows) < n_rows:
+            dropped       = np.ones(n_rows, dtype=bool)
+            dropped[rows] = False
+            if dropped.sum() <= n_rows // 2:
+                # Few dates dropped (usual: one holding listed late) — take
+                # their share off the cached column sums, zero-pad y
+                d_n, d_x, d_xx = self._sums(values[dropped], mask[dropped])
+                n, s_x, s_xx   = n - d_n, s_x - d_x, s_xx - d_xx
+                padded         = np.zeros(n_rows)
+                padded[rows]   = y
+                y              = padded
+            else:
+                values, mask   = values[rows], mask[rows]
+                n, s_x, s_xx   = self._sums(values, mask)
+
+        s_xy = values.T @ y
+        if mask is None:
+            s_y, s_yy = y.sum(), (y * y).sum()
+        else:
+            s_y, s_yy = mask.T @ y, mask.T @ (y * y)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            num  = n * s_xy - s_x * s_y
+            den  = np.sqrt((n * s_xx - s_x ** 2) * (n * s_yy - s_y ** 2))
+            corr = num / den
+        corr[(n < MIN_OBSERVATIONS) | ~(den > 0)] = np.nan
+        return np.clip(corr, -1.0, 1.0)
+
+
+def _covariance(gram: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+    """gram / (pairs - 1), with 0 where fewer than MIN_OBSERVATIONS pairs exist."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = gram / (pairs - 1)
+    cov[pairs < MIN_OBSERVATIONS] = 0.0
+    return cov
+
+
+def covariance_block(returns: ReturnsMatrix, other: ReturnsMatrix = None) -> np.ndarray:
+    """
+    Daily covariance between the tickers of `returns` and of `other`.
+
+    Like DataFrame.cov() this is pairwise-complete, but each ticker keeps
+    its own full-history mean, so tickers with gaps differ slightly from
+    pandas' per-pair means. Pairs with fewer than MIN_OBSERVATIONS shared
+    dates get 0 (no information) rather than NaN, so products stay finite.
+
+    Args:
+        returns: ReturnsMatrix (N tickers)
+        other:   ReturnsMatrix over the same dates (k tickers); default
+                 `returns` itself, giving the full N x N matrix
+
+    Returns:
+        (N, k) array
+    """
+    other = other if other is not None else returns
+    gram  = returns.values.T @ other.values
+    if returns.mask is None and other.mask is None:
+        pairs = np.full(gram.shape, float(len(returns.values)))
+    else:
+        left  = returns.mask if returns.mask is not None else np.ones(returns.values.shape)
+        right = other.mask   if other.mask   is not None else np.ones(other.values.shape)
+        pairs = left.T @ right
+    return _covariance(gram, pairs)
+
+
+def covariance_matrix(returns: ReturnsMatrix) -> np.ndarray:
+    """
+    Daily covariance of every pair of tickers (see covariance_block).
+
+    N x N — a reference for tests and benchmarks; queries use
+    ReturnsMatrix.covariance_with() / variances() instead.
+    """
+    return covariance_block(returns)
+
+
+def _portfolio_risk(
+    returns: ReturnsMatrix,
+    positions: np.ndarray,
+    weights: np.ndarray,
+) -> tuple[np.ndarray, float]:
+    """(Sigma w for every ticker, w' Sigma w)."""
+    sigma_w  = returns.covariance_with(positions, weights)
+    variance = float(sigma_w[positions] @ weights)
+    return sigma_w, max(variance, 0.0)
+
+
+def marginal_volatility(
+    returns: ReturnsMatrix,
+    positions: np.ndarray,
+    weights: np.ndarray,
+) -> tuple[np.ndarray, float]:
+    """
+    First-order change in portfolio volatility from moving weight into each ticker.
+
+    Adding ticker c at weight a, funded pro rata from the holdings, gives
+    w(a) = (1 - a) w + a e_c, and at a = 0:
+
+        d sigma / d a = ((Sigma w)_c - w' Sigma w) / sigma_p
+
+    Negative values mean the candidate lowers portfolio volatility.
+
+    Args:
+        returns:   ReturnsMatrix of the universe (N tickers)
+        positions: positions of the k holdings
+        weights:   holding weights summing to 1
+
+    Returns:
+        (annualized marginal volatility per ticker, annualized portfolio volatility)
+    """
+    sigma_w, variance = _portfolio_risk(returns, positions, weights)
+    vol               = np.sqrt(variance)
+    if vol == 0.0:
+        return np.full(len(returns.tickers), np.nan), 0.0
+    scale = np.sqrt(TRADING_DAYS)
+    return (sigma_w - variance) / vol * scale, vol * scale
+
+
+def volatility_change(
+    returns: ReturnsMatrix,
+    positions: np.ndarray,
+    weights: np.ndarray,
+    add_weight: float,
+) -> tuple[np.ndarray, float]:
+    """
+    Exact change in portfolio volatility from adding each ticker at `add_weight`.
+
+    With w(a) = (1 - a) w + a e_c the new variance is a rank-one update of
+    the current one, for every candidate c at once:
+
+        sigma^2(a) = (1 - a)^2 w'Sigma w + 2 a (1 - a) (Sigma w)_c + a^2 Sigma_cc
+
+    so the whole universe costs one Sigma w plus the diagonal of Sigma —
+    no optimizer calls.
+
+    Args:
+        returns:    ReturnsMatrix of the universe (N tickers)
+        positions:  positions of the k holdings
+        weights:    holding weights summing to 1
+        add_weight: weight given to the candidate, in (0, 1)
+
+    Returns:
+        (annualized volatility change per ticker, annualized portfolio volatility)
+    """
+    sigma_w, variance = _portfolio_risk(returns, positions, weights)
+    a        = add_weight
+    new_var  = (1 - a) ** 2 * variance + 2 * a * (1 - a) * sigma_w + a ** 2 * returns.variances()
+    scale    = np.sqrt(TRADING_DAYS)
+    vol      = np.sqrt(variance)
+    return (np.sqrt(np.maximum(new_var, 0.0)) - vol) * scale, vol * scale
+
+
+def lowest_n(scores: np.ndarray, n: int, exclude: np.ndarray = None) -> np.ndarray:
+    """
+    Positions of the `n` smallest non-NaN scores, in ascending order.
+
+    Args:
+        scores:  one score per ticker
+        n:       how many to return
+        exclude: positions that may not be returned (e.g. current holdings)
+
+    Returns:
+        int array of positions, length <= n
+    """
+    valid = ~np.isnan(scores)
+    if exclude is not None and len(exclude):
+        valid[exclude] = False
+    candidates = np.flatnonzero(valid)
+    if n <= 0:
+        return candidates[:0]
+    if n < len(candidates):
+        candidates = candidates[np.argpartition(scores[candidates], n - 1)[:n]]
+    return candidates[np.argsort(scores[candidates], kind='stable')]
@@ -0,0 +1,162 @@
+"""
+Automatic k Selection
+---------------------
+Chooses the number of KMeans clusters for the current universe instead
+of the fixed DEFAULT_N_CLUSTERS (an elbow reading on 50 tickers).
+
+sweep_k() fits one ClusterModel per candidate k — in parallel, one k per
+worker process — and scores each on the weighted feature matrix:
+
+  inertia     within-cluster sum of squares (always falls as k grows)
+  silhouette  on a fixed random subsample of SILHOUETTE_SAMPLE rows, so
+              the O(N^2) score stays cheap for thousands of tickers
+  min_size    smallest cluster — singletons are what the fixed k=8
+              produced on the 50-ticker universe
+
+choose_k() then applies a rule (settings.cluster_k_rule):
+
+  fixed       DEFAULT_N_CLUSTERS, no sweep
+  silhouette  highest silhouette among k whose smallest cluster has at
+              least `min_size` tickers
+  elbow       the k furthest below the straight line joining the first
+              and last points of the inertia curve (the "knee"), among
+              the same admissible k
+
+Fits for different k are independent, so with one worker per k the
+sweep's wall time is roughly that of its slowest single fit. In the build
+the sweep is its own DAG stage, memoized by StageCache on the scaled
+matrix — one sweep per distinct feature matrix — while the rule is
+applied in a cheap un-memoized stage, so changing the rule never re-sweeps.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import silhouette_score
+from threadpoolctl import threadpool_limits
+
+from app.core.dag import process_pool
+from app.core.logger import get_logger
+from app.models.clustering import DEFAULT_N_CLUSTERS, MINIBATCH_SIZE, ClusterModel, _apply_weights
+
+log = get_logger(__name__)
+
+K_RULES           = ('fixed', 'silhouette', 'elbow')
+SILHOUETTE_SAMPLE = 2000
+SWEEP_COLUMNS     = ['k', 'inertia', 'silhouette', 'min_size', 'seconds']
+
+
+def _score_k(scaled_df: pd.DataFrame, k: int, mode: str, batch_size: int, threads: int) -> dict:
+    """Fit and score one k (runs in a worker process, on `threads` BLAS/OpenMP threads)."""
+    start = time.perf_counter()
+    with threadpool_limits(limits=threads):
+        model    = ClusterModel(k, mode, batch_size)
+        ids      = model.fit_predict(scaled_df)
+        weighted = _apply_weights(scaled_df).to_numpy(dtype=np.float64)
+        sample   = min(SILHOUETTE_SAMPLE, len(weighted))
+        score    = float(silhouette_score(weighted, ids, sample_size=sample, random_state=0))
+    return {
+        'k':          k,
+        'inertia':    model.inertia,
+        'silhouette': score,
+        'min_size':   int(np.bincount(ids, minlength=k).min()),
+        'seconds':    round(time.perf_counter() - start, 3),
+    }
+
+
+def sweep_k(
+    scaled_df: pd.DataFrame,
+    ks: tuple[int, ...] = (),
+    mode: str = 'kmeans',
+    batch_size: int = MINIBATCH_SIZE,
+    max_workers: int = 4,
+    use_processes: bool = True,
+) -> pd.DataFrame:
+    """
+    Score every candidate k on the weighted feature matrix, in parallel.
+
+    Args:
+        scaled_df:     scaled features (weighted like cluster_stocks)
+        ks:            candidate cluster counts; values outside
+                       [2, n_tickers - 1] are dropped
+        mode:          ClusterModel mode used for every fit
+        max_workers:   parallel fits
+        use_processes: process pool (default) or threads
+
+    Returns:
+        one row per k: k, inertia, silhouette, min_size, seconds
+        (empty when there is nothing to sweep)
+    """
+    ks = sorted({k for k in ks if 2 <= k < len(scaled_df)})
+    if not ks:
+        return pd.DataFrame(columns=SWEEP_COLUMNS)
+
+    # Split the cores between workers so parallel fits do not oversubscribe
+    start    = time.perf_counter()
+    workers  = min(max_workers, len(ks))
+    threads  = max(1, (os.cpu_count() or 1) // workers)
+    executor = process_pool if use_processes else ThreadPoolExecutor
+    with executor(max_workers=workers) as pool:
+        futures = [pool.submit(_score_k, scaled_df, k, mode, batch_size, threads) for k in ks]
+        rows    = [f.result() for f in futures]
+
+    sweep = pd.DataFrame(rows, columns=SWEEP_COLUMNS)
+    log.info(
+        f"k sweep {ks[0]}..{ks[-1]} over {len(scaled_df)} tickers: "
+        f"{time.perf_counter() - start:.2f}s wall, {sweep['seconds'].sum():.2f}s of fits"
+    )
+    return sweep
+
+
+def _elbow(sweep: pd.DataFrame) -> int:
+    """k with the largest drop below the chord of the (normalized) inertia curve."""
+    if len(sweep) < 3:
+        return int(sweep['k'].iloc[0])
+    k     = sweep['k'].to_numpy(dtype=float)
+    y     = sweep['inertia'].to_numpy(dtype=float)
+    kn    = (k - k[0]) / (k[-1] - k[0])
+    yn    = (y - y.min()) / max(y.max() - y.min(), 1e-12)
+    chord = yn[0] + (yn[-1] - yn[0]) * kn
+    return int(k[np.argmax(chord - yn)])
+
+
+def choose_k(
+    sweep: pd.DataFrame,
+    rule: str = 'fixed',
+    min_size: int = 3,
+    default: int = DEFAULT_N_CLUSTERS,
+) -> int:
+    """
+    Pick the number of clusters from a sweep_k() table.
+
+    Args:
+        sweep:    sweep_k() output (may be empty)
+        rule:     one of K_RULES (see module docstring)
+        min_size: smallest admissible cluster; if no k qualifies, all are
+                  considered
+        default:  returned for rule='fixed' or an empty sweep
+
+    Returns:
+        number of clusters
+    """
+    if rule not in K_RULES:
+        raise ValueError(f"Unknown k rule '{rule}' — expected one of {K_RULES}")
+    if rule == 'fixed' or sweep is None or sweep.empty:
+        return default
+
+    admissible = sweep[sweep['min_size'] >= min_size]
+    if admissible.empty:
+        log.warning(f"No k keeps every cluster at >= {min_size} tickers — ignoring min_size")
+        admissible = sweep
+
+    if rule == 'silhouette':
+        k = int(admissible.loc[admissible['silhouette'].idxmax(), 'k'])
+    else:
+        k = _elbow(admissible.sort_values('k'))
+    log.info(f"Selected k={k} by {rule} rule")
+    return k
@@ -13,15 +13,48 @@ Using separate matrices preserves cross-sector behavioral insights:
   - XOM and KO may be technically similar (low momentum, high dividend) even
     if their fundamentals differ
 
-Two query functions:
+Query functions:
   - get_similar_stocks()       : most similar tickers (for substitution)
   - get_complementary_stocks() : least similar tickers (for diversification)
+  - get_similar_stocks_batch() : most similar tickers for many queries
+
+Out-of-universe queries:
+  - score_against()            : similarity of new scaled rows (e.g. from
+                                 FeaturePipeline.transform) to the universe,
+                                 without touching the N x N matrices
+  - get_similar_to_vector()    : most similar tickers for such a row
+  - score_block()              : k rows at once (k x N), used to splice new
+                                 tickers into the matrices without a rebuild
+
+Top-k neighbor index (NeighborIndex):
+  The dense matrices are N x N — three of them at 10,000 tickers is
+  2.4 GB of float64 per worker, to answer queries that need five rows.
+  NeighborIndex keeps, per ticker, only the `k` most and `k` least
+  similar tickers by combined similarity, plus the L2-normalized feature
+  rows (N x d) so any single row can still be scored exactly in O(N·d).
+  It is built in blocks of BLOCK_ROWS query rows (one block x N score
+  matrix, top / bottom k by argpartition), so peak memory is
+  O(BLOCK_ROWS·N) and the stored index is O(N·k). Both query functions
+  accept either a dense matrix or a neighbor index (any UnitEmbeddings:
+  NeighborIndex, or the approximate LSHIndex in app/models/ann.py).
+
+Query-time blend weights:
+  The 70/30 blend is only the default. Every index keeps the normalized
+  fundamental and technical rows separately, so `fund_weight=w` scores a
+  query against all tickers as w·(F @ f) + (1-w)·(T @ t) — two
+  matrix-vector products, no N x N storage, no rebuild. The NeighborIndex
+  lists only hold for the build blend; other weights scan exactly.
+  get_similar_stocks_batch() scores many query tickers at once
+  (two matrix-matrix products per block of BLOCK_ROWS queries).
 """
 
+from __future__ import annotations
+
 import pandas as pd
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 from app.core.logger import get_logger
+from app.core.memory import TickerIndex
 from app.features.fundamentals import FUNDAMENTAL_COLS, TECHNICAL_COLS
 
 log = get_logger(__name__)
@@ -30,6 +63,10 @@ log = get_logger(__name__)
 FUNDAMENTAL_WEIGHT = 0.70
 TECHNICAL_WEIGHT   = 0.30
 
+# NeighborIndex: neighbors kept per ticker (each way), query rows per block
+NEIGHBORS_K = 50
+BLOCK_ROWS  = 1024
+
 
 def _cosine_df(df: pd.DataFrame) -> pd.DataFrame:
     """Compute cosine similarity matrix and return as labeled DataFrame."""
@@ -81,6 +118,417 @@ def build_similarity_matrices(scaled_df: pd.DataFrame) -> dict[str, pd.DataFrame
     }
 
 
+def _blend(fund_weight: float | None) -> tuple[float, float]:
+    """(fundamental, technical) weights; None = the build default."""
+    if fund_weight is None:
+        return FUNDAMENTAL_WEIGHT, TECHNICAL_WEIGHT
+    if not 0.0 <= fund_weight <= 1.0:
+        raise ValueError(f"fund_weight must be in [0, 1], got {fund_weight}")
+    return float(fund_weight), 1.0 - float(fund_weight)
+
+
+def score_block(
+    query_scaled: pd.DataFrame,
+    scaled_df: pd.DataFrame,
+    fund_weight: float = None,
+) -> dict[str, pd.DataFrame]:
+    """
+    Similarity of k scaled feature rows to every universe ticker.
+
+    Uses the same column groups and 70/30 blend as build_similarity_matrices(),
+    so scores are directly comparable with (and can be spliced into) the
+    universe matrices. Costs k x N instead of N x N.
+
+    Args:
+        query_scaled: k rows of scaled features (same columns as scaled_df)
+        scaled_df:    universe scaled feature DataFrame
+        fund_weight:  fundamental share of the combined blend (default 0.70)
+
+    Returns:
+        dict with 'fundamental', 'technical', 'combined' (k x N) DataFrames
+    """
+    fund_cols = [c for c in FUNDAMENTAL_COLS if c in scaled_df.columns]
+    tech_cols = [c for c in TECHNICAL_COLS   if c in scaled_df.columns]
+
+    def _score(cols: list[str]) -> pd.DataFrame | None:
+        if not cols:
+            return None
+        sims = cosine_similarity(query_scaled[cols].to_numpy(), scaled_df[cols])
+        return pd.DataFrame(sims, index=query_scaled.index, columns=scaled_df.index)
+
+    fund_sim = _score(fund_cols)
+    tech_sim = _score(tech_cols)
+    w_fund, w_tech = _blend(fund_weight)
+
+    if fund_sim is not None and tech_sim is not None:
+        combined_sim = w_fund * fund_sim + w_tech * tech_sim
+    else:
+        combined_sim = fund_sim if fund_sim is not None else tech_sim
+
+    return {
+        'fundamental': fund_sim,
+        'technical':   tech_sim,
+        'combined':    combined_sim,
+    }
+
+
+def score_against(
+    query_scaled: pd.Series,
+    scaled_df: pd.DataFrame,
+    fund_weight: float = None,
+) -> dict[str, pd.Series]:
+    """
+    Similarity of one scaled feature vector to every universe ticker.
+
+    Args:
+        query_scaled: one row of scaled features (same columns as scaled_df)
+        scaled_df:    universe scaled feature DataFrame
+        fund_weight:  fundamental share of the combined blend (default 0.70)
+
+    Returns:
+        dict with 'fundamental', 'technical', 'combined' Series indexed by ticker
+    """
+    block = score_block(query_scaled.to_frame().T, scaled_df, fund_weight)
+    return {k: (v.iloc[0] if v is not None else None) for k, v in block.items()}
+
+
+def _unit_rows(values: np.ndarray) -> np.ndarray:
+    """L2-normalized rows; all-zero rows stay zero (cosine 0, as sklearn)."""
+    norms = np.linalg.norm(values, axis=1, keepdims=True)
+    return values / np.where(norms > 0, norms, 1.0)
+
+
+def _select(scores: np.ndarray, ids: np.ndarray, k: int, largest: bool) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Per row, the k best (score, id) pairs sorted best first.
+
+    NaN scores (padding / excluded) sort last; rows with fewer than k
+    candidates are padded with id -1 and NaN.
+    """
+    key   = np.where(np.isnan(scores), np.inf, -scores if largest else scores)
+    width = min(k, scores.shape[1])
+    if width < scores.shape[1]:
+        part  = np.argpartition(key, width - 1, axis=1)[:, :width]
+    else:
+        part  = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    order = np.take_along_axis(part, np.argsort(np.take_along_axis(key, part, 1), axis=1, kind='stable'), 1)
+    out_s = np.take_along_axis(scores, order, 1)
+    out_i = np.take_along_axis(ids, order, 1).astype(np.int32)
+    out_i[np.isnan(out_s)] = -1
+    if width < k:
+        pad   = k - width
+        out_s = np.hstack([out_s, np.full((len(out_s), pad), np.nan, dtype=out_s.dtype)])
+        out_i = np.hstack([out_i, np.full((len(out_i), pad), -1, dtype=np.int32)])
+    return out_s, out_i
+
+
+class UnitEmbeddings:
+    """
+    L2-normalized fundamental and technical rows of a universe.
+
+    The combined similarity of any row to every ticker, at any blend, is
+    two products over these (O(N·d)) — the base of both neighbor indexes,
+    of their exact fallback and of query-time blend weights.
+    """
+
+    kind         = 'exact'
+    _float_attrs = ('fund', 'tech')
+
+    def __init__(self, scaled_df: pd.DataFrame, dtype=np.float64):
+        fund_cols    = [c for c in FUNDAMENTAL_COLS if c in scaled_df.columns]
+        tech_cols    = [c for c in TECHNICAL_COLS   if c in scaled_df.columns]
+        self.tickers = TickerIndex(scaled_df.index)
+        self.fund    = _unit_rows(scaled_df[fund_cols].to_numpy(np.float64)).astype(dtype) if fund_cols else None
+        self.tech    = _unit_rows(scaled_df[tech_cols].to_numpy(np.float64)).astype(dtype) if tech_cols else None
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return (self.fund if self.fund is not None else self.tech).dtype
+
+    @property
+    def nbytes(self) -> int:
+        return sum(v.nbytes for v in vars(self).values() if isinstance(v, np.ndarray))
+
+    def astype(self, dtype):
+        """Copy with scores and features stored as `dtype` (compact mode)."""
+        out = object.__new__(type(self))
+        out.__dict__.update(self.__dict__)
+        for name in self._float_attrs:
+            value = getattr(self, name)
+            setattr(out, name, value.astype(dtype) if value is not None else None)
+        return out
+
+    # ── Scoring ───────────────────────────────────────────────────────────────
+
+    def _block(self, rows, cols=slice(None), fund_weight: float = None) -> np.ndarray:
+        """Combined similarity of the rows at `rows` to those at `cols` (slices / positions)."""
+        if self.fund is not None and self.tech is not None:
+            w_fund, w_tech = _blend(fund_weight)
+            return (
+                w_fund * (self.fund[rows] @ self.fund[cols].T) +
+                w_tech * (self.tech[rows] @ self.tech[cols].T)
+            )
+        units = self.fund if self.fund is not None else self.tech
+        return units[rows] @ units[cols].T
+
+    def row(self, ticker: str, fund_weight: float = None) -> pd.Series:
+        """Exact combined similarity of `ticker` to every ticker (like a matrix column)."""
+        pos = self.tickers.position(ticker)
+        return pd.Series(self._block([pos], fund_weight=fund_weight)[0], index=self.tickers.symbols, name=ticker)
+
+    def score(self, a: str, b: str, fund_weight: float = None) -> float:
+        """Exact combined similarity of two tickers."""
+        pos = [self.tickers.position(a)], [self.tickers.position(b)]
+        return float(self._block(*pos, fund_weight=fund_weight)[0, 0])
+
+    def _exact(self, pos: int, allowed: np.ndarray, n: int, largest: bool, fund_weight: float = None) -> pd.Series:
+        """The n best allowed tickers for the row at `pos`, scoring all of them."""
+        row = self._block([pos], fund_weight=fund_weight)[0].astype(np.float64)
+        row[pos] = np.nan
+        if allowed is not None:
+            row[~allowed] = np.nan
+        series = pd.Series(row, index=self.tickers.symbols).dropna()
+        return series.nlargest(n) if largest else series.nsmallest(n)
+
+    def neighbors(
+        self,
+        ticker: str,
+        allowed: np.ndarray = None,
+        n: int = 5,
+        largest: bool = True,
+        fund_weight: float = None,
+    ) -> pd.Series:
+        """
+        The n most (or least) similar tickers, excluding `ticker` itself.
+
+        Args:
+            allowed:     optional boolean mask over tickers (positions) that
+                         may be returned
+            fund_weight: fundamental share of the blend (default 0.70)
+        """
+        return self._exact(self.tickers.position(ticker), allowed, n, largest, fund_weight)
+
+    def neighbors_batch(
+        self,
+        tickers: list[str],
+        n: int = 5,
+        largest: bool = True,
+        fund_weight: float = None,
+        block_rows: int = BLOCK_ROWS,
+    ) -> dict[str, pd.Series]:
+        """
+        neighbors() for many query tickers, scored exactly in blocks.
+
+        Each block of `block_rows` queries is one (block x N) score matrix —
+        two matrix products — and an argpartition per row.
+
+        Returns:
+            {ticker: Series of the n best scores} for the known tickers
+        """
+        positions = self.tickers.positions(tickers)
+        ids       = np.arange(len(self), dtype=np.int32)
+        out       = {}
+        for start in range(0, len(positions), block_rows):
+            rows   = positions[start:start + block_rows]
+            scores = self._block(rows, fund_weight=fund_weight).astype(np.float64)
+            scores[np.arange(len(rows)), rows] = np.nan
+            best_s, best_i = _select(scores, np.broadcast_to(ids, scores.shape), n, largest)
+            for pos, s, i in zip(rows, best_s, best_i):
+                keep = i >= 0
+                out[self.tickers.symbols[pos]] = pd.Series(s[keep], index=self.tickers.symbols[i[keep]])
+        return out
+
+
+class NeighborIndex(UnitEmbeddings):
+    """
+    The k most and k least similar tickers of every ticker (combined score).
+
+    Each list is a valid prefix of that ticker's full ranking: a ticker
+    missing from a top list scores no higher than `top_floor` (and no
+    lower than `bottom_ceiling` for bottom lists), so filtering a list and
+    taking its first n survivors is exact whenever n of them survive.
+    Otherwise queries fall back to scoring the one row exactly from the
+    normalized features. Lists shrink when tickers are removed (padded
+    with id -1) and are merged, not rebuilt, when tickers are added.
+    """
+
+    kind         = 'topk'
+    _float_attrs = ('fund', 'tech', 'top_scores', 'bottom_scores', 'top_floor', 'bottom_ceiling')
+
+    def __init__(
+        self,
+        scaled_df: pd.DataFrame,
+        top_ids: np.ndarray = None,
+        top_scores: np.ndarray = None,
+        bottom_ids: np.ndarray = None,
+        bottom_scores: np.ndarray = None,
+        top_floor: np.ndarray = None,
+        bottom_ceiling: np.ndarray = None,
+        dtype=np.float64,
+    ):
+        super().__init__(scaled_df, dtype)
+        self.top_ids        = top_ids
+        self.top_scores     = top_scores
+        self.bottom_ids     = bottom_ids
+        self.bottom_scores  = bottom_scores
+        self.top_floor      = top_floor
+        self.bottom_ceiling = bottom_ceiling
+
+    @property
+    def k(self) -> int:
+        return self.top_ids.shape[1]
+
+    def arrays(self) -> dict[str, np.ndarray]:
+        """The neighbor lists (everything but the features), e.g. for saving."""
+        return {
+            'top_ids':        self.top_ids,
+            'top_scores':     self.top_scores,
+            'bottom_ids':     self.bottom_ids,
+            'bottom_scores':  self.bottom_scores,
+            'top_floor':      self.top_floor,
+            'bottom_ceiling': self.bottom_ceiling,
+        }
+
+    @classmethod
+    def from_arrays(cls, scaled_df: pd.DataFrame, arrays: dict[str, np.ndarray]) -> 'NeighborIndex':
+        """Index from saved arrays(); the normalized features are recomputed."""
+        return cls(scaled_df, dtype=arrays['top_scores'].dtype, **arrays)
+
+    # ── Build / update ────────────────────────────────────────────────────────
+
+    def _fill(self, start: int, scores: np.ndarray, k: int) -> tuple:
+        """Top / bottom lists and bounds for a block of rows starting at `start`."""
+        n     = scores.shape[1]
+        diag  = (np.arange(len(scores)), np.arange(start, start + len(scores)))
+        ids   = np.broadcast_to(np.arange(n, dtype=np.int32), scores.shape)
+        scores[diag] = np.nan                                   # never your own neighbor
+        top_s, top_i = _select(scores, ids, k, largest=True)
+        bot_s, bot_i = _select(scores, ids, k, largest=False)
+        full  = n - 1 > k                                       # some tickers left out
+        floor = top_s[:, -1] if full else np.full(len(scores), -np.inf)
+        ceil  = bot_s[:, -1] if full else np.full(len(scores), np.inf)
+        return top_i, top_s, bot_i, bot_s, floor, ceil
+
+    @classmethod
+    def build(
+        cls,
+        scaled_df: pd.DataFrame,
+        k: int = NEIGHBORS_K,
+        block_rows: int = BLOCK_ROWS,
+        dtype=np.float64,
+    ) -> 'NeighborIndex':
+        """
+        Index over `scaled_df`, scored block_rows rows at a time.
+
+        Args:
+            scaled_df:  scaled features (same columns as for the matrices)
+            k:          neighbors kept per ticker, each way
+            block_rows: query rows per block — peak memory ~ block_rows x N
+            dtype:      storage dtype of scores and normalized features
+        """
+        index = cls(scaled_df, dtype=dtype)
+        n     = len(scaled_df)
+        parts = []
+        for start in range(0, n, block_rows):
+            scores = index._block(slice(start, min(start + block_rows, n))).astype(np.float64)
+            parts.append(index._fill(start, scores, k))
+        (index.top_ids, index.top_scores, index.bottom_ids, index.bottom_scores,
+         index.top_floor, index.bottom_ceiling) = (
+            np.concatenate([p[i] for p in parts]) if parts else np.empty((0, k))
+            for i in range(6)
+        )
+        for name in ('top_scores', 'bottom_scores', 'top_floor', 'bottom_ceiling'):
+            setattr(index, name, getattr(index, name).astype(dtype))
+        log.info(f"Neighbor index built for {n} tickers (k={k}, {index.nbytes / 1e6:.1f} MB)")
+        return index
+
+    def extended(self, scaled_df: pd.DataFrame) -> 'NeighborIndex':
+        """
+        Index over `scaled_df` = this index's tickers followed by new ones.
+
+        New rows are scored against everyone (k_new x N); each old list is
+        merged with its k_new new columns. A merged entry below the old
+        floor is dropped — tickers outside the old list could outrank it.
+        """
+        n_old = len(self)
+        grown = NeighborIndex(scaled_df, dtype=self.top_scores.dtype)
+        new   = grown._block(slice(n_old, len(scaled_df))).astype(np.float64)   # (k_new, N)
+        new_lists = grown._fill(n_old, new.copy(), self.k)
+
+        cross  = new[:, :n_old].T                                               # (n_old, k_new)
+        new_id = np.broadcast_to(np.arange(n_old, len(scaled_df), dtype=np.int32), cross.shape)
+
+        def _merge(ids, scores, bound, largest):
+            cand_s = np.hstack([scores.astype(np.float64), cross])
+            cand_i = np.hstack([ids, new_id])
+            below  = cand_s < bound[:, None] if largest else cand_s > bound[:, None]
+            cand_s = np.where(below, np.nan, cand_s)
+            out_s, out_i = _select(cand_s, cand_i, self.k, largest)
+            full   = ~np.isnan(out_s[:, -1])
+            return out_i, out_s, np.where(full, out_s[:, -1], bound)
+
+        top_i, top_s, floor = _merge(self.top_ids, self.top_scores, self.top_floor, True)
+        bot_i, bot_s, ceil  = _merge(self.bottom_ids, self.bottom_scores, self.bottom_ceiling, False)
+
+        dtype = self.top_scores.dtype
+        grown.top_ids        = np.vstack([top_i, new_lists[0]])
+        grown.top_scores     = np.vstack([top_s, new_lists[1]]).astype(dtype)
+        grown.bottom_ids     = np.vstack([bot_i, new_lists[2]])
+        grown.bottom_scores  = np.vstack([bot_s, new_lists[3]]).astype(dtype)
+        grown.top_floor      = np.concatenate([floor, new_lists[4]]).astype(dtype)
+        grown.bottom_ceiling = np.concatenate([ceil, new_lists[5]]).astype(dtype)
+        return grown
+
+    def without(self, scaled_df: pd.DataFrame) -> 'NeighborIndex':
+        """Index restricted to the tickers of `scaled_df` (a subset, same order)."""
+        keep   = self.tickers.positions(scaled_df.index)
+        remap  = np.full(len(self) + 1, -1, dtype=np.int32)      # last slot: id -1 stays -1
+        remap[keep] = np.arange(len(keep), dtype=np.int32)
+        out    = NeighborIndex(scaled_df, dtype=self.top_scores.dtype)
+
+        def _drop(ids, scores):
+            ids    = remap[ids[keep]]
+            order  = np.argsort(ids < 0, axis=1, kind='stable')    # survivors first, in order
+            ids    = np.take_along_axis(ids, order, 1)
+            scores = np.take_along_axis(scores[keep], order, 1).copy()
+            scores[ids < 0] = np.nan
+            return ids, scores
+
+        out.top_ids, out.top_scores       = _drop(self.top_ids, self.top_scores)
+        out.bottom_ids, out.bottom_scores = _drop(self.bottom_ids, self.bottom_scores)
+        out.top_floor      = self.top_floor[keep]
+        out.bottom_ceiling = self.bottom_ceiling[keep]
+        return out
+
+    # ── Queries ───────────────────────────────────────────────────────────────
+
+    def neighbors(
+        self,
+        ticker: str,
+        allowed: np.ndarray = None,
+        n: int = 5,
+        largest: bool = True,
+        fund_weight: float = None,
+    ) -> pd.Series:
+        pos = self.tickers.position(ticker)
+        if fund_weight is not None and _blend(fund_weight)[0] != FUNDAMENTAL_WEIGHT:
+            return self._exact(pos, allowed, n, largest, fund_weight)   # lists are for the build blend
+        ids, scores = (self.top_ids, self.top_scores) if largest else (self.bottom_ids, self.bottom_scores)
+        ids, scores = ids[pos], scores[pos]
+        keep = ids >= 0
+        if allowed is not None:
+            keep &= allowed[np.maximum(ids, 0)]
+        if keep.sum() >= n:
+            ids, scores = ids[keep][:n], scores[keep][:n]
+            return pd.Series(scores.astype(np.float64), index=self.tickers.symbols[ids])
+
+        # List exhausted by the filter: score this one row exactly
+        return self._exact(pos, allowed, n, largest)
+
+
 def build_similarity_matrix(scaled_df: pd.DataFrame) -> pd.DataFrame:
     """
     Backward-compatible wrapper — returns combined similarity matrix.
@@ -89,12 +537,58 @@ def build_similarity_matrix(scaled_df: pd.DataFrame) -> pd.DataFrame:
     return build_similarity_matrices(scaled_df)['combined']
 
 
+def _format_results(
+    scores: pd.Series,
+    combined_df: pd.DataFrame,
+    ascending: bool,
+) -> pd.DataFrame:
+    """Attach display metrics to a selected set of similarity scores."""
+    display_cols = [
+        c for c in ['sector', 'cluster_label', 'pe_ratio', 'revenue_growth',
+                    'beta', 'momentum_6m', 'volatility']
+        if c in combined_df.columns
+    ]
+    result               = combined_df.loc[scores.index, display_cols].copy()
+    result['similarity'] = scores.astype(float).round(4)
+    return result.sort_values('similarity', ascending=ascending)
+
+
+def _query_index(
+    ticker: str,
+    index: UnitEmbeddings,
+    combined_df: pd.DataFrame,
+    top_n: int,
+    cluster_filter: bool,
+    largest: bool,
+    fund_weight: float = None,
+) -> pd.DataFrame:
+    """get_similar_stocks / get_complementary_stocks against a neighbor index."""
+    if ticker not in index.tickers:
+        raise ValueError(f"{ticker} not found in similarity matrix")
+
+    allowed = None
+    if cluster_filter and 'cluster_label' in combined_df.columns:
+        labels  = combined_df['cluster_label'].reindex(index.tickers.symbols).to_numpy()
+        same    = labels == combined_df.loc[ticker, 'cluster_label']
+        allowed = same if largest else ~same
+
+    scores = index.neighbors(ticker, allowed, top_n, largest, fund_weight=fund_weight)
+    return _format_results(scores.rename_axis(combined_df.index.name), combined_df, ascending=not largest)
+
+
+def _check_dense_blend(fund_weight: float | None):
+    """A dense matrix is fixed at the build blend; other weights need an index."""
+    if fund_weight is not None and _blend(fund_weight)[0] != FUNDAMENTAL_WEIGHT:
+        raise ValueError("fund_weight other than the build blend needs a neighbor index, not a matrix")
+
+
 def get_similar_stocks(
     ticker: str,
     similarity_df: pd.DataFrame,
     combined_df: pd.DataFrame,
     top_n: int = 5,
     same_cluster: bool = False,
+    fund_weight: float = None,
 ) -> pd.DataFrame:
     """
     Find the most similar stocks to a given ticker.
@@ -103,13 +597,19 @@ def get_similar_stocks(
     Args:
         ticker:        target ticker
         similarity_df: similarity matrix (fundamental, technical, or combined)
+                       or a neighbor index (NeighborIndex / LSHIndex, combined)
         combined_df:   merged DataFrame with fundamental + technical features
         top_n:         number of similar stocks to return
         same_cluster:  if True, restrict to same cluster_label as ticker
+        fund_weight:   fundamental share of the blend, scored at query time
+                       (neighbor index only; default 0.70)
 
     Returns:
         DataFrame with similarity score and key metrics
     """
+    if isinstance(similarity_df, UnitEmbeddings):
+        return _query_index(ticker, similarity_df, combined_df, top_n, same_cluster, True, fund_weight)
+    _check_dense_blend(fund_weight)
     if ticker not in similarity_df.index:
         raise ValueError(f"{ticker} not found in similarity matrix")
 
@@ -122,16 +622,7 @@ def get_similar_stocks(
         ].index
         candidates = candidates[candidates.index.isin(cluster_tickers)]
 
-    similar = candidates.nlargest(top_n)
-
-    display_cols = [
-        c for c in ['sector', 'cluster_label', 'pe_ratio', 'revenue_growth',
-                    'beta', 'momentum_6m', 'volatility']
-        if c in combined_df.columns
-    ]
-    result               = combined_df.loc[similar.index, display_cols].copy()
-    result['similarity'] = similar.round(4)
-    return result.sort_values('similarity', ascending=False)
+    return _format_results(candidates.nlargest(top_n), combined_df, ascending=False)
 
 
 def get_complementary_stocks(
@@ -140,6 +631,7 @@ def get_complementary_stocks(
     combined_df: pd.DataFrame,
     top_n: int = 5,
     exclude_same_cluster: bool = True,
+    fund_weight: float = None,
 ) -> pd.DataFrame:
     """
     Find the least similar (most diversifying) stocks to a given ticker.
@@ -147,14 +639,19 @@ def get_complementary_stocks(
 
     Args:
         ticker:               target ticker
-        similarity_df:        similarity matrix
+        similarity_df:        similarity matrix or neighbor index
         combined_df:          merged DataFrame
         top_n:                number of complementary stocks to return
         exclude_same_cluster: if True, exclude stocks in same cluster
+        fund_weight:          fundamental share of the blend (neighbor
+                              index only; default 0.70)
 
     Returns:
         DataFrame with similarity score and key metrics
     """
+    if isinstance(similarity_df, UnitEmbeddings):
+        return _query_index(ticker, similarity_df, combined_df, top_n, exclude_same_cluster, False, fund_weight)
+    _check_dense_blend(fund_weight)
     if ticker not in similarity_df.index:
         raise ValueError(f"{ticker} not found in similarity matrix")
 
@@ -167,16 +664,37 @@ def get_complementary_stocks(
         ].index
         candidates = candidates[~candidates.index.isin(same_cluster)]
 
-    complementary = candidates.nsmallest(top_n)
+    return _format_results(candidates.nsmallest(top_n), combined_df, ascending=True)
 
-    display_cols = [
-        c for c in ['sector', 'cluster_label', 'pe_ratio', 'revenue_growth',
-                    'beta', 'momentum_6m', 'volatility']
-        if c in combined_df.columns
-    ]
-    result               = combined_df.loc[complementary.index, display_cols].copy()
-    result['similarity'] = complementary.round(4)
-    return result.sort_values('similarity', ascending=True)
+
+def get_similar_stocks_batch(
+    tickers: list[str],
+    index: UnitEmbeddings,
+    combined_df: pd.DataFrame,
+    top_n: int = 5,
+    fund_weight: float = None,
+) -> dict[str, pd.DataFrame]:
+    """
+    get_similar_stocks() for many tickers in one pass.
+
+    Scores every query against the universe exactly, BLOCK_ROWS queries
+    per pair of matrix products, at any blend.
+
+    Args:
+        tickers:     query tickers (unknown ones are left out of the result)
+        index:       neighbor index (any UnitEmbeddings)
+        combined_df: merged DataFrame
+        top_n:       number of similar stocks per query
+        fund_weight: fundamental share of the blend (default 0.70)
+
+    Returns:
+        {ticker: DataFrame as from get_similar_stocks}
+    """
+    scores = index.neighbors_batch(tickers, top_n, largest=True, fund_weight=fund_weight)
+    return {
+        ticker: _format_results(s.rename_axis(combined_df.index.name), combined_df, ascending=False)
+        for ticker, s in scores.items()
+    }
 
 
 def similarity_report(
@@ -215,4 +733,31 @@ def similarity_report(
 
     print(f"\n[Complementary] — most diversifying additions")
     print(get_complementary_stocks(ticker, matrices['combined'], combined_df, top_n).to_string())
-    print()
\ No newline at end of file
+    print()
+
+def get_similar_to_vector(
+    query_scaled: pd.Series,
+    scaled_df: pd.DataFrame,
+    combined_df: pd.DataFrame,
+    top_n: int = 5,
+    exclude: str = None,
+    fund_weight: float = None,
+) -> pd.DataFrame:
+    """
+    Most similar universe tickers for a scaled feature vector.
+
+    Args:
+        query_scaled: one row of scaled features, e.g. from FeaturePipeline.transform()
+        scaled_df:    universe scaled feature DataFrame
+        combined_df:  feature DataFrame with metadata (sector, cluster_label etc.)
+        top_n:        number of results to return
+        exclude:      ticker to leave out of the results (the query itself)
+        fund_weight:  fundamental share of the blend (default 0.70)
+
+    Returns:
+        DataFrame of top_n similar tickers with similarity scores and key metrics
+    """
+    scores = score_against(query_scaled, scaled_df, fund_weight)['combined']
+    if exclude is not None:
+        scores = scores.drop(exclude, errors='ignore')
+    return _format_results(scores.nlargest(top_n), combined_df, ascending=False)
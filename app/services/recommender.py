@@ -1,18 +1,51 @@
+import copy
+import dataclasses
+import threading
 import time
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+import numpy as np
 import pandas as pd
 from app.core.config import settings
 from app.core.logger import get_logger
 from app.data.fetcher import fetch_prices, fetch_fundamentals
+from app.features.indicator_state import refresh_technical_features
 from app.features.technical import compute_technical_features
-from app.features.fundamentals import merge_features, scale_features
+from app.features.fundamentals import merge_features, fit_feature_pipeline
 from app.models.similarity import (
+    FUNDAMENTAL_WEIGHT,
+    NeighborIndex,
     build_similarity_matrices,
     get_similar_stocks,
+    get_similar_stocks_batch,
+    get_similar_to_vector,
     get_complementary_stocks,
 )
-from app.models.clustering import cluster_stocks
+from app.models.clustering import (
+    LabelRules,
+    assign_clusters,
+    cluster_centroids,
+    cluster_churn,
+    fit_clusters,
+    label_tickers,
+)
+from app.models.ann import LSHIndex
+from app.models.k_selection import choose_k, sweep_k
+from app.models.diversification import (
+    ReturnsMatrix,
+    lowest_n,
+    marginal_volatility,
+    volatility_change,
+)
 from app.models.optimizer import optimize_portfolio
 from app.core.cache import cache
+from app.core.stage_cache import StageCache, fingerprint
+from app.core.dag import DAGExecutor, Stage
+from app.evaluation.stability import bootstrap_stability
+from app.services.snapshot import RecommenderSnapshot
+from app.services.snapshot_store import SIMILARITY_KEYS, BuilderLease, SnapshotStore
+from app.services.universe import extend_snapshot, refit_reasons, shrink_snapshot
 
 log = get_logger(__name__)
 
@@ -20,166 +53,1114 @@ log = get_logger(__name__)
 # These are behaviorally unsuitable for portfolio construction
 EXCLUDE_FROM_OPTIMIZATION = {'Distressed', 'Negative Equity'}
 
+# How often a follower's stability(wait=True) looks for the builder's result
+STABILITY_POLL_SECONDS = 1.0
+
+
+@dataclass(frozen=True)
+class InvestableRules:
+    """Thresholds of the investable-universe filter (settings: INVESTABLE_*)."""
+    min_history:      int   = 60      # trading days of prices
+    min_debt_equity:  float = -3.0    # below -> negative equity
+    speculative_pe:   float = 300.0   # above, together with ...
+    speculative_beta: float = 1.5     # ... beta above -> speculative
+
+    @classmethod
+    def from_settings(cls) -> 'InvestableRules':
+        return cls(
+            min_history      = settings.investable_min_history,
+            min_debt_equity  = settings.investable_min_debt_equity,
+            speculative_pe   = settings.investable_speculative_pe,
+            speculative_beta = settings.investable_speculative_beta,
+        )
+
+
+# Reason codes in priority order — a ticker gets the first one that applies
+EXCLUSION_REASONS = ('insufficient_history', 'loss_making', 'negative_equity', 'speculative')
+
+
+def exclusion_reasons(
+    combined_df: pd.DataFrame,
+    prices: pd.DataFrame,
+    rules: InvestableRules = None,
+) -> pd.Series:
+    """
+    Reason code per ticker for exclusion from portfolio optimization.
+
+    Rules are applied on fundamentals directly (not cluster labels), as
+    whole-column boolean masks:
+      - insufficient_history : fewer than min_history prices (or none)
+      - loss_making          : eps_ttm <= 0 (missing EPS is not excluded)
+      - negative_equity      : debt_to_equity < min_debt_equity
+      - speculative          : pe_ratio > speculative_pe and beta > speculative_beta
+
+    Returns:
+        Series indexed like combined_df: the reason code, or None if investable
+    """
+    rules = rules or InvestableRules()
+
+    def col(name: str) -> pd.Series:
+        if name in combined_df.columns:
+            return combined_df[name].astype(float)
+        return pd.Series(np.nan, index=combined_df.index)
+
+    history = prices.reindex(columns=combined_df.index).notna().sum()
+    masks   = [
+        (history < rules.min_history).to_numpy(),
+        (col('eps_ttm') <= 0).to_numpy(),
+        (col('debt_to_equity') < rules.min_debt_equity).to_numpy(),
+        ((col('pe_ratio') > rules.speculative_pe) & (col('beta') > rules.speculative_beta)).to_numpy(),
+    ]
+    codes = np.select(masks, EXCLUSION_REASONS, default=None)
+    return pd.Series(codes, index=combined_df.index, name='exclusion_reason', dtype=object)
+
+
+def build_investable_universe(
+    combined_df: pd.DataFrame,
+    prices: pd.DataFrame,
+    rules: InvestableRules = None,
+) -> list[str]:
+    """
+    Filter out tickers unsuitable for portfolio optimization.
+
+    Returns:
+        list of investable ticker symbols (see exclusion_reasons for the rules)
+    """
+    reasons = exclusion_reasons(combined_df, prices, rules)
+    return reasons.index[reasons.isna()].tolist()
+
+
+def _scaled_frame(scale_out: tuple) -> pd.DataFrame:
+    """scaled_df from the (pipeline, scaled_df) output of the scale stage."""
+    return scale_out[1]
+
+
+def _fetch_features(tickers: list[str], pipeline) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Raw feature rows, the same rows scaled with a fitted pipeline, and prices.
+
+    Only `tickers` are fetched; those without enough data are left out of
+    the returned frames (both empty when nothing could be fetched). A
+    failed download (network, rate limit, unparseable response) counts as
+    no data rather than propagating out of a request.
+    """
+    try:
+        prices = fetch_prices(tickers)
+        if isinstance(prices, pd.Series):
+            prices = prices.to_frame(tickers[0])
+        fundamentals = fetch_fundamentals(tickers)
+    except Exception as e:
+        log.warning(f"Feature fetch failed for {tickers}: {e}")
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+    if prices.empty or fundamentals.empty:
+        return pd.DataFrame(), pd.DataFrame(), prices
+
+    technical = compute_technical_features(prices)
+    combined  = merge_features(fundamentals, technical)
+    combined  = combined.loc[[t for t in tickers if t in combined.index]]
+    if combined.empty:
+        return combined, pd.DataFrame(), prices
+    return combined, pipeline.transform(combined), prices
+
+
+def _clustered_frame(cluster_out: tuple) -> pd.DataFrame:
+    """Labelled combined_df from the (model, combined_df) output of the cluster stage."""
+    return cluster_out[1]
+
+
+def _returns_matrix(prices: pd.DataFrame, clustered: pd.DataFrame) -> ReturnsMatrix:
+    """gaps() returns matrix, columns in combined_df order (not memoized: saved per generation)."""
+    return ReturnsMatrix(prices, clustered.index)
+
 
 class RecommenderService:
+    """
+    Serves queries from an immutable RecommenderSnapshot.
+
+    build() assembles a complete snapshot off to the side and publishes it
+    with one reference assignment; query methods pin `self._snapshot` once
+    on entry and read only from that pinned object. The attributes below
+    (prices, combined_df, ...) are read-through views of the current
+    snapshot for callers that just need "the latest".
+
+    `role` is 'standalone' (one process builds and serves), or in shared
+    mode (start_shared) 'builder' / 'follower': one elected worker builds,
+    every worker serves the mmapped on-disk generation.
+    """
+
     def __init__(self):
-        self.prices            = None
-        self.combined_df       = None
-        self.scaled_df         = None
-        self.similarity_df     = None   # combined similarity (backward compat)
-        self._similarity_mats  = None   # full dict: fundamental/technical/combined
-        self.investable_tickers: list[str] = []
-        self.is_ready          = False
-        self.built_at          = None
-
-    def build(self, tickers: list[str] = None):
-        tickers = tickers or settings.tickers
-        log.info("Building recommender...")
+        self._snapshot: RecommenderSnapshot | None = None
+        self._build_lock       = threading.Lock()   # one build at a time
+        self._build_thread     = None
+        self.last_build_error  = None
+        self.stages            = StageCache(
+            settings.stage_cache_dir, enabled=settings.stage_cache_enabled
+        )
+        self.store             = (
+            SnapshotStore(settings.snapshot_dir, keep=settings.snapshot_keep)
+            if settings.snapshot_enabled else None
+        )
+        self.role              = 'standalone'
+        self._lease            = None
+        self._added            = []       # runtime universe changes, kept by later
+        self._removed          = set()    # builds; mirrored in the store when enabled
+        self._follow_stop      = threading.Event()
+        self._follow_thread    = None
+        self._stability        = None     # (generation, bootstrap_stability result, error)
+        self._stability_lock   = threading.Lock()
+        self._stability_thread = None
 
-        self.prices          = fetch_prices(tickers)
-        fundamentals         = fetch_fundamentals(tickers)
-        technical            = compute_technical_features(self.prices)
-        combined             = merge_features(fundamentals, technical)
-        self.scaled_df, _, _ = scale_features(combined)
-        self.combined_df     = cluster_stocks(self.scaled_df, combined)
-
-        # Build all three similarity matrices
-        self._similarity_mats = build_similarity_matrices(self.scaled_df)
-        self.similarity_df    = self._similarity_mats['combined']  # backward compat
-
-        # Investable universe — exclude distressed / negative equity clusters
-        self.investable_tickers = self._build_investable_universe()
-        
-        self.is_ready = True
-        self.built_at = time.time()
-        cache.invalidate()
-        log.info(
-            f"Recommender ready — "
-            f"universe: {len(self.combined_df)}, "
-            f"investable: {len(self.investable_tickers)}"
+    # ── Snapshot views ────────────────────────────────────────────────────────
+
+    @property
+    def snapshot(self) -> RecommenderSnapshot | None:
+        return self._snapshot
+
+    @property
+    def is_ready(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def is_building(self) -> bool:
+        return self._build_lock.locked()
+
+    def _view(name: str):
+        return property(lambda self: getattr(self._snapshot, name, None))
+
+    prices             = _view('prices')
+    combined_df        = _view('combined_df')
+    scaled_df          = _view('scaled_df')
+    feature_pipeline   = _view('feature_pipeline')
+    similarity_df      = _view('similarity_df')
+    _similarity_mats   = _view('similarity_mats')
+    ticker_index       = _view('ticker_index')
+    built_at           = _view('built_at')
+    generation         = _view('generation')
+    del _view
+
+    @property
+    def investable_tickers(self) -> list[str]:
+        return self._snapshot.investable_tickers if self._snapshot else []
+
+    @property
+    def compact(self) -> bool:
+        return bool(self._snapshot and self._snapshot.compact)
+
+    @property
+    def artifacts(self) -> dict:
+        return self._snapshot.artifacts if self._snapshot else {}
+
+    # ── Build ─────────────────────────────────────────────────────────────────
+
+    def build(self, tickers: list[str] = None) -> RecommenderSnapshot:
+        """
+        Build a new snapshot and publish it atomically.
+
+        Runs the build pipeline as a DAG (app/core/dag.py): the two fetches
+        overlap, and cluster / similarity both start as soon as scale is
+        done. Each stage (except the price fetch, which is the thing that
+        moves) is memoized by StageCache on a content hash of its inputs +
+        code version. Fundamentals are keyed on tickers + date, so a
+        rebuild where only prices moved skips them.
+
+        Only one build runs at a time; a concurrent call waits for the
+        running one. If the build raises, the current snapshot is kept.
+        """
+        with self._build_lock:
+            try:
+                snapshot = self._build_snapshot(tickers or self.universe_tickers())
+            except Exception as e:
+                self.last_build_error = f"{type(e).__name__}: {e}"
+                log.error(
+                    f"Build failed — keeping snapshot generation "
+                    f"{self.generation}: {self.last_build_error}"
+                )
+                raise
+            return self._publish_change(snapshot)
+
+    def load_latest_snapshot(self) -> bool:
+        """
+        Publish the newest valid on-disk snapshot (memory-mapped, no network).
+
+        Returns:
+            True if a snapshot was loaded
+        """
+        if self.store is None:
+            return False
+        snapshot = self.store.load()
+        if snapshot is None:
+            log.info("No on-disk snapshot — first build will run from scratch")
+            return False
+        if settings.compact_mode and not snapshot.compact:
+            snapshot = snapshot.compacted()
+        self._publish(snapshot)
+        return True
+
+    def _persist(self, snapshot: RecommenderSnapshot):
+        """Write the snapshot to the store; failures only cost the next cold start."""
+        if self.store is None:
+            return
+        try:
+            self.store.save(snapshot)
+        except Exception as e:
+            log.warning(f"Snapshot save failed — {type(e).__name__}: {e}")
+
+    def _persist_shared(self, snapshot: RecommenderSnapshot) -> RecommenderSnapshot:
+        """Save, then reopen the generation memory-mapped (falls back to `snapshot`)."""
+        self._persist(snapshot)
+        mapped = self.store.load(snapshot.generation)
+        if mapped is None or mapped.generation != snapshot.generation:
+            return snapshot
+        return dataclasses.replace(mapped, artifacts={**snapshot.artifacts, **mapped.artifacts})
+
+    def build_in_background(self, tickers: list[str] = None) -> bool:
+        """
+        Start build() on a daemon thread; returns False if one is already running.
+
+        Failures are logged and recorded in `last_build_error`; the service
+        keeps serving the last good snapshot (or 503s until the first one).
+        """
+        if self.is_building:
+            log.info("Build already in progress — skipping")
+            return False
+
+        def _run():
+            try:
+                self.build(tickers)
+            except Exception:
+                pass   # logged in build(); last good snapshot stays live
+
+        self._build_thread = threading.Thread(target=_run, name='recommender-build', daemon=True)
+        self._build_thread.start()
+        return True
+
+    # ── Shared mode ───────────────────────────────────────────────────────────
+
+    def start_shared(self) -> str:
+        """
+        Join the workers sharing this snapshot directory.
+
+        Attaches to the newest on-disk generation, then tries to win the
+        builder election. The builder refreshes in the background as in
+        standalone mode; followers never fetch or build. A poller thread
+        lets followers pick up new generations and take over the lease if
+        the builder process exits.
+
+        Returns:
+            'builder' or 'follower'
+        """
+        if self.store is None:
+            raise RuntimeError("Shared snapshot mode requires SNAPSHOT_ENABLED=true")
+        self._lease = BuilderLease(str(self.store.root))
+        self.load_latest_snapshot()
+
+        if self._lease.acquire():
+            self.role = 'builder'
+            self.build_in_background()
+        else:
+            self.role = 'follower'
+        log.info(f"Shared snapshot mode — this worker is the {self.role}")
+
+        self._follow_stop.clear()
+        self._follow_thread = threading.Thread(
+            target=self._follow, name='snapshot-follow', daemon=True
         )
+        self._follow_thread.start()
+        return self.role
 
-    def _build_investable_universe(self) -> list[str]:
+    def refresh_from_store(self) -> bool:
         """
-        Filter out tickers unsuitable for portfolio optimization.
+        Attach to a newer published generation, if there is one.
+
+        Returns:
+            True if a newer snapshot was published in this process
+        """
+        latest = self.store.latest_generation() if self.store else None
+        if latest is None or latest <= (self.generation or 0):
+            return False
+        return self.load_latest_snapshot()
+
+    def poll_shared(self):
+        """
+        One poll tick. The builder applies universe changes queued by
+        followers; a follower takes over a free lease, else picks up new
+        generations.
+        """
+        if self.role == 'builder':
+            self.apply_queued_changes()
+            return
+        if self.role != 'follower':
+            return
+        if self._lease.acquire():
+            self.role = 'builder'
+            log.warning("Builder lease was free — this worker takes over building")
+            self.build_in_background()
+            return
+        self.refresh_from_store()
+
+    def _follow(self):
+        while not self._follow_stop.wait(settings.snapshot_poll_seconds):
+            try:
+                self.poll_shared()
+            except Exception as e:
+                log.warning(f"Snapshot poll failed — {type(e).__name__}: {e}")
+
+    def stop(self):
+        """Stop following and give up the builder lease (shutdown)."""
+        self._follow_stop.set()
+        if self._lease is not None:
+            self._lease.release()
 
-        Excludes based on fundamentals directly (not cluster labels):
-          - Loss-making: negative or missing EPS (eps_ttm <= 0)
-          - Negative equity: debt_to_equity < -3
-          - Insufficient price history: < 60 trading days
+    # ── Universe changes ──────────────────────────────────────────────────────
+
+    def universe_tickers(self) -> list[str]:
+        """settings.tickers with the runtime additions / removals applied."""
+        added, removed = self._universe_delta()
+        base = [t for t in settings.tickers if t not in removed]
+        return base + [t for t in added if t not in base]
+
+    def _universe_delta(self) -> tuple[list[str], set[str]]:
+        """
+        Runtime (additions, removals) — read from the store when there is
+        one, so every worker, a restart and a lease takeover see the same
+        universe; held in memory otherwise.
+        """
+        if self.store is None:
+            return list(self._added), set(self._removed)
+        delta = self.store.load_universe()
+        return delta['added'], set(delta['removed'])
+
+    def _record_universe(self, added: list[str], removed: set[str]):
+        """Keep a new universe delta; written before the generation is published."""
+        self._added, self._removed = added, removed
+        if self.store is not None:
+            self.store.save_universe(added, sorted(removed))
+
+    def queue_universe_change(self, change: str, tickers: list[str]) -> dict:
+        """
+        Hand a universe change to the builder (shared-mode followers).
+
+        The request is written to the store's queue; the builder applies it
+        on its next poll (apply_queued_changes) and every worker picks the
+        result up as a new generation.
 
         Returns:
-            list of investable ticker symbols
+            {request_id, change, tickers}
+
+        Raises:
+            RuntimeError: without a snapshot store
         """
-        excluded: dict[str, str] = {}
+        if self.store is None:
+            raise RuntimeError("Queued universe changes require SNAPSHOT_ENABLED=true")
+        request_id = self.store.enqueue_universe_change(change, tickers)
+        log.info(f"Universe change queued for the builder — {change} {tickers} ({request_id})")
+        return {'request_id': request_id, 'change': change, 'tickers': list(tickers)}
 
-        for ticker in self.combined_df.index:
-            # Check price history
-            if (ticker not in self.prices.columns or
-                    self.prices[ticker].dropna().shape[0] < 60):
-                excluded[ticker] = 'insufficient_history'
-                continue
+    def apply_queued_changes(self) -> int:
+        """
+        Apply universe changes queued by followers, oldest first.
 
-            row = self.combined_df.loc[ticker]
+        Skipped while a build is running (the next poll retries). A request
+        that cannot be applied (no usable data, too few tickers left) is
+        logged and dropped; any other error leaves it queued.
 
-            # Loss-making: eps_ttm <= 0 or missing
-            eps = row.get('eps_ttm', None)
-            if eps is not None and pd.notna(eps) and eps <= 0:
-                excluded[ticker] = f'loss_making (eps_ttm={eps:.2f})'
-                continue
+        Returns:
+            number of requests applied
+        """
+        if self.store is None or self.role == 'follower' or not self.is_ready or self.is_building:
+            return 0
+        applied = 0
+        for request_id, request in self.store.queued_universe_changes():
+            change = self.add_tickers if request['change'] == 'add' else self.remove_tickers
+            try:
+                result = change(request['tickers'])
+            except ValueError as e:
+                log.warning(f"Queued universe change {request_id} dropped — {e}")
+            else:
+                applied += 1
+                log.info(f"Queued universe change {request_id} applied -> generation {result['generation']}")
+            self.store.ack_universe_change(request_id)
+        return applied
 
-            # Negative equity: extreme negative D/E
-            de = row.get('debt_to_equity', None)
-            if de is not None and pd.notna(de) and de < -3:
-                excluded[ticker] = f'negative_equity (d/e={de:.2f})'
-                continue
-            # Add after the negative equity check
-            pe   = row.get('pe_ratio',  None)
-            beta = row.get('beta',      None)
-            if (pd.notna(pe) and pe > 300 and
-                pd.notna(beta) and beta > 1.5):
-                excluded[ticker] = f'speculative (pe={pe:.0f}, beta={beta:.2f})'
-            continue        
-        investable = [t for t in self.combined_df.index if t not in excluded]
+    def add_tickers(self, tickers: list[str]) -> dict:
+        """
+        Add tickers to the live universe without a rebuild.
 
-        if excluded:
-            for ticker, reason in excluded.items():
-                log.info(f"Excluded from optimization: {ticker} — {reason}")
+        Fetches only the new symbols, scales them with the fitted feature
+        pipeline, assigns each to the nearest existing KMeans centroid and
+        splices k x N rows / columns into the similarity matrices
+        (app/services/universe.py). Publishes a new generation.
 
-        return investable
+        Returns:
+            {added, removed, skipped, generation, ticker_count, seconds,
+             refit_recommended, refit_reasons}
+
+        Raises:
+            RuntimeError: before the first build, or on a shared-mode follower
+                          (followers use queue_universe_change)
+            ValueError:   if none of the new tickers have usable data
+        """
+        with self._build_lock:
+            snap  = self._check_writable()
+            start = time.perf_counter()
+            new   = [t for t in dict.fromkeys(tickers) if t not in snap.ticker_index]
+            if not new:
+                return self._change_result(snap, [], [], list(tickers), start, [])
 
-    def similar(self, ticker: str, top_n: int = 5) -> list[dict]:
-        self._check_ready()
+            rows, scaled_rows, prices, model = self._featurize(new, snap)
+            failed   = [t for t in new if t not in rows.index]
+            if rows.empty:
+                raise ValueError(f"No usable data for {failed}")
+
+            snapshot = extend_snapshot(
+                snap, rows, scaled_rows, prices, self._next_generation(), cluster_model=model
+            )
+            reasons  = refit_reasons(snapshot, scaled_rows)
+            added, dropped = self._universe_delta()
+            self._record_universe(
+                added + [t for t in rows.index if t not in added], dropped - set(rows.index)
+            )
+            snapshot = self._publish_change(snapshot)
+            skipped  = [t for t in tickers if t not in rows.index]
+            log.info(
+                f"Universe +{list(rows.index)} (skipped: {skipped}) "
+                f"-> generation {snapshot.generation}"
+            )
+            return self._change_result(snapshot, list(rows.index), [], skipped, start, reasons)
+
+    def remove_tickers(self, tickers: list[str]) -> dict:
+        """
+        Drop tickers from the live universe — row / column selection only.
 
-        key    = f"similar:{ticker}:{top_n}"
+        Returns / Raises:
+            as add_tickers(); ValueError if fewer than 2 tickers would remain
+        """
+        with self._build_lock:
+            snap    = self._check_writable()
+            start   = time.perf_counter()
+            removed = [t for t in dict.fromkeys(tickers) if t in snap.ticker_index]
+            skipped = [t for t in tickers if t not in snap.ticker_index]
+            if not removed:
+                return self._change_result(snap, [], [], skipped, start, [])
+            if len(snap.ticker_index) - len(removed) < 2:
+                raise ValueError("At least 2 tickers must remain in the universe")
+
+            snapshot = shrink_snapshot(snap, removed, self._next_generation())
+            reasons  = refit_reasons(snapshot)
+            added, dropped = self._universe_delta()
+            dropped |= set(removed)
+            self._record_universe([t for t in added if t not in dropped], dropped)
+            snapshot = self._publish_change(snapshot)
+            log.info(
+                f"Universe -{removed} (skipped: {skipped}) "
+                f"-> generation {snapshot.generation}"
+            )
+            return self._change_result(snapshot, [], removed, skipped, start, reasons)
+
+    def _check_writable(self) -> RecommenderSnapshot:
+        snap = self._check_ready()
+        if self.role == 'follower':
+            raise RuntimeError("Universe changes must go to the builder worker")
+        return snap
+
+    @staticmethod
+    def _featurize(
+        tickers: list[str],
+        snap: RecommenderSnapshot,
+    ) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, object]:
+        """
+        combined_df rows, scaled rows, prices and cluster model for new tickers.
+
+        Uses the snapshot's fitted pipeline and KMeans centroids — nothing
+        about the existing universe is refitted. In minibatch mode a copy
+        of the build's ClusterModel is partial_fit on the new rows, so its
+        centroids follow the universe; otherwise the rows go to the nearest
+        existing centroid. Tickers without enough data are left out of the
+        returned frames.
+        """
+        combined, scaled_rows, prices = _fetch_features(tickers, snap.feature_pipeline)
+        if combined.empty:
+            return combined, scaled_rows, prices, None
+
+        model = snap.artifacts.get('cluster_model')
+        if model is not None and model.mode == 'minibatch' and len(scaled_rows):
+            model    = copy.deepcopy(model).partial_fit(scaled_rows)   # snapshot's stays as-is
+            clusters = model.predict(scaled_rows)
+        elif model is not None and len(scaled_rows):
+            clusters = model.predict(scaled_rows)
+        else:
+            # Loaded from disk (no model): centroids are the per-cluster means
+            centroids = cluster_centroids(snap.scaled_df, snap.combined_df['cluster'])
+            clusters  = assign_clusters(scaled_rows, centroids)
+
+        rows = combined.assign(cluster=clusters, cluster_label=label_tickers(combined, LabelRules.from_settings()))
+        rows['exclusion_reason'] = exclusion_reasons(rows, prices, InvestableRules.from_settings())
+        return rows, scaled_rows, prices, model
+
+    def _publish_change(self, snapshot: RecommenderSnapshot) -> RecommenderSnapshot:
+        """Publish a new snapshot and write it to the store."""
+        if self.role == 'builder':
+            # Serve the mmapped copy followers attach to, not a private one
+            snapshot = self._persist_shared(snapshot)
+            self._publish(snapshot)
+        else:
+            self._publish(snapshot)
+            self._persist(snapshot)
+        return snapshot
+
+    @staticmethod
+    def _change_result(snap, added, removed, skipped, start, reasons) -> dict:
+        return {
+            'added':             added,
+            'removed':           removed,
+            'skipped':           skipped,
+            'generation':        snap.generation,
+            'ticker_count':      len(snap.ticker_index),
+            'seconds':           round(time.perf_counter() - start, 3),
+            'refit_recommended': bool(reasons),
+            'refit_reasons':     reasons,
+        }
+
+    def _build_snapshot(self, tickers: list[str]) -> RecommenderSnapshot:
+        today = datetime.today().strftime('%Y%m%d')
+        self.stages.reset_report()
+        log.info("Building recommender...")
+
+        # Warm-start KMeans from the live generation so cluster ids carry over
+        previous  = self._snapshot
+        centroids = None
+        if previous is not None and settings.cluster_warm_start:
+            centroids = cluster_centroids(previous.scaled_df, previous.combined_df['cluster'])
+
+        dag = DAGExecutor(
+            self._build_stages(tickers, today, centroids),
+            cache=self.stages,
+            max_workers=settings.build_max_workers,
+            use_processes=settings.build_use_processes,
+        )
+        out = dag.run()
+
+        # Keep the fitted pipeline so out-of-universe tickers can be
+        # transformed into the same feature space without a rebuild; it
+        # is persisted with the generation by SnapshotStore, nowhere else
+        feature_pipeline, scaled_df = out['scale']
+
+        # The fitted ClusterModel places tickers added later (add_tickers)
+        cluster_model, clustered = out['cluster']
+        churn = None
+        if previous is not None:
+            churn = cluster_churn(previous.combined_df['cluster'], clustered['cluster'])
+            log.info(
+                f"Cluster churn vs generation {previous.generation}: "
+                f"{churn['changed']}/{churn['compared']} tickers moved ({churn['churn']:.1%})"
+            )
+
+        # Reason codes ride along in combined_df so queries can filter on them
+        reasons = out['investable']
+        self._log_exclusions(reasons)
+
+        snapshot = RecommenderSnapshot(
+            prices             = out['prices'],
+            combined_df        = clustered.assign(exclusion_reason=reasons),
+            scaled_df          = scaled_df,
+            feature_pipeline   = feature_pipeline,
+            similarity_mats    = out.get('similarity') or dict.fromkeys(SIMILARITY_KEYS),
+            investable_tickers = reasons.index[reasons.isna()].tolist(),
+            generation         = self._next_generation(),
+            built_at           = time.time(),
+            neighbors          = out['neighbors'],
+            returns            = out['returns'],
+            artifacts          = {
+                'fundamentals':  out['fundamentals'],
+                'technical':     out['technical'],
+                'merged':        out['merge'],
+                'cluster_model': cluster_model,
+                'cluster_churn': churn,
+                'k_sweep':       out['k_sweep'],
+                'stage_report':  list(self.stages.report),
+                'dag_report':    dag.report,
+            },
+        )
+
+        if settings.compact_mode:
+            before   = snapshot.memory_report()['total_mb']
+            snapshot = snapshot.compacted()
+            log.info(
+                f"Compact mode — {before:.2f}MB -> "
+                f"{snapshot.memory_report()['total_mb']:.2f}MB"
+            )
+        return snapshot
+
+    @staticmethod
+    def _log_exclusions(reasons: pd.Series):
+        counts = reasons.value_counts()
+        if counts.empty:
+            return
+        summary = ', '.join(f"{code}: {n}" for code, n in counts.items())
+        log.info(f"Excluded from optimization: {int(counts.sum())} ({summary})")
+        for ticker, code in reasons.dropna().items():
+            log.debug(f"Excluded from optimization: {ticker} — {code}")
+
+    def _next_generation(self) -> int:
+        on_disk = self.store.latest_generation() if self.store else None
+        return max(self.generation or 0, on_disk or 0) + 1
+
+    def _publish(self, snapshot: RecommenderSnapshot):
+        """Swap in a complete snapshot — a single reference assignment."""
+        snapshot.memory_report()     # deep scan once here, not on every /health probe
+        self._snapshot        = snapshot
+        self.last_build_error = None
+        cache.invalidate()   # keys are generation-scoped; this just frees memory
+        report = snapshot.artifacts.get('stage_report', [])
+        hits   = sum(r['status'] == 'hit' for r in report)
+        log.info(
+            f"Recommender ready — generation {snapshot.generation}, "
+            f"universe: {len(snapshot.combined_df)}, "
+            f"investable: {len(snapshot.investable_tickers)}, "
+            f"stages cached: {hits}/{len(report)}"
+        )
+        if settings.stability_on_publish and self.role != 'follower':
+            with self._stability_lock:
+                self._start_stability()
+
+    @staticmethod
+    def _build_stages(
+        tickers: list[str],
+        today: str,
+        centroids: pd.DataFrame = None,
+    ) -> list[Stage]:
+        """
+        The build graph — each stage receives its deps' outputs in order.
+
+        `centroids` (previous generation, weighted feature space) warm-start
+        the cluster stage; they are part of its cache key. k is chosen by
+        the k_sweep / n_clusters stages (app/models/k_selection.py). The
+        dense similarity stage only runs with settings.similarity_dense;
+        queries are served from the neighbors stage either way — exact
+        top-k lists, or approximate LSH tables for very large universes.
+        """
+        ks = (
+            tuple(range(settings.cluster_k_min, settings.cluster_k_max + 1))
+            if settings.cluster_k_rule != 'fixed' else ()
+        )
+        technical = (
+            partial(refresh_technical_features, path=settings.technical_state_path)
+            if settings.technical_incremental else compute_technical_features
+        )
+        neighbors = (
+            partial(LSHIndex.build, n_tables=settings.lsh_tables, n_bits=settings.lsh_bits)
+            if settings.similarity_index == 'lsh'
+            else partial(NeighborIndex.build, k=settings.similarity_neighbors)
+        )
+        stages = [
+            Stage('prices',       partial(fetch_prices, tickers), kind='io', memoize=False),
+            Stage('fundamentals', partial(fetch_fundamentals, tickers), kind='io',
+                  key_inputs=(sorted(tickers), today)),
+            Stage('technical',    technical,                  ('prices',),                 kind='cpu'),
+            Stage('merge',        merge_features,             ('fundamentals', 'technical')),
+            Stage('scale',        fit_feature_pipeline,       ('merge',),                  kind='cpu'),
+            Stage('scaled',       _scaled_frame,              ('scale',),                  memoize=False),
+            Stage('k_sweep',      partial(sweep_k, ks=ks, mode=settings.cluster_mode,
+                                          batch_size=settings.cluster_batch_size,
+                                          max_workers=settings.build_max_workers,
+                                          use_processes=settings.build_use_processes),
+                  ('scaled',)),
+            Stage('n_clusters',   partial(choose_k, rule=settings.cluster_k_rule,
+                                          min_size=settings.cluster_min_size),
+                  ('k_sweep',), memoize=False),
+            Stage('cluster',      partial(fit_clusters, mode=settings.cluster_mode,
+                                          batch_size=settings.cluster_batch_size,
+                                          previous=centroids, labels=LabelRules.from_settings()),
+                  ('scaled', 'merge', 'n_clusters'), kind='cpu'),
+            Stage('clustered',    _clustered_frame,           ('cluster',),                memoize=False),
+            Stage('neighbors',    neighbors,                  ('scaled',),                 kind='cpu'),
+            Stage('returns',      _returns_matrix,            ('prices', 'clustered'),     memoize=False),
+            Stage('investable',   partial(exclusion_reasons, rules=InvestableRules.from_settings()),
+                  ('clustered', 'prices')),
+        ]
+        if settings.similarity_dense:
+            stages.append(Stage('similarity', build_similarity_matrices, ('scaled',), kind='cpu'))
+        return stages
+
+    def memory_report(self) -> dict:
+        """Deep memory usage (MB) of the current snapshot (computed once per generation)."""
+        snap = self._check_ready()
+        return snap.memory_report()
+
+    def _build_investable_universe(self) -> list[str]:
+        """Investable subset of the current universe (see build_investable_universe)."""
+        return build_investable_universe(
+            self.combined_df, self.prices, InvestableRules.from_settings()
+        )
+
+    def similar(self, ticker: str, top_n: int = 5, fund_weight: float = None) -> list[dict]:
+        """
+        Most similar universe tickers.
+
+        `fund_weight` re-blends fundamental vs technical similarity at query
+        time (default: the build's 0.70) — scored from the snapshot's
+        normalized embeddings, nothing is rebuilt.
+        """
+        snap   = self._check_ready()   # pin: one snapshot for the whole request
+        weight = FUNDAMENTAL_WEIGHT if fund_weight is None else fund_weight
+
+        key    = f"similar:{snap.generation}:{ticker}:{top_n}:{weight}"
         cached = cache.get(key)
         if cached:
             return cached
 
         result = get_similar_stocks(
-            ticker, self.similarity_df, self.combined_df, top_n
+            ticker, snap.neighbors, snap.combined_df, top_n, fund_weight=weight
         )
         result = result.reset_index().to_dict(orient='records')
         cache.set(key, result)
         return result
 
-    def complementary(self, ticker: str, top_n: int = 5) -> list[dict]:
-        """Find most diversifying stocks for a given ticker."""
-        self._check_ready()
+    def similar_batch(self, tickers: list[str], top_n: int = 5, fund_weight: float = None) -> dict:
+        """
+        similar() for many universe tickers at once.
+
+        Cached queries are reused; the rest are scored together
+        (get_similar_stocks_batch — one pair of matrix products per block
+        of queries) and cached under the same keys as similar().
+
+        Returns:
+            {'results': {ticker: [similar records]} in request order,
+            'missing': tickers not in the universe}
+        """
+        snap    = self._check_ready()
+        weight  = FUNDAMENTAL_WEIGHT if fund_weight is None else fund_weight
+        known   = [t for t in tickers if t in snap.ticker_index]
+        keys    = {t: f"similar:{snap.generation}:{t}:{top_n}:{weight}" for t in known}
+        results = {t: cache.get(keys[t]) for t in known}
+
+        pending = [t for t in known if not results[t]]
+        if pending:
+            scored = get_similar_stocks_batch(pending, snap.neighbors, snap.combined_df, top_n, weight)
+            for ticker, frame in scored.items():
+                results[ticker] = frame.reset_index().to_dict(orient='records')
+                cache.set(keys[ticker], results[ticker])
+
+        return {
+            'results': {t: results[t] for t in known},
+            'missing': [t for t in tickers if t not in snap.ticker_index],
+        }
 
-        key    = f"complementary:{ticker}:{top_n}"
+    def similar_external(self, ticker: str, top_n: int = 5, fund_weight: float = None) -> list[dict]:
+        """
+        Similar stocks for a ticker outside the built universe.
+
+        Fetches just that symbol and scales it with the fitted feature
+        pipeline (no refit, no rebuild), then scores it against the
+        universe with the same fundamental/technical blend.
+
+        Raises:
+            ValueError: if `ticker` could not be fetched, or has no usable
+                prices/fundamentals
+        """
+        snap = self._check_ready()
+
+        weight = FUNDAMENTAL_WEIGHT if fund_weight is None else fund_weight
+        key    = f"similar_ext:{snap.generation}:{ticker}:{top_n}:{weight}"
         cached = cache.get(key)
         if cached:
             return cached
 
-        result = get_complementary_stocks(
-            ticker, self.similarity_df, self.combined_df, top_n
+        _, scaled_rows, _ = _fetch_features([ticker], snap.feature_pipeline)
+        if ticker not in scaled_rows.index:
+            raise ValueError(f"No usable data available for '{ticker}'")
+
+        query  = scaled_rows.loc[ticker]
+        result = get_similar_to_vector(
+            query, snap.scaled_df, snap.combined_df, top_n, exclude=ticker, fund_weight=weight
         )
         result = result.reset_index().to_dict(orient='records')
         cache.set(key, result)
         return result
 
-    def gaps(self, portfolio: list[str], top_n: int = 5) -> list[dict]:
-        self._check_ready()
+    def complementary(self, ticker: str, top_n: int = 5, fund_weight: float = None) -> list[dict]:
+        """Find most diversifying stocks for a given ticker (blend as in similar())."""
+        snap   = self._check_ready()
+        weight = FUNDAMENTAL_WEIGHT if fund_weight is None else fund_weight
 
-        key    = f"gaps:{':'.join(sorted(portfolio))}:{top_n}"
+        key    = f"complementary:{snap.generation}:{ticker}:{top_n}:{weight}"
         cached = cache.get(key)
         if cached:
             return cached
 
-        port_returns = (
-            self.prices[portfolio].pct_change().dropna().mean(axis=1)
+        result = get_complementary_stocks(
+            ticker, snap.neighbors, snap.combined_df, top_n, fund_weight=weight
         )
+        result = result.reset_index().to_dict(orient='records')
+        cache.set(key, result)
+        return result
+
+    def clusters(self, tickers: list[str]) -> dict:
+        """
+        Cluster id and label for any tickers, in or out of the universe.
+
+        Universe members report their built assignment. Other symbols are
+        fetched as one batch, scaled with the fitted feature pipeline and
+        placed by the snapshot's ClusterModel — a nearest-centroid lookup,
+        nothing is refitted — then labelled by the same rule table.
+        `distance` is the weighted-feature distance to the cluster centroid
+        (None when the snapshot has no fitted model).
+
+        Returns:
+            {'results': [{ticker, cluster, cluster_label, sector, distance,
+            in_universe}, ...] in request order, 'missing': tickers without
+            usable data}
+        """
+        snap    = self._check_ready()
+        model   = snap.artifacts.get('cluster_model')
+        results = {}
+
+        members = [t for t in tickers if t in snap.ticker_index]
+        if members:
+            rows     = snap.combined_df.loc[members]
+            distance = (
+                model.distances(snap.scaled_df.loc[members], rows['cluster'].to_numpy())
+                if model is not None else [None] * len(members)
+            )
+            for ticker, cluster, label, sector, dist in zip(
+                members, rows['cluster'], rows['cluster_label'], rows['sector'], distance,
+            ):
+                results[ticker] = self._cluster_entry(ticker, cluster, label, sector, dist, True)
+
+        others = [t for t in tickers if t not in results]
+        for ticker in others:
+            cached = cache.get(f"cluster:{snap.generation}:{ticker}")
+            if cached:
+                results[ticker] = cached
+
+        fetch = [t for t in others if t not in results]
+        if fetch:
+            combined, scaled_rows, _ = _fetch_features(fetch, snap.feature_pipeline)
+            if not combined.empty:
+                if model is not None:
+                    ids, distance = model.assign(scaled_rows)
+                else:
+                    centroids = cluster_centroids(snap.scaled_df, snap.combined_df['cluster'])
+                    ids       = assign_clusters(scaled_rows, centroids).to_numpy()
+                    distance  = [None] * len(ids)
+                labels = label_tickers(combined, LabelRules.from_settings())
+                for ticker, cluster, label, sector, dist in zip(
+                    combined.index, ids, labels, combined['sector'], distance,
+                ):
+                    entry = self._cluster_entry(ticker, cluster, label, sector, dist, False)
+                    cache.set(f"cluster:{snap.generation}:{ticker}", entry)
+                    results[ticker] = entry
+
+        return {
+            'results': [results[t] for t in tickers if t in results],
+            'missing': [t for t in tickers if t not in results],
+        }
+
+    def stability(self, wait: bool = False) -> dict | None:
+        """
+        Bootstrap cluster stability of the current generation.
+
+        Never computed on the calling thread: a background run starts when
+        a generation is published (settings.stability_on_publish) or on
+        the first call, and its result is kept until the next generation
+        (settings: STABILITY_*). The result is saved with the generation in
+        the snapshot store; shared-mode followers only ever read it from
+        there and never run the bootstrap themselves.
+
+        Args:
+            wait: block until the live generation's result is ready
+                  (scripts, tests) instead of returning None
 
-        correlations = {}
-        for ticker in self.combined_df.index:
-            if ticker in portfolio:
+        Returns:
+            the bootstrap_stability result, or None while it is computing
+
+        Raises:
+            RuntimeError: if the analysis of the live generation failed
+        """
+        while True:
+            snap = self._check_ready()
+            with self._stability_lock:
+                done = self._stability
+                if done is not None and done[0] == snap.generation:
+                    break
+                if self.role == 'follower':
+                    done = self._stored_stability(snap.generation)
+                    if done is not None:
+                        self._stability = done
+                        break
+                    runner = None
+                else:
+                    runner = self._start_stability()
+            if not wait:
+                return None
+            if runner is None:
+                time.sleep(STABILITY_POLL_SECONDS)     # the builder's result lands in the store
+            else:
+                runner.join()
+
+        _, result, error = done
+        if error is not None:
+            raise RuntimeError(f"Stability analysis failed for generation {snap.generation}: {error}")
+        return result
+
+    def _start_stability(self) -> threading.Thread:
+        """The background stability run, started if idle (call with _stability_lock held)."""
+        if self._stability_thread is None:
+            self._stability_thread = threading.Thread(
+                target=self._run_stability, name='recommender-stability', daemon=True
+            )
+            self._stability_thread.start()
+        return self._stability_thread
+
+    def _stored_stability(self, generation: int) -> tuple | None:
+        """(generation, result, error) saved with `generation` in the store, if any."""
+        if self.store is None:
+            return None
+        try:
+            saved = self.store.load_stability(generation)
+        except Exception as e:
+            log.warning(f"Stability of generation {generation} unreadable — {type(e).__name__}: {e}")
+            return None
+        return (generation, *saved) if saved is not None else None
+
+    def _run_stability(self):
+        """Analyse the live generation; repeat while newer ones were published meanwhile."""
+        while True:
+            with self._stability_lock:
+                snap = self._snapshot
+                if snap is None or (self._stability is not None and self._stability[0] == snap.generation):
+                    self._stability_thread = None
+                    return
+
+            # Already computed for this generation (restart, lease takeover)
+            stored = self._stored_stability(snap.generation)
+            if stored is not None:
+                with self._stability_lock:
+                    self._stability = stored
                 continue
-            corr = self.prices[ticker].pct_change().dropna().corr(port_returns)
-            correlations[ticker] = corr
-
-        rec_df = (
-            pd.Series(correlations)
-            .sort_values()
-            .head(top_n)
-            .reset_index()
-        )
-        rec_df.columns = ['ticker', 'correlation']
 
-        rec_df['sector'] = rec_df['ticker'].map(
-            self.combined_df['sector'].to_dict()
+            result, error = None, None
+            try:
+                result = bootstrap_stability(
+                    snap.scaled_df,
+                    snap.combined_df['cluster'].astype(int),
+                    n_clusters    = snap.combined_df['cluster'].nunique(),
+                    n_boot        = settings.stability_bootstrap,
+                    sample_frac   = settings.stability_sample_frac,
+                    feature_frac  = settings.stability_feature_frac,
+                    mode          = settings.cluster_mode,
+                    batch_size    = settings.cluster_batch_size,
+                    max_workers   = settings.build_max_workers,
+                    use_processes = settings.build_use_processes,
+                )
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                log.error(f"Stability analysis failed for generation {snap.generation}: {error}")
+
+            if self.store is not None:
+                try:
+                    self.store.save_stability(snap.generation, result, error)
+                except Exception as e:
+                    log.warning(f"Stability save failed — {type(e).__name__}: {e}")
+            with self._stability_lock:
+                self._stability = (snap.generation, result, error)
+
+    @staticmethod
+    def _cluster_entry(ticker, cluster, label, sector, distance, in_universe: bool) -> dict:
+        return {
+            'ticker':        ticker,
+            'cluster':       int(cluster),
+            'cluster_label': str(label),
+            'sector':        sector if pd.notna(sector) else None,
+            'distance':      round(float(distance), 4) if distance is not None else None,
+            'in_universe':   in_universe,
+        }
+
+    def gaps(
+        self,
+        portfolio: list[str],
+        top_n: int = 5,
+        weights: list[float] = None,
+        rank_by: str = 'correlation',
+        add_weight: float = 0.05,
+        investable_only: bool = False,
+    ) -> list[dict]:
+        """
+        Least correlated / most volatility-reducing additions to a portfolio.
+
+        Args:
+            portfolio: held tickers (up to hundreds)
+            top_n:     number of candidates to return
+            weights:   holding weights, parallel to `portfolio` (default:
+                       equal weight); normalized to sum to 1
+            rank_by:   'correlation'  — lowest correlation with the
+                                        portfolio's daily returns
+                       'marginal_vol' — largest first-order drop in
+                                        portfolio volatility (covariance)
+                       'vol_change'   — largest exact drop in portfolio
+                                        volatility from adding the
+                                        candidate at `add_weight`
+            add_weight: candidate weight for vol_change, funded pro rata
+            investable_only: only suggest tickers without an exclusion_reason
+
+        Returns:
+            list of {ticker, correlation, marginal_vol, vol_change, sector}
+        """
+        snap = self._check_ready()
+
+        holdings: dict[str, float] = {}
+        for ticker, w in zip(portfolio, weights or [1.0] * len(portfolio)):
+            holdings[ticker] = holdings.get(ticker, 0.0) + w
+
+        key    = (
+            f"gaps:{snap.generation}:{rank_by}:{top_n}:{add_weight}:{investable_only}:"
+            f"{fingerprint(sorted(holdings.items()))}"
         )
+        cached = cache.get(key)
+        if cached:
+            return cached
+
+        # One pass over the precomputed returns matrix (app/models/diversification.py)
+        returns   = snap.returns
+        positions = snap.ticker_index.positions(list(holdings))
+        w         = np.array([holdings[returns.tickers[i]] for i in positions])
+        w         = w / w.sum()
+
+        rows, target = returns.portfolio_returns(positions, w)
+        correlations = returns.correlations(rows, target)
+        marginal, _  = marginal_volatility(returns, positions, w)
+        vol_delta, _ = volatility_change(returns, positions, w, add_weight)
+        scores       = {
+            'correlation':  correlations,
+            'marginal_vol': marginal,
+            'vol_change':   vol_delta,
+        }[rank_by]
+        exclude      = positions
+        if investable_only and 'exclusion_reason' in snap.combined_df.columns:
+            blocked = np.flatnonzero(snap.combined_df['exclusion_reason'].notna().to_numpy())
+            exclude = np.union1d(positions, blocked)
+        picks        = lowest_n(scores, top_n, exclude=exclude)
 
-        result = rec_df.to_dict(orient='records')
+        sectors = snap.combined_df['sector']
+        result  = [
+            {
+                'ticker':       returns.tickers[i],
+                'correlation':  None if np.isnan(correlations[i]) else float(correlations[i]),
+                'marginal_vol': None if np.isnan(marginal[i]) else float(marginal[i]),
+                'vol_change':   float(vol_delta[i]),
+                'sector':       sectors.iloc[i],
+            }
+            for i in picks
+        ]
         cache.set(key, result)
         return result
 
     def optimize(self, tickers: list[str], risk: str = 'moderate') -> dict:
-        self._check_ready()
+        snap = self._check_ready()
 
         # Filter requested tickers to investable universe only
-        investable = [t for t in tickers if t in self.investable_tickers]
-        excluded   = [t for t in tickers if t not in self.investable_tickers]
+        investable = [t for t in tickers if t in snap.investable_tickers]
+        excluded   = [t for t in tickers if t not in snap.investable_tickers]
 
         if excluded:
             log.warning(
@@ -193,19 +1174,22 @@ class RecommenderService:
                 f"Excluded: {excluded}"
             )
 
-        key    = f"optimize:{':'.join(sorted(investable))}:{risk}"
+        key    = f"optimize:{snap.generation}:{':'.join(sorted(investable))}:{risk}"
         cached = cache.get(key)
         if cached:
             return cached
 
-        result = optimize_portfolio(investable, self.prices, risk)
+        result = optimize_portfolio(investable, snap.prices, risk)
         cache.set(key, result)
         return result
 
-    def _check_ready(self):
-        if not self.is_ready:
+    def _check_ready(self) -> RecommenderSnapshot:
+        """Return the current snapshot; raises RuntimeError before the first build."""
+        snap = self._snapshot
+        if snap is None:
             raise RuntimeError("Call .build() first")
+        return snap
 
 
 # Singleton
-recommender = RecommenderService()
\ No newline at end of file
+recommender = RecommenderService()
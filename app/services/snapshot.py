@@ -0,0 +1,124 @@
+"""
+Recommender Snapshot
+--------------------
+Everything one build produces, bundled into a single immutable object.
+
+RecommenderService holds exactly one reference to the current snapshot
+and replaces it with a single assignment when a rebuild finishes, so:
+  - a request pins the snapshot it started with and never sees new
+    prices paired with old similarity matrices
+  - a failed rebuild never touches the live snapshot — the service keeps
+    serving the last good one
+  - `generation` increases with every published build and is part of
+    every query cache key, so cached results never outlive their data
+
+Similarity queries are served from `neighbors` (top / bottom k per
+ticker, or an approximate LSHIndex — both linear in N). The dense matrices in `similarity_mats` are
+optional (settings.similarity_dense) — their values are None when off.
+
+`neighbors` and `returns` are produced by whoever makes the snapshot —
+the build DAG, the universe helpers, SnapshotStore — never here: a
+missing or misaligned one raises instead of being silently recomputed.
+
+Immutability is enforced on the snapshot's attributes (frozen dataclass).
+The DataFrames inside are shared, not copied — treat them as read-only.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from app.core.memory import TickerIndex, compact_frame, frame_mb
+from app.features.fundamentals import FeaturePipeline
+from app.models.ann import LSHIndex
+from app.models.diversification import ReturnsMatrix
+from app.models.similarity import NeighborIndex
+
+
+@dataclass(frozen=True)
+class RecommenderSnapshot:
+    prices:             pd.DataFrame
+    combined_df:        pd.DataFrame
+    scaled_df:          pd.DataFrame
+    feature_pipeline:   FeaturePipeline
+    similarity_mats:    dict[str, pd.DataFrame | None]    # fundamental/technical/combined
+    investable_tickers: list[str]
+    generation:         int
+    built_at:           float
+    compact:            bool  = False
+    neighbors:          NeighborIndex | LSHIndex | None = None   # scaled_df order (required)
+    returns:            ReturnsMatrix | None = field(default=None, repr=False)  # gaps(), combined_df order (required)
+    artifacts:          dict  = field(default_factory=dict)   # stage outputs / reports
+    ticker_index:       TickerIndex   = field(init=False, repr=False)
+    _memory:            dict | None   = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'ticker_index', TickerIndex(self.combined_df.index))
+        if not self._returns_aligned():
+            raise ValueError(
+                f"generation {self.generation}: returns matrix missing or not aligned "
+                f"with prices / combined_df"
+            )
+        if self.neighbors is None or not np.array_equal(self.neighbors.tickers.symbols, self.scaled_df.index):
+            raise ValueError(
+                f"generation {self.generation}: neighbor index missing or not aligned with scaled_df"
+            )
+
+    def _returns_aligned(self) -> bool:
+        """Whether `returns` (e.g. loaded from disk) matches these prices and tickers."""
+        return (
+            self.returns is not None
+            and self.returns.tickers == list(self.combined_df.index)
+            and self.returns.dates.equals(self.prices.index[1:])
+        )
+
+    @property
+    def similarity_df(self) -> pd.DataFrame:
+        """Combined similarity matrix (backward compat; None when dense matrices are off)."""
+        return self.similarity_mats['combined']
+
+    def compacted(self) -> RecommenderSnapshot:
+        """float32 / categorical copy of this snapshot (see app/core/memory.py)."""
+        return RecommenderSnapshot(
+            prices             = compact_frame(self.prices),
+            combined_df        = compact_frame(self.combined_df),
+            scaled_df          = compact_frame(self.scaled_df),
+            feature_pipeline   = self.feature_pipeline,
+            similarity_mats    = {
+                k: compact_frame(v) if v is not None else None for k, v in self.similarity_mats.items()
+            },
+            investable_tickers = self.investable_tickers,
+            generation         = self.generation,
+            built_at           = self.built_at,
+            compact            = True,
+            neighbors          = self.neighbors.astype(np.float32),
+            returns            = self.returns,
+            artifacts          = self.artifacts,
+        )
+
+    def memory_report(self) -> dict:
+        """
+        Deep memory usage (MB) of the snapshot's frames.
+
+        The deep scan is O(N·T) (object columns included), so it runs once
+        per snapshot — RecommenderService._publish warms it — and later
+        calls (every /health probe) return the cached figures.
+        """
+        if self._memory is not None:
+            return dict(self._memory)
+        report = {
+            'prices_mb':     frame_mb(self.prices),
+            'combined_mb':   frame_mb(self.combined_df),
+            'scaled_mb':     frame_mb(self.scaled_df),
+            'similarity_mb': sum(frame_mb(m) for m in self.similarity_mats.values()),
+            'neighbors_mb':  self.neighbors.nbytes / 1e6,
+            'returns_mb':    self.returns.nbytes / 1e6,
+        }
+        report = {k: round(v, 3) for k, v in report.items()}
+        report['total_mb'] = round(sum(report.values()), 3)
+        report['compact']  = self.compact
+        object.__setattr__(self, '_memory', report)
+        return dict(report)
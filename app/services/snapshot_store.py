@@ -0,0 +1,475 @@
+"""
+Snapshot Store
+--------------
+Versioned on-disk copies of RecommenderSnapshot for sub-second cold starts.
+
+Layout:
+    app/data/snapshots/
+        LATEST                      <- name of the newest complete generation
+        UNIVERSE.json               <- runtime universe delta {added, removed}
+        universe-queue/             <- changes posted to followers, for the builder
+        gen-000012/
+            manifest.json           <- format version, generation, frame layouts
+            prices.float64.npy
+            combined_df.float64.npy
+            combined_df.int32.npy
+            scaled_df.float64.npy
+            sim_fundamental.float64.npy
+            sim_technical.float64.npy
+            sim_combined.float64.npy    <- only with SIMILARITY_DENSE
+            nn_top_ids.npy ...          <- neighbor index arrays (NeighborIndex / LSHIndex)
+            returns_values.npy          <- centred daily returns (+ returns_mask.npy with gaps)
+            feature_pipeline.pkl
+            cluster_model.pkl       <- fitted ClusterModel (when the build had one)
+            stability.pkl           <- bootstrap cluster stability, added once computed
+        gen-000011/ ...
+
+Each DataFrame is stored as one raw .npy block per numeric dtype plus
+JSON for index / column order / object columns (sector, cluster_label).
+On load the blocks are opened with mmap_mode='r' and wrapped without a
+copy, so the big matrices (prices, returns, similarity) are paged in on
+demand rather than read up front.
+
+Writes are crash-safe: a generation is written into a temp directory and
+renamed into place (atomic on POSIX), then LATEST is replaced via
+os.replace. A reader therefore only ever sees complete generations; if
+LATEST is missing or its generation fails validation, older generations
+are tried newest-first. Generations of an older format are skipped, not
+upgraded in place — the service then builds a fresh one.
+
+Shared mode (several uvicorn workers on one host): BuilderLease elects a
+single builder per snapshot directory with a non-blocking flock. Only
+the builder fetches and builds; every worker — the builder included —
+serves the memory-mapped generation, so the matrices live once in the OS
+page cache instead of once per worker. The kernel drops the lock when
+the builder exits, and the next worker to poll takes over.
+
+Runtime universe changes (/admin/universe/*) live next to LATEST, not in
+the builder's memory: UNIVERSE.json holds the additions / removals every
+worker applies to settings.tickers, so a restart or a lease takeover
+keeps them. A follower cannot change the universe itself; it drops the
+request into universe-queue/ and the builder applies it on its next poll.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:     # non-POSIX: no election, every worker builds
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+from app.core.logger import get_logger
+from app.models.ann import LSHIndex
+from app.models.diversification import ReturnsMatrix
+from app.models.similarity import NeighborIndex
+from app.services.snapshot import RecommenderSnapshot
+
+log = get_logger(__name__)
+
+SNAPSHOT_DIR    = "app/data/snapshots"
+SNAPSHOT_FORMAT = 2     # 2: neighbor index + returns matrix required
+LATEST_FILE     = "LATEST"
+UNIVERSE_FILE   = "UNIVERSE.json"
+QUEUE_DIR       = "universe-queue"
+GEN_PREFIX      = "gen-"
+BUILDER_LOCK    = ".builder.lock"
+
+SIMILARITY_KEYS = ('fundamental', 'technical', 'combined')
+NEIGHBOR_KINDS  = {'topk': NeighborIndex, 'lsh': LSHIndex}
+
+
+def _gen_name(generation: int) -> str:
+    return f"{GEN_PREFIX}{generation:06d}"
+
+
+# ── Frame (de)serialization ───────────────────────────────────────────────────
+
+def _save_frame(directory: Path, name: str, df: pd.DataFrame) -> dict:
+    """Write df as per-dtype .npy blocks + JSON layout; returns the layout."""
+    index = df.index
+    if isinstance(index, pd.DatetimeIndex):
+        index_kind, index_values = 'datetime', [d.isoformat() for d in index]
+    else:
+        index_kind, index_values = 'str', [str(i) for i in index]
+
+    blocks, objects, categoricals = [], {}, []
+    by_dtype: dict[str, list] = {}
+    for col in df.columns:
+        dtype = df[col].dtype
+        if isinstance(dtype, np.dtype) and dtype.kind in 'biuf':
+            by_dtype.setdefault(dtype.str, []).append(col)
+        else:
+            if isinstance(dtype, pd.CategoricalDtype):
+                categoricals.append(str(col))
+            values            = df[col].astype(object).where(df[col].notna(), None)
+            objects[str(col)] = values.tolist()
+
+    for dtype_str, cols in by_dtype.items():
+        fname = f"{name}.{np.dtype(dtype_str).name}.npy"
+        np.save(directory / fname, np.ascontiguousarray(df[cols].to_numpy(dtype=np.dtype(dtype_str))))
+        blocks.append({'file': fname, 'columns': [str(c) for c in cols]})
+
+    return {
+        'index':        index_values,
+        'index_kind':   index_kind,
+        'index_name':   index.name,
+        'columns':      [str(c) for c in df.columns],
+        'columns_name': df.columns.name,
+        'blocks':       blocks,
+        'objects':      objects,
+        'categoricals': categoricals,
+    }
+
+
+def _load_frame(directory: Path, layout: dict, mmap: bool = True) -> pd.DataFrame:
+    """Rebuild a DataFrame from its layout; numeric blocks are memory-mapped."""
+    if layout['index_kind'] == 'datetime':
+        index = pd.DatetimeIndex(pd.to_datetime(layout['index']), name=layout['index_name'])
+    else:
+        index = pd.Index(layout['index'], name=layout['index_name'])
+
+    parts = []
+    for block in layout['blocks']:
+        values = np.load(directory / block['file'], mmap_mode='r' if mmap else None)
+        parts.append(pd.DataFrame(values, index=index, columns=block['columns'], copy=False))
+    for col, values in layout['objects'].items():
+        series = pd.Series(values, index=index, name=col, dtype=object)
+        if col in layout['categoricals']:
+            series = series.astype('category')
+        parts.append(series.to_frame())
+
+    if len(parts) == 1 and not layout['objects']:
+        df = parts[0]                       # single block: zero-copy over the mmap
+    else:
+        df = pd.concat(parts, axis=1)[layout['columns']]
+    df.columns.name = layout.get('columns_name')
+    return df
+
+
+# ── Store ─────────────────────────────────────────────────────────────────────
+
+class SnapshotStore:
+    """Save / load RecommenderSnapshot generations under one directory."""
+
+    def __init__(self, root: str = SNAPSHOT_DIR, keep: int = 3):
+        self.root = Path(root)
+        self.keep = keep
+
+    def generations(self) -> list[int]:
+        """Complete generations on disk, newest first."""
+        if not self.root.exists():
+            return []
+        gens = []
+        for p in self.root.glob(f"{GEN_PREFIX}*"):
+            suffix = p.name[len(GEN_PREFIX):]
+            if p.is_dir() and suffix.isdigit() and (p / 'manifest.json').exists():
+                gens.append(int(suffix))
+        return sorted(gens, reverse=True)
+
+    def latest_generation(self) -> int | None:
+        """Generation named by LATEST (falls back to the newest directory)."""
+        pointer = self.root / LATEST_FILE
+        if pointer.exists():
+            name = pointer.read_text(encoding='utf-8').strip()
+            if name.startswith(GEN_PREFIX) and name[len(GEN_PREFIX):].isdigit():
+                return int(name[len(GEN_PREFIX):])
+        gens = self.generations()
+        return gens[0] if gens else None
+
+    def save(self, snapshot: RecommenderSnapshot) -> Path:
+        """
+        Write `snapshot` as a new generation and point LATEST at it.
+
+        Returns:
+            path of the published generation directory
+        """
+        start = time.perf_counter()
+        self.root.mkdir(parents=True, exist_ok=True)
+        final = self.root / _gen_name(snapshot.generation)
+        tmp   = self.root / f".{final.name}.tmp-{os.getpid()}"
+        if tmp.exists():
+            shutil.rmtree(tmp)
+        tmp.mkdir()
+
+        frames = {
+            'prices':      _save_frame(tmp, 'prices',      snapshot.prices),
+            'combined_df': _save_frame(tmp, 'combined_df', snapshot.combined_df),
+            'scaled_df':   _save_frame(tmp, 'scaled_df',   snapshot.scaled_df),
+        }
+        for key in SIMILARITY_KEYS:
+            if snapshot.similarity_mats.get(key) is not None:
+                frames[f"sim_{key}"] = _save_frame(tmp, f"sim_{key}", snapshot.similarity_mats[key])
+
+        neighbors = {}
+        for name, values in snapshot.neighbors.arrays().items():
+            np.save(tmp / f"nn_{name}.npy", np.ascontiguousarray(values))
+            neighbors[name] = f"nn_{name}.npy"
+
+        returns = {}
+        for name, values in snapshot.returns.arrays().items():
+            np.save(tmp / f"returns_{name}.npy", np.ascontiguousarray(values))
+            returns[name] = f"returns_{name}.npy"
+
+        with open(tmp / 'feature_pipeline.pkl', 'wb') as f:
+            pickle.dump(snapshot.feature_pipeline, f, protocol=pickle.HIGHEST_PROTOCOL)
+        if snapshot.artifacts.get('cluster_model') is not None:
+            with open(tmp / 'cluster_model.pkl', 'wb') as f:
+                pickle.dump(snapshot.artifacts['cluster_model'], f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        manifest = {
+            'format':             SNAPSHOT_FORMAT,
+            'generation':         snapshot.generation,
+            'built_at':           snapshot.built_at,
+            'compact':            snapshot.compact,
+            'investable_tickers': list(snapshot.investable_tickers),
+            'frames':             frames,
+            'neighbors':          neighbors,
+            'neighbors_kind':     snapshot.neighbors.kind,
+            'returns':            returns,
+        }
+        # manifest last: its presence marks the directory complete
+        with open(tmp / 'manifest.json', 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, default=str)
+
+        if final.exists():
+            shutil.rmtree(final)
+        os.rename(tmp, final)
+        self._point_latest(final.name)
+        self._prune()
+
+        log.info(
+            f"Snapshot generation {snapshot.generation} saved -> {final} "
+            f"({time.perf_counter() - start:.2f}s)"
+        )
+        return final
+
+    def load(self, generation: int = None, mmap: bool = True) -> RecommenderSnapshot | None:
+        """
+        Load a generation (default: LATEST, then older ones if it is invalid).
+
+        Returns:
+            RecommenderSnapshot, or None if no valid generation exists
+        """
+        if generation is not None:
+            candidates = [generation]
+        else:
+            latest     = self.latest_generation()
+            candidates = ([latest] if latest is not None else []) + [
+                g for g in self.generations() if g != latest
+            ]
+
+        for gen in candidates:
+            try:
+                return self._load_generation(gen, mmap)
+            except Exception as e:
+                log.warning(f"Snapshot generation {gen} unreadable — {type(e).__name__}: {e}")
+        return None
+
+    def _load_generation(self, generation: int, mmap: bool) -> RecommenderSnapshot:
+        start     = time.perf_counter()
+        directory = self.root / _gen_name(generation)
+        with open(directory / 'manifest.json', 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"unsupported snapshot format {manifest.get('format')}")
+
+        frames = {k: _load_frame(directory, v, mmap) for k, v in manifest['frames'].items()}
+        with open(directory / 'feature_pipeline.pkl', 'rb') as f:
+            feature_pipeline = pickle.load(f)
+        artifacts = {'source': str(directory)}
+        if (directory / 'cluster_model.pkl').exists():
+            with open(directory / 'cluster_model.pkl', 'rb') as f:
+                artifacts['cluster_model'] = pickle.load(f)
+
+        # Neighbor index and returns matrix are wrapped, never rebuilt here
+        arrays    = {
+            name: np.load(directory / fname, mmap_mode='r' if mmap else None)
+            for name, fname in manifest['neighbors'].items()
+        }
+        kind      = NEIGHBOR_KINDS[manifest.get('neighbors_kind', 'topk')]
+        neighbors = kind.from_arrays(frames['scaled_df'], arrays)
+
+        arrays    = {
+            name: np.load(directory / fname, mmap_mode='r' if mmap else None)
+            for name, fname in manifest['returns'].items()
+        }
+        returns   = ReturnsMatrix.from_arrays(
+            frames['prices'].index[1:], frames['combined_df'].index, arrays,
+        )
+
+        snapshot = RecommenderSnapshot(
+            prices             = frames['prices'],
+            combined_df        = frames['combined_df'],
+            scaled_df          = frames['scaled_df'],
+            feature_pipeline   = feature_pipeline,
+            similarity_mats    = {k: frames.get(f"sim_{k}") for k in SIMILARITY_KEYS},
+            investable_tickers = manifest['investable_tickers'],
+            generation         = manifest['generation'],
+            built_at           = manifest['built_at'],
+            compact            = manifest['compact'],
+            neighbors          = neighbors,
+            returns            = returns,
+            artifacts          = artifacts,
+        )
+        log.info(
+            f"Snapshot generation {generation} loaded from {directory} "
+            f"({time.perf_counter() - start:.3f}s)"
+        )
+        return snapshot
+
+    def _point_latest(self, name: str) -> None:
+        tmp = self.root / f".{LATEST_FILE}.tmp-{os.getpid()}"
+        tmp.write_text(name, encoding='utf-8')
+        os.replace(tmp, self.root / LATEST_FILE)
+
+    def _prune(self) -> None:
+        """Keep the newest `keep` generations (readers may still map older ones)."""
+        for gen in self.generations()[self.keep:]:
+            shutil.rmtree(self.root / _gen_name(gen), ignore_errors=True)
+
+    def _write_json(self, path: Path, payload: dict) -> None:
+        """Write `payload` to `path` atomically (temp file + rename)."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.parent / f".{path.name}.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        os.replace(tmp, path)
+
+    # ── Cluster stability ─────────────────────────────────────────────────────
+
+    def save_stability(self, generation: int, result: dict | None, error: str | None = None) -> bool:
+        """
+        Attach a bootstrap stability result (or its failure) to a saved generation.
+
+        Written after the generation itself (temp file + rename), so readers
+        see either no result or a complete one.
+
+        Returns:
+            False if the generation is not on disk (never saved, or pruned)
+        """
+        directory = self.root / _gen_name(generation)
+        if not (directory / 'manifest.json').exists():
+            return False
+        tmp = directory / f".stability.pkl.tmp-{os.getpid()}-{threading.get_ident()}"
+        with open(tmp, 'wb') as f:
+            pickle.dump({'result': result, 'error': error}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, directory / 'stability.pkl')
+        return True
+
+    def load_stability(self, generation: int) -> tuple[dict | None, str | None] | None:
+        """
+        Stability saved with a generation.
+
+        Returns:
+            (result, error), or None while the builder has not saved one
+        """
+        path = self.root / _gen_name(generation) / 'stability.pkl'
+        try:
+            with open(path, 'rb') as f:
+                saved = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        return saved['result'], saved['error']
+
+    # ── Runtime universe changes ──────────────────────────────────────────────
+
+    def load_universe(self) -> dict:
+        """Runtime universe delta: {'added': [...], 'removed': [...]} (both empty when none)."""
+        try:
+            with open(self.root / UNIVERSE_FILE, 'r', encoding='utf-8') as f:
+                delta = json.load(f)
+        except FileNotFoundError:
+            return {'added': [], 'removed': []}
+        return {'added': list(delta.get('added', [])), 'removed': list(delta.get('removed', []))}
+
+    def save_universe(self, added: list[str], removed: list[str]) -> None:
+        """Replace the runtime universe delta (single writer: the builder / standalone)."""
+        self._write_json(self.root / UNIVERSE_FILE, {'added': list(added), 'removed': sorted(removed)})
+
+    def enqueue_universe_change(self, change: str, tickers: list[str]) -> str:
+        """
+        Queue a universe change for the builder.
+
+        Args:
+            change:  'add' or 'remove'
+            tickers: symbols to add / remove
+
+        Returns:
+            request id (the queue file name, ordered by arrival)
+        """
+        request_id = f"{time.time_ns():020d}-{os.getpid()}-{threading.get_ident()}.json"
+        self._write_json(self.root / QUEUE_DIR / request_id, {'change': change, 'tickers': list(tickers)})
+        return request_id
+
+    def queued_universe_changes(self) -> list[tuple[str, dict]]:
+        """Pending (request id, {'change', 'tickers'}) pairs, oldest first."""
+        queue = self.root / QUEUE_DIR
+        if not queue.exists():
+            return []
+        pending = []
+        for path in sorted(queue.glob('[!.]*.json')):
+            with open(path, 'r', encoding='utf-8') as f:
+                pending.append((path.name, json.load(f)))
+        return pending
+
+    def ack_universe_change(self, request_id: str) -> None:
+        """Drop a processed request from the queue."""
+        (self.root / QUEUE_DIR / request_id).unlink(missing_ok=True)
+
+
+# ── Builder election ──────────────────────────────────────────────────────────
+
+class BuilderLease:
+    """
+    Exclusive, non-blocking flock on <root>/.builder.lock.
+
+    At most one process holds the lease per snapshot directory. It is held
+    until release() or process exit — the kernel releases it even on a
+    crash, so there is no stale lock to clean up.
+    """
+
+    def __init__(self, root: str = SNAPSHOT_DIR):
+        self.path = Path(root) / BUILDER_LOCK
+        self._fh  = None
+
+    @property
+    def held(self) -> bool:
+        return self._fh is not None
+
+    def acquire(self) -> bool:
+        """Try to become the builder; True if this process holds the lease."""
+        if self._fh is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fh = open(self.path, 'a+')
+        if fcntl is not None:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                fh.close()
+                return False
+        fh.seek(0)
+        fh.truncate()
+        fh.write(str(os.getpid()))
+        fh.flush()
+        self._fh = fh
+        return True
+
+    def release(self) -> None:
+        if self._fh is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        self._fh.close()
+        self._fh = None
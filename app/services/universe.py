@@ -0,0 +1,190 @@
+"""
+Universe Changes
+----------------
+Add / remove tickers on a live RecommenderSnapshot without a full rebuild.
+
+A full build refits the feature pipeline, re-runs KMeans and recomputes
+every N x N matrix. For a change of k tickers almost all of that is
+wasted work:
+
+  add     the caller scales the new rows with the *fitted* pipeline and
+          assigns them to the nearest existing KMeans centroid; here only
+          the k new rows / columns of the similarity matrices are
+          computed (k x N) — the old N x N block is copied across
+          unchanged — and merged into the neighbor lists
+  remove  rows / columns are dropped; nothing is recomputed
+
+Either way the result is a new snapshot for the next generation; the old
+one is never mutated, so in-flight requests are unaffected.
+
+Scaling new tickers with moments fitted on the old universe is an
+approximation that degrades as the universe drifts; refit_reasons()
+says when a full rebuild is warranted.
+"""
+
+from __future__ import annotations
+
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.core.memory import compact_frame
+from app.models.diversification import ReturnsMatrix
+from app.models.similarity import score_block
+from app.services.snapshot import RecommenderSnapshot
+
+# Refit warnings: share of the universe changed since the pipeline was
+# fitted, and scaled values this far outside the fitted distribution
+REFIT_DRIFT_RATIO = 0.10
+REFIT_MAX_ZSCORE  = 6.0
+
+
+def _grow_square(old: pd.DataFrame, block: np.ndarray, index: pd.Index) -> pd.DataFrame:
+    """
+    Symmetric (N+k) x (N+k) matrix from the old N x N one and the k new rows.
+
+    `block` is (k, N+k): the new tickers against old + new, in `index` order.
+    """
+    n, k   = len(old), len(block)
+    values = np.empty((n + k, n + k), dtype=old.to_numpy().dtype)
+    values[:n, :n] = old.to_numpy()
+    values[n:, :]  = block
+    values[:n, n:] = block[:, :n].T
+    return pd.DataFrame(values, index=index, columns=index, copy=False)
+
+
+def _carry_artifacts(snap: RecommenderSnapshot, cluster_model, **change) -> dict:
+    """Artifacts of a changed snapshot: the change itself + the cluster model."""
+    artifacts = {'universe_change': change}
+    model     = cluster_model if cluster_model is not None else snap.artifacts.get('cluster_model')
+    if model is not None:
+        artifacts['cluster_model'] = model
+    return artifacts
+
+
+def extend_snapshot(
+    snap: RecommenderSnapshot,
+    rows: pd.DataFrame,
+    scaled_rows: pd.DataFrame,
+    prices: pd.DataFrame,
+    generation: int,
+    cluster_model=None,
+) -> RecommenderSnapshot:
+    """
+    Snapshot with k new tickers appended.
+
+    Args:
+        snap:          current snapshot
+        rows:          combined_df rows for the new tickers, including
+                       cluster / cluster_label / exclusion_reason
+        scaled_rows:   the same tickers scaled with snap.feature_pipeline
+        prices:        their price history (any dates; aligned to snap.prices)
+        generation:    generation number of the new snapshot
+        cluster_model: ClusterModel that placed the new rows (default: the
+                       snapshot's, carried over unchanged)
+
+    Returns:
+        new RecommenderSnapshot (snap is left untouched)
+    """
+    new_index   = snap.combined_df.index.append(rows.index)
+    new_prices  = prices.reindex(index=snap.prices.index, columns=rows.index)
+    new_prices  = new_prices.astype(snap.prices.dtypes.iloc[0])
+    scaled_rows = scaled_rows[snap.scaled_df.columns].astype(snap.scaled_df.dtypes.iloc[0])
+    scaled_df   = pd.concat([snap.scaled_df, scaled_rows])
+
+    # Similarity: k x (N + k) scores, spliced around the unchanged block (dense only)
+    similarity = dict.fromkeys(snap.similarity_mats)
+    if any(mat is not None for mat in snap.similarity_mats.values()):
+        blocks     = score_block(scaled_rows, scaled_df)
+        similarity = {
+            key: _grow_square(mat, blocks[key].to_numpy(), new_index) if mat is not None else None
+            for key, mat in snap.similarity_mats.items()
+        }
+    neighbors  = snap.neighbors.extended(scaled_df)
+
+    # Returns: each column is centred on its own history, so the new ones append as-is
+    returns    = snap.returns.extended(ReturnsMatrix(new_prices, rows.index))
+
+    # Categoricals with different categories concat to object — recompact
+    combined = pd.concat([snap.combined_df, rows.reindex(columns=snap.combined_df.columns)])
+    if snap.compact:
+        combined = compact_frame(combined)
+
+    reasons    = rows.get('exclusion_reason', pd.Series(None, index=rows.index, dtype=object))
+    investable = list(snap.investable_tickers) + reasons.index[reasons.isna()].tolist()
+
+    return RecommenderSnapshot(
+        prices             = pd.concat([snap.prices, new_prices], axis=1),
+        combined_df        = combined,
+        scaled_df          = scaled_df,
+        feature_pipeline   = snap.feature_pipeline,
+        similarity_mats    = similarity,
+        investable_tickers = investable,
+        generation         = generation,
+        built_at           = time.time(),
+        compact            = snap.compact,
+        neighbors          = neighbors,
+        returns            = returns,
+        artifacts          = _carry_artifacts(snap, cluster_model, added=list(rows.index)),
+    )
+
+
+def shrink_snapshot(
+    snap: RecommenderSnapshot,
+    tickers: list[str],
+    generation: int,
+) -> RecommenderSnapshot:
+    """Snapshot with `tickers` removed — pure row / column selection."""
+    drop = set(tickers)
+    keep = snap.combined_df.index[~snap.combined_df.index.isin(drop)]
+    pos  = snap.ticker_index.positions(keep)
+
+    def _square(mat: pd.DataFrame | None) -> pd.DataFrame | None:
+        if mat is None:
+            return None
+        values = mat.to_numpy().take(pos, axis=0).take(pos, axis=1)
+        return pd.DataFrame(values, index=keep, columns=keep, copy=False)
+
+    scaled_df = snap.scaled_df.loc[keep]
+    return RecommenderSnapshot(
+        prices             = snap.prices.drop(columns=[t for t in drop if t in snap.prices.columns]),
+        combined_df        = snap.combined_df.loc[keep],
+        scaled_df          = scaled_df,
+        feature_pipeline   = snap.feature_pipeline,
+        similarity_mats    = {k: _square(v) for k, v in snap.similarity_mats.items()},
+        investable_tickers = [t for t in snap.investable_tickers if t not in drop],
+        generation         = generation,
+        built_at           = time.time(),
+        compact            = snap.compact,
+        neighbors          = snap.neighbors.without(scaled_df),
+        returns            = snap.returns.subset(pos),
+        artifacts          = _carry_artifacts(snap, None, removed=sorted(drop)),
+    )
+
+
+def refit_reasons(snap: RecommenderSnapshot, scaled_rows: pd.DataFrame = None) -> list[str]:
+    """
+    Why the fitted feature pipeline / clusters should be rebuilt, if at all.
+
+    Returns:
+        human-readable reasons; empty when incremental changes are still fine
+    """
+    reasons     = []
+    fit_tickers = set(getattr(snap.feature_pipeline, 'fit_tickers', []) or [])
+    if fit_tickers:
+        changed = len(fit_tickers.symmetric_difference(snap.combined_df.index))
+        ratio   = changed / len(fit_tickers)
+        if ratio > REFIT_DRIFT_RATIO:
+            reasons.append(
+                f"{changed} tickers ({ratio:.0%}) changed since the scaler was fitted"
+            )
+    if scaled_rows is not None and len(scaled_rows):
+        extreme  = scaled_rows.abs().max(axis=1)
+        outliers = extreme[extreme > REFIT_MAX_ZSCORE]
+        if len(outliers):
+            reasons.append(
+                f"{', '.join(outliers.index)} outside the fitted feature range "
+                f"(|z| > {REFIT_MAX_ZSCORE:g})"
+            )
+    return reasons
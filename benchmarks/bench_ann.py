@@ -0,0 +1,105 @@
+"""
+Approximate Neighbor Benchmark
+------------------------------
+Offline recall / latency of the LSHIndex (app/models/ann.py) against
+exact cosine similarity.
+
+The universe is a synthetic mixture of CENTERS Gaussian groups (real
+feature vectors cluster by sector and style; a structureless cloud is
+LSH's worst case). Ground truth for QUERIES sampled tickers is the
+combined score from sklearn's cosine_similarity on the fundamental and
+technical columns, blended 70/30. For each (tables, bits, probes)
+setting: build time, index memory, recall@10 of similar and of
+complementary queries, mean candidates re-ranked, and query latency —
+next to the exact O(N·d) scan that the index replaces.
+
+Run with:
+    uv run python -m benchmarks.bench_ann
+"""
+
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+
+from app.core.logger import get_logger
+from app.features.fundamentals import ENGINEERED_COLS, FUNDAMENTAL_COLS, TECHNICAL_COLS
+from app.models.ann import LSHIndex
+from app.models.similarity import FUNDAMENTAL_WEIGHT, TECHNICAL_WEIGHT, UnitEmbeddings
+
+UNIVERSE = (10000, 50000)
+CENTERS  = 200
+QUERIES  = 200
+TOP      = 10
+SETTINGS = (            # (tables, bits, probes)
+    (8,  14, 0),
+    (16, 12, 2),
+    (16, 10, 2),
+    (32, 12, 4),
+)
+
+get_logger('app.models.ann').setLevel('WARNING')
+
+
+def _universe(n: int, rng) -> pd.DataFrame:
+    cols    = FUNDAMENTAL_COLS + TECHNICAL_COLS + ENGINEERED_COLS
+    centers = rng.normal(scale=2.0, size=(CENTERS, len(cols)))
+    values  = centers[rng.integers(0, CENTERS, n)] + rng.normal(size=(n, len(cols)))
+    return pd.DataFrame(values, index=[f"T{i:06d}" for i in range(n)], columns=cols)
+
+
+def _exact_top(scaled: pd.DataFrame, queries: np.ndarray) -> tuple[list, list]:
+    """Exact most / least similar TOP per query, from sklearn cosine_similarity."""
+    fund  = scaled[FUNDAMENTAL_COLS].to_numpy()
+    tech  = scaled[TECHNICAL_COLS].to_numpy()
+    score = (
+        FUNDAMENTAL_WEIGHT * cosine_similarity(fund[queries], fund) +
+        TECHNICAL_WEIGHT   * cosine_similarity(tech[queries], tech)
+    )
+    score[np.arange(len(queries)), queries] = np.nan
+    high  = [set(np.argsort(-np.nan_to_num(r, nan=-np.inf))[:TOP]) for r in score]
+    low   = [set(np.argsort(np.nan_to_num(r, nan=np.inf))[:TOP]) for r in score]
+    return high, low
+
+
+def _recall(index, tickers, queries, truth, largest: bool, **kwargs) -> tuple[float, float]:
+    """Mean recall@TOP and per-query latency (ms)."""
+    hits = 0
+    t0   = time.perf_counter()
+    for q, expected in zip(queries, truth):
+        found = index.neighbors(tickers[q], n=TOP, largest=largest, **kwargs).index
+        hits += len(expected & set(index.tickers.positions(found)))
+    return hits / (TOP * len(queries)), (time.perf_counter() - t0) / len(queries) * 1e3
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"  {'tickers':>8}  {'tables':>6}  {'bits':>4}  {'probes':>6}  {'build (s)':>9}  {'MB':>6}  "
+          f"{'cands':>6}  {'recall sim':>10}  {'recall comp':>11}  {'query (ms)':>10}")
+
+    for n in UNIVERSE:
+        scaled    = _universe(n, rng)
+        tickers   = scaled.index
+        queries   = rng.choice(n, QUERIES, replace=False)
+        high, low = _exact_top(scaled, queries)
+
+        exact       = UnitEmbeddings(scaled)
+        _, t_exact  = _recall(exact, tickers, queries[:20], high[:20], True)
+        print(f"  {n:>8}  {'exact O(N·d) scan':>40}  {'':>6}  {1.0:>10.3f}  {1.0:>11.3f}  {t_exact:>10.2f}")
+
+        for tables, bits, probes in SETTINGS:
+            t0    = time.perf_counter()
+            index = LSHIndex.build(scaled, n_tables=tables, n_bits=bits)
+            build = time.perf_counter() - t0
+            cands = np.mean([
+                len(index.candidates(index._embedding([q])[0], probes)) for q in queries[:50]
+            ])
+            r_sim, t_sim   = _recall(index, tickers, queries, high, True, probes=probes)
+            r_comp, t_comp = _recall(index, tickers, queries, low, False, probes=probes)
+            print(f"  {n:>8}  {tables:>6}  {bits:>4}  {probes:>6}  {build:>9.2f}  {index.nbytes / 1e6:>6.1f}  "
+                  f"{cands:>6.0f}  {r_sim:>10.3f}  {r_comp:>11.3f}  {(t_sim + t_comp) / 2:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,184 @@
+"""
+Clustering Benchmark
+--------------------
+Runtime and cluster quality of the two ClusterModel modes as the universe
+grows: full KMeans (n_init=10, the default) against MiniBatchKMeans.
+
+Quality is reported as
+  inertia     within-cluster sum of squares on the full weighted matrix
+              (lower is better; minibatch is usually a few % higher)
+  silhouette  on a fixed random sample of SILHOUETTE_SAMPLE rows (the
+              full score is O(N^2)); higher is better
+
+The last column times partial_fit + predict for ADDED new tickers, the
+incremental path used by add_tickers() in minibatch mode.
+
+A second table simulates a daily rebuild (features nudged by DRIFT
+standard deviations): a cold refit against a warm start from the
+previous centroids (n_init=1 + Hungarian renumbering), with the share
+of tickers whose cluster id changed.
+
+A third table times automatic k selection (app/models/k_selection.py):
+one fit at the default k against a sweep over SWEEP_KS, serially and
+with one worker process per k. The parallel speedup is bounded by the
+cores available (printed in the header).
+
+The last table is the per-request cost of placing tickers with a fitted
+model (/cluster): sklearn's KMeans.predict against ClusterModel.assign,
+the numpy nearest-centroid lookup, for 1 and 100 rows.
+
+Run with:
+    uv run python -m benchmarks.bench_clustering
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+from sklearn.metrics import silhouette_score
+
+from app.features.fundamentals import FEATURE_COLS
+from app.models.clustering import (
+    DEFAULT_N_CLUSTERS, ClusterModel, _apply_weights, cluster_centroids, cluster_churn, match_clusters,
+)
+from app.models.k_selection import choose_k, sweep_k
+
+UNIVERSE          = (1000, 5000, 20000)
+SILHOUETTE_SAMPLE = 2000
+ADDED             = 10
+DRIFT             = 0.05
+SWEEP_KS          = tuple(range(4, 17))
+PLACE_ROWS        = (1, 100)
+PLACE_REPEATS     = 2000
+
+
+def _universe(n: int, rng) -> pd.DataFrame:
+    """Scaled features drawn from a few overlapping groups, like real factor data."""
+    groups  = rng.normal(scale=1.5, size=(12, len(FEATURE_COLS)))
+    members = rng.integers(0, len(groups), n)
+    values  = groups[members] + rng.normal(size=(n, len(FEATURE_COLS)))
+    return pd.DataFrame(values, index=[f"T{i:05d}" for i in range(n)], columns=FEATURE_COLS)
+
+
+def _quality(scaled: pd.DataFrame, model: ClusterModel, ids: np.ndarray) -> tuple[float, float]:
+    weighted = _apply_weights(scaled).to_numpy()
+    inertia  = float(((weighted - model.centroids.to_numpy()[ids]) ** 2).sum())
+    sample   = min(SILHOUETTE_SAMPLE, len(weighted))
+    return inertia, silhouette_score(weighted, ids, sample_size=sample, random_state=0)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"k = {DEFAULT_N_CLUSTERS}, {len(FEATURE_COLS)} features, silhouette on {SILHOUETTE_SAMPLE} rows\n")
+    print(
+        f"  {'tickers':>8}  {'mode':>9}  {'fit (s)':>8}  {'inertia':>10}  "
+        f"{'silhouette':>10}  {f'+{ADDED} (ms)':>10}"
+    )
+
+    for n in UNIVERSE:
+        scaled = _universe(n + ADDED, rng)
+        base, new = scaled.iloc[:n], scaled.iloc[n:]
+        for mode in ('kmeans', 'minibatch'):
+            model = ClusterModel(DEFAULT_N_CLUSTERS, mode=mode)
+
+            t0 = time.perf_counter()
+            ids = model.fit_predict(base)
+            t_fit = time.perf_counter() - t0
+
+            inertia, silhouette = _quality(base, model, ids)
+
+            if mode == 'minibatch':
+                t0 = time.perf_counter()
+                model.partial_fit(new).predict(new)
+                t_add = f"{(time.perf_counter() - t0) * 1e3:.1f}"
+            else:
+                t_add = '-'
+
+            print(
+                f"  {n:>8}  {mode:>9}  {t_fit:>8.3f}  {inertia:>10.0f}  "
+                f"{silhouette:>10.3f}  {t_add:>10}"
+            )
+
+
+def rebuild_table():
+    rng = np.random.default_rng(1)
+    print(f"\nDaily rebuild (drift {DRIFT} sd), kmeans mode\n")
+    print(f"  {'tickers':>8}  {'cold (s)':>9}  {'cold churn':>10}  {'warm (s)':>9}  {'warm churn':>10}")
+
+    for n in UNIVERSE:
+        today     = _universe(n, rng)
+        previous  = pd.Series(ClusterModel().fit_predict(today), index=today.index)
+        centroids = cluster_centroids(today, previous)
+        tomorrow  = today + rng.normal(scale=DRIFT, size=today.shape)
+
+        t0 = time.perf_counter()
+        cold = ClusterModel().fit_predict(tomorrow)
+        t_cold = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        model = ClusterModel()
+        warm  = model.fit_predict(tomorrow, init=centroids)
+        warm  = match_clusters(model.centroids, centroids)[warm]
+        t_warm = time.perf_counter() - t0
+
+        cold_churn = cluster_churn(previous, pd.Series(cold, index=today.index))['churn']
+        warm_churn = cluster_churn(previous, pd.Series(warm, index=today.index))['churn']
+        print(f"  {n:>8}  {t_cold:>9.3f}  {cold_churn:>10.1%}  {t_warm:>9.3f}  {warm_churn:>10.1%}")
+
+
+def sweep_table():
+    rng = np.random.default_rng(2)
+    print(f"\nk sweep {SWEEP_KS[0]}..{SWEEP_KS[-1]}, kmeans mode, {os.cpu_count()} cpu(s)\n")
+    print(
+        f"  {'tickers':>8}  {'one fit (s)':>11}  {'serial (s)':>10}  "
+        f"{'parallel (s)':>12}  {'silhouette k':>12}  {'elbow k':>7}"
+    )
+
+    for n in UNIVERSE:
+        scaled = _universe(n, rng)
+
+        t0 = time.perf_counter()
+        ClusterModel().fit_predict(scaled)
+        t_one = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        sweep_k(scaled, SWEEP_KS, max_workers=1, use_processes=False)
+        t_serial = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        sweep = sweep_k(scaled, SWEEP_KS, max_workers=len(SWEEP_KS))
+        t_parallel = time.perf_counter() - t0
+
+        print(
+            f"  {n:>8}  {t_one:>11.3f}  {t_serial:>10.3f}  {t_parallel:>12.3f}  "
+            f"{choose_k(sweep, 'silhouette'):>12}  {choose_k(sweep, 'elbow'):>7}"
+        )
+
+
+def _per_call_us(fn) -> float:
+    t0 = time.perf_counter()
+    for _ in range(PLACE_REPEATS):
+        fn()
+    return (time.perf_counter() - t0) / PLACE_REPEATS * 1e6
+
+
+def place_table():
+    rng   = np.random.default_rng(3)
+    base  = _universe(5000, rng)
+    model = ClusterModel()
+    model.fit_predict(base)
+    print(f"\nPlacing tickers with a fitted model (k = {DEFAULT_N_CLUSTERS})\n")
+    print(f"  {'rows':>5}  {'sklearn predict (us)':>20}  {'assign (us)':>11}")
+
+    for rows in PLACE_ROWS:
+        scaled = _universe(rows, rng)
+        t_sk   = _per_call_us(lambda: model.estimator.predict(_apply_weights(scaled)[model.columns].to_numpy()))
+        t_np   = _per_call_us(lambda: model.assign(scaled))
+        print(f"  {rows:>5}  {t_sk:>20.0f}  {t_np:>11.0f}")
+
+
+if __name__ == '__main__':
+    main()
+    rebuild_table()
+    sweep_table()
+    place_table()
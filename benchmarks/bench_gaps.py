@@ -0,0 +1,102 @@
+"""
+Gaps Benchmark
+--------------
+Per-request cost of gaps() scoring: the old per-ticker pandas loop
+(pct_change + Series.corr for every candidate) against one pass of
+matrix-vector products over the precomputed ReturnsMatrix.
+
+The returns matrix is built once per snapshot; its build time is shown
+separately and is not part of the request path.
+
+A second table times a full weighted request (correlation, marginal
+volatility and the exact rank-one volatility change, with Sigma w taken
+straight from the returns matrix) for large portfolios, next to building
+the dense N x N covariance the request no longer needs.
+
+Run with:
+    uv run python -m benchmarks.bench_gaps
+"""
+
+import time
+import numpy as np
+import pandas as pd
+
+from app.models.diversification import (
+    ReturnsMatrix, covariance_matrix, lowest_n, marginal_volatility, volatility_change,
+)
+
+N_DATES   = 1256      # 5 years of trading days
+UNIVERSE  = (500, 1500, 3000)
+PORTFOLIO = 10
+HOLDINGS  = (50, 200, 500)
+TOP_N     = 5
+REPEATS   = 3
+
+
+def _timed(fn, repeats: int = REPEATS) -> float:
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _loop(prices: pd.DataFrame, portfolio: list[str]):
+    port = prices[portfolio].pct_change().dropna().mean(axis=1)
+    corr = {
+        t: prices[t].pct_change().dropna().corr(port)
+        for t in prices.columns if t not in portfolio
+    }
+    return pd.Series(corr).sort_values().head(TOP_N)
+
+
+def _vectorized(matrix: ReturnsMatrix, holdings: np.ndarray):
+    rows, target = matrix.portfolio_returns(holdings)
+    return lowest_n(matrix.correlations(rows, target), TOP_N, exclude=holdings)
+
+
+def _weighted(matrix: ReturnsMatrix, holdings: np.ndarray, w: np.ndarray):
+    rows, target = matrix.portfolio_returns(holdings, w)
+    matrix.correlations(rows, target)
+    marginal_volatility(matrix, holdings, w)
+    delta, _     = volatility_change(matrix, holdings, w, 0.05)
+    return lowest_n(delta, TOP_N, exclude=holdings)
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{N_DATES} dates, {PORTFOLIO}-ticker portfolio, top {TOP_N}\n")
+    print(f"  {'tickers':>8}  {'loop (s)':>9}  {'matrix (s)':>11}  {'speedup':>8}  {'build (s)':>10}")
+
+    for n in UNIVERSE:
+        tickers = [f"T{i:05d}" for i in range(n)]
+        prices  = pd.DataFrame(
+            100 * np.cumprod(1 + rng.normal(0.0004, 0.02, (N_DATES, n)), axis=0),
+            index=pd.bdate_range('2020-01-01', periods=N_DATES), columns=tickers,
+        )
+        prices.iloc[:300, ::17] = np.nan     # some late listings -> masked path
+        portfolio = tickers[:PORTFOLIO]
+        holdings  = np.arange(PORTFOLIO)
+
+        t_build = _timed(lambda: ReturnsMatrix(prices, tickers), repeats=1)
+        matrix  = ReturnsMatrix(prices, tickers)
+        t_loop  = _timed(lambda: _loop(prices, portfolio), repeats=1)
+        t_vec   = _timed(lambda: _vectorized(matrix, holdings))
+        print(
+            f"  {n:>8}  {t_loop:>9.3f}  {t_vec:>11.4f}  "
+            f"{t_loop / t_vec:>7.0f}x  {t_build:>10.3f}"
+        )
+
+    t_cov = _timed(lambda: covariance_matrix(matrix), repeats=1)
+    print(f"\nWeighted request, {n} tickers (dense N x N covariance would take {t_cov:.2f}s)\n")
+    print(f"  {'holdings':>8}  {'gapped':>7}  {'request (s)':>12}")
+    for k in HOLDINGS:
+        holdings = rng.choice(n, k, replace=False)
+        w        = rng.dirichlet(np.ones(k))
+        gapped   = int((holdings % 17 == 0).sum())
+        print(f"  {k:>8}  {gapped:>7}  {_timed(lambda: _weighted(matrix, holdings, w)):>12.4f}")
+
+
+if __name__ == '__main__':
+    main()
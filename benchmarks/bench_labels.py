@@ -0,0 +1,84 @@
+"""
+Cluster Label Benchmark
+-----------------------
+Cost of labelling the universe: the old per-row function applied with
+DataFrame.apply(axis=1) (nine row.get calls and a fresh sector dict per
+ticker) against label_tickers(), which evaluates the LabelRules table as
+whole-column masks and picks the first match with np.select.
+
+Run with:
+    uv run python -m benchmarks.bench_labels
+"""
+
+import time
+import numpy as np
+import pandas as pd
+
+from app.models.clustering import SECTOR_LABELS, label_tickers
+
+UNIVERSE = (1000, 10000, 100000)
+SECTORS  = list(SECTOR_LABELS) + ['Basic Materials']
+
+
+def _loop_label(row: pd.Series) -> str:
+    eps        = row.get('eps_ttm',        np.nan)
+    de         = row.get('debt_to_equity', np.nan)
+    rev_growth = row.get('revenue_growth', np.nan)
+    pe         = row.get('pe_ratio',       np.nan)
+    beta       = row.get('beta',           np.nan)
+    roe        = row.get('roe',            np.nan)
+    div        = row.get('dividend_yield', np.nan)
+    sector     = row.get('sector',         '')
+
+    if pd.notna(eps) and eps <= 0:
+        return 'Distressed'
+    if pd.notna(de) and de < -3:
+        return 'Negative Equity'
+    if pd.notna(rev_growth) and rev_growth > 0.50:
+        return 'Hypergrowth'
+    if pd.notna(pe) and pd.notna(beta) and pe > 150 and beta > 1.5:
+        return 'Speculative'
+    if pd.notna(roe) and pd.notna(rev_growth) and roe > 0.25 and rev_growth > 0.10:
+        return 'Quality Growth'
+    if pd.notna(beta) and pd.notna(div) and beta < 0.7 and div > 0.015:
+        return 'Defensive Income'
+    sector_map = dict(SECTOR_LABELS)
+    if sector in sector_map:
+        return sector_map[sector]
+    return 'Blend'
+
+
+def _universe(n: int, rng) -> pd.DataFrame:
+    return pd.DataFrame({
+        'pe_ratio':       rng.lognormal(3.0, 0.8, n),
+        'roe':            rng.normal(0.15, 0.12, n),
+        'debt_to_equity': rng.normal(1.0, 1.5, n),
+        'revenue_growth': rng.normal(0.08, 0.2, n),
+        'dividend_yield': rng.uniform(0.0, 0.05, n),
+        'beta':           rng.uniform(0.4, 2.0, n),
+        'eps_ttm':        rng.normal(4.0, 4.0, n),
+        'sector':         rng.choice(SECTORS, n),
+    }, index=[f"T{i:06d}" for i in range(n)])
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"  {'tickers':>8}  {'apply (s)':>10}  {'np.select (s)':>14}  {'speedup':>8}")
+
+    for n in UNIVERSE:
+        combined = _universe(n, rng)
+
+        t0 = time.perf_counter()
+        expected = combined.apply(_loop_label, axis=1)
+        t_loop = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        labels = label_tickers(combined)
+        t_vec = time.perf_counter() - t0
+
+        assert (labels == expected).all()
+        print(f"  {n:>8}  {t_loop:>10.3f}  {t_vec:>14.4f}  {t_loop / t_vec:>7.0f}x")
+
+
+if __name__ == '__main__':
+    main()
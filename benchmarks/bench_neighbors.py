@@ -0,0 +1,121 @@
+"""
+Neighbor Index Benchmark
+------------------------
+Cost of answering similar / complementary queries from the three dense
+N x N similarity matrices (build_similarity_matrices) against the top-k
+NeighborIndex (NeighborIndex.build, blocked, k per ticker each way).
+
+For each universe size: build time, peak traced memory during the build,
+memory held afterwards, and the latency of one get_similar_stocks query.
+The dense build is skipped above DENSE_MAX tickers — three float64
+20,000² matrices alone are 9.6 GB.
+
+blend_table(): a different fundamental / technical blend. With the dense
+matrices that is a rebuild; with the index it is a query-time
+fund_weight — per single query, and per query when BATCH queries are
+scored together with get_similar_stocks_batch.
+
+Run with:
+    uv run python -m benchmarks.bench_neighbors
+"""
+
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from app.core.logger import get_logger
+from app.features.fundamentals import ENGINEERED_COLS, FUNDAMENTAL_COLS, TECHNICAL_COLS
+from app.models.similarity import (
+    NeighborIndex, build_similarity_matrices, get_similar_stocks, get_similar_stocks_batch,
+)
+
+UNIVERSE  = (1000, 5000, 20000)
+DENSE_MAX = 5000
+QUERIES   = 50
+BATCH     = 500
+
+get_logger('app.models.similarity').setLevel('WARNING')
+
+
+def _traced(fn):
+    """fn() with its wall time and peak traced allocation (MB)."""
+    tracemalloc.start()
+    t0     = time.perf_counter()
+    result = fn()
+    wall   = time.perf_counter() - t0
+    peak   = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return result, wall, peak
+
+
+def _query_ms(source, combined: pd.DataFrame) -> float:
+    tickers = combined.index[:QUERIES]
+    t0 = time.perf_counter()
+    for ticker in tickers:
+        get_similar_stocks(ticker, source, combined, top_n=5)
+    return (time.perf_counter() - t0) / len(tickers) * 1e3
+
+
+def main():
+    rng  = np.random.default_rng(0)
+    cols = FUNDAMENTAL_COLS + TECHNICAL_COLS + ENGINEERED_COLS
+    print(f"  {'tickers':>8}  {'kind':>6}  {'build (s)':>10}  {'peak (MB)':>10}  "
+          f"{'held (MB)':>10}  {'query (ms)':>10}")
+
+    for n in UNIVERSE:
+        tickers  = [f"T{i:05d}" for i in range(n)]
+        scaled   = pd.DataFrame(rng.normal(size=(n, len(cols))), index=tickers, columns=cols)
+        combined = pd.DataFrame({'sector': 'Technology', 'cluster_label': 'Blend'}, index=tickers)
+
+        index, t_index, peak_index = _traced(lambda: NeighborIndex.build(scaled))
+        q_index = _query_ms(index, combined)
+
+        if n <= DENSE_MAX:
+            mats, t_dense, peak_dense = _traced(lambda: build_similarity_matrices(scaled))
+            held_dense = sum(m.to_numpy().nbytes for m in mats.values()) / 1e6
+            q_dense    = _query_ms(mats['combined'], combined)
+            expected   = get_similar_stocks(tickers[0], mats['combined'], combined, top_n=5)
+            assert list(get_similar_stocks(tickers[0], index, combined, top_n=5).index) == list(expected.index)
+            del mats
+            print(f"  {n:>8}  {'dense':>6}  {t_dense:>10.2f}  {peak_dense:>10.0f}  "
+                  f"{held_dense:>10.0f}  {q_dense:>10.3f}")
+        print(f"  {n:>8}  {'top-k':>6}  {t_index:>10.2f}  {peak_index:>10.0f}  "
+              f"{index.nbytes / 1e6:>10.1f}  {q_index:>10.3f}")
+
+
+def blend_table():
+    rng  = np.random.default_rng(1)
+    cols = FUNDAMENTAL_COLS + TECHNICAL_COLS + ENGINEERED_COLS
+    print(f"\nRe-blending at fund_weight=0.5 ({BATCH}-ticker batch)\n")
+    print(f"  {'tickers':>8}  {'dense rebuild (s)':>17}  {'single (ms)':>11}  {'batch (ms/query)':>16}")
+
+    for n in UNIVERSE:
+        tickers  = [f"T{i:05d}" for i in range(n)]
+        scaled   = pd.DataFrame(rng.normal(size=(n, len(cols))), index=tickers, columns=cols)
+        combined = pd.DataFrame({'sector': 'Technology', 'cluster_label': 'Blend'}, index=tickers)
+        index    = NeighborIndex.build(scaled)
+        queries  = tickers[:BATCH]
+
+        rebuild = '-'
+        if n <= DENSE_MAX:
+            t0 = time.perf_counter()
+            build_similarity_matrices(scaled)
+            rebuild = f"{time.perf_counter() - t0:.2f}"
+
+        t0 = time.perf_counter()
+        for ticker in queries[:QUERIES]:
+            get_similar_stocks(ticker, index, combined, top_n=5, fund_weight=0.5)
+        single = (time.perf_counter() - t0) / QUERIES * 1e3
+
+        t0 = time.perf_counter()
+        get_similar_stocks_batch(queries, index, combined, top_n=5, fund_weight=0.5)
+        batch = (time.perf_counter() - t0) / len(queries) * 1e3
+
+        print(f"  {n:>8}  {rebuild:>17}  {single:>11.2f}  {batch:>16.2f}")
+
+
+if __name__ == '__main__':
+    main()
+    blend_table()
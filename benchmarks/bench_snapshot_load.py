@@ -0,0 +1,83 @@
+"""
+Snapshot Cold-Start Benchmark
+-----------------------------
+Times saving and loading a full-size RecommenderSnapshot through
+SnapshotStore, i.e. what a worker pays at startup instead of a rebuild.
+
+Loading memory-maps the numeric blocks, so load time should stay well
+under a second and barely move with the universe size; the matrices are
+paged in on first touch. The "touch" column forces one full pass over
+the combined similarity matrix to show that deferred cost.
+
+Run with:
+    uv run python -m benchmarks.bench_snapshot_load
+"""
+
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+from app.models.diversification import ReturnsMatrix
+from app.models.similarity import NeighborIndex
+from app.services.snapshot import RecommenderSnapshot
+from app.services.snapshot_store import SnapshotStore
+
+N_DATES  = 1256      # 5 years of trading days
+N_FEATS  = 12
+UNIVERSE = (500, 1500, 3000)
+
+
+def _snapshot(n: int, rng) -> RecommenderSnapshot:
+    tickers  = [f"T{i:05d}" for i in range(n)]
+    dates    = pd.bdate_range('2020-01-01', periods=N_DATES)
+    prices   = pd.DataFrame(
+        100 * np.cumprod(1 + rng.normal(0.0004, 0.02, (N_DATES, n)), axis=0),
+        index=dates, columns=tickers,
+    )
+    features = pd.DataFrame(rng.normal(size=(n, N_FEATS)), index=tickers)
+    features.columns = [f"f{i}" for i in range(N_FEATS)]
+    combined = features.assign(sector='Tech', cluster=0, cluster_label='Value')
+    sim      = pd.DataFrame(np.corrcoef(features.to_numpy()), index=tickers, columns=tickers)
+    return RecommenderSnapshot(
+        prices             = prices,
+        combined_df        = combined,
+        scaled_df          = features,
+        feature_pipeline   = None,
+        similarity_mats    = {'fundamental': sim, 'technical': sim, 'combined': sim},
+        investable_tickers = tickers,
+        generation         = 1,
+        built_at           = time.time(),
+        neighbors          = NeighborIndex.build(features),
+        returns            = ReturnsMatrix(prices, tickers),
+    )
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{N_DATES} dates, 3 similarity matrices\n")
+    print(f"  {'tickers':>8}  {'save (s)':>9}  {'load (s)':>9}  {'touch (s)':>10}")
+
+    for n in UNIVERSE:
+        snapshot = _snapshot(n, rng)
+        with tempfile.TemporaryDirectory() as root:
+            store = SnapshotStore(root)
+
+            t0 = time.perf_counter()
+            store.save(snapshot)
+            t_save = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            loaded = store.load()
+            t_load = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            float(loaded.similarity_df.to_numpy().sum())
+            t_touch = time.perf_counter() - t0
+            del loaded
+
+        print(f"  {n:>8}  {t_save:>9.3f}  {t_load:>9.3f}  {t_touch:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
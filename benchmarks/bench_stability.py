@@ -0,0 +1,60 @@
+"""
+Cluster Stability Benchmark
+---------------------------
+Wall time of bootstrap_stability() (app/evaluation/stability.py) as the
+universe grows: one worker against one worker process per core. The
+replicates are independent KMeans fits, so the pooled run should scale
+with the cores available (printed in the header) until the N x N
+co-assignment accumulation in the parent dominates.
+
+Run with:
+    uv run python -m benchmarks.bench_stability
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+
+from app.features.fundamentals import FEATURE_COLS
+from app.models.clustering import DEFAULT_N_CLUSTERS, ClusterModel
+from app.evaluation.stability import bootstrap_stability
+
+UNIVERSE = (200, 1000, 3000)
+N_BOOT   = 50
+
+
+def _universe(n: int, rng) -> pd.DataFrame:
+    groups  = rng.normal(scale=1.5, size=(12, len(FEATURE_COLS)))
+    members = rng.integers(0, len(groups), n)
+    values  = groups[members] + rng.normal(size=(n, len(FEATURE_COLS)))
+    return pd.DataFrame(values, index=[f"T{i:05d}" for i in range(n)], columns=FEATURE_COLS)
+
+
+def main():
+    rng     = np.random.default_rng(0)
+    workers = os.cpu_count() or 1
+    print(f"{N_BOOT} replicates, k = {DEFAULT_N_CLUSTERS}, {workers} cpu(s)\n")
+    print(f"  {'tickers':>8}  {'1 worker (s)':>12}  {f'{workers} procs (s)':>12}  {'stability':>9}  {'ARI':>5}")
+
+    for n in UNIVERSE:
+        scaled = _universe(n, rng)
+        ids    = pd.Series(ClusterModel().fit_predict(scaled), index=scaled.index)
+
+        t0 = time.perf_counter()
+        bootstrap_stability(scaled, ids, n_boot=N_BOOT, max_workers=1, use_processes=False)
+        t_serial = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        result = bootstrap_stability(scaled, ids, n_boot=N_BOOT, max_workers=workers)
+        t_pool = time.perf_counter() - t0
+
+        summary = result['summary']
+        print(
+            f"  {n:>8}  {t_serial:>12.2f}  {t_pool:>12.2f}  "
+            f"{summary['mean_stability']:>9.2f}  {summary['ari_mean']:>5.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""
+Technical Horizon Benchmark
+---------------------------
+Shows how the cost of the multi-horizon engine grows with the number of
+horizons, against one pandas rolling call per horizon.
+
+The engine pays for its cumulative sums once; each extra horizon is two
+gathers per ticker, so per-horizon cost should flatten out while the
+pandas baseline grows linearly.
+
+Run with:
+    uv run python -m benchmarks.bench_technical_horizons
+"""
+
+import time
+import numpy as np
+import pandas as pd
+
+from app.features.technical import _compact, _feature_block
+
+N_DATES   = 1256      # 5 years of trading days
+N_TICKERS = 3000
+REPEATS   = 3
+
+
+def _timed(fn) -> float:
+    best = float('inf')
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _engine(packed, ends, windows):
+    _feature_block(
+        packed, ends,
+        momentum={f'mom_{w}': w for w in windows},
+        skip_momentum={},
+        vol_windows={f'vol_{w}': w for w in windows},
+        downside_windows={},
+    )
+
+
+def _pandas_baseline(prices, windows):
+    log_ret = np.log(prices).diff()
+    for w in windows:
+        prices.pct_change(w, fill_method=None).iloc[-1]
+        log_ret.rolling(w).std().iloc[-1]
+
+
+def main():
+    rng    = np.random.default_rng(0)
+    prices = pd.DataFrame(
+        100 * np.cumprod(1 + rng.normal(0.0004, 0.02, (N_DATES, N_TICKERS)), axis=0)
+    )
+    packed, counts = _compact(prices.to_numpy())
+    ends           = (counts - 1)[None, :]
+
+    print(f"{N_DATES} dates x {N_TICKERS} tickers, best of {REPEATS}\n")
+    print(f"  {'horizons':>8}  {'engine (s)':>11}  {'per horizon':>12}  {'pandas (s)':>11}  {'per horizon':>12}")
+
+    all_windows = [5, 10, 21, 42, 63, 126, 189, 252]
+    for k in (1, 2, 4, 8):
+        windows = all_windows[:k]
+        t_eng   = _timed(lambda: _engine(packed, ends, windows))
+        t_pd    = _timed(lambda: _pandas_baseline(prices, windows))
+        print(
+            f"  {2 * k:>8}  {t_eng:>11.3f}  {t_eng / (2 * k):>12.4f}  "
+            f"{t_pd:>11.3f}  {t_pd / (2 * k):>12.4f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
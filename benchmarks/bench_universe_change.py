@@ -0,0 +1,88 @@
+"""
+Universe Change Benchmark
+-------------------------
+Cost of adding tickers to a live universe: the incremental splice in
+app/services/universe.py (k x N similarity rows, old N x N block
+copied) against recomputing the same matrices from scratch, which
+is what a full build() pays on top of refetching every symbol.
+
+Fetching, feature engineering and scaling of the new symbols are the
+same in both cases and are left out. What a full build() additionally
+pays — refetching all N symbols, refitting the scaler, KMeans — is
+network-bound (minutes at N = 2,000) and is not simulated here; the
+splice is bounded by copying the old matrices into the grown ones.
+
+Run with:
+    uv run python -m benchmarks.bench_universe_change
+"""
+
+import time
+import numpy as np
+import pandas as pd
+
+from app.features.fundamentals import FEATURE_COLS
+from app.models.diversification import ReturnsMatrix
+from app.models.similarity import NeighborIndex, build_similarity_matrices
+from app.services.snapshot import RecommenderSnapshot
+from app.services.universe import extend_snapshot, shrink_snapshot
+
+N_DATES  = 1256      # 5 years of trading days
+UNIVERSE = (500, 1000, 2000)
+ADDED    = (1, 10)
+
+
+def _universe(n: int, rng) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    tickers = [f"T{i:05d}" for i in range(n)]
+    dates   = pd.bdate_range('2020-01-01', periods=N_DATES)
+    prices  = pd.DataFrame(
+        100 * np.cumprod(1 + rng.normal(0.0004, 0.02, (N_DATES, n)), axis=0),
+        index=dates, columns=tickers,
+    )
+    scaled   = pd.DataFrame(rng.normal(size=(n, len(FEATURE_COLS))), index=tickers, columns=FEATURE_COLS)
+    combined = scaled.assign(
+        sector='Tech', cluster=rng.integers(0, 8, n), cluster_label='Value', exclusion_reason=None,
+    )
+    return prices, combined, scaled
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{N_DATES} dates, 3 similarity matrices + returns matrix\n")
+    print(f"  {'tickers':>8}  {'added':>6}  {'full (s)':>9}  {'splice (s)':>11}  {'remove (s)':>11}")
+
+    for n in UNIVERSE:
+        prices, combined, scaled = _universe(n + max(ADDED), rng)
+        for k in ADDED:
+            old, new = combined.index[:n], combined.index[n:n + k]
+            snap     = RecommenderSnapshot(
+                prices             = prices[old],
+                combined_df        = combined.loc[old],
+                scaled_df          = scaled.loc[old],
+                feature_pipeline   = None,
+                similarity_mats    = build_similarity_matrices(scaled.loc[old]),
+                investable_tickers = list(old),
+                generation         = 1,
+                built_at           = time.time(),
+                neighbors          = NeighborIndex.build(scaled.loc[old]),
+                returns            = ReturnsMatrix(prices[old], old),
+            )
+            grown = old.append(new)
+
+            t0 = time.perf_counter()
+            build_similarity_matrices(scaled.loc[grown])
+            ReturnsMatrix(prices[grown], grown)
+            t_full = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            extended = extend_snapshot(snap, combined.loc[new], scaled.loc[new], prices[new], 2)
+            t_splice = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            shrink_snapshot(extended, list(new), 3)
+            t_remove = time.perf_counter() - t0
+
+            print(f"  {n:>8}  {k:>6}  {t_full:>9.3f}  {t_splice:>11.3f}  {t_remove:>11.3f}")
+
+
+if __name__ == '__main__':
+    main()
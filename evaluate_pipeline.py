@@ -4,7 +4,7 @@ Full Pipeline Evaluation
 End-to-end evaluation of the stock recommender pipeline:
   1. Data pipeline health check
   2. Feature pipeline validation
-  3. Clustering quality
+  3. Clustering quality and bootstrap stability
   4. Similarity sanity check
   5. Walk-forward backtest (all 3 risk profiles)
   6. Realized vs predicted metrics
@@ -25,13 +25,11 @@ import numpy as np
 
 from app.core.config import settings
 from app.core.logger import get_logger
-from app.data.fetcher import fetch_prices, fetch_fundamentals
-from app.features.technical import compute_technical_features
-from app.features.fundamentals import merge_features, scale_features
-from app.models.clustering import cluster_stocks, get_cluster_stats
-from app.models.similarity import build_similarity_matrices, get_similar_stocks
+from app.models.clustering import get_cluster_stats
+from app.models.similarity import get_similar_stocks
 from app.models.optimizer import optimize_portfolio
 from app.evaluation.backtester import backtest_optimizer, compute_portfolio_metrics
+from app.evaluation.stability import UNSTABLE_BELOW
 from app.services.recommender import recommender
 
 log = get_logger(__name__)
@@ -57,10 +55,14 @@ def info(msg: str): print(f"         {msg}")
 section("1 / DATA PIPELINE")
 t0 = time.time()
 
-prices = fetch_prices(settings.tickers, period='5y')
+# One build; every later section reads its artifacts instead of re-running
+# the stages (unchanged stages are loaded from the stage cache)
+recommender.build()
+
+prices = recommender.prices
 ok(f"Prices fetched — {len(prices.columns)} tickers, {len(prices)} trading days")
 
-funds = fetch_fundamentals(settings.tickers)
+funds = recommender.artifacts['fundamentals']
 ok(f"Fundamentals fetched — {len(funds)} tickers, {len(funds.columns)} fields")
 
 missing_prices = [t for t in settings.tickers if t not in prices.columns]
@@ -75,17 +77,24 @@ if nan_pct > 20:
 else:
     ok(f"Fundamentals NaN rate: {nan_pct:.1f}%")
 
-info(f"Data fetch time: {time.time()-t0:.1f}s")
+info(f"Build time: {time.time()-t0:.1f}s")
+for r in recommender.artifacts['stage_report']:
+    info(f"  stage {r['stage']:<13} {r['status']:<5} {r['seconds']:.2f}s")
+dag = recommender.artifacts['dag_report']
+info(
+    f"Critical path: {' -> '.join(dag['critical_path'])} "
+    f"({dag['critical_path_seconds']:.2f}s of {dag['stage_seconds_sum']:.2f}s total stage time)"
+)
 
 
 # ── 2. Feature pipeline ───────────────────────────────────────────────────────
 
 section("2 / FEATURE PIPELINE")
 
-tech   = compute_technical_features(prices)
+tech   = recommender.artifacts['technical']
 ok(f"Technical features — {len(tech)} tickers, {len(tech.columns)} features")
 
-merged = merge_features(funds, tech)
+merged = recommender.artifacts['merged']
 ok(f"Merged shape: {merged.shape}")
 
 if len(merged) < len(funds) * 0.8:
@@ -93,7 +102,7 @@ if len(merged) < len(funds) * 0.8:
 else:
     ok(f"Inner join retained {len(merged)}/{len(funds)} tickers")
 
-scaled, scaler, imputer = scale_features(merged)
+scaled = recommender.scaled_df
 ok(f"Scaled shape: {scaled.shape}")
 
 nan_after_scale = scaled.isna().sum().sum()
@@ -113,7 +122,7 @@ else:
 
 section("3 / CLUSTERING")
 
-clustered = cluster_stocks(scaled, merged)
+clustered = recommender.combined_df
 
 label_counts = clustered['cluster_label'].value_counts()
 info("Cluster label distribution:")
@@ -140,32 +149,45 @@ print(stats[['pe_ratio', 'revenue_growth', 'beta', 'roe']].to_string(
     float_format=lambda x: f'{x:.3f}'
 ))
 
+# Bootstrap stability: are the KMeans groupings structure or noise?
+stability = recommender.stability(wait=True)
+stab      = stability['summary']
+print(f"\n  Bootstrap stability ({stab['n_boot']} replicates, "
+      f"{stab['sample_frac']:.0%} tickers x {stab['feature_frac']:.0%} features, {stab['seconds']:.1f}s):")
+status = ok if stab['mean_stability'] >= UNSTABLE_BELOW else warn
+status(f"Mean ticker stability {stab['mean_stability']:.2f} (min {stab['min_stability']:.2f}), "
+       f"ARI vs built clusters {stab['ari_mean']:.2f} (p5 {stab['ari_p5']:.2f})")
+for cluster, row in stability['clusters'].iterrows():
+    members = stability['tickers'].index[stability['tickers']['cluster'] == cluster]
+    info(f"  cluster {cluster}: {row['stability']:.2f}  ({', '.join(members[:6])}{' ...' if len(members) > 6 else ''})")
+if stab['unstable']:
+    warn(f"Unstable tickers (< {UNSTABLE_BELOW}): {stab['unstable']}")
+
 
 # ── 4. Investable universe ────────────────────────────────────────────────────
 
 section("4 / INVESTABLE UNIVERSE")
 
-recommender.build()
 investable = recommender.investable_tickers
 excluded   = sorted(set(settings.tickers) - set(investable))
 
 ok(f"Investable tickers: {len(investable)} / {len(settings.tickers)}")
 if excluded:
     warn(f"Excluded from optimization: {excluded}")
+    reasons = recommender.combined_df['exclusion_reason']
     for t in excluded:
         row = merged.loc[t] if t in merged.index else None
         if row is not None:
             eps = row.get('eps_ttm', float('nan'))
             de  = row.get('debt_to_equity', float('nan'))
-            info(f"  {t}: eps_ttm={eps:.2f}, d/e={de:.2f}, label={clustered.loc[t,'cluster_label'] if t in clustered.index else 'N/A'}")
+            info(f"  {t}: {reasons.get(t)} — eps_ttm={eps:.2f}, d/e={de:.2f}, label={clustered.loc[t,'cluster_label'] if t in clustered.index else 'N/A'}")
 
 
 # ── 5. Similarity sanity check ────────────────────────────────────────────────
 
 section("5 / SIMILARITY SANITY CHECK")
 
-matrices = build_similarity_matrices(scaled)
-sim_df   = matrices['combined']
+neighbors = recommender.snapshot.neighbors
 
 test_pairs = [
     ('AAPL',  'MSFT',  'should be similar — both Quality Growth tech'),
@@ -175,10 +197,10 @@ test_pairs = [
 ]
 
 for t1, t2, note in test_pairs:
-    if t1 not in sim_df.index or t2 not in sim_df.index:
+    if t1 not in neighbors.tickers or t2 not in neighbors.tickers:
         warn(f"{t1}/{t2} not in universe — skipping")
         continue
-    score = sim_df.loc[t1, t2]
+    score = neighbors.score(t1, t2)
     status = ok if (
         ('similar' in note and score > 0.3) or
         ('dissimilar' in note and score < 0.3)
@@ -186,7 +208,7 @@ for t1, t2, note in test_pairs:
     status(f"{t1} <-> {t2}: {score:.3f}  ({note})")
 
 # Top 3 similar to AAPL
-aapl_similar = get_similar_stocks('AAPL', sim_df, clustered, top_n=3)
+aapl_similar = get_similar_stocks('AAPL', neighbors, clustered, top_n=3)
 info(f"\n  Top 3 similar to AAPL:")
 for ticker, row in aapl_similar.iterrows():
     info(f"  {ticker:6s} similarity={row['similarity']:.3f}  label={row.get('cluster_label','?')}")
@@ -295,6 +317,7 @@ scores['Ticker coverage']   = 'PASS' if not missing_prices else 'WARN'
 # Feature quality
 scores['Feature scaling']   = 'PASS' if nan_after_scale == 0 else 'FAIL'
 scores['Cluster quality']   = 'PASS' if len(singleton_clusters) <= 4 else 'WARN'
+scores['Cluster stability'] = 'PASS' if stab['mean_stability'] >= UNSTABLE_BELOW else 'WARN'
 
 # Backtest
 if 'moderate' in backtest_results:
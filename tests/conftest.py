@@ -7,6 +7,12 @@ from unittest.mock import patch, MagicMock
 
 TICKERS = ['AAPL', 'MSFT', 'JNJ', 'XOM']
 
+@pytest.fixture(autouse=True)
+def technical_state_in_tmp(tmp_path):
+    """Builds keep their IndicatorState under the test's tmp_path, not app/data/state."""
+    with patch('app.core.config.settings.technical_state_path', str(tmp_path / 'technical_state.npz')):
+        yield
+
 @pytest.fixture
 def sample_prices():
     """Fake price history for 4 stocks over 300 days"""
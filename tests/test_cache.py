@@ -240,4 +240,81 @@ def test_disk_cache_handles_corrupt_file(disk_cache, tmp_path):
     """Corrupt JSON file should return None gracefully."""
     corrupt = (tmp_path / 'cache' / 'corrupt.json')
     corrupt.write_text('{ not valid json }')
-    assert disk_cache.get('corrupt') is None
\ No newline at end of file
+    assert disk_cache.get('corrupt') is None
+
+# ── StageCache tests ──────────────────────────────────────────────────────────
+
+with patch('app.core.stage_cache.log'):
+    from app.core.stage_cache import StageCache, fingerprint
+
+
+def _double(df):
+    return df * 2
+
+
+@pytest.fixture
+def stage_cache(tmp_path):
+    return StageCache(cache_dir=str(tmp_path / 'stages'))
+
+
+@pytest.fixture
+def frame():
+    import pandas as pd
+    return pd.DataFrame({'a': [1.0, 2.0], 'b': [3.0, 4.0]}, index=['X', 'Y'])
+
+
+def test_stage_cache_miss_then_hit(stage_cache, frame):
+    """Second run with identical inputs should load instead of recomputing."""
+    fn = MagicMock(side_effect=_double, __module__=__name__)
+    first  = stage_cache.run('double', fn, frame)
+    second = stage_cache.run('double', fn, frame)
+    assert fn.call_count == 1
+    assert [r['status'] for r in stage_cache.report] == ['miss', 'hit']
+    assert second.equals(first)
+
+
+def test_stage_cache_changed_input_misses(stage_cache, frame):
+    """Changing any value in the input frame should change the key."""
+    stage_cache.run('double', _double, frame)
+    changed = frame.copy()
+    changed.iloc[0, 0] = 99.0
+    result = stage_cache.run('double', _double, changed)
+    assert stage_cache.report[-1]['status'] == 'miss'
+    assert result.iloc[0, 0] == 198.0
+
+
+def test_stage_cache_key_inputs_override(stage_cache):
+    """key_inputs decide the key when the arguments don't (network fetches)."""
+    fn = MagicMock(return_value={'x': 1}, __module__=__name__)
+    stage_cache.run('fetch', fn, ['AAPL'], key_inputs=(['AAPL'], '20240101'))
+    stage_cache.run('fetch', fn, ['AAPL'], key_inputs=(['AAPL'], '20240101'))
+    stage_cache.run('fetch', fn, ['AAPL'], key_inputs=(['AAPL'], '20240102'))
+    assert [r['status'] for r in stage_cache.report] == ['miss', 'hit', 'miss']
+
+
+def test_stage_cache_memoize_false_always_runs(stage_cache, frame):
+    """memoize=False should run every time and report 'run'."""
+    stage_cache.run('double', _double, frame, memoize=False)
+    stage_cache.run('double', _double, frame, memoize=False)
+    assert [r['status'] for r in stage_cache.report] == ['run', 'run']
+
+
+def test_stage_cache_keeps_latest_artifact_only(stage_cache, frame, tmp_path):
+    """A new key for the same stage should replace the old artifact."""
+    stage_cache.run('double', _double, frame)
+    stage_cache.run('double', _double, frame + 1)
+    assert len(list((tmp_path / 'stages').glob('double-*.pkl'))) == 1
+
+
+def test_stage_cache_disabled(tmp_path, frame):
+    """Disabled cache should run every stage and write nothing."""
+    stages = StageCache(cache_dir=str(tmp_path / 'stages'), enabled=False)
+    stages.run('double', _double, frame)
+    assert stages.report[0]['status'] == 'run'
+    assert not (tmp_path / 'stages').exists()
+
+
+def test_fingerprint_content_not_identity(frame):
+    """Equal frames hash equal; column renames change the hash."""
+    assert fingerprint(frame) == fingerprint(frame.copy())
+    assert fingerprint(frame) != fingerprint(frame.rename(columns={'a': 'c'}))
@@ -0,0 +1,154 @@
+"""
+Tests for app/core/dag.py (DAGExecutor)
+"""
+
+import threading
+import time
+import pytest
+from functools import partial
+from unittest.mock import patch
+
+with patch('app.core.dag.log'), patch('app.core.stage_cache.log'):
+    from app.core.dag import DAGExecutor, Stage, process_pool
+    from app.core.stage_cache import StageCache
+
+
+def _sleep_value(seconds, value):
+    time.sleep(seconds)
+    return value
+
+
+def _add(a, b):
+    return a + b
+
+
+def _square(x):
+    return x * x
+
+
+def _boom(*args):
+    raise RuntimeError("stage failed")
+
+
+_HELD = threading.Lock()
+
+
+def _lock_is_free():
+    if _HELD.acquire(timeout=2):
+        _HELD.release()
+        return True
+    return False
+
+
+# ── Execution tests ───────────────────────────────────────────────────────────
+
+def test_dag_passes_dep_outputs_in_order():
+    """Stage functions receive dependency outputs positionally, in deps order."""
+    stages = [
+        Stage('a', partial(_sleep_value, 0, 'x')),
+        Stage('b', partial(_sleep_value, 0, 'y')),
+        Stage('ab', _add, ('a', 'b')),
+        Stage('ba', _add, ('b', 'a')),
+    ]
+    out = DAGExecutor(stages).run()
+    assert out['ab'] == 'xy'
+    assert out['ba'] == 'yx'
+
+
+def test_dag_runs_independent_stages_concurrently():
+    """Two independent 0.3s io stages should overlap, not add up."""
+    stages = [
+        Stage('left',  partial(_sleep_value, 0.3, 1)),
+        Stage('right', partial(_sleep_value, 0.3, 2)),
+        Stage('sum',   _add, ('left', 'right')),
+    ]
+    dag = DAGExecutor(stages, max_workers=2)
+    out = dag.run()
+    assert out['sum'] == 3
+    assert dag.report['wall_seconds'] < 0.55
+    assert dag.report['stage_seconds_sum'] >= 0.6
+
+
+def test_dag_cpu_stage_runs_in_process_pool():
+    """cpu stages should run (and return) through the process pool."""
+    stages = [
+        Stage('x',      partial(_sleep_value, 0, 7)),
+        Stage('square', _square, ('x',), kind='cpu'),
+    ]
+    assert DAGExecutor(stages, use_processes=True).run()['square'] == 49
+
+
+def test_process_pool_does_not_inherit_held_locks():
+    """Workers must not start as fork() copies holding another thread's locks."""
+    holding, release = threading.Event(), threading.Event()
+
+    def hold():
+        with _HELD:
+            holding.set()
+            release.wait(10)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    holding.wait(5)
+    try:
+        with process_pool(1) as pool:
+            assert pool.submit(_lock_is_free).result(timeout=60)
+    finally:
+        release.set()
+        holder.join()
+
+
+def test_dag_critical_path():
+    """Critical path should follow the slowest dependency chain."""
+    stages = [
+        Stage('slow', partial(_sleep_value, 0.2, 1)),
+        Stage('fast', partial(_sleep_value, 0.0, 2)),
+        Stage('join', _add, ('fast', 'slow')),
+    ]
+    dag = DAGExecutor(stages)
+    dag.run()
+    assert dag.report['critical_path'] == ['slow', 'join']
+    assert dag.report['critical_path_seconds'] >= 0.2
+
+
+def test_dag_stage_failure_propagates():
+    """An exception in a stage should surface from run()."""
+    stages = [Stage('ok', partial(_sleep_value, 0, 1)), Stage('bad', _boom, ('ok',))]
+    with pytest.raises(RuntimeError, match="stage failed"):
+        DAGExecutor(stages).run()
+
+
+# ── Validation tests ──────────────────────────────────────────────────────────
+
+def test_dag_unknown_dependency_raises():
+    with pytest.raises(ValueError, match="unknown"):
+        DAGExecutor([Stage('a', _square, ('missing',))])
+
+
+def test_dag_cycle_raises():
+    with pytest.raises(ValueError, match="Cycle"):
+        DAGExecutor([Stage('a', _square, ('b',)), Stage('b', _square, ('a',))])
+
+
+def test_dag_invalid_kind_raises():
+    with pytest.raises(ValueError, match="kind"):
+        DAGExecutor([Stage('a', partial(_sleep_value, 0, 1), kind='gpu')])
+
+
+# ── Stage cache integration ───────────────────────────────────────────────────
+
+def test_dag_cached_stages_are_not_dispatched(tmp_path):
+    """A second run with unchanged inputs should load memoized stages."""
+    def stages():
+        return [
+            Stage('x',      partial(_sleep_value, 0, 3), memoize=False),
+            Stage('square', _square, ('x',), kind='cpu'),
+        ]
+
+    cache = StageCache(cache_dir=str(tmp_path))
+    DAGExecutor(stages(), cache=cache, use_processes=False).run()
+    cache.reset_report()
+    out = DAGExecutor(stages(), cache=cache, use_processes=False).run()
+
+    assert out['square'] == 9
+    assert {r['stage']: r['status'] for r in cache.report} == {'x': 'run', 'square': 'hit'}
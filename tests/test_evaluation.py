@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 from unittest.mock import patch, MagicMock
 from app.evaluation.backtester import backtest_optimizer, compute_portfolio_metrics
+from app.evaluation.stability import bootstrap_stability
 
 TICKERS = ['AAPL', 'MSFT', 'JNJ', 'XOM']
 
@@ -179,4 +180,53 @@ def test_metrics_equal_weight_benchmark(rich_prices):
     weights = {t: 1/n for t in TICKERS}
     result  = compute_portfolio_metrics(rich_prices, weights)
     assert result['realized_volatility'] > 0
-    assert -1.0 < result['total_return'] < 10.0  # sanity bounds
\ No newline at end of file
+    assert -1.0 < result['total_return'] < 10.0  # sanity bounds
+
+
+# ── bootstrap_stability tests ─────────────────────────────────────────────────
+
+def _features(structured: bool, n_per: int = 20, seed: int = 0) -> tuple[pd.DataFrame, pd.Series]:
+    """Three separated blobs (structured) or one Gaussian cloud, with KMeans ids."""
+    from app.models.clustering import ClusterModel
+
+    rng   = np.random.default_rng(seed)
+    cols  = ['pe_ratio', 'roe', 'beta', 'momentum_3m', 'volatility', 'rsi']
+    spread = 6.0 if structured else 0.0
+    mids  = rng.normal(scale=spread, size=(3, len(cols)))
+    data  = np.vstack([m + rng.normal(size=(n_per, len(cols))) for m in mids])
+    df    = pd.DataFrame(data, index=[f"S{i}" for i in range(len(data))], columns=cols)
+    ids   = pd.Series(ClusterModel(3).fit_predict(df), index=df.index)
+    return df, ids
+
+
+def test_stability_high_for_separated_clusters():
+    scaled, ids = _features(structured=True)
+    result      = bootstrap_stability(scaled, ids, n_clusters=3, n_boot=12, use_processes=False)
+
+    summary = result['summary']
+    assert summary['n_boot'] == 12
+    assert summary['mean_stability'] > 0.95 and summary['ari_mean'] > 0.95
+    assert summary['unstable'] == []
+    coassign = result['coassignment']
+    assert coassign.shape == (60, 60)
+    np.testing.assert_allclose(np.diag(coassign), 1.0)
+    np.testing.assert_allclose(coassign.to_numpy(), coassign.to_numpy().T)
+    assert result['clusters']['size'].sum() == 60
+
+
+def test_stability_low_for_noise():
+    """KMeans on an unstructured cloud should be flagged as unstable."""
+    structured = bootstrap_stability(*_features(True), n_clusters=3, n_boot=12, use_processes=False)
+    noise      = bootstrap_stability(*_features(False), n_clusters=3, n_boot=12, use_processes=False)
+    assert noise['summary']['ari_mean'] < structured['summary']['ari_mean'] - 0.2
+    assert noise['summary']['mean_stability'] < structured['summary']['mean_stability']
+
+
+def test_stability_deterministic_across_pools():
+    """Replicates are seeded by index, so chunking and pool type do not change results."""
+    scaled, ids = _features(structured=False, n_per=10)
+    threads     = bootstrap_stability(scaled, ids, n_clusters=3, n_boot=6, max_workers=1, use_processes=False)
+    processes   = bootstrap_stability(scaled, ids, n_clusters=3, n_boot=6, max_workers=3)
+    pd.testing.assert_frame_equal(threads['coassignment'], processes['coassignment'])
+    pd.testing.assert_frame_equal(threads['tickers'], processes['tickers'])
+
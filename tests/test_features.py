@@ -1,10 +1,12 @@
 import pytest
 import pandas as pd
 import numpy as np
+from unittest.mock import patch
 from app.features.technical import compute_rsi, compute_technical_features
 from app.features.fundamentals import (
     merge_features,
     scale_features,
+    FeaturePipeline,
     FEATURE_COLS,
     ENGINEERED_COLS,
 )
@@ -114,6 +116,83 @@ def test_volatility_is_annualized(sample_prices):
     assert result['volatility'].between(0.05, 1.0).all()
 
 
+def _per_ticker_reference(prices: pd.DataFrame) -> pd.DataFrame:
+    """Original per-column loop, kept here as the parity oracle."""
+    records = {}
+    for ticker in prices.columns:
+        close = prices[ticker].dropna()
+        if len(close) < 60:
+            continue
+        returns = close.pct_change().dropna()
+        records[ticker] = {
+            'momentum_3m': close.pct_change(63).iloc[-1],
+            'momentum_6m': close.pct_change(126).iloc[-1],
+            'volatility':  returns.std() * np.sqrt(252),
+            'rsi':         compute_rsi(close),
+        }
+    return pd.DataFrame(records).T.astype(float)
+
+
+def test_technical_features_match_per_ticker_loop():
+    """Vectorized path should match the per-ticker loop, NaN runs included."""
+    rng    = np.random.default_rng(7)
+    dates  = pd.date_range('2022-01-01', periods=300, freq='B')
+    prices = pd.DataFrame(
+        100 * np.cumprod(1 + rng.normal(0.0005, 0.02, (300, 6)), axis=0),
+        index=dates, columns=['A', 'B', 'C', 'D', 'E', 'F'],
+    )
+    prices.iloc[:150, 1]     = np.nan    # late listing
+    prices.iloc[100:140, 2]  = np.nan    # trading halt mid-history
+    prices.iloc[-3:, 3]      = np.nan    # stale last bars
+    prices.iloc[:260, 4]     = np.nan    # too short -> skipped
+    prices.iloc[::5, 5]      = np.nan    # scattered gaps
+
+    expected = _per_ticker_reference(prices)
+    result   = compute_technical_features(prices)
+    pd.testing.assert_frame_equal(result[expected.columns], expected, rtol=1e-9)
+
+
+def test_horizon_features_match_pandas_rolling():
+    """Multi-horizon momentum / volatility should match pandas definitions."""
+    rng     = np.random.default_rng(3)
+    dates   = pd.date_range('2021-01-01', periods=400, freq='B')
+    close   = pd.Series(100 * np.cumprod(1 + rng.normal(0.0004, 0.02, 400)), index=dates)
+    result  = compute_technical_features(close.to_frame('AAPL')).loc['AAPL']
+    log_ret = np.log(close).diff()
+
+    assert result['momentum_1m']     == pytest.approx(close.pct_change(21).iloc[-1], rel=1e-9)
+    assert result['momentum_12m']    == pytest.approx(close.pct_change(252).iloc[-1], rel=1e-9)
+    assert result['momentum_12_1']   == pytest.approx(close.iloc[-22] / close.iloc[-253] - 1, rel=1e-9)
+    assert result['volatility_20d']  == pytest.approx(log_ret.rolling(20).std().iloc[-1] * np.sqrt(252), rel=1e-8)
+    assert result['volatility_252d'] == pytest.approx(log_ret.rolling(252).std().iloc[-1] * np.sqrt(252), rel=1e-8)
+    downside = np.sqrt((log_ret.clip(upper=0) ** 2).rolling(252).mean().iloc[-1] * 252)
+    assert result['downside_vol']    == pytest.approx(downside, rel=1e-8)
+
+
+def test_long_horizons_nan_on_short_history(sample_prices):
+    """12-month features need 253 bars — 200-day history leaves them NaN."""
+    result = compute_technical_features(sample_prices)
+    assert result['momentum_12m'].isna().all()
+    assert result['volatility_252d'].isna().all()
+    assert result['volatility_20d'].notna().all()
+
+
+def test_scale_features_keeps_all_nan_horizon_columns(sample_combined):
+    """All-NaN long-horizon columns should survive imputation and scaling."""
+    scaled, _, _ = scale_features(sample_combined)
+    assert 'momentum_12m' in scaled.columns
+    assert not scaled.isnull().any().any()
+
+
+def test_technical_features_short_momentum_is_nan():
+    """Tickers with < 126 valid bars keep a row but have NaN momentum_6m."""
+    dates  = pd.date_range('2023-01-01', periods=100, freq='B')
+    prices = pd.DataFrame({'AAPL': np.linspace(100, 150, 100)}, index=dates)
+    result = compute_technical_features(prices)
+    assert pd.notna(result.loc['AAPL', 'momentum_3m'])
+    assert pd.isna(result.loc['AAPL', 'momentum_6m'])
+
+
 # ── merge_features tests ──────────────────────────────────────────────────────
 
 def test_merge_features_shape(sample_fundamentals, sample_technical):
@@ -156,6 +235,44 @@ def test_scale_features_standardized(sample_combined):
     assert abs(scaled.std().mean() - 1.0) < 0.3
 
 
+# ── FeaturePipeline fit / transform tests ────────────────────────────────────
+
+def test_pipeline_transform_matches_fit_transform(sample_combined):
+    """Transforming the training rows should reproduce fit_transform exactly."""
+    pipeline = FeaturePipeline()
+    scaled   = pipeline.fit_transform(sample_combined)
+    pd.testing.assert_frame_equal(pipeline.transform(sample_combined), scaled)
+
+
+def test_pipeline_transform_single_row_uses_training_stats(sample_combined):
+    """A single new row is scaled with the training medians, not its own."""
+    pipeline = FeaturePipeline().fit(sample_combined)
+    row      = sample_combined.iloc[[0]].copy()
+    row['pe_ratio'] = np.nan
+    result   = pipeline.transform(row)
+
+    assert list(result.columns) == pipeline.feature_cols
+    assert not result.isnull().any().any()
+    k        = pipeline.feature_cols.index('pe_ratio')
+    expected = (pipeline.median_imputer.statistics_[0] - pipeline.scaler.mean_[k]) / pipeline.scaler.scale_[k]
+    assert result['pe_ratio'].iloc[0] == pytest.approx(expected)
+
+
+def test_pipeline_transform_requires_fit(sample_combined):
+    """transform() on an unfitted pipeline should raise."""
+    with pytest.raises(RuntimeError):
+        FeaturePipeline().transform(sample_combined)
+
+
+def test_pipeline_save_load_roundtrip(sample_combined, tmp_path):
+    """A reloaded pipeline should transform identically."""
+    pipeline = FeaturePipeline().fit(sample_combined)
+    path     = tmp_path / 'pipeline.pkl'
+    pipeline.save(str(path))
+    loaded   = FeaturePipeline.load(str(path))
+    pd.testing.assert_frame_equal(loaded.transform(sample_combined), pipeline.transform(sample_combined))
+
+
 # ── Engineered feature tests ──────────────────────────────────────────────────
 
 def test_is_profitable_flag(sample_combined):
@@ -300,4 +417,159 @@ def test_full_pipeline_with_edge_cases():
     )
     scaled, scaler, imputer = scale_features(df)
     assert not scaled.isnull().any().any()
-    assert scaled.shape[0] == len(df)
\ No newline at end of file
+    assert scaled.shape[0] == len(df)
+
+# ── Incremental indicator state tests ─────────────────────────────────────────
+
+@pytest.fixture
+def gappy_prices():
+    """300 days for 4 tickers with a late listing and a mid-history halt."""
+    rng    = np.random.default_rng(11)
+    dates  = pd.date_range('2022-01-03', periods=300, freq='B')
+    prices = pd.DataFrame(
+        100 * np.cumprod(1 + rng.normal(0.0005, 0.02, (300, 4)), axis=0),
+        index=dates, columns=['AAPL', 'MSFT', 'JNJ', 'XOM'],
+    )
+    prices.iloc[:120, 1]    = np.nan
+    prices.iloc[250:260, 2] = np.nan
+    return prices
+
+
+def test_indicator_state_seed_matches_full_recompute(gappy_prices):
+    """State seeded from history should reproduce compute_technical_features."""
+    from app.features.indicator_state import IndicatorState
+    state = IndicatorState.from_prices(gappy_prices)
+    assert state.verify(gappy_prices)['ok']
+
+
+def test_indicator_state_incremental_updates_match(gappy_prices):
+    """Bar-by-bar updates should match a full recompute on the longer history."""
+    from app.features.indicator_state import IndicatorState
+    state = IndicatorState.from_prices(gappy_prices.iloc[:200])
+    state.update_many(gappy_prices.iloc[200:])
+    report = state.verify(gappy_prices)
+    assert report['ok'], report
+
+
+def test_indicator_state_ignores_replayed_bar(gappy_prices):
+    """Re-applying an already-seen bar should not change the state."""
+    from app.features.indicator_state import IndicatorState
+    state  = IndicatorState.from_prices(gappy_prices)
+    before = state.features()
+    state.update(gappy_prices.iloc[-1], as_of=gappy_prices.index[-1])
+    pd.testing.assert_frame_equal(state.features(), before)
+
+
+def test_indicator_state_adds_new_ticker(gappy_prices):
+    """A ticker first seen in a new bar should start accumulating history."""
+    from app.features.indicator_state import IndicatorState
+    state = IndicatorState.from_prices(gappy_prices)
+    bar   = gappy_prices.iloc[-1].copy()
+    bar['NEW'] = 50.0
+    state.update(bar, as_of=gappy_prices.index[-1] + pd.Timedelta(days=1))
+    assert 'NEW' in state.tickers
+    assert 'NEW' not in state.features().index    # below MIN_HISTORY
+
+
+def test_indicator_state_save_load_roundtrip(gappy_prices, tmp_path):
+    """Persisted state should reload with identical features and as_of."""
+    from app.features.indicator_state import IndicatorState
+    state = IndicatorState.from_prices(gappy_prices)
+    path  = tmp_path / 'state.npz'
+    state.save(str(path))
+    loaded = IndicatorState.load(str(path))
+    pd.testing.assert_frame_equal(loaded.features(), state.features())
+    assert loaded.as_of == state.as_of
+
+
+def test_refresh_technical_features_rolls_saved_state_forward(gappy_prices, tmp_path):
+    """The technical stage applies only new bars to the saved state and checks a sample."""
+    import app.features.indicator_state as module
+
+    path = str(tmp_path / 'state.npz')
+    module.refresh_technical_features(gappy_prices.iloc[:200], path=path)
+    with patch.object(module, 'compute_technical_features',
+                      wraps=module.compute_technical_features) as full:
+        features = module.refresh_technical_features(gappy_prices, path=path, sample=2)
+
+    assert [call.args[0].shape[1] for call in full.call_args_list] == [2]   # the sample only
+    expected = compute_technical_features(gappy_prices)
+    assert features.index.tolist() == expected.index.tolist()
+    pd.testing.assert_frame_equal(features, expected, rtol=1e-8)
+    assert module.IndicatorState.load(path).as_of == gappy_prices.index[-1]
+
+
+def test_refresh_technical_features_recomputes_stale_state(gappy_prices, tmp_path):
+    """Re-adjusted history or new tickers fall back to a full recompute and reseed."""
+    import app.features.indicator_state as module
+
+    path = str(tmp_path / 'state.npz')
+    module.refresh_technical_features(gappy_prices.iloc[:200], path=path)
+    adjusted = gappy_prices * 0.5                      # e.g. a 2:1 split, back-adjusted
+    assert module._stale_reason(module._load_state(path), adjusted).startswith('closes at')
+    pd.testing.assert_frame_equal(
+        module.refresh_technical_features(adjusted, path=path),
+        compute_technical_features(adjusted),
+    )
+
+    grown = adjusted.assign(NEW=adjusted['AAPL'] * 1.1)
+    assert module._stale_reason(module._load_state(path), grown) == '1 ticker(s) without state'
+    pd.testing.assert_frame_equal(
+        module.refresh_technical_features(grown, path=path), compute_technical_features(grown),
+    )
+    assert 'NEW' in module.IndicatorState.load(path).tickers
+
+
+# ── Technical panel tests ─────────────────────────────────────────────────────
+
+def test_technical_panel_matches_truncated_recompute(gappy_prices):
+    """panel.at(d) should equal compute_technical_features(prices.loc[:d])."""
+    from app.features.technical_panel import compute_technical_panel
+    panel = compute_technical_panel(gappy_prices)
+    for d in gappy_prices.index[[59, 100, 130, 255, -1]]:
+        expected = compute_technical_features(gappy_prices.loc[:d])
+        pd.testing.assert_frame_equal(panel.at(d), expected, rtol=1e-7)
+
+
+def test_technical_panel_shape(gappy_prices):
+    """Panel values should be (dates, tickers, features)."""
+    from app.features.technical_panel import compute_technical_panel, PANEL_FEATURES
+    panel = compute_technical_panel(gappy_prices)
+    assert panel.values.shape == (len(gappy_prices), 4, len(PANEL_FEATURES))
+    assert panel.feature('rsi').shape == gappy_prices.shape
+
+
+def test_technical_panel_cache_is_memory_mapped(gappy_prices, tmp_path):
+    """Second load should come from disk as a read-only memmap."""
+    from app.features.technical_panel import load_or_compute_technical_panel
+    first  = load_or_compute_technical_panel(gappy_prices, cache_dir=str(tmp_path))
+    second = load_or_compute_technical_panel(gappy_prices, cache_dir=str(tmp_path))
+    assert isinstance(second.values, np.memmap)
+    assert len(list(tmp_path.iterdir())) == 1
+    pd.testing.assert_frame_equal(first.at(gappy_prices.index[-1]), second.at(gappy_prices.index[-1]))
+
+
+def test_technical_panel_cache_replaces_partial_write(gappy_prices, tmp_path):
+    """A half-written cache entry should be recomputed and swapped in whole, leaving no temp dirs."""
+    from app.features.technical_panel import _prices_key, load_or_compute_technical_panel
+    partial = tmp_path / _prices_key(gappy_prices)
+    partial.mkdir()
+    (partial / 'values.npy').write_bytes(b'\x93NUMPY truncated')
+
+    panel = load_or_compute_technical_panel(gappy_prices, cache_dir=str(tmp_path))
+    assert [p.name for p in tmp_path.iterdir()] == [partial.name]
+    assert (partial / 'meta.json').exists()
+    assert panel.values.shape[0] == len(gappy_prices)
+
+
+def test_technical_panel_save_never_replaces_a_complete_entry(gappy_prices, tmp_path):
+    """A second save of the same key leaves the published files (maybe mapped by readers) in place."""
+    from app.features.technical_panel import compute_technical_panel
+    panel = compute_technical_panel(gappy_prices)
+    path  = tmp_path / 'key'
+    panel.save(str(path))
+    inode = (path / 'values.npy').stat().st_ino
+
+    panel.save(str(path))
+    assert (path / 'values.npy').stat().st_ino == inode
+    assert [p.name for p in tmp_path.iterdir()] == ['key']
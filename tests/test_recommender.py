@@ -10,12 +10,20 @@ import pandas as pd
 import numpy as np
 from unittest.mock import patch, MagicMock
 from app.models.similarity import (
+    NeighborIndex,
     build_similarity_matrix,
     build_similarity_matrices,
     get_similar_stocks,
+    get_similar_to_vector,
     get_complementary_stocks,
+    get_similar_stocks_batch,
+    score_against,
 )
-from app.models.clustering import cluster_stocks
+from app.models.ann import LSHIndex
+from app.models.clustering import (
+    FEATURE_WEIGHTS, ClusterModel, LabelRules, _apply_weights, cluster_centroids, cluster_churn, cluster_stocks, fit_clusters, label_tickers,
+)
+from app.models.k_selection import choose_k, sweep_k
 from app.models.optimizer import optimize_portfolio
 
 TICKERS = ['AAPL', 'MSFT', 'JNJ', 'XOM', 'JPM']
@@ -23,6 +31,13 @@ TICKERS = ['AAPL', 'MSFT', 'JNJ', 'XOM', 'JPM']
 
 # ── Fixtures ──────────────────────────────────────────────────────────────────
 
+@pytest.fixture(autouse=True)
+def no_stability_on_publish():
+    """Builds here do not start the background stability run unless a test opts in."""
+    with patch('app.services.recommender.settings.stability_on_publish', False):
+        yield
+
+
 @pytest.fixture
 def sample_scaled():
     """Scaled feature DataFrame with realistic column names."""
@@ -167,6 +182,25 @@ def test_get_similar_has_similarity_column(sample_scaled, sample_combined):
     assert 'similarity' in result.columns
 
 
+def test_score_against_matches_matrix_row(sample_scaled):
+    """Scoring a universe row as a vector should equal its matrix row."""
+    mats   = build_similarity_matrices(sample_scaled)
+    scores = score_against(sample_scaled.loc['AAPL'], sample_scaled)
+    for key in ['fundamental', 'technical', 'combined']:
+        np.testing.assert_allclose(scores[key].values, mats[key].loc['AAPL'].values)
+
+
+def test_get_similar_to_vector_matches_get_similar(sample_scaled, sample_combined):
+    """Vector query with the ticker excluded should match get_similar_stocks."""
+    matrix   = build_similarity_matrix(sample_scaled)
+    expected = get_similar_stocks('AAPL', matrix, sample_combined, top_n=3)
+    result   = get_similar_to_vector(
+        sample_scaled.loc['AAPL'], sample_scaled, sample_combined, top_n=3, exclude='AAPL'
+    )
+    assert list(result.index) == list(expected.index)
+    np.testing.assert_allclose(result['similarity'], expected['similarity'])
+
+
 # ── get_complementary_stocks tests ───────────────────────────────────────────
 
 def test_get_complementary_returns_correct_n(sample_scaled, sample_combined):
@@ -209,6 +243,161 @@ def test_get_complementary_invalid_ticker(sample_scaled, sample_combined):
         get_complementary_stocks('FAKE', matrix, sample_combined)
 
 
+# ── NeighborIndex tests ───────────────────────────────────────────────────────
+
+@pytest.fixture
+def neighbor_universe():
+    """200 random tickers with 4 cluster labels (scaled, combined)."""
+    from app.features.fundamentals import FUNDAMENTAL_COLS, TECHNICAL_COLS, ENGINEERED_COLS
+    rng     = np.random.default_rng(7)
+    tickers = [f"N{i:03d}" for i in range(200)]
+    cols    = FUNDAMENTAL_COLS + TECHNICAL_COLS + ENGINEERED_COLS
+    scaled  = pd.DataFrame(rng.normal(size=(200, len(cols))), index=tickers, columns=cols)
+    combined = pd.DataFrame({
+        'sector':        'Technology',
+        'cluster_label': rng.choice(['A', 'B', 'C', 'D'], 200, p=[0.7, 0.1, 0.1, 0.1]),
+    }, index=tickers)
+    return scaled, combined
+
+
+def _assert_same_results(index, dense, combined, tickers, top_n=5):
+    for ticker in tickers:
+        for query, kwargs in (
+            (get_similar_stocks,       {}),
+            (get_similar_stocks,       {'same_cluster': True}),
+            (get_complementary_stocks, {}),
+            (get_complementary_stocks, {'exclude_same_cluster': True}),
+        ):
+            expected = query(ticker, dense, combined, top_n, **kwargs)
+            result   = query(ticker, index, combined, top_n, **kwargs)
+            assert list(result.index) == list(expected.index), (ticker, query.__name__, kwargs)
+            np.testing.assert_allclose(result['similarity'], expected['similarity'])
+
+
+def test_neighbor_index_matches_dense_matrix(neighbor_universe):
+    """Top / bottom lists (and the exact fallback under filters) match the dense matrix."""
+    scaled, combined = neighbor_universe
+    index = NeighborIndex.build(scaled, k=8, block_rows=32)
+    dense = build_similarity_matrices(scaled)['combined']
+
+    assert index.top_ids.shape == (200, 8) and index.nbytes < dense.to_numpy().nbytes / 4
+    _assert_same_results(index, dense, combined, scaled.index[::9], top_n=5)
+    _assert_same_results(index, dense, combined, scaled.index[:3], top_n=20)   # > k: fallback
+    assert index.score('N001', 'N002') == pytest.approx(dense.loc['N001', 'N002'])
+    np.testing.assert_allclose(index.row('N005'), dense['N005'])
+
+
+def test_neighbor_index_extend_and_shrink_stay_exact(neighbor_universe):
+    """Merged (added) and filtered (removed) lists rank like a fresh dense matrix."""
+    scaled, combined = neighbor_universe
+    grown   = NeighborIndex.build(scaled.iloc[:170], k=6).extended(scaled)
+    rebuilt = NeighborIndex.build(scaled, k=6)
+    assert len(grown) == 200
+    np.testing.assert_array_equal(grown.top_ids[170:], rebuilt.top_ids[170:])
+    _assert_same_results(grown, build_similarity_matrices(scaled)['combined'], combined, scaled.index[::7])
+
+    keep   = scaled.index[scaled.index.str[-1] != '3']
+    shrunk = rebuilt.without(scaled.loc[keep])
+    assert shrunk.tickers.tolist() == keep.tolist()
+    assert (shrunk.top_ids < len(keep)).all()
+    _assert_same_results(
+        shrunk, build_similarity_matrices(scaled.loc[keep])['combined'], combined.loc[keep], keep[::7]
+    )
+
+
+def _recall(index, dense, tickers, largest: bool, n: int = 5) -> float:
+    hits = 0
+    for ticker in tickers:
+        row       = dense[ticker].drop(ticker)
+        expected  = row.nlargest(n) if largest else row.nsmallest(n)
+        found     = index.neighbors(ticker, n=n, largest=largest)
+        hits     += len(expected.index.intersection(found.index))
+        np.testing.assert_allclose(found.to_numpy(), row[found.index].to_numpy())   # exact re-rank
+    return hits / (n * len(tickers))
+
+
+def test_lsh_index_recall_and_exact_scores(neighbor_universe):
+    """LSH finds most true neighbors both ways and reports exact scores."""
+    scaled, combined = neighbor_universe
+    dense = build_similarity_matrices(scaled)['combined']
+    index = LSHIndex.build(scaled, n_tables=32, n_bits=6)
+
+    assert _recall(index, dense, scaled.index[::5], largest=True)  >= 0.9
+    assert _recall(index, dense, scaled.index[::5], largest=False) >= 0.9
+    assert _recall(index, dense, scaled.index[::5], largest=True) > \
+        _recall(LSHIndex.build(scaled, n_tables=2, n_bits=10), dense, scaled.index[::5], largest=True)
+
+    result = get_similar_stocks('N000', index, combined, 5, same_cluster=True)
+    label  = combined.loc['N000', 'cluster_label']
+    assert len(result) == 5 and (combined.loc[result.index, 'cluster_label'] == label).all()
+    assert index.score('N001', 'N002') == pytest.approx(dense.loc['N001', 'N002'])
+
+
+def test_lsh_index_incremental_and_fallback(neighbor_universe):
+    """Adds / removes only hash or drop rows; too few candidates fall back to exact."""
+    scaled, combined = neighbor_universe
+    index = LSHIndex.build(scaled, n_tables=4, n_bits=12)
+
+    grown = LSHIndex.build(scaled.iloc[:170], n_tables=4, n_bits=12).extended(scaled)
+    np.testing.assert_array_equal(grown.codes, index.codes)
+    keep  = scaled.index[::2]
+    np.testing.assert_array_equal(
+        index.without(scaled.loc[keep]).codes, LSHIndex.build(scaled.loc[keep], n_tables=4, n_bits=12).codes
+    )
+
+    allowed = np.zeros(len(scaled), dtype=bool)
+    allowed[[10, 50, 150]] = True
+    dense   = build_similarity_matrices(scaled)['combined']
+    found   = index.neighbors('N000', allowed, n=3, probes=0)
+    expected = dense['N000'].iloc[[10, 50, 150]].sort_values(ascending=False)
+    pd.testing.assert_series_equal(found, expected, check_names=False)
+
+
+def test_query_time_blend_matches_reweighted_matrices(neighbor_universe):
+    """fund_weight=w ranks like w * fundamental + (1 - w) * technical, without a rebuild."""
+    scaled, combined = neighbor_universe
+    mats  = build_similarity_matrices(scaled)
+    index = NeighborIndex.build(scaled, k=8)
+    lsh   = LSHIndex.build(scaled, n_tables=32, n_bits=6)
+
+    for w in (0.0, 0.5, 1.0):
+        blended = w * mats['fundamental'] + (1 - w) * mats['technical']
+        for ticker in scaled.index[::25]:
+            for query in (get_similar_stocks, get_complementary_stocks):
+                expected = query(ticker, blended, combined, 5)
+                result   = query(ticker, index, combined, 5, fund_weight=w)
+                assert list(result.index) == list(expected.index)
+                approx   = query(ticker, lsh, combined, 5, fund_weight=w)
+                np.testing.assert_allclose(
+                    approx['similarity'], blended.loc[approx.index, ticker].round(4), atol=1e-12
+                )
+        np.testing.assert_allclose(
+            score_against(scaled.loc['N003'], scaled, fund_weight=w)['combined'], index.row('N003', w)
+        )
+
+    with pytest.raises(ValueError):
+        get_similar_stocks('N000', mats['combined'], combined, 5, fund_weight=0.5)
+    assert len(get_similar_stocks('N000', mats['combined'], combined, 5, fund_weight=0.7)) == 5
+    with pytest.raises(ValueError):
+        index.neighbors('N000', fund_weight=1.5)
+
+
+def test_similar_batch_matches_single_queries(neighbor_universe):
+    """Batch scoring equals one get_similar_stocks call per ticker, at any blend."""
+    scaled, combined = neighbor_universe
+    index   = NeighborIndex.build(scaled, k=8)
+    tickers = list(scaled.index[::13]) + ['FAKE']
+
+    batch = get_similar_stocks_batch(tickers, index, combined, top_n=4, fund_weight=0.3)
+    assert list(batch) == tickers[:-1]
+    for ticker, result in batch.items():
+        pd.testing.assert_frame_equal(result, get_similar_stocks(ticker, index, combined, 4, fund_weight=0.3))
+
+    small = index.neighbors_batch(tickers, n=4, fund_weight=0.3, block_rows=3)
+    for ticker, scores in small.items():
+        np.testing.assert_allclose(scores.to_numpy(), batch[ticker]['similarity'], atol=1e-4)
+
+
 # ── cluster_stocks tests ──────────────────────────────────────────────────────
 
 def test_cluster_adds_columns(sample_scaled, sample_combined):
@@ -261,6 +450,211 @@ def test_cluster_label_sector_fallback(sample_scaled, sample_combined):
     assert result.loc['JPM', 'cluster_label'] == 'Financials'
 
 
+def _loop_label(row: pd.Series) -> str:
+    """Reference: the original per-row labelling function."""
+    eps        = row.get('eps_ttm',        np.nan)
+    de         = row.get('debt_to_equity', np.nan)
+    rev_growth = row.get('revenue_growth', np.nan)
+    pe         = row.get('pe_ratio',       np.nan)
+    beta       = row.get('beta',           np.nan)
+    roe        = row.get('roe',            np.nan)
+    div        = row.get('dividend_yield', np.nan)
+    sector     = row.get('sector',         '')
+
+    if pd.notna(eps) and eps <= 0:
+        return 'Distressed'
+    if pd.notna(de) and de < -3:
+        return 'Negative Equity'
+    if pd.notna(rev_growth) and rev_growth > 0.50:
+        return 'Hypergrowth'
+    if pd.notna(pe) and pd.notna(beta) and pe > 150 and beta > 1.5:
+        return 'Speculative'
+    if pd.notna(roe) and pd.notna(rev_growth) and roe > 0.25 and rev_growth > 0.10:
+        return 'Quality Growth'
+    if pd.notna(beta) and pd.notna(div) and beta < 0.7 and div > 0.015:
+        return 'Defensive Income'
+    sector_map = {
+        'Energy': 'Energy', 'Healthcare': 'Healthcare', 'Financial Services': 'Financials',
+        'Technology': 'Technology', 'Communication Services': 'Technology',
+        'Consumer Defensive': 'Consumer Defensive', 'Consumer Cyclical': 'Consumer Cyclical',
+        'Industrials': 'Industrials', 'Utilities': 'Utilities', 'Real Estate': 'Real Estate',
+    }
+    if sector in sector_map:
+        return sector_map[sector]
+    return 'Blend'
+
+
+@pytest.fixture
+def label_universe():
+    """Random fundamentals hitting every rule, exact thresholds, NaNs and odd sectors."""
+    rng = np.random.default_rng(7)
+    n   = 2000
+
+    def draw(values, nan_share=0.1):
+        out = rng.choice(values, n).astype(float)
+        out[rng.random(n) < nan_share] = np.nan
+        return out
+
+    return pd.DataFrame({
+        'eps_ttm':        draw([-1.0, 0.0, 0.01, 3.0]),
+        'debt_to_equity': draw([-5.0, -3.0, -2.9, 0.5]),
+        'revenue_growth': draw([0.05, 0.10, 0.11, 0.50, 0.51]),
+        'pe_ratio':       draw([10.0, 150.0, 151.0, 400.0]),
+        'beta':           draw([0.5, 0.7, 1.0, 1.5, 1.6]),
+        'roe':            draw([0.1, 0.25, 0.3]),
+        'dividend_yield': draw([0.0, 0.015, 0.03]),
+        'sector':         rng.choice(
+            ['Energy', 'Technology', 'Communication Services', 'Financial Services', 'Basic Materials', None], n,
+        ),
+    }, index=[f"L{i}" for i in range(n)])
+
+
+def test_label_tickers_matches_loop(label_universe):
+    """Vectorized rule table should reproduce the per-row labels exactly."""
+    expected = label_universe.apply(_loop_label, axis=1)
+    result   = label_tickers(label_universe)
+    assert result.name == 'cluster_label'
+    assert (result == expected).all()
+    assert set(expected) >= {'Distressed', 'Speculative', 'Quality Growth', 'Defensive Income', 'Blend'}
+
+
+def test_label_tickers_handles_categorical_and_missing_columns(label_universe):
+    """Compact (categorical) sectors and absent columns behave like the loop."""
+    compact  = label_universe.astype({'sector': 'category'})
+    assert (label_tickers(compact) == label_universe.apply(_loop_label, axis=1)).all()
+
+    partial  = label_universe.drop(columns=['pe_ratio', 'sector'])
+    expected = partial.apply(_loop_label, axis=1)
+    assert (label_tickers(partial) == expected).all()
+
+
+def test_label_rules_from_json(tmp_path, label_universe):
+    """A JSON rule file replaces the parts it names and keeps the rest."""
+    import json
+
+    path = tmp_path / 'labels.json'
+    path.write_text(json.dumps({
+        'rules':   [{'label': 'Cash Cow', 'when': [['dividend_yield', '>=', 0.03], ['beta', '<', 1.0]]}],
+        'default': 'Other',
+    }))
+    rules  = LabelRules.from_json(str(path))
+    result = label_tickers(label_universe, rules)
+
+    cash_cow = (label_universe['dividend_yield'] >= 0.03) & (label_universe['beta'] < 1.0)
+    assert (result[cash_cow] == 'Cash Cow').all()
+    assert result.loc[~cash_cow & (label_universe['sector'] == 'Energy')].eq('Energy').all()
+    assert result.loc[~cash_cow & label_universe['sector'].isna()].eq('Other').all()
+    with pytest.raises(ValueError):
+        LabelRules(rules=(('Broken', (('beta', '!=', 1.0),)),))
+
+
+def _blobs(n_per: int = 60, centers: int = 4, seed: int = 0) -> pd.DataFrame:
+    rng  = np.random.default_rng(seed)
+    mids = rng.normal(scale=8.0, size=(centers, 6))
+    data = np.vstack([m + rng.normal(scale=0.3, size=(n_per, 6)) for m in mids])
+    return pd.DataFrame(
+        data, index=[f"B{i}" for i in range(len(data))],
+        columns=['pe_ratio', 'roe', 'beta', 'momentum_3m', 'volatility', 'rsi'],
+    )
+
+
+def test_minibatch_mode_recovers_kmeans_partition():
+    """On well-separated data both modes should find the same clusters."""
+    from sklearn.metrics import adjusted_rand_score
+
+    scaled    = _blobs()
+    full      = ClusterModel(4, mode='kmeans').fit_predict(scaled)
+    minibatch = ClusterModel(4, mode='minibatch', batch_size=32).fit_predict(scaled)
+    assert adjusted_rand_score(full, minibatch) == pytest.approx(1.0)
+
+
+def test_cluster_model_partial_fit_moves_centroids():
+    """partial_fit should fold new rows in (minibatch only) and predict should place them."""
+    scaled = _blobs()
+    model  = ClusterModel(4, mode='minibatch', batch_size=32)
+    model.fit_predict(scaled.iloc[:-20])
+    before = model.centroids.copy()
+
+    model.partial_fit(scaled.iloc[-20:])
+    assert not np.allclose(model.centroids.to_numpy(), before.to_numpy())
+    assert model.predict(scaled.iloc[-20:]).nunique() == 1    # last rows share one blob
+    with pytest.raises(ValueError):
+        ClusterModel(4, mode='kmeans').partial_fit(scaled)
+    with pytest.raises(ValueError):
+        ClusterModel(4, mode='hierarchical')
+
+
+def test_warm_start_keeps_previous_cluster_ids():
+    """A warm-started refit renumbers clusters to match the previous generation."""
+    scaled   = _blobs()
+    combined = pd.DataFrame({'sector': 'Technology'}, index=scaled.index)
+    _, first = fit_clusters(scaled, combined, n_clusters=4)
+
+    # Previous generation numbered the same clusters differently
+    relabel  = {0: 2, 1: 3, 2: 0, 3: 1}
+    previous = cluster_centroids(scaled, first['cluster'].map(relabel))
+    moved    = scaled + np.random.default_rng(1).normal(scale=0.05, size=scaled.shape)
+    model, second = fit_clusters(moved, combined, n_clusters=4, previous=previous)
+
+    assert model.estimator.n_init == 1
+    pd.testing.assert_series_equal(
+        second['cluster'], first['cluster'].map(relabel).astype(second['cluster'].dtype)
+    )
+    assert (model.predict(moved) == second['cluster']).all()
+    assert cluster_churn(first['cluster'].map(relabel), second['cluster'])['churn'] == 0.0
+
+
+def test_cluster_model_predict_matches_estimator():
+    """The numpy nearest-centroid lookup agrees with sklearn's predict."""
+    scaled = _blobs() * 3.0
+    model  = ClusterModel(6)
+    model.fit_predict(scaled)
+    ids, dist = model.assign(scaled)
+
+    weighted = _apply_weights(scaled).to_numpy()
+    assert (ids == model.estimator.predict(weighted)).all()
+    np.testing.assert_allclose(dist, model.distances(scaled, ids))
+    np.testing.assert_allclose(model.weights, [FEATURE_WEIGHTS.get(c, 1.0) for c in scaled.columns])
+
+
+def test_cluster_churn_compares_common_tickers():
+    """Churn counts id changes among tickers present in both generations."""
+    old = pd.Series([0, 1, 2, 2], index=['A', 'B', 'C', 'D'])
+    new = pd.Series([0, 2, 2, 1], index=['A', 'B', 'C', 'E'])
+    assert cluster_churn(old, new) == {'compared': 3, 'changed': 1, 'churn': 0.3333}
+
+
+def test_sweep_k_scores_each_admissible_k():
+    """One row per k in [2, n - 1]; out-of-range candidates are dropped."""
+    scaled = _blobs(n_per=10)
+    sweep  = sweep_k(scaled, ks=(1, 3, 4, 5, 40, 400), use_processes=False)
+    assert sweep['k'].tolist() == [3, 4, 5]
+    assert sweep['inertia'].is_monotonic_decreasing
+    assert sweep_k(scaled, ks=(), use_processes=False).empty
+
+
+def test_choose_k_silhouette_and_elbow_find_true_k():
+    """Both sweep rules should recover the number of well-separated blobs."""
+    sweep = sweep_k(_blobs(), ks=range(2, 9), use_processes=False)
+    assert choose_k(sweep, rule='silhouette') == 4
+    assert choose_k(sweep, rule='elbow') == 4
+
+
+def test_choose_k_min_size_fixed_and_unknown_rule():
+    sweep = pd.DataFrame({
+        'k':          [3, 4, 5],
+        'inertia':    [30.0, 20.0, 15.0],
+        'silhouette': [0.4, 0.5, 0.7],
+        'min_size':   [10, 5, 1],
+    })
+    assert choose_k(sweep, rule='silhouette', min_size=3) == 4     # k=5 has a singleton
+    assert choose_k(sweep, rule='silhouette', min_size=50) == 5    # none qualify → all
+    assert choose_k(sweep, rule='fixed', default=8) == 8
+    assert choose_k(sweep.iloc[:0], rule='silhouette', default=8) == 8
+    with pytest.raises(ValueError):
+        choose_k(sweep, rule='gap')
+
+
 # ── optimize_portfolio tests ──────────────────────────────────────────────────
 
 def test_optimize_returns_all_keys(sample_prices):
@@ -339,4 +733,1081 @@ def test_optimize_all_risk_profiles(sample_prices):
     for risk in ['conservative', 'moderate', 'aggressive']:
         result = optimize_portfolio(TICKERS, sample_prices, risk=risk)
         assert result['expected_return'] is not None
-        assert result['sharpe_ratio'] is not None
\ No newline at end of file
+        assert result['sharpe_ratio'] is not None
+
+
+# ── Diversification (gaps) tests ──────────────────────────────────────────────
+
+def _loop_gap_correlations(prices, portfolio):
+    """Reference: the per-ticker pandas loop gaps() used to run."""
+    port = prices[portfolio].pct_change().dropna().mean(axis=1)
+    return pd.Series({
+        t: prices[t].pct_change().dropna().corr(port)
+        for t in prices.columns if t not in portfolio
+    })
+
+
+@pytest.fixture
+def gappy_prices():
+    """Prices with a late listing and a few missing days."""
+    rng    = np.random.default_rng(7)
+    cols   = [f"G{i}" for i in range(40)]
+    prices = pd.DataFrame(
+        100 * np.cumprod(1 + rng.normal(0.0003, 0.02, (260, 40)), axis=0),
+        index=pd.date_range('2023-01-02', periods=260, freq='B'), columns=cols,
+    )
+    prices.iloc[:120, 5]  = np.nan       # listed mid-window
+    prices.iloc[50:53, 9] = np.nan       # short gap
+    prices.iloc[:200, 1]  = np.nan       # held ticker with short history
+    return prices
+
+
+def test_returns_matrix_matches_pandas_corr(gappy_prices):
+    """Vectorized correlations should equal pairwise-complete Series.corr."""
+    from app.models.diversification import ReturnsMatrix
+
+    portfolio    = ['G0', 'G1', 'G2']
+    matrix       = ReturnsMatrix(gappy_prices, gappy_prices.columns)
+    rows, target = matrix.portfolio_returns(np.array([0, 1, 2]))
+    corr         = pd.Series(matrix.correlations(rows, target), index=gappy_prices.columns)
+
+    expected = _loop_gap_correlations(gappy_prices, portfolio)
+    np.testing.assert_allclose(corr[expected.index], expected, atol=1e-10)
+
+
+def test_returns_matrix_dense_path_matches_pandas_corr(sample_prices):
+    """Without gaps the mask is dropped and results still match."""
+    from app.models.diversification import ReturnsMatrix
+
+    matrix       = ReturnsMatrix(sample_prices, sample_prices.columns)
+    rows, target = matrix.portfolio_returns(np.array([0, 1]))
+    assert matrix.mask is None
+    expected = _loop_gap_correlations(sample_prices, ['AAPL', 'MSFT'])
+    corr     = pd.Series(matrix.correlations(rows, target), index=sample_prices.columns)
+    np.testing.assert_allclose(corr[expected.index], expected, atol=1e-10)
+
+
+def test_weighted_portfolio_returns_match_pandas(sample_prices):
+    """A weighted portfolio series should correlate like the pandas dot product."""
+    from app.models.diversification import ReturnsMatrix
+
+    weights      = np.array([0.6, 0.3, 0.1])
+    matrix       = ReturnsMatrix(sample_prices, sample_prices.columns)
+    rows, target = matrix.portfolio_returns(np.array([0, 1, 2]), weights)
+    port         = sample_prices.iloc[:, :3].pct_change().dropna() @ weights
+    expected     = sample_prices.pct_change().dropna().corrwith(port)
+    np.testing.assert_allclose(matrix.correlations(rows, target), expected, atol=1e-10)
+
+
+def test_covariance_matches_pandas_when_dense(sample_prices):
+    from app.models.diversification import ReturnsMatrix, covariance_matrix
+
+    cov = covariance_matrix(ReturnsMatrix(sample_prices, sample_prices.columns))
+    np.testing.assert_allclose(cov, sample_prices.pct_change().cov(), atol=1e-14)
+
+
+def test_covariance_with_matches_dense_matrix_with_gaps(sample_prices):
+    """Sigma w and the diagonal without the N x N matrix, gapped holdings included."""
+    from app.models.diversification import ReturnsMatrix, covariance_matrix
+
+    prices                = sample_prices.copy()
+    prices.iloc[:40, 1]   = np.nan            # held, short history
+    prices.iloc[10:20, 3] = np.nan            # candidate with a hole
+    prices.iloc[:-2, 4]   = np.nan            # too few observations -> 0
+    matrix    = ReturnsMatrix(prices, prices.columns)
+    cov       = covariance_matrix(matrix)
+    positions = np.array([0, 1, 2])
+    weights   = np.array([0.5, 0.3, 0.2])
+
+    np.testing.assert_allclose(matrix.covariance_with(positions, weights),
+                               cov[:, positions] @ weights, atol=1e-16)
+    np.testing.assert_allclose(matrix.variances(), np.diagonal(cov), atol=1e-16)
+
+
+def test_marginal_volatility_matches_finite_difference(sample_prices):
+    """Analytic d(sigma)/d(alpha) should match a small step of adding the ticker."""
+    from app.models.diversification import TRADING_DAYS, covariance_matrix, ReturnsMatrix, \
+        marginal_volatility
+
+    matrix    = ReturnsMatrix(sample_prices, sample_prices.columns)
+    cov       = covariance_matrix(matrix)
+    positions = np.array([0, 1])
+    weights   = np.array([0.75, 0.25])
+    marginal, vol = marginal_volatility(matrix, positions, weights)
+
+    full          = np.zeros(len(cov))
+    full[positions] = weights
+    assert vol == pytest.approx(np.sqrt(full @ cov @ full * TRADING_DAYS))
+    step = 1e-6
+    for c in (2, 3, 4):
+        bumped     = (1 - step) * full
+        bumped[c] += step
+        numeric    = (np.sqrt(bumped @ cov @ bumped * TRADING_DAYS) - vol) / step
+        assert marginal[c] == pytest.approx(numeric, rel=1e-4)
+
+
+def test_volatility_change_matches_direct_recompute(sample_prices):
+    """Rank-one update should equal recomputing sqrt(w'Sigma w) for each candidate."""
+    from app.models.diversification import TRADING_DAYS, covariance_matrix, ReturnsMatrix, \
+        volatility_change
+
+    matrix    = ReturnsMatrix(sample_prices, sample_prices.columns)
+    cov       = covariance_matrix(matrix)
+    positions = np.array([0, 1])
+    weights   = np.array([0.4, 0.6])
+    full            = np.zeros(len(cov))
+    full[positions] = weights
+
+    delta, vol = volatility_change(matrix, positions, weights, add_weight=0.1)
+    for c in range(len(cov)):
+        new     = 0.9 * full
+        new[c] += 0.1
+        direct  = np.sqrt(new @ cov @ new * TRADING_DAYS) - vol
+        assert delta[c] == pytest.approx(direct, abs=1e-12)
+
+
+def test_lowest_n_sorted_excludes_and_skips_nan():
+    from app.models.diversification import lowest_n
+
+    scores = np.array([0.5, np.nan, -0.2, 0.1, -0.9, 0.0])
+    assert lowest_n(scores, 3, exclude=np.array([4])).tolist() == [2, 5, 3]
+    assert lowest_n(scores, 10).tolist() == [4, 2, 5, 3, 0]
+    assert lowest_n(scores, 0).tolist() == []
+
+
+# ── Investable universe tests ─────────────────────────────────────────────────
+
+def _loop_exclusions(combined_df, prices):
+    """Reference: the per-row filter the recommender used to run."""
+    excluded = {}
+    for ticker in combined_df.index:
+        if ticker not in prices.columns or prices[ticker].dropna().shape[0] < 60:
+            excluded[ticker] = 'insufficient_history'
+            continue
+        row = combined_df.loc[ticker]
+        eps, de = row.get('eps_ttm'), row.get('debt_to_equity')
+        pe, beta = row.get('pe_ratio'), row.get('beta')
+        if pd.notna(eps) and eps <= 0:
+            excluded[ticker] = 'loss_making'
+        elif pd.notna(de) and de < -3:
+            excluded[ticker] = 'negative_equity'
+        elif pd.notna(pe) and pe > 300 and pd.notna(beta) and beta > 1.5:
+            excluded[ticker] = 'speculative'
+    return excluded
+
+
+@pytest.fixture
+def screen_universe():
+    rng     = np.random.default_rng(3)
+    tickers = [f"S{i}" for i in range(200)]
+    combined = pd.DataFrame({
+        'eps_ttm':        rng.choice([-1.0, 0.0, 2.0, np.nan], 200, p=[0.1, 0.05, 0.8, 0.05]),
+        'debt_to_equity': rng.choice([-5.0, 0.5, np.nan], 200, p=[0.1, 0.85, 0.05]),
+        'pe_ratio':       rng.choice([20.0, 400.0, np.nan], 200, p=[0.7, 0.25, 0.05]),
+        'beta':           rng.choice([0.9, 2.0], 200),
+    }, index=tickers)
+    prices = pd.DataFrame(
+        100.0, index=pd.date_range('2024-01-01', periods=100, freq='B'), columns=tickers[:-5]
+    )
+    prices.iloc[:60, :10] = np.nan      # 40 days of history
+    return combined, prices
+
+
+def test_exclusion_reasons_match_loop(screen_universe):
+    """Vectorized masks should give the same code per ticker as the old loop."""
+    from app.services.recommender import exclusion_reasons, build_investable_universe
+
+    combined, prices = screen_universe
+    reasons  = exclusion_reasons(combined, prices)
+    expected = _loop_exclusions(combined, prices)
+
+    assert reasons.dropna().to_dict() == expected
+    assert build_investable_universe(combined, prices) == [
+        t for t in combined.index if t not in expected
+    ]
+
+
+def test_exclusion_rules_are_configurable(screen_universe):
+    from app.services.recommender import InvestableRules, exclusion_reasons
+
+    combined, prices = screen_universe
+    loose = exclusion_reasons(combined, prices, InvestableRules(min_history=30, speculative_pe=1e9))
+    assert 'speculative' not in set(loose.dropna())
+    assert (loose.loc[prices.columns[:10]] != 'insufficient_history').all()
+    with patch('app.services.recommender.settings.investable_min_history', 30):
+        assert InvestableRules.from_settings().min_history == 30
+
+
+# ── Build stage memoization tests ─────────────────────────────────────────────
+
+BUILD_TICKERS = [f"T{i}" for i in range(10)]
+
+
+def _build_fundamentals():
+    rng = np.random.default_rng(0)
+    n   = len(BUILD_TICKERS)
+    return pd.DataFrame({
+        'pe_ratio':       rng.uniform(8, 40, n),
+        'pb_ratio':       rng.uniform(1, 10, n),
+        'roe':            rng.uniform(0.05, 0.4, n),
+        'debt_to_equity': rng.uniform(0.1, 2.0, n),
+        'revenue_growth': rng.uniform(-0.05, 0.3, n),
+        'dividend_yield': rng.uniform(0.0, 0.04, n),
+        'beta':           rng.uniform(0.6, 1.6, n),
+        'market_cap':     rng.uniform(1e10, 1e12, n),
+        'eps_ttm':        rng.uniform(1, 20, n),
+        'sector':         ['Technology', 'Healthcare'] * (n // 2),
+        'as_of_date':     ['2024-01-01'] * n,
+    }, index=pd.Index(BUILD_TICKERS, name='ticker'))
+
+
+def _build_prices(periods: int):
+    rng   = np.random.default_rng(1)
+    dates = pd.date_range('2022-01-03', periods=periods, freq='B')
+    return pd.DataFrame(
+        100 * np.cumprod(1 + rng.normal(0.0004, 0.015, (periods, len(BUILD_TICKERS))), axis=0),
+        index=dates, columns=BUILD_TICKERS,
+    )
+
+
+def test_build_skips_fundamentals_when_only_prices_move(tmp_path):
+    """Second build with new prices only should hit the fundamentals stage."""
+    from app.services.recommender import RecommenderService
+    from app.core.stage_cache import StageCache
+    from app.services.snapshot_store import SnapshotStore
+
+    service        = RecommenderService()
+    service.stages = StageCache(cache_dir=str(tmp_path))
+    service.store  = SnapshotStore(str(tmp_path / 'snapshots'))
+    fetch_funds    = MagicMock(return_value=_build_fundamentals())
+
+    with patch('app.services.recommender.fetch_fundamentals', fetch_funds):
+        with patch('app.services.recommender.fetch_prices', return_value=_build_prices(300)):
+            service.build(BUILD_TICKERS)
+        first = {r['stage']: r['status'] for r in service.stages.report}
+
+        with patch('app.services.recommender.fetch_prices', return_value=_build_prices(301)):
+            service.build(BUILD_TICKERS)
+        second = {r['stage']: r['status'] for r in service.stages.report}
+
+    assert fetch_funds.call_count == 1
+    assert first['fundamentals']  == 'miss'
+    assert second['fundamentals'] == 'hit'
+    assert second['prices']       == 'run'
+    assert second['technical']    == 'miss'
+    assert service.is_ready
+
+
+def test_build_identical_inputs_hits_every_stage(tmp_path):
+    """
+    Rebuilding from unchanged inputs should load every memoized stage.
+
+    The previous generation's centroids are an input of the (warm-started)
+    cluster stage, so the first build that has a predecessor runs it once.
+    """
+    from app.services.recommender import RecommenderService
+    from app.core.stage_cache import StageCache
+    from app.services.snapshot_store import SnapshotStore
+
+    service        = RecommenderService()
+    service.stages = StageCache(cache_dir=str(tmp_path))
+    service.store  = SnapshotStore(str(tmp_path / 'snapshots'))
+
+    with patch('app.services.recommender.fetch_fundamentals', return_value=_build_fundamentals()), \
+         patch('app.services.recommender.fetch_prices', return_value=_build_prices(300)):
+        service.build(BUILD_TICKERS)
+        service.build(BUILD_TICKERS)
+        expected = service.combined_df.copy()
+        service.build(BUILD_TICKERS)
+
+    statuses = {r['stage']: r['status'] for r in service.stages.report}
+    assert 'miss' not in statuses.values()
+    assert statuses['cluster'] == statuses['neighbors'] == 'hit'
+    assert 'similarity' not in statuses
+    pd.testing.assert_frame_equal(service.combined_df, expected)
+
+
+def test_build_sweeps_k_when_rule_is_not_fixed(tmp_path):
+    """A sweep rule records the k table and clusters with the chosen k."""
+    from app.services.recommender import RecommenderService
+    from app.core.stage_cache import StageCache
+    from app.services.snapshot_store import SnapshotStore
+
+    service        = RecommenderService()
+    service.stages = StageCache(cache_dir=str(tmp_path))
+    service.store  = SnapshotStore(str(tmp_path / 'snapshots'))
+
+    with patch('app.services.recommender.fetch_fundamentals', return_value=_build_fundamentals()), \
+         patch('app.services.recommender.fetch_prices', return_value=_build_prices(300)), \
+         patch('app.services.recommender.settings.cluster_k_rule', 'silhouette'), \
+         patch('app.services.recommender.settings.cluster_k_min', 2), \
+         patch('app.services.recommender.settings.cluster_k_max', 5), \
+         patch('app.services.recommender.settings.cluster_min_size', 1), \
+         patch('app.services.recommender.settings.build_use_processes', False):
+        service.build(BUILD_TICKERS)
+
+    sweep = service.artifacts['k_sweep']
+    best  = int(sweep.loc[sweep['silhouette'].idxmax(), 'k'])
+    assert sweep['k'].tolist() == [2, 3, 4, 5]
+    assert service.combined_df['cluster'].nunique() == best
+
+
+# ── Compact mode tests ────────────────────────────────────────────────────────
+
+def _built_service(tmp_path, compact: bool, dense: bool = False):
+    from app.services.recommender import RecommenderService
+    from app.core.stage_cache import StageCache
+    from app.services.snapshot_store import SnapshotStore
+
+    service        = RecommenderService()
+    service.stages = StageCache(cache_dir=str(tmp_path))
+    service.store  = SnapshotStore(str(tmp_path / 'snapshots'))
+    with patch('app.services.recommender.fetch_fundamentals', return_value=_build_fundamentals()), \
+         patch('app.services.recommender.fetch_prices', return_value=_build_prices(300)), \
+         patch('app.services.recommender.settings.compact_mode', compact), \
+         patch('app.services.recommender.settings.similarity_dense', dense):
+        service.build(BUILD_TICKERS)
+    return service
+
+
+def test_compact_mode_within_tolerance(tmp_path):
+    """Compact similarity scores should match float64 within COMPACT_ATOL."""
+    from app.core.memory import COMPACT_ATOL
+
+    full    = _built_service(tmp_path, compact=False, dense=True)
+    compact = _built_service(tmp_path, compact=True, dense=True)
+
+    assert compact.similarity_df.dtypes.eq(np.float32).all()
+    np.testing.assert_allclose(
+        compact.similarity_df.to_numpy(), full.similarity_df.to_numpy(), atol=COMPACT_ATOL
+    )
+    assert compact.similar('T0', 3)[0]['ticker'] == full.similar('T0', 3)[0]['ticker']
+
+
+def test_dense_similarity_off_serves_from_neighbor_index(tmp_path):
+    """By default the N x N matrices are skipped; answers match a SIMILARITY_DENSE=true build."""
+    dense = _built_service(tmp_path, compact=False, dense=True)
+    lean  = _built_service(tmp_path / 'lean', compact=False)
+
+    assert lean.similarity_df is None
+    assert 'similarity' not in [r['stage'] for r in lean.artifacts['dag_report']['stages']]
+    assert lean.memory_report()['similarity_mb'] == 0 < lean.memory_report()['neighbors_mb']
+    for ticker in ('T0', 'T5'):
+        assert lean.similar(ticker, 3) == dense.similar(ticker, 3)
+        assert lean.complementary(ticker, 3) == dense.complementary(ticker, 3)
+
+
+def test_service_blend_weights_and_batch(tmp_path):
+    """similar() re-blends per request; similar_batch() agrees and lists missing tickers."""
+    service = _built_service(tmp_path, compact=False)
+
+    fundamental = service.similar('T0', 3, fund_weight=1.0)
+    technical   = service.similar('T0', 3, fund_weight=0.0)
+    assert [r['similarity'] for r in fundamental] != [r['similarity'] for r in technical]
+    assert service.similar('T0', 3) == service.similar('T0', 3, fund_weight=0.7)
+
+    batch = service.similar_batch(['T0', 'T1', 'NOPE'], 3, fund_weight=0.0)
+    assert list(batch['results']) == ['T0', 'T1'] and batch['missing'] == ['NOPE']
+    assert batch['results']['T0'] == technical
+    assert batch['results']['T1'] == service.similar('T1', 3, fund_weight=0.0)
+
+
+def test_compact_mode_categorical_and_smaller(tmp_path):
+    """Compact mode should use categoricals and report less memory."""
+    full    = _built_service(tmp_path, compact=False)
+    compact = _built_service(tmp_path, compact=True)
+
+    assert isinstance(compact.combined_df['sector'].dtype, pd.CategoricalDtype)
+    assert isinstance(compact.combined_df['cluster_label'].dtype, pd.CategoricalDtype)
+    assert compact.memory_report()['compact'] is True
+    assert compact.memory_report()['total_mb'] < full.memory_report()['total_mb']
+
+
+def test_memory_report_computed_once_per_generation(tmp_path):
+    """Publishing runs the deep scan; later reports (every /health probe) are cached."""
+    import app.services.snapshot as snapshot_module
+
+    service = _built_service(tmp_path, compact=False)
+    with patch.object(snapshot_module, 'frame_mb', wraps=snapshot_module.frame_mb) as scan:
+        first = service.memory_report()
+        first['total_mb'] = -1
+        assert service.memory_report()['total_mb'] > 0
+        scan.assert_not_called()
+
+        service.remove_tickers(['T3'])
+        assert scan.called
+        scan.reset_mock()
+        service.memory_report()
+        scan.assert_not_called()
+
+
+def test_ticker_index_positions():
+    """TickerIndex should map symbols to positions and skip unknowns."""
+    from app.core.memory import TickerIndex
+
+    index = TickerIndex(['AAPL', 'MSFT', 'JNJ'])
+    assert len(index) == 3
+    assert 'MSFT' in index and 'FAKE' not in index
+    assert index.position('JNJ') == 2
+    assert index.positions(['JNJ', 'FAKE', 'AAPL']).tolist() == [2, 0]
+    with pytest.raises(AttributeError):
+        index.extra = 1
+
+
+# ── Snapshot swap tests ───────────────────────────────────────────────────────
+
+def test_rebuild_publishes_new_generation_and_keeps_old_intact(tmp_path):
+    """A rebuild swaps in a new snapshot; a pinned old one is unchanged."""
+    import dataclasses
+    service = _built_service(tmp_path, compact=False)
+    pinned  = service.snapshot
+    before  = pinned.prices.shape
+
+    with patch('app.services.recommender.fetch_fundamentals', return_value=_build_fundamentals()), \
+         patch('app.services.recommender.fetch_prices', return_value=_build_prices(320)):
+        service.build(BUILD_TICKERS)
+
+    assert service.generation == pinned.generation + 1
+    assert service.snapshot is not pinned
+    assert pinned.prices.shape == before
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        pinned.prices = None
+
+
+def test_failed_rebuild_keeps_last_good_snapshot(tmp_path):
+    """If a rebuild raises, the previous snapshot keeps serving."""
+    service = _built_service(tmp_path, compact=False)
+    good    = service.snapshot
+
+    with patch('app.services.recommender.fetch_prices', side_effect=ConnectionError("offline")), \
+         patch('app.services.recommender.fetch_fundamentals', return_value=_build_fundamentals()):
+        with pytest.raises(ConnectionError):
+            service.build(BUILD_TICKERS)
+
+    assert service.snapshot is good
+    assert service.is_ready
+    assert 'offline' in service.last_build_error
+    assert service.similar('T0', 2)
+
+
+def test_background_build_is_single_flight(tmp_path):
+    """A second background build is refused while one holds the lock."""
+    from app.services.recommender import RecommenderService
+
+    service = RecommenderService()
+    with service._build_lock:
+        assert service.is_building
+        assert service.build_in_background() is False
+    assert not service.is_ready
+
+
+def test_query_before_build_raises():
+    """Queries before the first snapshot should raise RuntimeError."""
+    from app.services.recommender import RecommenderService
+    with pytest.raises(RuntimeError):
+        RecommenderService().similar('AAPL')
+
+
+# ── On-disk snapshot tests ────────────────────────────────────────────────────
+
+def test_snapshot_store_roundtrip(tmp_path):
+    """A saved snapshot should load back equal, with mmapped numeric blocks."""
+    from app.services.snapshot_store import SnapshotStore
+
+    service = _built_service(tmp_path, compact=False, dense=True)
+    snap    = service.snapshot
+    loaded  = SnapshotStore(str(tmp_path / 'snapshots')).load()
+
+    assert loaded.generation == snap.generation
+    pd.testing.assert_frame_equal(loaded.prices, snap.prices, check_freq=False)
+    pd.testing.assert_frame_equal(loaded.scaled_df, snap.scaled_df)
+    pd.testing.assert_frame_equal(loaded.similarity_df, snap.similarity_df)
+    pd.testing.assert_frame_equal(loaded.combined_df, snap.combined_df, check_dtype=False)
+    assert loaded.investable_tickers == snap.investable_tickers
+    assert isinstance(loaded.similarity_df.values.base, np.memmap) or \
+        not loaded.similarity_df.values.flags.writeable
+
+
+def test_snapshot_store_keeps_neighbor_index(tmp_path):
+    """Neighbor lists are saved with the generation and loaded memory-mapped."""
+    from app.services.snapshot_store import SnapshotStore
+
+    service = _built_service(tmp_path, compact=False)
+    loaded  = SnapshotStore(str(tmp_path / 'snapshots')).load()
+    for name, values in service.snapshot.neighbors.arrays().items():
+        np.testing.assert_array_equal(loaded.neighbors.arrays()[name], values)
+    assert isinstance(loaded.neighbors.top_ids, np.memmap)
+    assert loaded.neighbors.score('T0', 'T1') == pytest.approx(service.snapshot.neighbors.score('T0', 'T1'))
+
+
+def test_snapshot_store_keeps_returns_matrix(tmp_path):
+    """Centred returns are saved with the generation and memory-mapped, not rebuilt on load."""
+    from app.services.snapshot_store import SnapshotStore
+
+    service = _built_service(tmp_path, compact=False)
+    loaded  = SnapshotStore(str(tmp_path / 'snapshots')).load()
+    for name, values in service.snapshot.returns.arrays().items():
+        assert isinstance(loaded.returns.arrays()[name], np.memmap)
+        np.testing.assert_array_equal(loaded.returns.arrays()[name], values)
+    assert loaded.returns.dates.equals(service.snapshot.returns.dates)
+
+    rows, target = loaded.returns.portfolio_returns(np.array([0, 3]))
+    np.testing.assert_allclose(
+        loaded.returns.correlations(rows, target),
+        service.snapshot.returns.correlations(*service.snapshot.returns.portfolio_returns(np.array([0, 3]))),
+    )
+
+
+def test_snapshot_never_rebuilds_missing_or_stale_parts(tmp_path):
+    """A snapshot without aligned returns / neighbors raises instead of recomputing them."""
+    snap = _built_service(tmp_path, compact=False).snapshot
+    with pytest.raises(ValueError, match='returns matrix'):
+        dataclasses_replace(snap, returns=None)
+    with pytest.raises(ValueError, match='returns matrix'):
+        dataclasses_replace(snap, returns=snap.returns.subset(np.arange(5)))
+    with pytest.raises(ValueError, match='neighbor index'):
+        dataclasses_replace(snap, neighbors=None)
+    with patch('app.services.snapshot.ReturnsMatrix') as rebuild:
+        dataclasses_replace(snap, generation=snap.generation + 1)
+    rebuild.assert_not_called()
+
+
+def test_lsh_similarity_index_builds_saves_and_serves(tmp_path):
+    """SIMILARITY_INDEX=lsh builds an LSHIndex that round-trips through the store."""
+    from app.services.snapshot_store import SnapshotStore
+
+    with patch('app.services.recommender.settings.similarity_index', 'lsh'):
+        service = _built_service(tmp_path, compact=False)
+    loaded  = SnapshotStore(str(tmp_path / 'snapshots')).load()
+
+    assert isinstance(service.snapshot.neighbors, LSHIndex)
+    assert isinstance(loaded.neighbors, LSHIndex)
+    np.testing.assert_array_equal(loaded.neighbors.codes, service.snapshot.neighbors.codes)
+    assert len(service.similar('T0', 3)) == 3 and len(service.complementary('T0', 3)) == 3
+
+
+def test_snapshot_store_keeps_cluster_model(tmp_path):
+    """The fitted ClusterModel is saved with the generation and placed rows identically."""
+    from app.services.snapshot_store import SnapshotStore
+
+    service = _built_service(tmp_path, compact=False)
+    loaded  = SnapshotStore(str(tmp_path / 'snapshots')).load()
+    model   = loaded.artifacts['cluster_model']
+    assert (model.predict(loaded.scaled_df) == service.artifacts['cluster_model'].predict(service.scaled_df)).all()
+
+
+def test_feature_pipeline_persisted_only_with_the_generation(tmp_path):
+    """The build leaves pipeline persistence to SnapshotStore — no write outside the generation."""
+    from app.features.fundamentals import FeaturePipeline
+    from app.services.snapshot_store import SnapshotStore
+
+    with patch.object(FeaturePipeline, 'save') as save:
+        service = _built_service(tmp_path, compact=False)
+    save.assert_not_called()
+    loaded = SnapshotStore(str(tmp_path / 'snapshots')).load()
+    pd.testing.assert_frame_equal(
+        loaded.feature_pipeline.transform(service.combined_df), service.scaled_df,
+    )
+
+
+def test_snapshot_store_compact_roundtrip(tmp_path):
+    """float32 and categorical columns should survive the round trip."""
+    from app.services.snapshot_store import SnapshotStore
+
+    service = _built_service(tmp_path, compact=True, dense=True)
+    loaded  = SnapshotStore(str(tmp_path / 'snapshots')).load()
+    assert loaded.compact
+    assert loaded.similarity_df.dtypes.eq(np.float32).all()
+    assert isinstance(loaded.combined_df['cluster_label'].dtype, pd.CategoricalDtype)
+    pd.testing.assert_frame_equal(loaded.combined_df, service.combined_df, check_dtype=False)
+
+
+def test_snapshot_store_falls_back_when_latest_is_corrupt(tmp_path):
+    """An unreadable LATEST generation should fall back to the previous one."""
+    from app.services.snapshot_store import SnapshotStore
+
+    store = SnapshotStore(str(tmp_path / 'store'), keep=5)
+    snap  = _built_service(tmp_path, compact=False).snapshot
+    store.save(snap)
+    newer = dataclasses_replace(snap, generation=snap.generation + 1)
+    path  = store.save(newer)
+    (path / 'prices.float64.npy').write_bytes(b'corrupt')
+
+    assert store.latest_generation() == snap.generation + 1
+    assert store.load().generation == snap.generation
+
+
+def test_snapshot_store_prunes_old_generations(tmp_path):
+    """Only the newest `keep` generations should stay on disk."""
+    from app.services.snapshot_store import SnapshotStore
+
+    store = SnapshotStore(str(tmp_path / 'store'), keep=2)
+    snap  = _built_service(tmp_path, compact=False).snapshot
+    for gen in range(1, 5):
+        store.save(dataclasses_replace(snap, generation=gen))
+    assert store.generations() == [4, 3]
+    assert not list((tmp_path / 'store').glob('.*tmp*'))
+
+
+def test_service_loads_snapshot_without_network(tmp_path):
+    """A fresh service should serve from disk before any build or fetch."""
+    from app.services.recommender import RecommenderService
+    from app.services.snapshot_store import SnapshotStore
+
+    built   = _built_service(tmp_path, compact=False)
+    service = RecommenderService()
+    service.store = SnapshotStore(str(tmp_path / 'snapshots'))
+
+    with patch('app.services.recommender.fetch_prices') as fetch:
+        assert service.load_latest_snapshot() is True
+        fetch.assert_not_called()
+    assert service.generation == built.generation
+    assert service.similar('T0', 3) == built.similar('T0', 3)
+    assert service._next_generation() == built.generation + 1
+
+
+def test_service_gaps_matches_loop(tmp_path):
+    """gaps() should rank exactly like the per-ticker pandas loop."""
+    service   = _built_service(tmp_path, compact=False)
+    portfolio = ['T0', 'T3']
+    expected  = _loop_gap_correlations(
+        service.prices[service.combined_df.index], portfolio
+    ).sort_values().head(4)
+
+    result = service.gaps(portfolio, top_n=4)
+    assert [r['ticker'] for r in result] == expected.index.tolist()
+    np.testing.assert_allclose([r['correlation'] for r in result], expected, atol=1e-10)
+    assert result[0]['sector'] == service.combined_df.loc[result[0]['ticker'], 'sector']
+
+
+def test_service_gaps_weighted_marginal_vol(tmp_path):
+    """rank_by='marginal_vol' should order by the covariance-based score."""
+    service = _built_service(tmp_path, compact=False)
+    result  = service.gaps(['T0', 'T1', 'T2'], top_n=7, weights=[5, 3, 2], rank_by='marginal_vol')
+
+    scores = [r['marginal_vol'] for r in result]
+    assert scores == sorted(scores)
+    assert not {'T0', 'T1', 'T2'} & {r['ticker'] for r in result}
+    by_corr = [r['correlation'] for r in service.gaps(['T0', 'T1', 'T2'], 7, weights=[5, 3, 2])]
+    assert by_corr == sorted(by_corr)
+
+    by_delta = service.gaps(['T0', 'T1', 'T2'], 7, weights=[5, 3, 2],
+                            rank_by='vol_change', add_weight=0.2)
+    deltas   = [r['vol_change'] for r in by_delta]
+    assert deltas == sorted(deltas)
+    small    = {r['ticker']: r['vol_change'] for r in service.gaps(
+        ['T0', 'T1', 'T2'], 7, weights=[5, 3, 2], rank_by='vol_change', add_weight=0.01)}
+    assert all(abs(small[r['ticker']]) < abs(r['vol_change']) for r in by_delta)
+    assert not hasattr(service.snapshot, 'covariance')
+
+
+def test_build_publishes_exclusion_reason_column(tmp_path):
+    """combined_df should carry reason codes; gaps can filter on them."""
+    service  = _built_service(tmp_path, compact=False)
+    reasons  = service.combined_df['exclusion_reason']
+    expected = [t for t in service.combined_df.index if pd.isna(reasons[t])]
+    assert service.investable_tickers == expected
+
+    blocked = service.combined_df.index[service.combined_df['eps_ttm'] > 15]
+    fake    = reasons.copy()
+    fake[blocked] = 'loss_making'
+    snap    = dataclasses_replace(
+        service.snapshot, combined_df=service.combined_df.assign(exclusion_reason=fake)
+    )
+    service._publish(snap)
+    picks = {r['ticker'] for r in service.gaps(['T0'], top_n=9, investable_only=True)}
+    assert picks and not picks & set(blocked)
+
+
+# ── Shared snapshot tests ─────────────────────────────────────────────────────
+
+def test_builder_lease_is_exclusive(tmp_path):
+    """Only one lease holder per directory; release lets another take over."""
+    from app.services.snapshot_store import BuilderLease
+
+    first, second = BuilderLease(str(tmp_path)), BuilderLease(str(tmp_path))
+    assert first.acquire() is True
+    assert second.acquire() is False
+    first.release()
+    assert second.acquire() is True
+    second.release()
+
+
+def test_shared_follower_attaches_without_building(tmp_path):
+    """A follower serves the builder's mmapped snapshot and never fetches."""
+    from app.services.recommender import RecommenderService
+    from app.services.snapshot_store import BuilderLease, SnapshotStore
+
+    built = _built_service(tmp_path, compact=False, dense=True)
+    held  = BuilderLease(str(tmp_path / 'snapshots'))
+    assert held.acquire()
+
+    follower       = RecommenderService()
+    follower.store = SnapshotStore(str(tmp_path / 'snapshots'))
+    with patch('app.services.recommender.fetch_prices') as fetch, \
+         patch('app.services.recommender.settings.snapshot_poll_seconds', 60):
+        assert follower.start_shared() == 'follower'
+        follower.poll_shared()
+        fetch.assert_not_called()
+    follower.stop()
+    held.release()
+
+    assert not follower.is_building
+    assert follower.generation == built.generation
+    assert follower.similar('T0', 3) == built.similar('T0', 3)
+    base = follower.similarity_df.to_numpy()
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    assert isinstance(base, np.memmap)
+
+
+def test_shared_follower_picks_up_new_generation_and_takes_over(tmp_path):
+    """Followers follow LATEST, and take the lease once the builder exits."""
+    from app.services.recommender import RecommenderService
+    from app.services.snapshot_store import BuilderLease, SnapshotStore
+
+    builder = _built_service(tmp_path, compact=False)
+    lease   = BuilderLease(str(tmp_path / 'snapshots'))
+    assert lease.acquire()
+
+    follower       = RecommenderService()
+    follower.store = SnapshotStore(str(tmp_path / 'snapshots'))
+    with patch('app.services.recommender.settings.snapshot_poll_seconds', 60):
+        follower.start_shared()
+    assert follower.refresh_from_store() is False
+
+    builder.store.save(dataclasses_replace(builder.snapshot, generation=builder.generation + 1))
+    follower.poll_shared()
+    assert follower.generation == builder.generation + 1
+
+    lease.release()
+    with patch.object(follower, 'build_in_background') as bg:
+        follower.poll_shared()
+    bg.assert_called_once()
+    assert follower.role == 'builder'
+    follower.stop()
+
+
+def test_shared_builder_serves_mmapped_copy(tmp_path):
+    """The elected builder publishes the on-disk generation, keeping its reports."""
+    service      = _built_service(tmp_path, compact=False)
+    service.role = 'builder'
+    with patch('app.services.recommender.fetch_fundamentals', return_value=_build_fundamentals()), \
+         patch('app.services.recommender.fetch_prices', return_value=_build_prices(310)):
+        service.build(BUILD_TICKERS)
+
+    assert 'source' in service.artifacts
+    assert 'dag_report' in service.artifacts
+    assert service.artifacts['cluster_churn']['compared'] == len(BUILD_TICKERS)
+    assert not service.prices.to_numpy().flags.writeable
+
+
+def dataclasses_replace(snapshot, **changes):
+    import dataclasses
+    return dataclasses.replace(snapshot, **changes)
+
+
+# ── Universe change tests ─────────────────────────────────────────────────────
+
+def _service_without(tmp_path, held_out: list[str], compact: bool = False, dense: bool = False):
+    """Service built on BUILD_TICKERS minus `held_out`."""
+    from app.services.recommender import RecommenderService
+    from app.core.stage_cache import StageCache
+    from app.services.snapshot_store import SnapshotStore
+
+    kept           = [t for t in BUILD_TICKERS if t not in held_out]
+    service        = RecommenderService()
+    service.stages = StageCache(cache_dir=str(tmp_path))
+    service.store  = SnapshotStore(str(tmp_path / 'snapshots'))
+    with patch('app.services.recommender.fetch_fundamentals', return_value=_build_fundamentals().loc[kept]), \
+         patch('app.services.recommender.fetch_prices', return_value=_build_prices(300)[kept]), \
+         patch('app.services.recommender.settings.compact_mode', compact), \
+         patch('app.services.recommender.settings.similarity_dense', dense):
+        service.build(kept)
+    return service
+
+
+def _add(service, tickers: list[str]) -> dict:
+    with patch('app.services.recommender.fetch_fundamentals',
+               return_value=_build_fundamentals().loc[tickers]), \
+         patch('app.services.recommender.fetch_prices',
+               return_value=_build_prices(300)[tickers]) as fetch:
+        result = service.add_tickers(tickers)
+    fetch.assert_called_once_with(tickers)     # only the new symbols
+    return result
+
+
+def test_add_tickers_splices_matrices_like_a_full_recompute(tmp_path):
+    """Spliced similarity rows equal recomputing on the grown universe."""
+    from app.models.similarity import build_similarity_matrices
+    from app.models.diversification import ReturnsMatrix
+
+    service = _service_without(tmp_path, ['T8', 'T9'], dense=True)
+    pinned  = service.snapshot
+    result  = _add(service, ['T8', 'T9'])
+    snap    = service.snapshot
+
+    assert result['added'] == ['T8', 'T9'] and result['skipped'] == []
+    assert result['generation'] == pinned.generation + 1
+    assert snap.combined_df.index.tolist() == BUILD_TICKERS
+    assert len(pinned.combined_df) == 8
+    full = build_similarity_matrices(snap.scaled_df)
+    for key, mat in snap.similarity_mats.items():
+        np.testing.assert_allclose(mat.to_numpy(), full[key].to_numpy(), atol=1e-12)
+    np.testing.assert_allclose(
+        snap.returns.variances(),
+        ReturnsMatrix(snap.prices, snap.combined_df.index).variances(), atol=1e-15,
+    )
+    assert service.similar('T8', 3)
+    assert service.universe_tickers()[-2:] == ['T8', 'T9']
+
+
+def test_add_tickers_assigns_nearest_existing_cluster(tmp_path):
+    """New tickers join existing KMeans clusters, scaled by the fitted pipeline."""
+    from app.models.clustering import _apply_weights, cluster_centroids
+
+    service   = _service_without(tmp_path, ['T9'])
+    before    = service.snapshot
+    _add(service, ['T9'])
+    snap      = service.snapshot
+    centroids = cluster_centroids(before.scaled_df, before.combined_df['cluster'])
+    weighted  = _apply_weights(snap.scaled_df.loc[['T9']])[centroids.columns].to_numpy()
+    nearest   = centroids.index[((centroids.to_numpy() - weighted) ** 2).sum(axis=1).argmin()]
+
+    assert snap.combined_df.at['T9', 'cluster'] == nearest
+    assert snap.feature_pipeline is before.feature_pipeline
+    assert snap.combined_df.at['T9', 'cluster_label']
+
+
+def test_remove_tickers_drops_rows_and_columns(tmp_path):
+    """Removal is a pure selection of the old matrices; later builds keep it."""
+    service = _built_service(tmp_path, compact=True, dense=True)
+    before  = service.snapshot
+    result  = service.remove_tickers(['T3', 'FAKE'])
+    snap    = service.snapshot
+    keep    = [t for t in BUILD_TICKERS if t != 'T3']
+
+    assert result['removed'] == ['T3'] and result['skipped'] == ['FAKE']
+    assert snap.combined_df.index.tolist() == keep
+    assert 'T3' not in snap.investable_tickers and 'T3' not in snap.prices.columns
+    pd.testing.assert_frame_equal(snap.similarity_df, before.similarity_df.loc[keep, keep])
+    np.testing.assert_array_equal(snap.returns.values, np.delete(before.returns.values, 3, axis=1))
+    assert snap.compact and 'T3' not in service.universe_tickers()
+
+
+def test_universe_change_guards(tmp_path):
+    """Followers refuse changes; known tickers are skipped; refit is flagged on drift."""
+    service = _service_without(tmp_path, ['T8', 'T9'])
+
+    result = service.add_tickers(['T0'])
+    assert result['added'] == [] and result['skipped'] == ['T0']
+    assert result['generation'] == service.generation
+
+    result = _add(service, ['T8'])
+    assert result['refit_recommended'] is True
+    assert 'changed since the scaler was fitted' in result['refit_reasons'][0]
+
+    service.role = 'follower'
+    with pytest.raises(RuntimeError):
+        service.remove_tickers(['T0'])
+
+
+def test_universe_delta_survives_restart(tmp_path):
+    """Runtime changes live next to LATEST, so a fresh worker on the store keeps them."""
+    from app.services.recommender import RecommenderService
+    from app.services.snapshot_store import SnapshotStore
+
+    service = _service_without(tmp_path, ['T8', 'T9'])
+    _add(service, ['T8'])
+    service.remove_tickers(['T0'])
+
+    restarted       = RecommenderService()
+    restarted.store = SnapshotStore(str(tmp_path / 'snapshots'))
+    assert restarted.store.load_universe() == {'added': ['T8'], 'removed': ['T0']}
+    assert restarted.universe_tickers() == service.universe_tickers()
+    assert 'T8' in restarted.universe_tickers() and 'T0' not in restarted.universe_tickers()
+
+    _add(service, ['T0'])
+    assert restarted.store.load_universe() == {'added': ['T8', 'T0'], 'removed': []}
+
+
+def test_follower_universe_change_is_applied_by_the_builder(tmp_path):
+    """A follower queues the change; the builder applies it on its next poll."""
+    from app.services.recommender import RecommenderService
+    from app.services.snapshot_store import SnapshotStore
+
+    builder         = _service_without(tmp_path, ['T9'])
+    builder.role    = 'builder'
+    follower        = RecommenderService()
+    follower.store  = SnapshotStore(str(tmp_path / 'snapshots'))
+    follower.role   = 'follower'
+    follower.load_latest_snapshot()
+
+    queued = follower.queue_universe_change('add', ['T9'])
+    follower.queue_universe_change('remove', ['T0', 'T1', 'T2', 'T3', 'T4', 'T5', 'T6', 'T7', 'T9'])
+    assert [r for r, _ in builder.store.queued_universe_changes()][0] == queued['request_id']
+    before = builder.generation
+    with patch('app.services.recommender.fetch_fundamentals', return_value=_build_fundamentals().loc[['T9']]), \
+         patch('app.services.recommender.fetch_prices', return_value=_build_prices(300)[['T9']]):
+        builder.poll_shared()
+
+    assert builder.generation == before + 1                  # the impossible removal was dropped
+    assert builder.store.queued_universe_changes() == []
+    assert 'T9' in builder.universe_tickers() and 'T9' in follower.universe_tickers()
+    assert follower.refresh_from_store()
+    assert follower.generation == builder.generation and 'T9' in follower.combined_df.index
+
+
+def test_add_tickers_minibatch_partial_fits_a_copy(tmp_path):
+    """In minibatch mode new tickers update a copy of the build's ClusterModel."""
+    with patch('app.services.recommender.settings.cluster_mode', 'minibatch'):
+        service = _service_without(tmp_path, ['T9'])
+    before    = service.snapshot.artifacts['cluster_model']
+    centroids = before.centroids.copy()
+    _add(service, ['T9'])
+    after     = service.snapshot.artifacts['cluster_model']
+
+    assert before.mode == after.mode == 'minibatch'
+    assert after is not before
+    pd.testing.assert_frame_equal(before.centroids, centroids)
+    assert service.snapshot.combined_df.at['T9', 'cluster'] == after.predict(
+        service.snapshot.scaled_df.loc[['T9']]
+    ).iloc[0]
+
+
+def test_clusters_places_members_and_outsiders(tmp_path):
+    """Members report the built cluster; outsiders are fetched once and placed by the model."""
+    from app.models.clustering import label_tickers
+
+    service = _service_without(tmp_path, ['T8', 'T9'])
+    snap    = service.snapshot
+    outside = _build_fundamentals().loc[['T8', 'T9']]
+    with patch('app.services.recommender.fetch_fundamentals', return_value=outside), \
+         patch('app.services.recommender.fetch_prices', return_value=_build_prices(300)[['T8', 'T9']]) as fetch:
+        result = service.clusters(['T9', 'T0', 'T8'])
+        again  = service.clusters(['T9'])
+    fetch.assert_called_once_with(['T9', 'T8'])     # outsiders only, second call from cache
+
+    by_ticker = {r['ticker']: r for r in result['results']}
+    assert [r['ticker'] for r in result['results']] == ['T9', 'T0', 'T8']
+    assert result['missing'] == []
+    assert by_ticker['T0']['in_universe'] and not by_ticker['T8']['in_universe']
+    assert by_ticker['T0']['cluster'] == snap.combined_df.loc['T0', 'cluster']
+    assert by_ticker['T0']['cluster_label'] == snap.combined_df.loc['T0', 'cluster_label']
+    assert again['results'][0] == by_ticker['T9']
+
+    # Outsiders: same placement and labels as adding them to the universe would give
+    _add(service, ['T8', 'T9'])
+    added = service.combined_df.loc[['T8', 'T9']]
+    for ticker in ['T8', 'T9']:
+        assert by_ticker[ticker]['cluster'] == added.loc[ticker, 'cluster']
+        assert by_ticker[ticker]['cluster_label'] == label_tickers(added).loc[ticker]
+        assert by_ticker[ticker]['distance'] >= 0
+
+
+def test_clusters_reports_tickers_without_data(tmp_path):
+    service = _service_without(tmp_path, ['T8', 'T9'])
+    with patch('app.services.recommender.fetch_fundamentals', return_value=pd.DataFrame()), \
+         patch('app.services.recommender.fetch_prices', return_value=pd.DataFrame()):
+        result = service.clusters(['T0', 'ZZZZ'])
+    assert [r['ticker'] for r in result['results']] == ['T0']
+    assert result['missing'] == ['ZZZZ']
+
+
+def test_fetch_failures_count_as_missing_data(tmp_path):
+    """A failed download is reported as no data, never as an unhandled error."""
+    service = _service_without(tmp_path, ['T8', 'T9'])
+    with patch('app.services.recommender.fetch_prices', side_effect=ConnectionError("offline")), \
+         patch('app.services.recommender.fetch_fundamentals', return_value=_build_fundamentals()):
+        assert service.clusters(['ZZZZ'])['missing'] == ['ZZZZ']
+        with pytest.raises(ValueError):
+            service.similar_external('ZZZZ')
+
+
+def test_stability_computed_once_per_generation(tmp_path):
+    """stability() is cached for the live generation and recomputed after a rebuild."""
+    import app.services.recommender as recommender_module
+
+    service = _service_without(tmp_path, [])
+    with patch.object(recommender_module, 'bootstrap_stability',
+                      wraps=recommender_module.bootstrap_stability) as run, \
+         patch('app.services.recommender.settings.stability_bootstrap', 4), \
+         patch('app.services.recommender.settings.build_use_processes', False):
+        first = service.stability(wait=True)
+        assert service.stability() is first
+        service.remove_tickers(['T9'])
+        second = service.stability(wait=True)
+
+    assert run.call_count == 2
+    assert first['summary']['n_boot'] == 4
+    assert len(first['tickers']) == 10 and len(second['tickers']) == 9
+
+
+def test_stability_runs_off_the_request_thread(tmp_path):
+    """Publishing starts the run in the background; callers get None until it is done."""
+    import threading
+    import app.services.recommender as recommender_module
+
+    service = _service_without(tmp_path, ['T9'])
+    release = threading.Event()
+    result  = {'summary': {}, 'clusters': pd.DataFrame(), 'tickers': pd.DataFrame()}
+
+    def slow_bootstrap(*args, **kwargs):
+        release.wait(10)
+        return result
+
+    with patch.object(recommender_module, 'bootstrap_stability', side_effect=slow_bootstrap) as run, \
+         patch('app.services.recommender.settings.stability_on_publish', True):
+        service.remove_tickers(['T8'])
+        assert service._stability_thread is not None
+        assert service.stability() is None
+        release.set()
+        assert service.stability(wait=True) is result
+    assert run.call_count == 1
+
+
+def test_stability_computed_by_the_builder_only(tmp_path):
+    """Followers read the builder's stored result; a restarted builder reuses it too."""
+    import app.services.recommender as recommender_module
+    from app.services.recommender import RecommenderService
+    from app.services.snapshot_store import SnapshotStore
+
+    def _worker(role):
+        worker       = RecommenderService()
+        worker.store = SnapshotStore(str(tmp_path / 'snapshots'))
+        worker.role  = role
+        worker.load_latest_snapshot()
+        return worker
+
+    builder      = _service_without(tmp_path, ['T9'])
+    builder.role = 'builder'
+    with patch.object(recommender_module, 'bootstrap_stability',
+                      wraps=recommender_module.bootstrap_stability) as run, \
+         patch('app.services.recommender.settings.stability_bootstrap', 4), \
+         patch('app.services.recommender.settings.stability_on_publish', True):
+        follower = _worker('follower')
+        assert follower._stability_thread is None
+        assert follower.stability() is None
+
+        result = builder.stability(wait=True)
+        stored = follower.stability()
+        assert stored['summary'] == result['summary']
+        pd.testing.assert_frame_equal(stored['tickers'], result['tickers'])
+
+        restarted = _worker('builder')
+        assert restarted.stability(wait=True)['summary'] == result['summary']
+    assert run.call_count == 1
+
+
+def test_stability_failure_is_reported(tmp_path):
+    """A failed background run raises for its generation instead of retrying per request."""
+    import app.services.recommender as recommender_module
+
+    service = _service_without(tmp_path, [])
+    with patch.object(recommender_module, 'bootstrap_stability', side_effect=MemoryError("too big")) as run:
+        with pytest.raises(RuntimeError, match="too big"):
+            service.stability(wait=True)
+        with pytest.raises(RuntimeError):
+            service.stability()
+    assert run.call_count == 1
+
@@ -6,6 +6,8 @@ Tests cover HTTP status codes, response shapes, and error handling.
 """
 
 import pytest
+import numpy as np
+import pandas as pd
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock, PropertyMock
 
@@ -15,9 +17,19 @@ from unittest.mock import patch, MagicMock, PropertyMock
 def mock_recommender():
     """Mock recommender service with is_ready=True and sample data."""
     mock = MagicMock()
-    mock.is_ready = True
+    mock.is_ready    = True
+    mock.is_building = False
+    mock.generation  = 1
+    mock.role        = 'standalone'
+    mock.artifacts   = {'cluster_churn': {'compared': 5, 'changed': 1, 'churn': 0.2}}
     mock.combined_df.index.tolist.return_value = ['AAPL', 'MSFT', 'JNJ', 'XOM', 'JPM']
 
+    # memory_report() response
+    mock.memory_report.return_value = {
+        'prices_mb': 1.0, 'combined_mb': 0.1, 'scaled_mb': 0.05,
+        'similarity_mb': 0.06, 'total_mb': 1.21, 'compact': False,
+    }
+
     # similar() response
     mock.similar.return_value = [
         {
@@ -30,11 +42,30 @@ def mock_recommender():
         }
     ]
 
+    # similar_external() — out-of-universe tickers fail to fetch by default
+    mock.similar_external.side_effect = ValueError("No data available")
+
     # gaps() response
     mock.gaps.return_value = [
         {'ticker': 'JNJ', 'sector': 'Healthcare', 'correlation': -0.05}
     ]
 
+    # add_tickers() / remove_tickers() response
+    mock.add_tickers.return_value = {
+        'added': ['NFLX'], 'removed': [], 'skipped': [], 'generation': 2,
+        'ticker_count': 6, 'seconds': 1.2,
+        'refit_recommended': False, 'refit_reasons': [],
+    }
+
+    # clusters() response
+    mock.clusters.return_value = {
+        'results': [{
+            'ticker': 'AAPL', 'cluster': 3, 'cluster_label': 'Quality Growth',
+            'sector': 'Technology', 'distance': 1.25, 'in_universe': True,
+        }],
+        'missing': [],
+    }
+
     # optimize() response
     mock.optimize.return_value = {
         'weights':         {'AAPL': 0.5, 'MSFT': 0.5},
@@ -58,9 +89,10 @@ def mock_recommender():
 def client(mock_recommender):
     """TestClient with mocked recommender."""
     import app.api.routes as routes_module
-    with patch.object(routes_module, 'recommender', mock_recommender):
-        from app.main import app
-        with TestClient(app, raise_server_exceptions=False) as c:
+    import app.main as main_module
+    with patch.object(routes_module, 'recommender', mock_recommender), \
+         patch.object(main_module, 'recommender', mock_recommender):
+        with TestClient(main_module.app, raise_server_exceptions=False) as c:
             yield c
 
 
@@ -82,6 +114,13 @@ def test_health_response_shape(client):
     assert 'uptime_seconds'  in data
 
 
+def test_health_includes_memory_report(client):
+    """Health should report memory usage of the built universe."""
+    data = client.get('/api/v1/health').json()
+    assert data['memory']['total_mb'] == pytest.approx(1.21)
+    assert data['memory']['compact'] is False
+
+
 def test_health_status_ok(client):
     """Health status should be 'ok'."""
     response = client.get('/api/v1/health')
@@ -94,6 +133,46 @@ def test_health_ready_true(client):
     assert response.json()['ready'] is True
 
 
+def test_startup_builds_in_background(client, mock_recommender):
+    """Lifespan should start a background build instead of blocking on build()."""
+    mock_recommender.build_in_background.assert_called_once()
+    mock_recommender.build.assert_not_called()
+
+
+def test_startup_shared_mode_joins_election(mock_recommender):
+    """With SHARED_SNAPSHOT the lifespan should elect instead of building directly."""
+    import app.api.routes as routes_module
+    import app.main as main_module
+    mock_recommender.role = 'follower'
+    with patch.object(routes_module, 'recommender', mock_recommender), \
+         patch.object(main_module, 'recommender', mock_recommender), \
+         patch.object(main_module.settings, 'shared_snapshot', True):
+        with TestClient(main_module.app) as c:
+            assert c.get('/api/v1/health').json()['role'] == 'follower'
+    mock_recommender.start_shared.assert_called_once()
+    mock_recommender.build_in_background.assert_not_called()
+    mock_recommender.stop.assert_called_once()
+
+
+def test_health_reports_generation(client):
+    """Health should expose the live snapshot generation and build state."""
+    data = client.get('/api/v1/health').json()
+    assert data['generation'] == 1
+    assert data['building'] is False
+    assert data['cluster_churn'] == pytest.approx(0.2)
+
+
+def test_not_ready_returns_503(client, mock_recommender):
+    """Query routes should 503 until the first snapshot is published."""
+    mock_recommender.is_ready    = False
+    mock_recommender.is_building = True
+    assert client.get('/api/v1/similar/AAPL').status_code == 503
+    assert client.post('/api/v1/gaps', json={'portfolio': ['AAPL']}).status_code == 503
+    health = client.get('/api/v1/health').json()
+    assert health['ready'] is False and health['building'] is True
+    assert health['memory'] is None
+
+
 # ── /similar/{ticker} ─────────────────────────────────────────────────────────
 
 def test_similar_returns_200(client):
@@ -119,7 +198,7 @@ def test_similar_response_shape(client):
 def test_similar_top_n_param(client, mock_recommender):
     """top_n query param should be passed to recommender."""
     client.get('/api/v1/similar/AAPL?top_n=3')
-    mock_recommender.similar.assert_called_with('AAPL', 3)
+    mock_recommender.similar.assert_called_with('AAPL', 3, None)
 
 
 def test_similar_invalid_ticker_returns_400(client):
@@ -128,10 +207,118 @@ def test_similar_invalid_ticker_returns_400(client):
     assert response.status_code == 400
 
 
+def test_similar_out_of_universe_uses_external(client, mock_recommender):
+    """Ticker outside the universe should be answered via similar_external."""
+    mock_recommender.similar_external.side_effect = None
+    mock_recommender.similar_external.return_value = mock_recommender.similar.return_value
+    response = client.get('/api/v1/similar/nflx?top_n=3')
+    assert response.status_code == 200
+    mock_recommender.similar_external.assert_called_with('NFLX', 3, None)
+    mock_recommender.similar.assert_not_called()
+
+
+def test_similar_malformed_ticker_rejected_before_fetch(client, mock_recommender):
+    """Malformed out-of-universe symbols return 400 without a live fetch."""
+    response = client.get('/api/v1/similar/not%20a%20ticker!')
+    assert response.status_code == 400
+    assert response.json()['detail']['error'] == 'Invalid ticker format'
+    mock_recommender.similar_external.assert_not_called()
+
+
 def test_similar_ticker_uppercased(client, mock_recommender):
     """Ticker should be uppercased before calling recommender."""
     client.get('/api/v1/similar/aapl')
-    mock_recommender.similar.assert_called_with('AAPL', 5)
+    mock_recommender.similar.assert_called_with('AAPL', 5, None)
+
+
+def test_similar_fund_weight_param(client, mock_recommender):
+    """fund_weight is passed through; values outside [0, 1] are rejected."""
+    client.get('/api/v1/similar/AAPL?fund_weight=0.5')
+    mock_recommender.similar.assert_called_with('AAPL', 5, 0.5)
+    assert client.get('/api/v1/similar/AAPL?fund_weight=1.5').status_code == 422
+
+
+def test_similar_batch_scores_many_tickers(client, mock_recommender):
+    """POST /similar passes unique uppercased tickers, top_n and fund_weight."""
+    mock_recommender.similar_batch.return_value = {
+        'results': {'AAPL': mock_recommender.similar.return_value}, 'missing': ['FAKE'],
+    }
+    response = client.post(
+        '/api/v1/similar', json={'tickers': ['aapl', 'AAPL', 'fake'], 'top_n': 2, 'fund_weight': 0.2},
+    )
+    assert response.status_code == 200
+    assert response.json()['results']['AAPL'][0]['ticker'] == mock_recommender.similar.return_value[0]['ticker']
+    assert response.json()['missing'] == ['FAKE']
+    mock_recommender.similar_batch.assert_called_with(['AAPL', 'FAKE'], 2, 0.2)
+    assert client.post('/api/v1/similar', json={'tickers': ['AAPL'], 'fund_weight': -1}).status_code == 422
+
+
+# ── /cluster ──────────────────────────────────────────────────────────────────
+
+def test_cluster_returns_assignment(client, mock_recommender):
+    """GET /cluster/{ticker} returns one placement, ticker uppercased."""
+    response = client.get('/api/v1/cluster/aapl')
+    assert response.status_code == 200
+    assert response.json()['cluster_label'] == 'Quality Growth'
+    mock_recommender.clusters.assert_called_with(['AAPL'])
+
+
+def test_cluster_without_data_returns_404(client, mock_recommender):
+    mock_recommender.clusters.return_value = {'results': [], 'missing': ['FAKE']}
+    response = client.get('/api/v1/cluster/FAKE')
+    assert response.status_code == 404
+
+
+def test_cluster_malformed_ticker_rejected_before_fetch(client, mock_recommender):
+    """GET and POST /cluster return 400 for malformed symbols without placing them."""
+    assert client.get('/api/v1/cluster/$$$').status_code == 400
+    assert client.post('/api/v1/cluster', json={'tickers': ['AAPL', '../etc']}).status_code == 400
+    mock_recommender.clusters.assert_not_called()
+
+
+def test_cluster_batch_dedupes_and_reports_missing(client, mock_recommender):
+    """POST /cluster passes unique uppercased tickers and returns missing ones."""
+    mock_recommender.clusters.return_value = {
+        'results': mock_recommender.clusters.return_value['results'], 'missing': ['FAKE'],
+    }
+    response = client.post('/api/v1/cluster', json={'tickers': ['aapl', 'AAPL', 'fake']})
+    assert response.status_code == 200
+    assert response.json()['missing'] == ['FAKE']
+    mock_recommender.clusters.assert_called_with(['AAPL', 'FAKE'])
+    assert client.post('/api/v1/cluster', json={'tickers': []}).status_code == 422
+
+
+# ── /evaluate/stability ───────────────────────────────────────────────────────
+
+def test_stability_lists_least_stable_first(client, mock_recommender):
+    mock_recommender.stability.return_value = {
+        'summary':  {'n_boot': 50, 'mean_stability': 0.8, 'unstable': ['JNJ']},
+        'clusters': pd.DataFrame({'size': [3, 2], 'stability': [0.9, 0.5]},
+                                 index=pd.Index([0, 1], name='cluster')),
+        'tickers':  pd.DataFrame({'cluster': [0, 0, 1], 'stability': [0.95, np.nan, 0.4], 'sampled': [40] * 3},
+                                 index=['AAPL', 'MSFT', 'JNJ']),
+    }
+    response = client.get('/api/v1/evaluate/stability?limit=2')
+    assert response.status_code == 200
+    data = response.json()
+    assert [t['ticker'] for t in data['tickers']] == ['JNJ', 'AAPL']
+    assert data['clusters'][1] == {'cluster': 1, 'size': 2, 'stability': 0.5}
+    assert data['summary']['unstable'] == ['JNJ']
+
+
+def test_stability_running_returns_503(client, mock_recommender):
+    """While the background analysis runs the endpoint answers 503 with Retry-After."""
+    mock_recommender.stability.return_value = None
+    response = client.get('/api/v1/evaluate/stability')
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '5'
+
+
+def test_stability_failure_returns_500(client, mock_recommender):
+    mock_recommender.stability.side_effect = RuntimeError("Stability analysis failed for generation 1")
+    response = client.get('/api/v1/evaluate/stability')
+    assert response.status_code == 500
+    assert 'generation 1' in response.json()['detail']
 
 
 # ── /gaps ─────────────────────────────────────────────────────────────────────
@@ -171,7 +358,48 @@ def test_gaps_empty_portfolio_returns_422(client):
 def test_gaps_top_n_param(client, mock_recommender):
     """top_n should be passed to recommender."""
     client.post('/api/v1/gaps', json={'portfolio': ['AAPL', 'MSFT'], 'top_n': 3})
-    mock_recommender.gaps.assert_called_with(['AAPL', 'MSFT'], 3)
+    mock_recommender.gaps.assert_called_with(
+        ['AAPL', 'MSFT'], 3, weights=None, rank_by='correlation', add_weight=0.05,
+        investable_only=False,
+    )
+
+
+def test_gaps_weighted_marginal_vol(client, mock_recommender):
+    """Weights and rank_by should be forwarded to the recommender."""
+    response = client.post('/api/v1/gaps', json={
+        'portfolio': ['AAPL', 'MSFT'], 'weights': [0.7, 0.3], 'rank_by': 'marginal_vol',
+    })
+    assert response.status_code == 200
+    mock_recommender.gaps.assert_called_with(
+        ['AAPL', 'MSFT'], 5, weights=[0.7, 0.3], rank_by='marginal_vol', add_weight=0.05,
+        investable_only=False,
+    )
+
+
+def test_gaps_vol_change_mode(client, mock_recommender):
+    """rank_by=vol_change should forward the candidate weight."""
+    response = client.post('/api/v1/gaps', json={
+        'portfolio': ['AAPL', 'MSFT'], 'rank_by': 'vol_change', 'add_weight': 0.1,
+    })
+    assert response.status_code == 200
+    assert mock_recommender.gaps.call_args.kwargs['add_weight'] == 0.1
+    assert client.post('/api/v1/gaps', json={
+        'portfolio': ['AAPL'], 'rank_by': 'vol_change', 'add_weight': 1.5,
+    }).status_code == 422
+
+
+def test_gaps_weights_length_mismatch_returns_422(client):
+    response = client.post('/api/v1/gaps', json={'portfolio': ['AAPL', 'MSFT'], 'weights': [1.0]})
+    assert response.status_code == 422
+
+
+def test_gaps_accepts_large_portfolio():
+    """The old 20-holding cap is lifted to MAX_HOLDINGS."""
+    from app.api.schemas import GapsRequest, MAX_HOLDINGS
+    req = GapsRequest(portfolio=[f"T{i}" for i in range(500)], weights=[1.0] * 500)
+    assert len(req.portfolio) == 500
+    with pytest.raises(ValueError):
+        GapsRequest(portfolio=['A'] * (MAX_HOLDINGS + 1))
 
 
 # ── /optimize ─────────────────────────────────────────────────────────────────
@@ -241,6 +469,65 @@ def test_optimize_tickers_uppercased(client, mock_recommender):
     assert 'MSFT' in call_args
 
 
+# ── /admin/universe ───────────────────────────────────────────────────────────
+
+ADMIN = {'X-Admin-Token': 'secret'}
+
+
+@pytest.fixture
+def admin_token():
+    with patch('app.api.routes.settings.admin_token', 'secret'):
+        yield
+
+
+def test_universe_change_disabled_without_admin_token(client, mock_recommender):
+    """With no ADMIN_TOKEN configured the admin endpoints are closed, token or not."""
+    with patch('app.api.routes.settings.admin_token', ''):
+        assert client.post('/api/v1/admin/universe/add', json={'tickers': ['NFLX']}).status_code == 403
+        assert client.post('/api/v1/admin/universe/remove', json={'tickers': ['AAPL']},
+                           headers={'X-Admin-Token': ''}).status_code == 403
+    mock_recommender.add_tickers.assert_not_called()
+    mock_recommender.remove_tickers.assert_not_called()
+
+
+def test_universe_add_returns_change(client, mock_recommender, admin_token):
+    """POST /admin/universe/add should uppercase tickers and report the change."""
+    response = client.post('/api/v1/admin/universe/add', json={'tickers': [' nflx']}, headers=ADMIN)
+    assert response.status_code == 200
+    assert response.json()['added'] == ['NFLX']
+    mock_recommender.add_tickers.assert_called_once_with(['NFLX'])
+
+
+def test_universe_change_conflicts_return_409(client, mock_recommender, admin_token):
+    """In-flight builds should refuse universe changes."""
+    mock_recommender.is_building = True
+    assert client.post('/api/v1/admin/universe/remove', json={'tickers': ['AAPL']},
+                       headers=ADMIN).status_code == 409
+    mock_recommender.remove_tickers.assert_not_called()
+
+
+def test_universe_change_on_follower_is_queued(client, mock_recommender, admin_token):
+    """A follower hands the change to the builder and answers 202."""
+    mock_recommender.role = 'follower'
+    mock_recommender.queue_universe_change.return_value = {
+        'request_id': '1-2-3.json', 'change': 'add', 'tickers': ['NFLX'],
+    }
+    response = client.post('/api/v1/admin/universe/add', json={'tickers': ['nflx']}, headers=ADMIN)
+    assert response.status_code == 202
+    assert response.json()['request_id'] == '1-2-3.json'
+    mock_recommender.queue_universe_change.assert_called_once_with('add', ['NFLX'])
+    mock_recommender.add_tickers.assert_not_called()
+
+
+def test_universe_change_requires_admin_token(client, mock_recommender, admin_token):
+    """With ADMIN_TOKEN set the header must match."""
+    mock_recommender.remove_tickers.side_effect = ValueError("At least 2 tickers must remain")
+    url = '/api/v1/admin/universe/remove'
+    assert client.post(url, json={'tickers': ['AAPL']}).status_code == 401
+    assert client.post(url, json={'tickers': ['AAPL']}, headers={'X-Admin-Token': 'wrong'}).status_code == 401
+    assert client.post(url, json={'tickers': ['AAPL']}, headers=ADMIN).status_code == 400
+
+
 # ── Schema validation tests ───────────────────────────────────────────────────
 
 def test_gaps_request_uppercase_validator():